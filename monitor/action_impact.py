@@ -0,0 +1,285 @@
+"""Impacto das ações: antes × depois de implementada_em (série temporal interrompida).
+
+Para cada ação com implementada_em e cada métrica ligada a ela (relation_graph),
+em todos os contratantes/planejamentos de uma vez (um bincount por estatística):
+
+- reta de mínimos quadrados nos `days` dias antes (pré) e depois (pós) da
+  implementação, x = dias desde implementada_em (regressão segmentada: nível e
+  inclinação livres em cada lado)
+  ➜ nivel = salto no dia da implementação, inclinacao = mudança de slope/dia
+- efeito = pós observado - pré extrapolado no último dia do pós, com t
+  (σ² combinado dos dois lados, n - 4 g.l.)
+- efeito_norm = efeito / desvio da métrica no pré: comparável entre métricas
+  de unidades diferentes
+- sentido desejado por métrica: `tipo` da meta no plano (menor_que ➜ queda é
+  boa); sem meta, o trecho de impacto_esperado que cita a métrica (todas as
+  palavras do nome, ex.: "Redução do estoque inativo" ➜ total_sku_inativo_(estoque_>_0));
+  sem nenhum dos dois, a métrica não entra na eficácia (sentido None)
+
+Eficácia da ação (observado = média do efeito_norm no sentido desejado):
+
+- alta       ➜ todas as métricas avaliadas melhoraram com significância (5%)
+- média      ➜ parte delas
+- contrária  ➜ nenhuma melhorou e alguma piorou com significância
+- baixa      ➜ nenhuma mudança significativa
+
+Ações sem data, sem métricas no extrato, com menos de MIN_POINTS pontos de
+cada lado ou sem sentido desejado em nenhuma métrica ficam sem avaliação
+(observado/eficacia = None).
+
+Uso
+---
+$ python action_impact.py --input_dir ./data --contratante 45 --planejamento 123
+"""
+from __future__ import annotations
+import argparse, re, sys, unicodedata
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metric_engine
+import projection
+from metric_catalog import MetricCatalog, PLAN_COL
+from metric_store import TENANT_COL
+from relation_graph import RelationGraph
+
+DAYS = 30          # janela de cada lado da implementação
+MIN_POINTS = 3     # pontos de cada lado (≥ 2 g.l. no σ² combinado)
+ALPHA = 0.05       # significância do efeito (bicaudal)
+ACTION_COL = "action_id"
+CASE_KEYS = [TENANT_COL, PLAN_COL, ACTION_COL, metric_engine.METRIC_COL]
+SENSE = {1: "alta", -1: "queda"}  # direction ➜ sentido desejado no snapshot
+
+_DOWN = re.compile(r"redu[zçc]|diminu|queda|menos\b|elimin|zerar", re.IGNORECASE)
+_UP = re.compile(r"aument|eleva|cresc|melhor|mais\b|ganho|maior", re.IGNORECASE)
+_SIGNED = re.compile(r"^\s*([+-])\s*\d")
+_CLAUSES = re.compile(r"[;\n]|,(?!\d)")
+_WORDS = re.compile(r"[a-z]+")
+# partes do nome que não identificam a métrica no texto
+_GENERIC_WORDS = {"total", "sku", "skus", "percent", "custo", "com", "de", "em", "dias"}
+
+################################################################################
+# Casos (ação × métrica × plano)
+################################################################################
+
+def expected_sign(text: Any) -> int:
+    """Sentido pedido em impacto_esperado: -1 (redução), 1 (aumento) ou 0 (não dá p/ dizer)."""
+    if not isinstance(text, str) or not text.strip():
+        return 0
+    m = _SIGNED.match(text)
+    if m:
+        return -1 if m.group(1) == "-" else 1
+    down, up = _DOWN.search(text), _UP.search(text)
+    if down and (not up or down.start() < up.start()):
+        return -1
+    return 1 if up else 0
+
+
+def _words(text: str) -> set:
+    plain = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+    return set(_WORDS.findall(plain))
+
+
+def expected_directions(text: Any, metric_ids: Iterable[str]) -> Dict[str, int]:
+    """Sentido pedido em impacto_esperado p/ cada métrica citada: -1 (redução) ou 1 (aumento).
+
+    Cada trecho (separado por ';', ',' ou quebra de linha) vale só p/ as métricas
+    cujas palavras do nome aparecem todas nele; métricas não citadas, ou citadas
+    em trechos de sentidos opostos, ficam de fora.
+    """
+    if not isinstance(text, str) or not text.strip():
+        return {}
+    clauses = [(expected_sign(c), _words(c)) for c in _CLAUSES.split(text)]
+    out: Dict[str, int] = {}
+    for mid in metric_ids:
+        key = _words(mid.replace("_", " ")) - _GENERIC_WORDS
+        signs = {sign for sign, words in clauses if sign and key and key <= words}
+        if len(signs) == 1:
+            out[mid] = signs.pop()
+    return out
+
+
+def impact_cases(graph: RelationGraph, plans: Iterable[Tuple[Any, Any]],
+                 catalog: Optional[MetricCatalog] = None) -> pd.DataFrame:
+    """Uma linha por (contratante, planejamento, ação, métrica) com data de implementação.
+
+    Colunas: CASE_KEYS + t0 (implementada_em) + direction (1 = alta é boa, -1 = queda é
+    boa, 0 = sem sentido desejado: fora da eficácia).
+    """
+    rows: List[Tuple[Any, ...]] = []
+    for contratante, planejamento in plans:
+        for aid in graph.actions():
+            info = graph.info("action", aid, planejamento)
+            t0 = pd.to_datetime(info.get("implementada_em"), errors="coerce")
+            metrics = graph.metrics_for_action(aid)
+            if pd.isna(t0) or not metrics:
+                continue
+            signs = expected_directions(info.get("impacto_esperado"), metrics)
+            rows += [(contratante, planejamento, aid, mid, t0.normalize(), signs.get(mid, 0)) for mid in metrics]
+    cases = pd.DataFrame(rows, columns=[*CASE_KEYS, "t0", "direction"])
+    if catalog is not None and len(cases):
+        # meta do plano manda: menor_que (direção 1 no catálogo) ➜ queda é boa
+        _, target_dir = catalog.lookup(cases[metric_engine.METRIC_COL], cases[PLAN_COL])
+        cases["direction"] = np.where(target_dir != 0, -target_dir.astype(int), cases["direction"])
+    return cases
+
+
+def history_bounds(cases: pd.DataFrame, days: int = DAYS) -> Optional[Tuple[date, date]]:
+    """Dias (inclusivos) do extrato necessários p/ avaliar os casos (None se não há casos).
+
+    Datas sem hora: o store lê o último dia inteiro, como a janela de `evaluate`.
+    """
+    if cases.empty:
+        return None
+    lo, hi = cases["t0"].min() - pd.Timedelta(days=days), cases["t0"].max() + pd.Timedelta(days=days)
+    return lo.date(), hi.date()
+
+################################################################################
+# Avaliação vetorizada
+################################################################################
+
+def evaluate(df: pd.DataFrame, ts_col: str, cases: pd.DataFrame, *, days: int = DAYS,
+             alpha: float = ALPHA) -> pd.DataFrame:
+    """Regressão segmentada de todos os casos sobre o extrato largo `df` (id_contratante, ts, métricas).
+
+    Devolve `cases` com n_antes, n_depois, nivel, inclinacao, efeito, efeito_norm,
+    t e significativo; casos sem pontos suficientes ficam com NaN.
+    """
+    out = cases.reset_index(drop=True).copy()
+    metric_cols = [m for m in pd.unique(out[metric_engine.METRIC_COL]) if m in df.columns]
+    ncases = len(out)
+
+    long = metric_engine.to_long(df, ts_col, metric_cols, [TENANT_COL])
+    long["mcode"] = long[metric_engine.METRIC_COL].cat.codes.astype("int64")
+    keyed = out[[TENANT_COL, metric_engine.METRIC_COL, "t0"]].assign(
+        case=np.arange(ncases),
+        mcode=pd.Index(metric_cols).get_indexer(out[metric_engine.METRIC_COL]))
+    rows = long[[TENANT_COL, "mcode", ts_col, "value"]].merge(
+        keyed[keyed["mcode"] >= 0], on=[TENANT_COL, "mcode"], how="inner")
+
+    x = ((rows[ts_col] - rows["t0"]) // pd.Timedelta(days=1)).to_numpy(dtype=float)
+    keep = (x >= -days) & (x <= days)
+    x, case = x[keep], rows["case"].to_numpy()[keep]
+    y = rows["value"].to_numpy()[keep]
+    post = (x >= 0).astype("int64")
+
+    # y centrado na média do caso (estabilidade numérica das somas)
+    cnt = np.bincount(case, minlength=ncases)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        y = y - (np.bincount(case, y, minlength=ncases) / cnt)[case]
+    cell = case * 2 + post
+
+    def acc(weights=None) -> np.ndarray:
+        return np.bincount(cell, weights, minlength=ncases * 2).reshape(ncases, 2).astype(float)
+
+    n, sx, sy, sxx, sxy, syy = acc(), acc(x), acc(y), acc(x * x), acc(x * y), acc(y * y)
+    xe = np.zeros(ncases)
+    np.maximum.at(xe, case[post == 1], x[post == 1])  # último dia do pós
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        xbar, ybar = sx / n, sy / n
+        cxx, cxy, cyy = sxx - sx * xbar, sxy - sx * ybar, syy - sy * ybar
+        b = cxy / cxx
+        a = ybar - b * xbar                       # valor de cada reta em x = 0 (implementação)
+        sse = np.maximum(cyy - b * cxy, 0.0)
+        dof = n.sum(axis=1) - 4
+        s2 = sse.sum(axis=1) / dof
+        effect = (a[:, 1] - a[:, 0]) + (b[:, 1] - b[:, 0]) * xe
+        var = s2 * (1 / n[:, 0] + (xe - xbar[:, 0]) ** 2 / cxx[:, 0]
+                    + 1 / n[:, 1] + (xe - xbar[:, 1]) ** 2 / cxx[:, 1])
+        t = effect / np.sqrt(var)
+        sd_pre = np.sqrt(np.maximum(cyy[:, 0], 0.0) / n[:, 0])
+        norm = np.where(sd_pre > 0, effect / sd_pre, np.nan)
+
+    ok = (n >= MIN_POINTS).all(axis=1) & (cxx > 0).all(axis=1)
+    crit = projection.t_ppf(1 - alpha / 2, np.where(ok, dof, np.nan))
+    nan = np.full(ncases, np.nan)
+    out["n_antes"], out["n_depois"] = n[:, 0].astype("int64"), n[:, 1].astype("int64")
+    out["nivel"] = np.where(ok, a[:, 1] - a[:, 0], nan)
+    out["inclinacao"] = np.where(ok, b[:, 1] - b[:, 0], nan)
+    out["efeito"] = np.where(ok, effect, nan)
+    out["efeito_norm"] = np.where(ok, norm, nan)
+    out["t"] = np.where(ok, np.where(np.isnan(t), 0.0, t), nan)  # pré e pós constantes e iguais: t = 0
+    out["significativo"] = ok & (np.abs(out["t"].to_numpy()) >= crit)
+    return out
+
+################################################################################
+# Resumo por ação (campos do snapshot)
+################################################################################
+
+def _opt(v: float, ndigits: int) -> Optional[float]:
+    return None if v is None or not np.isfinite(v) else round(float(v), ndigits)
+
+
+def _efficacy(good: np.ndarray, bad: np.ndarray) -> str:
+    if good.all():
+        return "alta"
+    if good.any():
+        return "média"
+    return "contrária" if bad.any() else "baixa"
+
+
+def summarize(results: pd.DataFrame) -> Dict[Tuple[Any, Any], Dict[str, Dict[str, Any]]]:
+    """{(contratante, planejamento): {action_id: observado, eficacia, recomendacao, impacto}}."""
+    out: Dict[Tuple[Any, Any], Dict[str, Dict[str, Any]]] = {}
+    rated = results[results["t"].notna()]
+    for (contratante, planejamento, aid), g in rated.groupby([TENANT_COL, PLAN_COL, ACTION_COL], sort=False):
+        direction = g["direction"].to_numpy()
+        judged = direction != 0  # métricas sem sentido desejado não pesam na eficácia
+        signed_t = direction * g["t"].to_numpy()
+        sig = g["significativo"].to_numpy()
+        good, bad = (sig & (signed_t > 0))[judged], (sig & (signed_t < 0))[judged]
+        norm = (direction * g["efeito_norm"].to_numpy(dtype=float))[judged]
+        efficacy = _efficacy(good, bad) if judged.any() else None
+        out.setdefault((contratante, planejamento), {})[aid] = {
+            "observado": _opt(np.nanmean(norm) if np.isfinite(norm).any() else np.nan, 2),
+            "eficacia": efficacy,
+            "recomendacao": efficacy and ("manter" if efficacy == "alta" else "ajustar"),
+            "impacto": [
+                {"metric": r.metric_id, "sentido": SENSE.get(r.direction),
+                 "n_antes": int(r.n_antes), "n_depois": int(r.n_depois),
+                 "nivel": _opt(r.nivel, 3), "inclinacao": _opt(r.inclinacao, 3), "efeito": _opt(r.efeito, 3),
+                 "efeito_norm": _opt(r.efeito_norm, 2), "t": _opt(r.t, 2), "significativo": bool(r.significativo)}
+                for r in g.itertuples(index=False)
+            ],
+        }
+    return out
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    import generate_analysis as ga  # só p/ a CLI: store, grafo e catálogo como no snapshot
+
+    p = argparse.ArgumentParser(description="Impacto antes × depois das ações de um planejamento")
+    p.add_argument("--input_dir", required=True, help="Diretório onde estão os CSV/JSON de entrada")
+    p.add_argument("--contratante", type=int, required=True)
+    p.add_argument("--planejamento", type=int, required=True)
+    p.add_argument("--store", default=None, help="Store colunar de métricas (padrão: <input_dir>/metric_store)")
+    p.add_argument("--days", type=int, default=ga.IMPACT_DAYS, help="Dias de cada lado da implementação")
+    args = p.parse_args()
+
+    base_dir = Path(args.input_dir)
+    refs = ga.load_reference(base_dir)
+    cases = impact_cases(refs["graph"], [(args.contratante, args.planejamento)], refs["catalog"])
+    bounds = history_bounds(cases, args.days)
+    if bounds is None:
+        print("Nenhuma ação com implementada_em e métricas ligadas.")
+        return 0
+    df = ga.load_extract(base_dir, args.store, contratante=args.contratante, start=bounds[0], end=bounds[1])
+    res = evaluate(df, "data_extracao", cases, days=args.days)
+    cols = [ACTION_COL, metric_engine.METRIC_COL, "direction", "n_antes", "n_depois",
+            "nivel", "inclinacao", "efeito", "efeito_norm", "t", "significativo"]
+    with pd.option_context("display.max_rows", None, "display.width", 180, "display.float_format", "{:.3f}".format):
+        print(res[cols].to_string(index=False))
+    for aid, a in summarize(res).get((args.contratante, args.planejamento), {}).items():
+        print(f"ação {aid}: eficácia {a['eficacia']}, observado {a['observado']} (efeito médio em desvios do pré)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
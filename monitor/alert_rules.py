@@ -0,0 +1,429 @@
+"""Regras de alerta declarativas (alert_rules.yaml), avaliadas de forma vetorizada.
+
+As regras ficam em YAML ao lado do config.yaml, são compiladas uma vez e
+avaliadas sobre o resultado do motor colunar (`metric_engine.metric_stats` +
+`MetricCatalog.attach`): cada regra é uma máscara NumPy sobre todas as
+métricas de todos os contratantes/planejamentos de uma vez. O resultado tem o
+formato do bloco `alerts` do snapshot (metric, issue, detail, severity).
+
+Formato
+-------
+rules:
+  - id: abaixo_meta                   # também é o `issue` do alerta (ou use `issue:`)
+    severity: alta
+    metrics: [m1, m2]                 # opcional: só essas métricas
+    when:                             # todas as condições precisam valer
+      status: abaixo_meta             # valor ➜ igualdade; lista ➜ pertence à lista
+      abs(delta_pct): {gt: 15}        # {op: valor}: gt ge lt le eq ne in not_in
+    detail: "{metric} {current} fora da meta {target} ({tipo})"
+  - id: razao_a_b
+    ratio: [metrica_a, metrica_b]     # metrica_a / metrica_b do mesmo contratante/planejamento
+    field: current                    # coluna usada na razão (padrão: current)
+    when: {ratio: {gt: 2}}
+overrides:                            # por id_planejamento: substitui campos da regra;
+  2:                                  # `when` é mesclado condição a condição
+    abaixo_meta: {when: {abs(delta_pct): {gt: 5}}}
+    tendencia_rapida: {enabled: false}
+
+Campos: qualquer coluna do resultado (current, target, delta_pct, slope_7d,
+trend_15d, status, tipo, ...), `slope` (janela principal), `abs(<campo>)` e,
+nas regras de razão, `ratio`. Os números são comparados arredondados como no
+snapshot (delta_pct com 2 casas, slopes com 3). `issue` e `detail` aceitam os
+mesmos campos, mais {metric} (e {numerator}/{denominator} nas razões); o alerta
+de uma razão fica na métrica do numerador.
+
+Uso
+---
+$ python alert_rules.py check                              # valida alert_rules.yaml e resume
+$ python alert_rules.py eval snapshot/structured_snapshot_X.json --rules outras_regras.yaml
+"""
+from __future__ import annotations
+import argparse, json, operator, re, string, sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from metric_engine import METRIC_COL
+
+RULES_PATH = Path(__file__).with_name("alert_rules.yaml")
+PLAN_COL = "id_planejamento"
+ALERT_COLUMNS = ["metric", "issue", "detail", "severity"]
+DEFAULT_SEVERITY = "média"
+FORMAT_DEFAULTS = {"tipo": "menor_que"}  # meta sem tipo (formato antigo) é "menor_que"
+
+OPS: Dict[str, Callable[[np.ndarray, Any], np.ndarray]] = {
+    "gt": operator.gt, "ge": operator.ge, "lt": operator.lt, "le": operator.le,
+    "eq": operator.eq, "ne": operator.ne,
+    "in": lambda a, v: np.isin(a, list(v)),
+    "not_in": lambda a, v: ~np.isin(a, list(v)),
+}
+ORDERED = {"gt", "ge", "lt", "le"}
+RULE_KEYS = {"id", "issue", "severity", "metrics", "when", "detail", "ratio", "field", "enabled"}
+_ABS = re.compile(r"^abs\((\w+)\)$")
+
+
+def _decimals(column: str) -> Optional[int]:
+    """Casas com que a coluna aparece no snapshot (metric_engine.metrics_block)."""
+    if column == "delta_pct":
+        return 2
+    if column.startswith("slope_"):
+        return 3
+    if column in ("proj_value", "proj_lower", "proj_upper", "proj_prob"):
+        return 3
+    return None
+
+
+class Rule(NamedTuple):
+    id: str
+    issue: str
+    severity: str
+    metrics: Optional[Tuple[str, ...]]
+    when: Tuple[Tuple[str, str, Any], ...]  # (campo, op, valor)
+    detail: str
+    ratio: Optional[Tuple[str, str]]
+    field: str
+    enabled: bool
+
+################################################################################
+# Compilação
+################################################################################
+
+def _conditions(rule_id: str, when: Dict[str, Any]) -> Tuple[Tuple[str, str, Any], ...]:
+    out = []
+    for field, spec in (when or {}).items():
+        if isinstance(spec, dict):
+            items = list(spec.items())
+        elif isinstance(spec, (list, tuple)):
+            items = [("in", spec)]
+        else:
+            items = [("eq", spec)]
+        for op, value in items:
+            if op not in OPS:
+                raise ValueError(f"regra {rule_id}: operador desconhecido {op!r} em {field!r} "
+                                 f"(use {', '.join(OPS)})")
+            if op in ("in", "not_in") and not isinstance(value, (list, tuple)):
+                value = [value]
+            if op in ORDERED:
+                try:
+                    value = float(value)  # o YAML lê 1e6 (sem ponto) como texto
+                except (TypeError, ValueError):
+                    raise ValueError(f"regra {rule_id}: {field} {op} espera número, veio {value!r}") from None
+            out.append((str(field), op, value))
+    return tuple(out)
+
+
+def compile_rule(raw: Dict[str, Any]) -> Rule:
+    if "id" not in raw:
+        raise ValueError(f"regra sem id: {raw}")
+    rule_id = str(raw["id"])
+    unknown = set(raw) - RULE_KEYS
+    if unknown:
+        raise ValueError(f"regra {rule_id}: chaves desconhecidas {sorted(unknown)}")
+    ratio = raw.get("ratio")
+    if ratio is not None and (not isinstance(ratio, (list, tuple)) or len(ratio) != 2):
+        raise ValueError(f"regra {rule_id}: ratio deve ser [numerador, denominador]")
+    metrics = raw.get("metrics")
+    return Rule(
+        id=rule_id,
+        issue=str(raw.get("issue") or rule_id),
+        severity=str(raw.get("severity") or DEFAULT_SEVERITY),
+        metrics=tuple(str(m) for m in metrics) if metrics else None,
+        when=_conditions(rule_id, raw.get("when")),
+        detail=str(raw.get("detail") or "{metric}: " + rule_id),
+        ratio=(str(ratio[0]), str(ratio[1])) if ratio else None,
+        field=str(raw.get("field") or "current"),
+        enabled=bool(raw.get("enabled", True)),
+    )
+
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    merged = {**base, **override, "id": base["id"]}
+    if "when" in override:
+        merged["when"] = {**(base.get("when") or {}), **(override["when"] or {})}
+    return merged
+
+
+class AlertRules:
+    """Regras compiladas: base + variantes por id_planejamento."""
+
+    def __init__(self, rules: Sequence[Rule], overrides: Dict[str, Dict[str, Rule]],
+                 primary: Optional[int] = None):
+        self.rules = list(rules)
+        self.overrides = overrides  # plano (str) ➜ id da regra ➜ variante
+        self.primary = primary      # janela de `slope` (generate_analysis.TEMPORALITY)
+        self._variants = {r.id: {p: ov[r.id] for p, ov in overrides.items() if r.id in ov} for r in self.rules}
+
+    @classmethod
+    def from_dict(cls, doc: Dict[str, Any], primary: Optional[int] = None) -> "AlertRules":
+        raw_rules = (doc or {}).get("rules") or []
+        by_id = {str(r.get("id")): r for r in raw_rules}
+        if len(by_id) != len(raw_rules):
+            raise ValueError("ids de regra repetidos em alert_rules")
+        overrides: Dict[str, Dict[str, Rule]] = {}
+        for plan, ovs in ((doc or {}).get("overrides") or {}).items():
+            for rule_id, ov in (ovs or {}).items():
+                if str(rule_id) not in by_id:
+                    raise ValueError(f"override do planejamento {plan}: regra {rule_id!r} não existe")
+                overrides.setdefault(str(plan), {})[str(rule_id)] = compile_rule(_merge(by_id[str(rule_id)], ov or {}))
+        return cls([compile_rule(r) for r in raw_rules], overrides, primary)
+
+    # -------------------------------------------------------------- avaliação
+    def evaluate(self, stats: pd.DataFrame, planejamento: Any = None) -> pd.DataFrame:
+        """Alertas de todas as linhas de `stats` (índice [..., metric_id]).
+
+        O planejamento de cada linha vem do nível id_planejamento do índice
+        (modo batch) ou de `planejamento`. Devolve um DataFrame com os níveis do
+        índice (menos metric_id) + ALERT_COLUMNS, na ordem das linhas de
+        `stats` e, dentro de cada métrica, na ordem das regras.
+        """
+        cols = _Columns(stats, self.primary)
+        plan = str(planejamento) if planejamento is not None else None
+        hits: List[Tuple[np.ndarray, int, Rule, Dict[str, np.ndarray]]] = []
+        for order, rule in enumerate(self.rules):
+            variants = self._variants[rule.id]
+            if cols.plan is None or not variants:
+                self._apply(variants.get(plan, rule) if cols.plan is None else rule, cols, None, order, hits)
+                continue
+            self._apply(rule, cols, ~np.isin(cols.plan, list(variants)), order, hits)
+            for p, variant in variants.items():
+                self._apply(variant, cols, cols.plan == p, order, hits)
+        return cols.alerts(hits)
+
+    def alerts(self, stats: pd.DataFrame, planejamento: Any = None) -> List[Dict[str, Any]]:
+        """Bloco `alerts` (sem timestamp) de um único contratante/planejamento."""
+        return self.evaluate(stats, planejamento)[ALERT_COLUMNS].to_dict("records")
+
+    @staticmethod
+    def _apply(rule: Rule, cols: "_Columns", plan_mask: Optional[np.ndarray], order: int,
+               hits: List[Tuple[np.ndarray, int, Rule, Dict[str, np.ndarray]]]) -> None:
+        if not rule.enabled:
+            return
+        rows = cols.rows(rule.ratio[:1] if rule.ratio else rule.metrics)
+        if plan_mask is not None:
+            rows = rows[plan_mask[rows]]
+        extra: Dict[str, np.ndarray] = {}
+        if rule.ratio:
+            extra["ratio"] = cols.ratio(rule.field, rule.ratio[1], rows)
+        everything = rows is cols.all_rows
+        mask = np.ones(len(rows), dtype=bool)
+        for field, op, value in rule.when:
+            if field in extra:
+                mask &= OPS[op](extra[field], value)
+            else:
+                cond = cols.condition(field, op, value, rule.id)
+                mask &= cond if everything else cond[rows]
+        if mask.any():
+            hits.append((rows[mask], order, rule, {k: v[mask] for k, v in extra.items()}))
+
+
+def load_rules(path: str | Path | None = None, primary: Optional[int] = None) -> AlertRules:
+    """Compila o YAML de regras (padrão: alert_rules.yaml ao lado do config.yaml)."""
+    with open(path or RULES_PATH, "r", encoding="utf-8") as fp:
+        return AlertRules.from_dict(yaml.safe_load(fp), primary)
+
+
+def alerts_by_group(alerts: pd.DataFrame, keys: Sequence[str]) -> Dict[Tuple[Any, ...], List[Dict[str, Any]]]:
+    """Separa o resultado de `evaluate` por (contratante, planejamento, ...)."""
+    out: Dict[Tuple[Any, ...], List[Dict[str, Any]]] = {}
+    records = zip(*(alerts[c].tolist() for c in ALERT_COLUMNS))
+    for key, rec in zip(zip(*(alerts[k].tolist() for k in keys)), records):
+        out.setdefault(key, []).append(dict(zip(ALERT_COLUMNS, rec)))
+    return out
+
+################################################################################
+# Colunas do resultado do motor
+################################################################################
+
+class _Columns:
+    """Arrays das colunas de `stats` (carregados sob demanda) e índices por métrica."""
+
+    def __init__(self, stats: pd.DataFrame, primary: Optional[int]):
+        idx = stats.index
+        self.stats = stats
+        self.primary = primary
+        self.levels = [n for n in idx.names if n != METRIC_COL]
+        self.metric = idx.get_level_values(METRIC_COL).astype(str).to_numpy()
+        self.plan = idx.get_level_values(PLAN_COL).astype(str).to_numpy() if PLAN_COL in self.levels else None
+        self.gid = idx.droplevel(METRIC_COL).factorize()[0] if self.levels else np.zeros(len(stats), dtype=np.intp)
+        codes, uniques = pd.factorize(self.metric)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self._metric_rows = {m: order[bounds[i]:bounds[i + 1]] for i, m in enumerate(uniques)}
+        self.all_rows = np.arange(len(stats))
+        self._fields: Dict[str, np.ndarray] = {}
+        self._codes: Dict[str, Tuple[np.ndarray, pd.Index]] = {}
+        self._conditions: Dict[Tuple[str, str, Any], np.ndarray] = {}
+        self._lists: Dict[str, list] = {}
+
+    def rows(self, metrics: Optional[Sequence[str]]) -> np.ndarray:
+        if metrics is None:
+            return self.all_rows
+        parts = [self._metric_rows[m] for m in metrics if m in self._metric_rows]
+        return np.sort(np.concatenate(parts)) if parts else self.all_rows[:0]
+
+    def column(self, name: str) -> str:
+        return f"slope_{self.primary}d" if name == "slope" and self.primary is not None else name
+
+    def field(self, name: str, rule_id: str = "") -> np.ndarray:
+        if name not in self._fields:
+            m = _ABS.match(name)
+            if m:
+                values = np.abs(self.field(m.group(1), rule_id).astype(float))
+            else:
+                col = self.column(name)
+                if col not in self.stats.columns:
+                    raise ValueError(f"regra {rule_id}: campo desconhecido {name!r}")
+                values = self.stats[col].to_numpy()
+                if values.dtype.kind == "f":
+                    dec = _decimals(col)
+                    values = np.round(values, dec) if dec is not None else values
+            self._fields[name] = values
+        return self._fields[name]
+
+    def condition(self, field: str, op: str, value: Any, rule_id: str = "") -> np.ndarray:
+        """Máscara (todas as linhas) de uma condição; repetidas entre regras saem do cache.
+
+        Colunas de texto (status, trend, tipo, ...) são comparadas pelos códigos
+        de `pd.factorize`, não string a string.
+        """
+        key = (field, op, tuple(value) if isinstance(value, list) else value)
+        if key not in self._conditions:
+            values = self.field(field, rule_id)
+            if values.dtype == object and op in ("eq", "ne", "in", "not_in"):
+                if field not in self._codes:
+                    codes, uniques = pd.factorize(values)
+                    self._codes[field] = codes, pd.Index(uniques)
+                codes, uniques = self._codes[field]
+                wanted = [value] if op in ("eq", "ne") else value
+                found = uniques.get_indexer([v for v in wanted if v is not None])
+                found = np.append(found[found >= 0], [-1] if None in wanted else [])  # -1 = nulo
+                hit = np.isin(codes, found)
+                mask = ~hit if op in ("ne", "not_in") else hit
+            else:
+                mask = OPS[op](values, value)
+            self._conditions[key] = mask
+        return self._conditions[key]
+
+    def ratio(self, field: str, denominator: str, rows: np.ndarray) -> np.ndarray:
+        values = self.field(field).astype(float)
+        den = np.full(self.gid.max() + 1 if len(self.gid) else 0, np.nan)
+        den_rows = self._metric_rows.get(denominator, self.all_rows[:0])
+        den[self.gid[den_rows]] = values[den_rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return values[rows] / den[self.gid[rows]]
+
+    # ------------------------------------------------------------- formatação
+    def formatted(self, name: str) -> list:
+        """Valores da coluna como aparecem no snapshot (arredondados, NaN ➜ None)."""
+        col = self.column(name)
+        if col not in self._lists:
+            dec = _decimals(col)
+            default = FORMAT_DEFAULTS.get(name)
+            values = self.stats[col].tolist()
+            self._lists[col] = [
+                default if v is None or v != v
+                else round(v, dec) if dec is not None and isinstance(v, float) else v
+                for v in values
+            ]
+        return self._lists[col]
+
+    def alerts(self, hits: List[Tuple[np.ndarray, int, Rule, Dict[str, np.ndarray]]]) -> pd.DataFrame:
+        if not hits:
+            return pd.DataFrame(columns=[*self.levels, *ALERT_COLUMNS])
+        issues: List[str] = []
+        details: List[str] = []
+        for rows, _, rule, extra in hits:
+            issues += self._format(rule.issue, rows, rule, extra)
+            details += self._format(rule.detail, rows, rule, extra)
+        rows = np.concatenate([h[0] for h in hits])
+        orders = np.concatenate([np.full(len(h[0]), h[1]) for h in hits])
+        severity = np.concatenate([np.full(len(h[0]), h[2].severity, dtype=object) for h in hits])
+        sort = np.lexsort((orders, rows))  # ordem das linhas de stats; dentro da métrica, das regras
+        out = {n: self.stats.index.get_level_values(n)[rows[sort]] for n in self.levels}
+        out.update(metric=self.metric[rows[sort]], issue=np.array(issues, dtype=object)[sort],
+                   detail=np.array(details, dtype=object)[sort], severity=severity[sort])
+        return pd.DataFrame(out)
+
+    def _format(self, template: str, rows: np.ndarray, rule: Rule, extra: Dict[str, np.ndarray]) -> List[str]:
+        names = _fields(template)
+        if not names:
+            return [template] * len(rows)
+        columns = [self._template_values(n, rows, rule, extra) for n in names]
+        return [template.format_map(dict(zip(names, vals))) for vals in zip(*columns)]
+
+    def _template_values(self, name: str, rows: np.ndarray, rule: Rule, extra: Dict[str, np.ndarray]) -> list:
+        if name == "metric":
+            return self.metric[rows].tolist()
+        if rule.ratio and name in ("numerator", "denominator"):
+            return [rule.ratio[name == "denominator"]] * len(rows)
+        if name in extra:
+            return [round(v, 3) for v in extra[name].tolist()]
+        if self.column(name) not in self.stats.columns:
+            raise ValueError(f"regra {rule.id}: campo desconhecido {name!r} no texto do alerta")
+        values = self.formatted(name)
+        return [values[r] for r in rows.tolist()]
+
+
+def _fields(template: str) -> List[str]:
+    return sorted({f for _, f, _, _ in string.Formatter().parse(template) if f})
+
+################################################################################
+# Snapshot ➜ frame (p/ reavaliar snapshots já gravados)
+################################################################################
+
+def metrics_frame(metrics_dict: Dict[str, Any]) -> pd.DataFrame:
+    """Bloco `metrics` de um snapshot como frame indexado por metric_id."""
+    rows = {mid: {k: v for k, v in m.items() if not isinstance(v, (list, dict))} for mid, m in metrics_dict.items()}
+    for mid, m in metrics_dict.items():
+        if "projection" in m:  # bloco projection ➜ colunas proj_* (como em projection.attach)
+            proj = m["projection"] or {}
+            rows[mid].update({f"proj_{k}": proj.get(k) for k in ("value", "lower", "upper", "level")},
+                             proj_prob=proj.get("prob_meta"))
+    df = pd.DataFrame.from_dict(rows, orient="index")
+    df.index.name = METRIC_COL
+    for col in df.columns:
+        if df[col].map(lambda v: v is None or isinstance(v, (int, float))).all():
+            df[col] = df[col].astype(float)
+    return df
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Regras de alerta declarativas (alert_rules.yaml)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("check", help="Valida e resume o arquivo de regras")
+    c.add_argument("--rules", default=str(RULES_PATH))
+    e = sub.add_parser("eval", help="Reavalia as regras sobre as métricas de um snapshot")
+    e.add_argument("snapshot")
+    e.add_argument("--rules", default=str(RULES_PATH))
+    e.add_argument("--primary", type=int, default=None, help="Janela de {slope} (padrão: temporality do config.yaml)")
+    args = p.parse_args()
+
+    if args.cmd == "check":
+        rules = load_rules(args.rules)
+        print(f"{len(rules.rules)} regra(s), overrides p/ {len(rules.overrides)} planejamento(s)")
+        for r in rules.rules:
+            kind = f"razão {r.ratio[0]}/{r.ratio[1]}" if r.ratio else f"{len(r.metrics or [])} métrica(s)" if r.metrics else "todas"
+            print(f"  {r.id:<24} {r.severity:<6} {kind:<28} {len(r.when)} condição(ões)"
+                  f"{'' if r.enabled else '  (desligada)'}")
+        return 0
+
+    with open(args.snapshot, "r", encoding="utf-8") as fp:
+        snap = json.load(fp)
+    primary = args.primary
+    if primary is None:
+        with open(RULES_PATH.with_name("config.yaml"), "r", encoding="utf-8") as fp:
+            primary = int((yaml.safe_load(fp) or {}).get("temporality", 7))
+    rules = load_rules(args.rules, primary)
+    alerts = rules.alerts(metrics_frame(snap.get("metrics", {})), snap.get("planejamento_id"))
+    print(json.dumps(alerts, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
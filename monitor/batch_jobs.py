@@ -0,0 +1,424 @@
+"""Execução em lote (offline) das chamadas ao LLM de relatórios e snapshots.
+
+Em vez de uma chamada síncrona por contratante, junta todos os prompts
+pendentes num arquivo JSONL (formato da Batch API da OpenAI), envia de uma vez,
+acompanha o processamento e distribui as respostas de volta:
+
+- kind=report  ➜ snapshot sem relatório ➜ grava relatorio_quinzenal_<ts>.md ao lado do snapshot
+- kind=summary ➜ snapshot com llm_summary vazio (generate_analysis --batch --defer_llm)
+                 ➜ preenche o llm_summary no próprio JSON
+  (no mesmo lote, o prompt do relatório vê o snapshot ainda sem llm_summary;
+  p/ incluí-lo, rode --kind summary antes e --kind report depois)
+
+Tudo fica em <run_dir> (jobs.jsonl, manifest.json, results.jsonl) e cada etapa
+é idempotente: rodar o mesmo comando de novo retoma de onde parou (reenvia só se
+o lote ainda não foi criado, volta a acompanhar o lote em andamento, baixa o
+resultado uma vez e só distribui o que faltou). Um lote que termina sem resposta
+p/ algum job (failed/expired/cancelled ou erro por item) conta esses jobs como
+erro (saída != 0); rodar de novo reenvia, num lote novo, só os que faltaram.
+Respostas já presentes no cache (llm_cache) não entram no lote e as recebidas
+são gravadas nele.
+
+O backend é plugável: `OpenAIBatchBackend` fala com a Batch API pelo SDK; com
+--base_url aponta p/ o servidor local (`serve`), que imita os endpoints usados
+e responde com textos fixos, para testes sem custo.
+
+Uso
+---
+$ python batch_jobs.py run --snapshots snapshot/snapshots --run_dir ./batch_run --kind summary report
+$ python batch_jobs.py serve --port 8765 &
+$ python batch_jobs.py run --snapshots snapshot/snapshots --run_dir /tmp/run --base_url http://127.0.0.1:8765/v1
+"""
+from __future__ import annotations
+import argparse, json, sys, threading, time, uuid
+from email.parser import BytesParser
+from email.policy import default as email_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol
+
+import llm_cache
+
+ENDPOINT = "/v1/chat/completions"
+TERMINAL = {"completed", "failed", "expired", "cancelled"}
+KINDS = ("summary", "report")
+
+################################################################################
+# Jobs
+################################################################################
+
+def report_path(snapshot_path: Path) -> Path:
+    return snapshot_path.with_name(snapshot_path.stem.replace("structured_snapshot", "relatorio_quinzenal") + ".md")
+
+
+def _load_json(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(path)
+
+
+def request_for(kind: str, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Corpo da chamada (model, messages, ...) igual ao das execuções síncronas."""
+    if kind == "summary":
+        import generate_analysis as mod
+        messages = mod.summary_messages(snapshot["metrics"], snapshot.get("alerts", []))
+    else:
+        import generate_report as mod
+        messages = mod.report_messages(snapshot)
+    return {"model": mod.MODEL_NAME, "temperature": mod.TEMPERATURE,
+            "max_tokens": mod.MAX_TOKENS, "messages": messages}
+
+
+def is_pending(kind: str, path: Path, snapshot: Dict[str, Any]) -> bool:
+    if kind == "summary":
+        return not snapshot.get("llm_summary")
+    return not report_path(path).exists()
+
+
+def cache_key(body: Dict[str, Any]) -> str:
+    # mesma chave de llm_cache.chat_completion(client, model=..., temperature=..., max_tokens=..., messages=...)
+    return llm_cache.make_key(body["model"], body["temperature"], body["messages"], max_tokens=body["max_tokens"])
+
+
+def fan_out(kind: str, path: Path, content: str, repo_path: Optional[str] = None) -> None:
+    """Grava a resposta no artefato do contratante (e reindexa o snapshot, se houver repositório)."""
+    if kind == "summary":
+        snapshot = _load_json(path)
+        snapshot["llm_summary"] = content
+        _write_atomic(path, json.dumps(snapshot, ensure_ascii=False, indent=2))
+        if repo_path:
+            import snapshot_repo
+            with snapshot_repo.SnapshotRepo(repo_path) as repo:
+                repo.put(snapshot, str(path))
+    else:
+        import generate_report
+        snapshot = _load_json(path)
+        md = generate_report.render_report(snapshot, content, generate_report.periodo_str(snapshot))
+        _write_atomic(report_path(path), md)
+
+################################################################################
+# Backends
+################################################################################
+
+class BatchBackend(Protocol):
+    def submit(self, jobs_path: Path) -> Dict[str, str]: ...
+    def status(self, batch_id: str) -> Dict[str, Any]: ...
+    def download(self, file_id: str) -> str: ...
+
+
+class OpenAIBatchBackend:
+    """Batch API da OpenAI (ou compatível, via base_url)."""
+
+    def __init__(self, client=None, base_url: Optional[str] = None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(base_url=base_url, api_key="local" if base_url else None)
+        self.client = client
+
+    def submit(self, jobs_path: Path) -> Dict[str, str]:
+        with open(jobs_path, "rb") as fp:
+            f = self.client.files.create(file=fp, purpose="batch")
+        batch = self.client.batches.create(input_file_id=f.id, endpoint=ENDPOINT, completion_window="24h")
+        return {"batch_id": batch.id, "input_file_id": f.id}
+
+    def status(self, batch_id: str) -> Dict[str, Any]:
+        b = self.client.batches.retrieve(batch_id)
+        counts = b.request_counts.model_dump() if b.request_counts else {}
+        return {"status": b.status, "output_file_id": b.output_file_id,
+                "error_file_id": b.error_file_id, "counts": counts}
+
+    def download(self, file_id: str) -> str:
+        return self.client.files.content(file_id).text
+
+################################################################################
+# Execução (retomável)
+################################################################################
+
+class BatchRun:
+    """Um lote persistido em run_dir; cada método pula o que já foi feito."""
+
+    def __init__(self, run_dir: str | Path, backend: BatchBackend, cache: Optional[llm_cache.LLMCache] = None,
+                 repo: Optional[str] = None):
+        self.repo = repo
+        self.dir = Path(run_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.backend = backend
+        self.cache = cache or llm_cache.get_cache()
+        self.manifest_path = self.dir / "manifest.json"
+        self.jobs_path = self.dir / "jobs.jsonl"
+        self.results_path = self.dir / "results.jsonl"
+        self.manifest: Dict[str, Any] = _load_json(self.manifest_path) if self.manifest_path.exists() else {}
+
+    def _save(self) -> None:
+        _write_atomic(self.manifest_path, json.dumps(self.manifest, ensure_ascii=False, indent=2))
+
+    def prepare(self, snapshot_root: str | Path, kinds=KINDS) -> int:
+        """Escreve jobs.jsonl com os pendentes. Respostas em cache são aplicadas na hora."""
+        if "jobs" in self.manifest:
+            return len(self.manifest["jobs"])
+        jobs: Dict[str, Dict[str, str]] = {}
+        from_cache = 0
+        with open(self.jobs_path, "w", encoding="utf-8") as out:
+            for path in sorted(Path(snapshot_root).rglob("structured_snapshot_*.json")):
+                snapshot = _load_json(path)
+                for kind in kinds:
+                    if not is_pending(kind, path, snapshot):
+                        continue
+                    body = request_for(kind, snapshot)
+                    cached = self.cache.get(cache_key(body))
+                    if cached is not None:
+                        fan_out(kind, path, cached, self.repo)
+                        from_cache += 1
+                        continue
+                    cid = f"{kind}-{len(jobs):06d}"
+                    jobs[cid] = {"kind": kind, "path": str(path), "key": cache_key(body)}
+                    out.write(json.dumps({"custom_id": cid, "method": "POST", "url": ENDPOINT, "body": body},
+                                         ensure_ascii=False) + "\n")
+        self.manifest.update({"jobs": jobs, "done": [], "errors": {}, "from_cache": from_cache})
+        self._save()
+        return len(jobs)
+
+    def pending(self) -> List[str]:
+        done = set(self.manifest.get("done", []))
+        return [cid for cid in self.manifest.get("jobs", {}) if cid not in done]
+
+    def retry(self) -> int:
+        """Lote anterior já terminou e foi distribuído com pendentes: prepara um lote novo só com eles."""
+        pending = set(self.pending())
+        if not self.manifest.get("collected") or not pending:
+            return 0
+        with open(self.jobs_path, "r", encoding="utf-8") as fp:
+            lines = [line for line in fp if line.strip() and json.loads(line)["custom_id"] in pending]
+        _write_atomic(self.jobs_path, "".join(lines))
+        old = self.manifest["batch_id"]
+        if self.results_path.exists():  # guardado p/ consulta; o próximo lote baixa o seu
+            self.results_path.replace(self.dir / f"results_{old}.jsonl")
+        self.manifest.setdefault("attempts", []).append({"batch_id": old, "status": self.manifest.get("status"),
+                                                         "errors": len(self.manifest["errors"])})
+        self.manifest["errors"] = {}
+        for k in ("batch_id", "input_file_id", "status", "output_file_id", "error_file_id", "counts", "collected"):
+            self.manifest.pop(k, None)
+        self._save()
+        return len(pending)
+
+    def submit(self) -> None:
+        self.retry()
+        if self.manifest.get("batch_id") or not self.manifest.get("jobs"):
+            return
+        self.manifest.update(self.backend.submit(self.jobs_path))
+        self.manifest["status"] = "submitted"
+        self._save()
+
+    def wait(self, poll: float = 30.0, timeout: Optional[float] = None) -> str:
+        if not self.manifest.get("batch_id") or self.manifest.get("status") in TERMINAL:
+            return self.manifest.get("status", "empty")
+        t0 = time.monotonic()
+        while True:
+            st = self.backend.status(self.manifest["batch_id"])
+            self.manifest.update(status=st["status"], output_file_id=st["output_file_id"],
+                                 error_file_id=st["error_file_id"], counts=st["counts"])
+            self._save()
+            if st["status"] in TERMINAL:
+                return st["status"]
+            if timeout is not None and time.monotonic() - t0 > timeout:
+                raise TimeoutError(f"Lote {self.manifest['batch_id']} ainda em {st['status']}; rode de novo p/ retomar")
+            print(f"lote {self.manifest['batch_id']}: {st['status']} {st['counts']}", file=sys.stderr)
+            time.sleep(poll)
+
+    def collect(self) -> Dict[str, int]:
+        """Baixa o resultado (uma vez) e distribui o que ainda não foi distribuído.
+
+        Com o lote terminado, todo job sem resposta vira erro (failed/expired sem
+        saída, p.ex.) e o lote fica marcado como distribuído ➜ `retry` o reenvia.
+        """
+        status = self.manifest.get("status")
+        if not self.results_path.exists() and (self.manifest.get("output_file_id") or self.manifest.get("error_file_id")):
+            text = ""
+            for fid in (self.manifest.get("output_file_id"), self.manifest.get("error_file_id")):
+                if fid:
+                    text += self.backend.download(fid)
+            _write_atomic(self.results_path, text)
+        if "jobs" not in self.manifest:
+            return {"ok": 0, "errors": 0}
+
+        jobs, done, errors = self.manifest["jobs"], set(self.manifest["done"]), self.manifest["errors"]
+        results = self.results_path.read_text(encoding="utf-8").splitlines() if self.results_path.exists() else []
+        for line in results:
+            if not line.strip():
+                continue
+            res = json.loads(line)
+            cid = res["custom_id"]
+            if cid in done or cid not in jobs:
+                continue
+            resp = res.get("response") or {}
+            if res.get("error") or resp.get("status_code") != 200:
+                errors[cid] = res.get("error") or resp.get("body")
+                continue
+            choice = resp["body"]["choices"][0]
+            content = (choice["message"]["content"] or "").strip()
+            job = jobs[cid]
+            fan_out(job["kind"], Path(job["path"]), content, self.repo)
+            if llm_cache.cacheable(content, choice.get("finish_reason")):
+                self.cache.set(job["key"], content)
+            done.add(cid)
+            errors.pop(cid, None)
+            self.manifest["done"] = sorted(done)
+            self._save()  # progresso salvo a cada item: interrupção aqui também retoma
+        if status in TERMINAL and not self.manifest.get("collected"):
+            for cid in jobs:
+                if cid not in done and cid not in errors:
+                    errors[cid] = {"message": f"sem resposta (lote {status})"}
+            self.manifest["collected"] = True
+            self._save()
+        return {"ok": len(done), "errors": len(errors)}
+
+
+def run(snapshot_root: str, run_dir: str, backend: BatchBackend, kinds=KINDS,
+        poll: float = 30.0, timeout: Optional[float] = None, repo: Optional[str] = None) -> Dict[str, Any]:
+    batch = BatchRun(run_dir, backend, repo=repo)
+    n = batch.prepare(snapshot_root, kinds)
+    batch.submit()
+    status = batch.wait(poll, timeout) if n else "empty"
+    summary = batch.collect()
+    return {"jobs": n, "from_cache": batch.manifest.get("from_cache", 0), "status": status, **summary}
+
+################################################################################
+# Servidor local (imita Files + Batches da OpenAI)
+################################################################################
+
+def canned_reply(body: Dict[str, Any]) -> str:
+    """Resposta fixa do servidor local (mesmas seções que o relatório espera)."""
+    if body.get("max_tokens", 0) <= 200:
+        return "Resumo gerado localmente (servidor de testes)."
+    return ("## Resumo Executivo\nResumo gerado localmente (servidor de testes).\n\n"
+            "## Recomendações\n- Recomendação gerada localmente.\n")
+
+
+class _LocalBatchState:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def process(self, batch_id: str) -> None:
+        time.sleep(self.delay)
+        with self.lock:
+            batch = self.batches[batch_id]
+            batch["status"] = "in_progress"
+            lines = self.files[batch["input_file_id"]].decode("utf-8").splitlines()
+        out = []
+        for line in filter(None, lines):
+            req = json.loads(line)
+            out.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": req["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion",
+                    "created": int(time.time()), "model": req["body"]["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": canned_reply(req["body"])}}],
+                }}, "error": None,
+            }, ensure_ascii=False))
+        time.sleep(self.delay)
+        with self.lock:
+            fid = f"file-{uuid.uuid4().hex[:12]}"
+            self.files[fid] = ("\n".join(out) + "\n").encode("utf-8")
+            batch.update(status="completed", output_file_id=fid, completed_at=int(time.time()),
+                         request_counts={"total": len(out), "completed": len(out), "failed": 0})
+
+
+def make_local_server(port: int = 8765, delay: float = 1.0) -> ThreadingHTTPServer:
+    state = _LocalBatchState(delay)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):  # silencioso
+            pass
+
+        def _json(self, obj: Dict[str, Any], code: int = 200) -> None:
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.endswith("/files"):
+                msg = BytesParser(policy=email_policy).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+                content = next(p.get_payload(decode=True) for p in msg.iter_parts() if p.get_filename())
+                fid = f"file-{uuid.uuid4().hex[:12]}"
+                with state.lock:
+                    state.files[fid] = content
+                return self._json({"id": fid, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                                   "filename": "jobs.jsonl", "purpose": "batch", "status": "processed"})
+            if self.path.endswith("/batches"):
+                req = json.loads(body)
+                bid = f"batch_{uuid.uuid4().hex[:12]}"
+                batch = {"id": bid, "object": "batch", "endpoint": req["endpoint"], "status": "validating",
+                         "input_file_id": req["input_file_id"], "completion_window": req["completion_window"],
+                         "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+                         "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+                with state.lock:
+                    state.batches[bid] = batch
+                threading.Thread(target=state.process, args=(bid,), daemon=True).start()
+                return self._json(batch)
+            self._json({"error": {"message": "not found"}}, 404)
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            with state.lock:
+                if "batches" in parts and parts[-1] in state.batches:
+                    return self._json(state.batches[parts[-1]])
+                if parts[-1] == "content" and parts[-2] in state.files:
+                    data = state.files[parts[-2]]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+            self._json({"error": {"message": "not found"}}, 404)
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Chamadas ao LLM em lote (Batch API), retomáveis")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Prepara, envia, acompanha e distribui um lote")
+    r.add_argument("--snapshots", required=True, help="Raiz dos snapshots (busca structured_snapshot_*.json)")
+    r.add_argument("--run_dir", required=True, help="Diretório do lote (rodar de novo retoma)")
+    r.add_argument("--kind", nargs="+", choices=KINDS, default=["report"])
+    r.add_argument("--base_url", default=None, help="API compatível (ex.: servidor local de `serve`)")
+    r.add_argument("--poll", type=float, default=30.0, help="Intervalo de consulta do status (s)")
+    r.add_argument("--timeout", type=float, default=None, help="Desiste de esperar após N s (retomável)")
+    r.add_argument("--repo", default=None, help="Repositório SQLite a atualizar com os llm_summary preenchidos")
+    s = sub.add_parser("serve", help="Servidor local que imita a Batch API (testes)")
+    s.add_argument("--port", type=int, default=8765)
+    s.add_argument("--delay", type=float, default=1.0, help="Atraso simulado de cada etapa do lote (s)")
+    args = p.parse_args()
+
+    if args.cmd == "serve":
+        server = make_local_server(args.port, args.delay)
+        print(f"Servidor de lotes local em http://127.0.0.1:{args.port}/v1")
+        server.serve_forever()
+        return 0
+
+    result = run(args.snapshots, args.run_dir, OpenAIBatchBackend(base_url=args.base_url),
+                 kinds=args.kind, poll=args.poll, timeout=args.timeout, repo=args.repo)
+    print(json.dumps(result, ensure_ascii=False))
+    return 1 if result.get("errors") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
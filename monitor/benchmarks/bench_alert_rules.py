@@ -0,0 +1,148 @@
+"""Benchmark: alertas do snapshot  x  regras declarativas (alert_rules).
+
+Monta um resultado sintético do motor colunar (T contratantes × M métricas,
+mesmas colunas de `metric_engine.metric_stats` + `MetricCatalog.attach`) e
+
+1. compara o loop original (dois `if`s por métrica, um contratante por vez,
+   sobre o `metrics_block`) com alert_rules.yaml avaliado de uma vez: os
+   alertas precisam ser idênticos;
+2. mede `evaluate` com R regras geradas (limiares por métrica, tendências,
+   razões entre métricas e overrides por planejamento) sobre a base inteira.
+
+Uso
+---
+$ python benchmarks/bench_alert_rules.py --tenants 500 --metrics 49 --rules 2000 --repeat 3
+"""
+from __future__ import annotations
+import argparse, sys, time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import alert_rules  # noqa: E402
+import metric_engine  # noqa: E402
+
+WINDOWS = [7, 15, 30]
+PRIMARY = 7
+KEYS = ["id_contratante", "id_planejamento"]
+
+
+def synthetic_stats(tenants: int, n_metrics: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = tenants * n_metrics
+    idx = pd.MultiIndex.from_product(
+        [np.arange(1, tenants + 1), [f"m{j}" for j in range(n_metrics)]], names=["id_contratante", "metric_id"])
+    out = pd.DataFrame(index=idx)
+    out["baseline"] = rng.uniform(1, 1000, n)
+    out["current"] = out["baseline"] * rng.uniform(0.5, 1.5, n)
+    out["delta_abs"] = out["current"] - out["baseline"]
+    out["delta_pct"] = out["delta_abs"] / out["baseline"] * 100
+    for d in WINDOWS:
+        out[f"slope_{d}d"] = rng.normal(0, 0.3, n)
+    for d in WINDOWS:
+        out[f"trend_{d}d"] = metric_engine.classify_trend_vec(out[f"slope_{d}d"].to_numpy(), 0.1, 2)
+    out["trend"] = out[f"trend_{PRIMARY}d"]
+    has_target = rng.random(n) < 0.4
+    direction = np.where(has_target, np.where(rng.random(n) < 0.5, 1, -1), 0)
+    out["has_target"] = has_target
+    out["target"] = np.where(has_target, out["baseline"] * rng.uniform(0.7, 1.3, n), np.nan)
+    out["tipo"] = np.where(direction == 1, "menor_que", np.where(direction == -1, "maior_que", None))
+    out["status"] = metric_engine.target_status(out["current"].to_numpy(), out["target"].to_numpy(), direction)
+    # 1 planejamento por contratante (id = contratante)
+    out["id_planejamento"] = out.index.get_level_values("id_contratante")
+    return out.set_index("id_planejamento", append=True).reorder_levels([0, 2, 1])
+
+
+def legacy_alerts(metrics_dict: Dict[str, Any], alert_delta_pct: float = 15) -> List[Dict[str, Any]]:
+    """Cópia fiel do bloco de alertas do assemble_snapshot original (sem timestamp)."""
+    alerts = []
+    for mid, mdict in metrics_dict.items():
+        if mdict["status"] == "abaixo_meta" and abs(mdict["delta_pct"] or 0) > alert_delta_pct:
+            alerts.append({"metric": mid, "issue": "abaixo_meta",
+                           "detail": f"{mid} {mdict['current']} fora da meta {mdict['target']} "
+                                     f"({mdict.get('tipo') or 'menor_que'})",
+                           "severity": "alta"})
+        if mdict["trend"] in ("up_fast", "down_fast"):
+            alerts.append({"metric": mid, "issue": mdict["trend"],
+                           "detail": f"Tendência {mdict['trend']} (slope {mdict[f'slope_{PRIMARY}d']})",
+                           "severity": "média"})
+    return alerts
+
+
+def generated_rules(n_rules: int, n_metrics: int, tenants: int, seed: int = 1) -> Dict[str, Any]:
+    """Limiares seletivos (como alertas reais): poucas linhas disparam cada regra."""
+    rng = np.random.default_rng(seed)
+    rules: List[Dict[str, Any]] = []
+    for i in range(n_rules):
+        kind = i % 4
+        if kind == 0:
+            rules.append({"id": f"limite_{i}", "metrics": [f"m{rng.integers(n_metrics)}"],
+                          "when": {"current": {"gt": float(rng.uniform(1300, 1500))}}})
+        elif kind == 1:
+            rules.append({"id": f"queda_{i}", "metrics": [f"m{j}" for j in rng.integers(n_metrics, size=3)],
+                          "when": {"abs(delta_pct)": {"gt": float(rng.uniform(40, 50))}, "trend_15d": ["down", "down_fast"]}})
+        elif kind == 2:
+            a, b = rng.integers(n_metrics, size=2)
+            rules.append({"id": f"razao_{i}", "ratio": [f"m{a}", f"m{b}"], "when": {"ratio": {"gt": float(rng.uniform(5, 20))}}})
+        else:
+            rules.append({"id": f"geral_{i}", "when": {"status": "abaixo_meta", "slope": {"lt": float(rng.uniform(-1.2, -0.9))}}})
+    overrides = {int(p): {rules[int(r)]["id"]: {"severity": "alta"} for r in rng.integers(len(rules), size=5)}
+                 for p in rng.integers(1, tenants + 1, size=min(tenants, 20))} if rules else {}
+    return {"rules": rules, "overrides": overrides}
+
+
+def best(fn, repeat: int) -> tuple[float, Any]:
+    times, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark das regras de alerta declarativas")
+    p.add_argument("--tenants", type=int, default=200)
+    p.add_argument("--metrics", type=int, default=49)
+    p.add_argument("--rules", type=int, default=1000, help="Regras geradas p/ o teste de escala")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    stats = synthetic_stats(args.tenants, args.metrics)
+    default = alert_rules.load_rules(primary=PRIMARY)
+
+    def legacy() -> Dict[Any, List[Dict[str, Any]]]:
+        return {k: legacy_alerts(metric_engine.metrics_block(g)) for k, g in stats.groupby(level=KEYS, sort=False)}
+
+    def engine() -> Dict[Any, List[Dict[str, Any]]]:
+        return alert_rules.alerts_by_group(default.evaluate(stats), KEYS)
+
+    t_old, old = best(legacy, args.repeat)
+    t_new, new = best(engine, args.repeat)
+    diffs = [k for k in old if old[k] != new.get(k, [])]
+    if diffs:
+        print(f"DIVERGÊNCIAS em {len(diffs)} contratante(s), p.ex. {diffs[0]}:")
+        print(f"  original: {old[diffs[0]][:3]}\n  regras  : {new.get(diffs[0], [])[:3]}")
+        return 1
+
+    n_alerts = sum(len(v) for v in new.values())
+    print(f"{args.tenants} contratante(s) × {args.metrics} métricas = {len(stats)} linhas "
+          f"(melhor de {args.repeat}); {n_alerts} alertas idênticos")
+    print(f"  loop original (metrics_block + ifs): {t_old * 1000:9.1f} ms")
+    print(f"  alert_rules.yaml (2 regras)        : {t_new * 1000:9.1f} ms   ({t_old / t_new:.1f}x)")
+
+    t0 = time.perf_counter()
+    many = alert_rules.AlertRules.from_dict(generated_rules(args.rules, args.metrics, args.tenants), PRIMARY)
+    t_compile = time.perf_counter() - t0
+    t_many, out = best(lambda: many.evaluate(stats), args.repeat)
+    print(f"  {args.rules} regras geradas: compilação {t_compile * 1000:7.1f} ms, "
+          f"avaliação {t_many * 1000:7.1f} ms, {len(out)} alertas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
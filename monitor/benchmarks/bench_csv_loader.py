@@ -0,0 +1,149 @@
+"""Benchmark: leitura do database.csv no InventoryTrackingAgent.
+
+Compara o caminho antigo (csv.DictReader + `_try_parse_number` célula a célula,
+uma lista de dicts por linha) com o carregador tipado do metric_store
+(`read_csv_typed`, uma passada vetorizada; `iter_csv_tenants` em blocos).
+Gera um database.csv sintético (T contratantes × D dias, cabeçalhos em
+maiúsculas do mapping_metrics.json), confere que os dois caminhos devolvem os
+mesmos valores p/ um contratante e imprime tempos e pico de memória.
+
+O pico vem do tracemalloc (objetos Python e arrays NumPy/pandas); os buffers
+internos do pyarrow não entram na conta, mas são limitados ao tamanho do bloco.
+
+Uso
+---
+$ python benchmarks/bench_csv_loader.py --days 730 --tenants 50 --repeat 3
+"""
+from __future__ import annotations
+import argparse, csv, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import metric_store  # noqa: E402
+
+MAPPING_PATH = Path(__file__).resolve().parents[2] / "database" / "mapping_metrics.json"
+
+
+def synthetic_database(path: Path, mapping: Dict[str, str], days: int, tenants: int, seed: int = 0) -> None:
+    """database.csv agrupado por contratante, com os cabeçalhos legados."""
+    rng = np.random.default_rng(seed)
+    headers = [h for k, h in mapping.items() if k != metric_store.TS_COL]
+    dates = pd.date_range("2023-01-01 06:00", periods=days, freq="D").strftime("%Y-%m-%dT%H:%M:%SZ")
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        fp.write(",".join(["contratante", mapping[metric_store.TS_COL], *headers]) + "\n")
+        for tid in range(1, tenants + 1):
+            values = rng.uniform(0, 10_000, (days, len(headers))).round(2)
+            values[rng.random(values.shape) < 0.01] = np.nan  # células vazias
+            df = pd.DataFrame(values, columns=headers)
+            df.insert(0, "DATA_HORA_ANALISE", dates)
+            df.insert(0, "contratante", f"t{tid}")
+            df.to_csv(fp, header=False, index=False)
+
+
+def _try_parse_number(value):
+    """Cópia fiel do parser célula a célula do quinzenal.py."""
+    try:
+        if value is None or value == '':
+            return None
+        if '.' in value or 'e' in value.lower():
+            return float(value)
+        return int(value)
+    except Exception:
+        return value
+
+
+def legacy_rows(path: Path, contratante: str) -> List[Dict[str, Any]]:
+    """Cópia fiel do `_load_rows_from_csv` original."""
+    with open(path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        return [
+            {k: _try_parse_number(v) for k, v in row.items() if k != 'contratante'}
+            for row in reader if row['contratante'] == contratante
+        ]
+
+
+def typed_frame(path: Path, contratante: str, mapping: Dict[str, str],
+                block_size: int = metric_store.CSV_BLOCK_BYTES) -> pd.DataFrame:
+    return metric_store.read_csv_typed(path, mapping, contratante=contratante, block_size=block_size)
+
+
+def typed_rows(path: Path, contratante: str, mapping: Dict[str, str]) -> List[Dict[str, Any]]:
+    """O que o agente faz agora: frame tipado ➜ linhas (mesmo formato do caminho do store)."""
+    df = typed_frame(path, contratante, mapping).drop(columns=[metric_store.TENANT_COL])
+    df[metric_store.TS_COL] = df[metric_store.TS_COL].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def stream_all(path: Path, mapping: Dict[str, str]) -> int:
+    return sum(len(df) for _, df in metric_store.iter_csv_tenants(path, mapping))
+
+
+def compare(rows: List[Dict[str, Any]], df: pd.DataFrame, mapping: Dict[str, str]) -> List[str]:
+    diffs = []
+    if len(rows) != len(df):
+        return [f"nº de linhas difere: {len(rows)} != {len(df)}"]
+    for canon, header in mapping.items():
+        if canon == metric_store.TS_COL:
+            continue
+        old = np.array([np.nan if r[header] is None else r[header] for r in rows], dtype=float)
+        if not np.allclose(old, df[canon].to_numpy(), equal_nan=True):
+            diffs.append(f"{canon}: valores diferem")
+    return diffs
+
+
+def measure(fn, repeat: int, *args) -> tuple[float, float]:
+    """(melhor tempo em s, pico de memória em MB de uma execução)."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1024 ** 2
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark do carregador tipado do database.csv")
+    p.add_argument("--days", type=int, default=730)
+    p.add_argument("--tenants", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--block_size", type=int, default=metric_store.CSV_BLOCK_BYTES, help="bytes por bloco")
+    args = p.parse_args()
+
+    mapping = metric_store.load_mapping(MAPPING_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "database.csv"
+        synthetic_database(path, mapping, args.days, args.tenants)
+        target = f"t{args.tenants // 2 + 1}"
+
+        diffs = compare(legacy_rows(path, target), typed_frame(path, target, mapping), mapping)
+        if diffs:
+            print("DIVERGÊNCIAS:\n  " + "\n  ".join(diffs[:20]))
+            return 1
+
+        size_mb = path.stat().st_size / 1024 ** 2
+        print(f"{args.tenants} contratante(s) × {args.days} dias × {len(mapping) - 1} métricas "
+              f"({size_mb:.1f} MB, melhor de {args.repeat})")
+        results = [
+            ("DictReader ➜ linhas", measure(legacy_rows, args.repeat, path, target)),
+            ("tipado ➜ linhas", measure(typed_rows, args.repeat, path, target, mapping)),
+            ("tipado (DataFrame)", measure(typed_frame, args.repeat, path, target, mapping, args.block_size)),
+            ("streaming, todos", measure(stream_all, args.repeat, path, mapping)),
+        ]
+    for label, (t, peak) in results:
+        print(f"  {label:<20}: {t * 1000:9.1f} ms   pico {peak:8.1f} MB")
+    print(f"  speedup (linhas)    : {results[0][1][0] / results[1][1][0]:9.1f}x")
+    print(f"  speedup (DataFrame) : {results[0][1][0] / results[2][1][0]:9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
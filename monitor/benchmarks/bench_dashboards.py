@@ -0,0 +1,114 @@
+"""Benchmark: dashboards do quinzenal para muitos contratantes.
+
+Gera análises sintéticas (métricas + status das ações) p/ T contratantes e
+compara
+
+- original : uma Figure nova por PNG, desenhada no processo principal
+- modelo   : `dashboards.render` (figura-modelo reaproveitada), em série
+- pool     : `dashboards.DashboardPool` com W processos
+- reexec.  : o pool de novo sobre os mesmos PNGs (nada muda ➜ nada é desenhado)
+
+Imprime tempo e o crescimento do RSS do processo principal em cada etapa; uma
+fração `--dup` dos contratantes repete o payload de outro (copiado, não desenhado).
+
+Uso
+---
+$ python benchmarks/bench_dashboards.py --tenants 200 --workers 4
+"""
+from __future__ import annotations
+import argparse, os, resource, sys, tempfile, time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import dashboards  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+
+def synthetic_analyses(tenants: int, dup: float, seed: int = 0) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    rng = np.random.default_rng(seed)
+    out = []
+    for t in range(tenants):
+        if out and rng.random() < dup:
+            out.append(out[rng.integers(len(out))])
+            continue
+        metrics = {"metrics_comparison": [
+            {"metric_name": f"metrica_{j}", "current_value": round(float(rng.uniform(0, 1000)), 1),
+             "target_value": round(float(rng.uniform(0, 1000)), 1),
+             "progress_rate": f"{rng.uniform(0, 100):.1f}%"} for j in range(6)]}
+        sizes = rng.integers(0, 10, 4)
+        actions = {"overall_plan_status": {
+            "actions_complete": int(sizes[0]), "actions_in_progress": int(sizes[1]),
+            "actions_delayed": int(sizes[2]), "actions_not_started": int(sizes[3]) + 1,
+            "overall_completion": f"{rng.uniform(0, 100):.1f}%"}}
+        out.append((metrics, actions))
+    return out
+
+
+def legacy(kind: str, analysis: Dict[str, Any], path: Path) -> None:
+    """Como era antes: Figure nova a cada dashboard."""
+    payload = dashboards.KINDS[kind][0](analysis)
+    fig = Figure(figsize=dashboards.FIGSIZE)
+    fig.subplots(1, 2)
+    dashboards.KINDS[kind][1](fig, payload)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as fp:
+        return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+
+def run_serial(fn, analyses, out: Path) -> None:
+    for t, (metrics, actions) in enumerate(analyses):
+        fn("metricas", metrics, out / f"{t}_metricas.png")
+        fn("acoes", actions, out / f"{t}_acoes.png")
+
+
+def run_pool(analyses, out: Path, workers: int) -> Dict[str, int]:
+    with dashboards.DashboardPool(workers, jobs=2 * len(analyses)) as pool:
+        futs = []
+        for t, (metrics, actions) in enumerate(analyses):
+            futs.append(pool.submit("metricas", metrics, out / f"{t}_metricas.png"))
+            futs.append(pool.submit("acoes", actions, out / f"{t}_acoes.png"))
+        for f in futs:
+            f.result()
+    return pool.stats
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark da renderização dos dashboards")
+    p.add_argument("--tenants", type=int, default=100)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--dup", type=float, default=0.1, help="Fração de contratantes com payload repetido")
+    args = p.parse_args()
+
+    analyses = synthetic_analyses(args.tenants, args.dup)
+    print(f"{args.tenants} contratante(s), {2 * args.tenants} PNGs, {args.workers} processo(s)")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy("metricas", analyses[0][0], Path(tmp) / "aquecimento.png")  # fontes/caches do matplotlib
+        steps = [
+            ("original", lambda d: run_serial(legacy, analyses, d)),
+            ("modelo", lambda d: run_serial(dashboards.render, analyses, d)),
+            ("pool", lambda d: run_pool(analyses, d, args.workers)),
+            ("reexec.", lambda d: run_pool(analyses, d, args.workers)),
+        ]
+        for label, fn in steps:
+            out = Path(tmp) / ("pool" if label == "reexec." else label)
+            out.mkdir(exist_ok=True)
+            rss0 = rss_mb()
+            t0 = time.perf_counter()
+            stats = fn(out)
+            dt = time.perf_counter() - t0
+            extra = f"   {stats}" if stats else ""
+            print(f"  {label:<9}: {dt:8.2f} s   RSS {rss_mb() - rss0:+7.1f} MB{extra}")
+    print(f"  pico RSS  : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:8.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
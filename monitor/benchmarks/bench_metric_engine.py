@@ -0,0 +1,159 @@
+"""Benchmark: loop original de build_snapshot  x  motor colunar (metric_engine).
+
+Gera um extrato sintético (T contratantes × D dias × M métricas), roda as duas
+implementações, confere que produzem os mesmos valores e imprime os tempos.
+Com T > 1 o loop original roda uma vez por contratante e o motor roda uma única
+vez com `keys=["id_contratante"]`.
+
+Uso
+---
+$ python benchmarks/bench_metric_engine.py --days 180 --metrics 49 --tenants 200 --repeat 3
+"""
+from __future__ import annotations
+import argparse, sys, time
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import metric_engine  # noqa: E402
+from generate_analysis import EPSILON, FAST_FACTOR, classify_trend, last_window, slope  # noqa: E402
+
+
+def synthetic_extract(days: int, n_metrics: int, tenants: int = 1, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    frames = [_tenant_extract(rng, tid, days, n_metrics) for tid in range(1, tenants + 1)]
+    df = pd.concat([f for f, _ in frames], ignore_index=True)
+    return df, frames[0][1]
+
+
+def _tenant_extract(rng: np.random.Generator, tid: int, days: int, n_metrics: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    dates = pd.date_range("2025-01-01 09:00", periods=days, freq="D")
+    base = rng.uniform(5, 500, n_metrics)
+    drift = rng.normal(0, 0.3, n_metrics)
+    values = base + np.outer(np.arange(days), drift) + rng.normal(0, 1, (days, n_metrics))
+    values[rng.random(values.shape) < 0.02] = np.nan  # buracos pontuais
+    cols = [f"m{i:02d}" for i in range(1, n_metrics + 1)]
+    df = pd.DataFrame(values, columns=cols)
+    df.insert(0, "data_extracao", dates)
+    df.insert(0, "id_contratante", tid)
+    relev = pd.DataFrame({
+        "metric_id": cols[::2],
+        "has_target": True,
+        "target": base[::2],
+    })
+    return df, relev
+
+
+def legacy_loop(df_extr: pd.DataFrame, df_relev: pd.DataFrame) -> Dict[str, Any]:
+    """Cópia fiel do loop por métrica que existia em build_snapshot."""
+    metrics_dict: Dict[str, Any] = {}
+    metric_cols = [c for c in df_extr.columns if c not in ("id_contratante", "data_extracao")]
+    for metric_id in metric_cols:
+        series = df_extr.set_index("data_extracao")[metric_id].dropna()
+        if series.empty:
+            continue
+        baseline_val = float(series.iloc[0])
+        current_val = float(series.iloc[-1])
+        delta_abs = current_val - baseline_val
+        delta_pct = (delta_abs / baseline_val * 100) if baseline_val != 0 else None
+        last7 = series[last_window(series.index, days=7)]
+        slp = slope(last7) if len(last7) >= 2 else 0.0
+        trend = classify_trend(slp)
+        row_target = df_relev[df_relev["metric_id"] == metric_id]
+        has_target = bool(row_target["has_target"].iloc[0]) if not row_target.empty else False
+        target_val = float(row_target["target"].iloc[0]) if has_target else None
+        status = "sem_meta"
+        if has_target and target_val is not None:
+            status = (
+                "acima_meta" if current_val < target_val else
+                "abaixo_meta" if current_val > target_val else
+                "dentro_meta"
+            )
+        metrics_dict[metric_id] = {
+            "name": metric_id, "has_target": has_target, "baseline": baseline_val,
+            "current": current_val, "target": target_val, "delta_abs": delta_abs,
+            "delta_pct": round(delta_pct, 2) if delta_pct is not None else None,
+            "slope_7d": round(slp, 3), "trend": trend, "status": status,
+            "problem_ids": [], "action_ids": [],
+        }
+    return metrics_dict
+
+
+def engine(df_extr: pd.DataFrame, df_relev: pd.DataFrame) -> Dict[str, Any]:
+    metric_cols = [c for c in df_extr.columns if c not in ("id_contratante", "data_extracao")]
+    stats = metric_engine.metric_stats(df_extr, "data_extracao", metric_cols,
+                                       windows=[7], eps=EPSILON, fast_factor=FAST_FACTOR)
+    stats = metric_engine.attach_targets(stats, df_relev)
+    return metric_engine.metrics_block(stats)
+
+
+def legacy_all_tenants(df: pd.DataFrame, df_relev: pd.DataFrame) -> None:
+    for _, df_t in df.groupby("id_contratante"):
+        legacy_loop(df_t, df_relev)
+
+
+def engine_all_tenants(df: pd.DataFrame, df_relev: pd.DataFrame) -> pd.DataFrame:
+    metric_cols = [c for c in df.columns if c not in ("id_contratante", "data_extracao")]
+    stats = metric_engine.metric_stats(df, "data_extracao", metric_cols, keys=["id_contratante"],
+                                       windows=[7], eps=EPSILON, fast_factor=FAST_FACTOR)
+    return metric_engine.attach_targets(stats, df_relev)
+
+
+def compare(a: Dict[str, Any], b: Dict[str, Any]) -> list[str]:
+    diffs = []
+    if list(a) != list(b):
+        diffs.append("conjunto/ordem de métricas difere")
+    for mid in a:
+        for k, va in a[mid].items():
+            vb = b.get(mid, {}).get(k)
+            if isinstance(va, float) and isinstance(vb, float):
+                if not np.isclose(va, vb, rtol=1e-9, atol=1e-9):
+                    diffs.append(f"{mid}.{k}: {va} != {vb}")
+            elif va != vb:
+                diffs.append(f"{mid}.{k}: {va!r} != {vb!r}")
+    return diffs
+
+
+def best_of(fn, repeat: int, *args) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark do motor colunar de métricas")
+    p.add_argument("--days", type=int, default=180)
+    p.add_argument("--metrics", type=int, default=49)
+    p.add_argument("--tenants", type=int, default=1)
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+
+    df, relev = synthetic_extract(args.days, args.metrics, args.tenants)
+    first = df[df["id_contratante"] == 1]
+    diffs = compare(legacy_loop(first, relev), engine(first, relev))
+    if diffs:
+        print("DIVERGÊNCIAS:\n  " + "\n  ".join(diffs[:20]))
+        return 1
+
+    if args.tenants == 1:
+        t_legacy = best_of(legacy_loop, args.repeat, df, relev)
+        t_engine = best_of(engine, args.repeat, df, relev)
+    else:
+        t_legacy = best_of(legacy_all_tenants, args.repeat, df, relev)
+        t_engine = best_of(engine_all_tenants, args.repeat, df, relev)
+    print(f"{args.tenants} contratante(s) × {args.days} dias × {args.metrics} métricas (melhor de {args.repeat})")
+    print(f"  loop original : {t_legacy * 1000:8.1f} ms")
+    print(f"  metric_engine : {t_engine * 1000:8.1f} ms")
+    print(f"  speedup       : {t_legacy / t_engine:8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
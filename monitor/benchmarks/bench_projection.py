@@ -0,0 +1,133 @@
+"""Benchmark: projeção até data_fim série a série (np.polyfit)  x  projection.py.
+
+Gera o extrato sintético do bench_metric_engine (T contratantes × D dias × M
+métricas, 1 planejamento por contratante com data_fim `--horizon` dias depois
+do último dia e metas em metade das métricas) e
+
+1. projeta cada série num loop (polyfit + intervalo de previsão da t), uma
+   amostra de contratantes, e confere contra as colunas proj_* vetorizadas;
+2. mede o custo de `fit_days` no metric_engine e do `projection.attach` sobre
+   a base inteira (T × M séries).
+
+Uso
+---
+$ python benchmarks/bench_projection.py --tenants 500 --days 120 --metrics 49 --repeat 3
+"""
+from __future__ import annotations
+import argparse, sys, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import metric_engine  # noqa: E402
+import projection  # noqa: E402
+from bench_metric_engine import synthetic_extract  # noqa: E402
+from generate_analysis import EPSILON, FAST_FACTOR, last_window  # noqa: E402
+
+WINDOWS = [7, 15, 30]
+FIT_DAYS = 30
+LEVEL = 0.9
+KEYS = ["id_contratante", "id_planejamento"]
+
+
+def with_targets(stats: pd.DataFrame, seed: int = 2) -> pd.DataFrame:
+    """Metas (tipo alternado) em metade das métricas, perto do valor atual."""
+    rng = np.random.default_rng(seed)
+    out = stats.copy()
+    has = np.arange(len(out)) % 2 == 0
+    out["target"] = np.where(has, out["current"] * rng.uniform(0.8, 1.2, len(out)), np.nan)
+    out["tipo"] = np.where(has, np.where(rng.random(len(out)) < 0.5, "menor_que", "maior_que"), "")
+    return out
+
+
+def legacy_projection(series: pd.Series, end: pd.Timestamp, target: float, tipo: str) -> tuple:
+    """Uma série por vez: polyfit na janela, valor em data_fim, intervalo e P(meta)."""
+    w = series[last_window(series.index, FIT_DAYS)]
+    x = -((w.index[-1] - w.index) // pd.Timedelta(days=1)).to_numpy(dtype=float)
+    h = float((end.normalize() - w.index[-1].normalize()).days)
+    b, a = np.polyfit(x, w.to_numpy(), 1)
+    n = len(x)
+    s2 = ((w.to_numpy() - (a + b * x)) ** 2).sum() / (n - 2)
+    se = np.sqrt(s2 * (1 + 1 / n + (h - x.mean()) ** 2 / ((x - x.mean()) ** 2).sum()))
+    q = float(projection.t_ppf(0.5 + LEVEL / 2, np.array([n - 2.0]))[0])
+    value = a + b * h
+    prob = np.nan
+    if tipo:
+        gap = (target - value) if tipo == "menor_que" else (value - target)
+        prob = float(projection.t_cdf(gap / se, n - 2))
+    return value, value - q * se, value + q * se, prob
+
+
+def best(fn, repeat: int):
+    times, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark das projeções até o fim do plano")
+    p.add_argument("--tenants", type=int, default=200)
+    p.add_argument("--days", type=int, default=120)
+    p.add_argument("--metrics", type=int, default=49)
+    p.add_argument("--horizon", type=int, default=60, help="Dias entre o último ponto e data_fim")
+    p.add_argument("--check", type=int, default=3, help="Contratantes conferidos contra o loop")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    df, _ = synthetic_extract(args.days, args.metrics, args.tenants)
+    df["id_planejamento"] = df["id_contratante"]
+    metric_cols = [c for c in df.columns if c not in (*KEYS, "data_extracao")]
+    last_day = df["data_extracao"].max().normalize()
+    plan_ends = pd.Series(last_day + pd.Timedelta(days=args.horizon), index=range(1, args.tenants + 1))
+
+    def stats_only() -> pd.DataFrame:
+        return metric_engine.metric_stats(df, "data_extracao", metric_cols, keys=KEYS, windows=WINDOWS,
+                                          eps=EPSILON, fast_factor=FAST_FACTOR)
+
+    def stats_fit() -> pd.DataFrame:
+        return metric_engine.metric_stats(df, "data_extracao", metric_cols, keys=KEYS, windows=WINDOWS,
+                                          eps=EPSILON, fast_factor=FAST_FACTOR, fit_days=FIT_DAYS)
+
+    t_base, _ = best(stats_only, args.repeat)
+    t_fit, stats = best(stats_fit, args.repeat)
+    stats = with_targets(stats)
+    t_proj, proj = best(lambda: projection.attach(stats, plan_ends, level=LEVEL), args.repeat)
+
+    # conferência série a série (e tempo do loop, extrapolado p/ a base inteira)
+    cols = ["proj_value", "proj_lower", "proj_upper", "proj_prob"]
+    bad, checked, t0 = 0, 0, time.perf_counter()
+    for tid in range(1, min(args.check, args.tenants) + 1):
+        sub = df[df["id_contratante"] == tid].set_index("data_extracao")
+        for mid in metric_cols:
+            row = proj.loc[(tid, tid, mid)]
+            got = row[cols].to_numpy(dtype=float)
+            exp = np.array(legacy_projection(sub[mid].dropna(), plan_ends[tid], row["target"], row["tipo"]))
+            checked += 1
+            if not np.allclose(got, exp, rtol=1e-7, atol=1e-7, equal_nan=True):
+                bad += 1
+                if bad <= 3:
+                    print(f"DIVERGÊNCIA {tid}/{mid}: {got} != {exp}")
+    t_loop = (time.perf_counter() - t0) / max(checked, 1) * len(stats)
+    if bad:
+        print(f"{bad} de {checked} séries divergem")
+        return 1
+
+    n_prob = int(proj["proj_prob"].notna().sum())
+    print(f"{args.tenants} contratante(s) × {args.days} dias × {args.metrics} métricas = {len(stats)} séries "
+          f"(melhor de {args.repeat}); {checked} conferidas contra o loop")
+    print(f"  metric_stats                 : {t_base * 1000:9.1f} ms")
+    print(f"  metric_stats + fit_days      : {t_fit * 1000:9.1f} ms   (+{(t_fit - t_base) * 1000:.1f} ms)")
+    print(f"  projection.attach            : {t_proj * 1000:9.1f} ms   ({n_prob} probabilidades)")
+    print(f"  loop polyfit (extrapolado)   : {t_loop * 1000:9.1f} ms   "
+          f"({t_loop / (t_fit - t_base + t_proj):.0f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
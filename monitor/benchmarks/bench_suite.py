@@ -0,0 +1,382 @@
+"""Suíte de benchmarks em escala sintética, com um endpoint local no lugar da OpenAI.
+
+Gera (ou reaproveita) um diretório de entrada com synthetic_inputs.py —
+N contratantes × D dias × 48 métricas — e mede, cada caso num subprocesso
+novo (o pico de memória de um não contamina o seguinte):
+
+- load_store / load_csv: `InventoryTrackingAgent.load_data_from_database` a partir
+  do store colunar e do database.csv legado (linhas/s);
+- build_snapshot: `generate_analysis.build_snapshot` de uma amostra de contratantes,
+  com o cache de pontos de mudança vazio (snapshots/s);
+- batch: `generate_analysis.build_batch` de todos os planejamentos, com o llm_summary
+  vindo do endpoint local (snapshots/s);
+- build_human_prompt: prompt do relatório de snapshots prontos (prompts/s);
+- report: `generate_report.generate_report` de ponta a ponta (relatórios/s);
+- cycle: `quinzenal.run_cycles_concurrently` (3 chamadas ao LLM + 2 dashboards por
+  contratante; ciclos/s).
+
+O endpoint local (`make_chat_server`) imita /chat/completions: responde o JSON de
+comparação de métricas e de status das ações que o quinzenal espera, o texto do
+batch_jobs.canned_reply para os demais prompts e `usage` com tokens estimados;
+`--llm_latency` soma um atraso fixo por chamada. O cache de LLM fica desligado
+(LLM_CACHE_BYPASS=1) e a telemetria também (TELEMETRY_DISABLE=1).
+
+Cada caso roda em `--rounds` processos; em cada um, ≥ `--repeat` execuções e
+até somar `--min_time` s, e vale a mediana (das execuções e depois dos
+processos) do tempo e do pico de RSS (ru_maxrss; os processos de
+dashboards/batch não entram). Com `--update_baseline` os números viram a
+referência da escala em baselines.json; sem ele, um caso mais lento que a
+referência × (1 + `--tolerance`) e mais de `--min_delta` s acima dela, ou com
+pico de memória acima de referência × (1 + `--mem_tolerance`), é regressão e o
+script sai com código 1. As referências valem para a máquina em que foram gravadas
+(`machine` no JSON): em outra máquina, regrave antes de comparar.
+
+Uso
+---
+$ python benchmarks/bench_suite.py --scale small
+$ python benchmarks/bench_suite.py --scale medium --cases batch cycle --update_baseline
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, platform, re, resource, shutil, statistics, subprocess, sys, tempfile, threading, time
+from argparse import Namespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+HERE = Path(__file__).resolve().parent
+MONITOR = HERE.parent
+sys.path.insert(0, str(MONITOR))
+sys.path.insert(0, str(HERE))
+
+import synthetic_inputs  # noqa: E402
+
+BASELINES = HERE / "baselines.json"
+# escala ➜ (contratantes, dias, amostra de contratantes dos casos por contratante)
+SCALES = {"small": (50, 180, 5), "medium": (300, 365, 10), "large": (2000, 365, 20)}
+CASES = ["load_store", "load_csv", "build_snapshot", "batch", "build_human_prompt", "report", "cycle"]
+ACTION_PLAN = MONITOR / "plans" / "action_plan_pt_cenario_a.md"
+PROBLEM_ANALYSIS = MONITOR / "plans" / "problem_analysis_pt_cenario_a.md"
+MIN_TIME = 1.0  # s mínimos medidos por caso (--min_time)
+JSON_BLOCK = re.compile(r"```json\s*(\{.*?\})\s*```", re.S)
+
+
+def timed(fn, repeat: int, setup=None):
+    """Mediana de ≥ `repeat` execuções, repetindo até somar MIN_TIME s (casos rápidos ficam mais estáveis)."""
+    times, out = [], None
+    while len(times) < repeat or sum(times) < MIN_TIME:
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), out
+
+
+################################################################################
+# Endpoint local de chat completions
+################################################################################
+
+def canned_chat(prompt: str, body: Dict[str, Any]) -> str:
+    """Resposta fixa no formato que cada prompt pede."""
+    from batch_jobs import canned_reply
+
+    if "analise a evolução das métricas" in prompt:
+        blocks = [json.loads(b) for b in JSON_BLOCK.findall(prompt)[:2]]
+        base, cur = (blocks + [{}, {}])[:2]
+        rows = [{"metric_name": k, "initial_value": base.get(k), "current_value": v,
+                 "target_value": round(v * 0.9, 2), "progress_rate": f"{(i * 7) % 100}%",
+                 "trend": "improving", "status": "on_track"}
+                for i, (k, v) in enumerate(cur.items()) if isinstance(v, (int, float))][:12]
+        return "```json\n" + json.dumps({"metrics_comparison": rows, "key_insights": ["gerado localmente"],
+                                         "concerns": [], "opportunities": []}) + "\n```"
+    if "avalie o progresso das ações" in prompt:
+        return json.dumps({"action_status": [{"problem": "Estoque negativo", "action": "Inventário cíclico",
+                                              "status": "in_progress", "completion_percentage": 40}],
+                           "overall_plan_status": {"actions_complete": 1, "actions_in_progress": 2,
+                                                   "actions_delayed": 1, "actions_not_started": 0,
+                                                   "overall_completion": "45%"},
+                           "new_actions_recommended": []})
+    if "relatório quinzenal" in prompt:
+        return canned_reply({"max_tokens": 4096})
+    return canned_reply(body)
+
+
+def make_chat_server(port: int = 0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Servidor de /chat/completions (port=0: porta livre; veja server.server_port)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):  # silencioso
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+            text = canned_chat(prompt, body)
+            if latency:
+                time.sleep(latency)
+            data = json.dumps({
+                "id": "chatcmpl-local", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "local"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                          "total_tokens": (len(prompt) + len(text)) // 4},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+
+def serve_chat(latency: float) -> ThreadingHTTPServer:
+    """Sobe o endpoint numa thread e aponta os clientes OpenAI/LangChain para ele."""
+    server = make_chat_server(0, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.update(OPENAI_API_KEY="sk-local", OPENAI_BASE_URL=url, OPENAI_API_BASE=url)
+    return server
+
+
+################################################################################
+# Casos (cada um roda no seu subprocesso)
+################################################################################
+
+def _tenants(data: Path, sample: int) -> List[int]:
+    import pandas as pd
+
+    ids = pd.read_csv(data / "planejamento.csv")["id_contratante"].tolist()
+    step = max(len(ids) // sample, 1)
+    return ids[::step][:sample]
+
+
+def _snapshot_args(data: Path, out: str, contratante: int = 0, **kw) -> Namespace:
+    return Namespace(input_dir=str(data), contratante=contratante, planejamento=contratante, out=out, store=None,
+                     state_dir=None, rebuild_state=False, verify_state=False, batch=False, workers=1, repo=None,
+                     defer_llm=False, profile=None, **kw)
+
+
+def _clear_caches(data: Path) -> None:
+    (data / ".changepoints.json").unlink(missing_ok=True)
+
+
+def case_load(data: Path, sample: int, repeat: int, source: str) -> Dict[str, Any]:
+    import quinzenal
+
+    db = str(data / "metric_store") if source == "store" else str(data / "database.csv")
+    tenants = _tenants(data, sample)
+
+    def run() -> int:
+        rows = 0
+        for t in tenants:
+            agent = quinzenal.InventoryTrackingAgent(model_name="gpt-4o", max_retries=0)
+            agent.load_data_from_database(db, str(t), str(ACTION_PLAN), str(PROBLEM_ANALYSIS))
+            rows += agent.cycle_count
+        return rows
+
+    seconds, rows = timed(run, repeat)
+    return {"seconds": seconds, "items": rows, "unit": "linhas"}
+
+
+def case_build_snapshot(data: Path, sample: int, repeat: int) -> Dict[str, Any]:
+    import generate_analysis
+
+    tenants = _tenants(data, sample)
+    seconds, _ = timed(lambda: [generate_analysis.build_snapshot(_snapshot_args(data, "", t)) for t in tenants],
+                      repeat, setup=lambda: _clear_caches(data))
+    return {"seconds": seconds, "items": len(tenants), "unit": "snapshots"}
+
+
+def case_batch(data: Path, sample: int, repeat: int, tmp: Path) -> Dict[str, Any]:
+    import generate_analysis
+
+    def setup() -> None:
+        _clear_caches(data)
+        shutil.rmtree(tmp / "batch", ignore_errors=True)
+
+    args = _snapshot_args(data, str(tmp / "batch"))
+    args.batch = True
+    seconds, paths = timed(lambda: generate_analysis.build_batch(args), repeat, setup=setup)
+    return {"seconds": seconds, "items": len(paths), "unit": "snapshots"}
+
+
+def _snapshots(data: Path, sample: int, tmp: Path) -> List[str]:
+    """Snapshots prontos da amostra (fora do tempo medido)."""
+    import generate_analysis
+
+    paths = []
+    for t in _tenants(data, sample):
+        path = str(tmp / f"snapshot_{t}.json")
+        generate_analysis.save_snapshot(generate_analysis.build_snapshot(_snapshot_args(data, path, t)), path)
+        paths.append(path)
+    return paths
+
+
+def case_build_human_prompt(data: Path, sample: int, repeat: int, tmp: Path) -> Dict[str, Any]:
+    import generate_report
+
+    snaps = [generate_report.load_snapshot(p) for p in _snapshots(data, sample, tmp)] * 20
+    seconds, _ = timed(lambda: [generate_report.build_human_prompt(s) for s in snaps], repeat)
+    return {"seconds": seconds, "items": len(snaps), "unit": "prompts"}
+
+
+def case_report(data: Path, sample: int, repeat: int, tmp: Path) -> Dict[str, Any]:
+    import generate_report
+
+    paths = _snapshots(data, sample, tmp)
+    seconds, _ = timed(lambda: [generate_report.generate_report(p) for p in paths], repeat)
+    return {"seconds": seconds, "items": len(paths), "unit": "relatórios"}
+
+
+def case_cycle(data: Path, sample: int, repeat: int, tmp: Path) -> Dict[str, Any]:
+    import quinzenal
+
+    tenants = [str(t) for t in _tenants(data, sample)]
+
+    def run() -> Dict[str, Any]:
+        return asyncio.run(quinzenal.run_cycles_concurrently(
+            tenants, str(data / "metric_store"), str(ACTION_PLAN), str(PROBLEM_ANALYSIS), str(tmp / "cycles"),
+            max_concurrency=4, render_workers=1))
+
+    seconds, results = timed(run, repeat)
+    failed = {c: str(r) for c, r in results.items()
+              if isinstance(r, Exception) or not all(os.path.exists(f) for f in r.values())}
+    if failed:  # dashboard que falha só vai p/ o log
+        raise RuntimeError(f"ciclos com erro: {failed}")
+    return {"seconds": seconds, "items": len(tenants), "unit": "ciclos"}
+
+
+def run_case(name: str, data: Path, sample: int, repeat: int, latency: float, min_time: float) -> Dict[str, Any]:
+    global MIN_TIME
+    MIN_TIME = min_time
+    os.environ.update(LLM_CACHE_BYPASS="1", TELEMETRY_DISABLE="1")
+    serve_chat(latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if name in ("load_store", "load_csv"):
+            res = case_load(data, sample, repeat, name[len("load_"):])
+        elif name == "build_snapshot":
+            res = case_build_snapshot(data, sample, repeat)
+        else:
+            res = globals()[f"case_{name}"](data, sample, repeat, tmp)
+    res["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return res
+
+
+################################################################################
+# Orquestração e referências
+################################################################################
+
+def machine() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "platform": platform.platform(terse=True),
+            "processor": platform.machine(), "cpus": os.cpu_count()}
+
+
+def load_baselines() -> Dict[str, Any]:
+    if BASELINES.exists():
+        return json.loads(BASELINES.read_text(encoding="utf-8"))
+    return {"machine": None, "scales": {}}
+
+
+def save_baselines(doc: Dict[str, Any]) -> None:
+    tmp = BASELINES.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(doc, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, BASELINES)
+
+
+def compare(res: Dict[str, Any], ref: Optional[Dict[str, Any]], tol: float, mem_tol: float,
+            min_delta: float = 0.0) -> str:
+    """'' se dentro da tolerância; senão a descrição da regressão.
+
+    Tempo só regride se passar da folga relativa *e* de `min_delta` s: em casos
+    de décimos de segundo, o ruído entre execuções sozinho já passa de 25%.
+    """
+    if not ref:
+        return ""
+    problems = []
+    if res["seconds"] > ref["seconds"] * (1 + tol) and res["seconds"] - ref["seconds"] > min_delta:
+        problems.append(f"tempo {res['seconds'] / ref['seconds']:.2f}x a referência")
+    if res["rss_mb"] > ref["rss_mb"] * (1 + mem_tol):
+        problems.append(f"memória {res['rss_mb'] / ref['rss_mb']:.2f}x a referência")
+    return "; ".join(problems)
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Suíte de benchmarks em escala sintética com LLM local")
+    p.add_argument("--scale", choices=sorted(SCALES), default="small")
+    p.add_argument("--cases", nargs="*", choices=CASES, default=CASES)
+    p.add_argument("--data", default=None, help="Diretório de entrada (padrão: <tmp>/bench_suite_<escala>)")
+    p.add_argument("--regenerate", action="store_true", help="Recria o diretório de entrada mesmo se existir")
+    p.add_argument("--repeat", type=int, default=3, help="Execuções mínimas de cada caso por processo (mediana)")
+    p.add_argument("--min_time", type=float, default=MIN_TIME, help="Repete cada caso até somar N s por processo")
+    p.add_argument("--rounds", type=int, default=3, help="Processos por caso; vale a mediana entre eles")
+    p.add_argument("--llm_latency", type=float, default=0.0, help="Atraso (s) por chamada ao endpoint local")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Folga de tempo sobre a referência")
+    p.add_argument("--mem_tolerance", type=float, default=0.15, help="Folga de pico de memória sobre a referência")
+    p.add_argument("--min_delta", type=float, default=0.1, help="Piora absoluta mínima (s) p/ contar regressão de tempo")
+    p.add_argument("--update_baseline", action="store_true", help="Grava os resultados como referência da escala")
+    p.add_argument("--case", default=None, help=argparse.SUPPRESS)  # execução interna de um caso
+    args = p.parse_args()
+    tenants, days, sample = SCALES[args.scale]
+    data = Path(args.data or Path(tempfile.gettempdir()) / f"bench_suite_{args.scale}")
+
+    if args.case:
+        print(json.dumps(run_case(args.case, data, sample, args.repeat, args.llm_latency, args.min_time)))
+        return 0
+
+    marker = data / ".bench_suite.json"
+    spec = {"tenants": tenants, "days": days, "seed": 0}
+    if args.regenerate or not marker.exists() or json.loads(marker.read_text()) != spec:
+        t0 = time.perf_counter()
+        synthetic_inputs.write_inputs(data, tenants, days, seed=0, csv=True)
+        marker.write_text(json.dumps(spec))
+        print(f"entrada sintética em {data} ({time.perf_counter() - t0:.1f} s)")
+
+    doc = load_baselines()
+    refs = doc["scales"].get(args.scale, {})
+    if refs and not args.update_baseline and doc.get("machine") != machine():
+        print(f"aviso: referências gravadas em outra máquina ({doc.get('machine')})")
+    print(f"escala {args.scale}: {tenants} contratante(s) × {days} dias × {len(synthetic_inputs.schema())} métricas, "
+          f"amostra de {sample} (mediana de {args.rounds} processo(s) × ≥{args.repeat} execuções/{args.min_time:g} s)")
+    results, regressions = {}, []
+    for name in args.cases:
+        rounds = []
+        for _ in range(args.rounds):
+            proc = subprocess.run([sys.executable, __file__, "--case", name, "--scale", args.scale, "--data", str(data),
+                                   "--repeat", str(args.repeat), "--min_time", str(args.min_time),
+                                   "--llm_latency", str(args.llm_latency)],
+                                  cwd=MONITOR, capture_output=True, text=True)
+            if proc.returncode:
+                break
+            rounds.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        if proc.returncode:
+            print(f"  {name:<20}: FALHOU\n{proc.stderr[-2000:]}")
+            regressions.append(name)
+            continue
+        res = results[name] = {**rounds[0], "seconds": statistics.median(r["seconds"] for r in rounds),
+                               "rss_mb": statistics.median(r["rss_mb"] for r in rounds)}
+        bad = "" if args.update_baseline else compare(res, refs.get(name), args.tolerance, args.mem_tolerance,
+                                                      args.min_delta)
+        ref = refs.get(name)
+        vs = f"  ({res['seconds'] / ref['seconds']:.2f}x ref.)" if ref else ""
+        print(f"  {name:<20}: {res['seconds'] * 1000:9.1f} ms  {res['items'] / res['seconds']:10.1f} "
+              f"{res['unit']}/s  pico {res['rss_mb']:7.1f} MB{vs}" + (f"  REGRESSÃO: {bad}" if bad else ""))
+        if bad:
+            regressions.append(name)
+
+    if args.update_baseline:
+        doc["machine"] = machine()
+        doc["scales"].setdefault(args.scale, {}).update(
+            {k: {"seconds": round(v["seconds"], 4), "rss_mb": round(v["rss_mb"], 1), "items": v["items"]}
+             for k, v in results.items()})
+        save_baselines(doc)
+        print(f"referências de '{args.scale}' gravadas em {BASELINES}")
+    if regressions:
+        print(f"{len(regressions)} caso(s) com regressão ou falha: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
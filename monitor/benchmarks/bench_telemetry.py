@@ -0,0 +1,99 @@
+"""Benchmark: custo da telemetria (telemetry.py) por evento e numa execução batch típica.
+
+Mede, com a saída num diretório temporário,
+
+1. um bloco vazio sem telemetria (referência);
+2. `span` com TELEMETRY_DISABLE (no-op) e ligado (contador + linha no events.jsonl);
+3. `span` aninhado dentro de `tenant(...)` (rótulos herdados);
+4. `record_llm` (tokens + custo);
+5. `flush` do .prom com os contadores acumulados;
+
+e estima o custo de uma rodada do generate_analysis --batch com `--tenants`
+planejamentos (~6 etapas no processo pai + 4 spans por snapshot no worker).
+
+Uso
+---
+$ python benchmarks/bench_telemetry.py --events 100000 --tenants 500 --repeat 3
+"""
+from __future__ import annotations
+import argparse, os, sys, tempfile, time
+from contextlib import nullcontext
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import telemetry  # noqa: E402
+
+SPANS_PER_SNAPSHOT = 4  # snapshot, relations, llm, save
+PARENT_SPANS = 6        # load, impacts, etl, metrics, alerts, changepoints (+ assemble)
+
+
+def best(fn, repeat: int):
+    times, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark do custo da telemetria")
+    p.add_argument("--events", type=int, default=100_000)
+    p.add_argument("--tenants", type=int, default=500, help="Planejamentos da rodada batch estimada")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+    n = args.events
+
+    with tempfile.TemporaryDirectory() as tmp:
+        telemetry.configure(job="bench_telemetry", out_dir=tmp)
+
+        def bare() -> None:
+            for _ in range(n):
+                with nullcontext():
+                    pass
+
+        def spans() -> None:
+            for _ in range(n):
+                with telemetry.span("etapa"):
+                    pass
+
+        def nested() -> None:
+            with telemetry.tenant(45, 123), telemetry.span("snapshot"):
+                for _ in range(n):
+                    with telemetry.span("etapa"):
+                        pass
+
+        def llm() -> None:
+            for _ in range(n):
+                telemetry.record_llm("gpt-4o", 1200, 300, 0.8)
+
+        t_bare, _ = best(bare, args.repeat)
+        telemetry.configure(enabled=False)
+        t_off, _ = best(spans, args.repeat)
+        telemetry.configure(enabled=True)
+        t_on, _ = best(spans, args.repeat)
+        t_nested, _ = best(nested, args.repeat)
+        t_llm, _ = best(llm, args.repeat)
+        t_flush, path = best(telemetry.flush, args.repeat)
+        lines = sum(1 for _ in open(Path(tmp) / telemetry.EVENTS_NAME, "rb"))
+        size = os.path.getsize(Path(tmp) / telemetry.EVENTS_NAME)
+        telemetry.configure(enabled=False)  # não grava o .prom do benchmark ao sair
+
+    per = lambda t: (t - t_bare) / n * 1e6  # noqa: E731
+    per_span = per(t_nested)
+    batch = (PARENT_SPANS + args.tenants * SPANS_PER_SNAPSHOT) * per_span / 1e3
+    print(f"{n} eventos (melhor de {args.repeat}); events.jsonl: {lines} linhas, {size / lines:.0f} bytes/linha")
+    print(f"  bloco vazio (referência)     : {t_bare / n * 1e6:7.2f} µs")
+    print(f"  span desligado               : {per(t_off):7.2f} µs/evento")
+    print(f"  span ligado                  : {per(t_on):7.2f} µs/evento")
+    print(f"  span em tenant + aninhado    : {per_span:7.2f} µs/evento")
+    print(f"  record_llm                   : {per(t_llm):7.2f} µs/evento")
+    print(f"  flush (.prom)                : {t_flush * 1e3:7.2f} ms")
+    print(f"  rodada batch, {args.tenants} planejamentos: {batch:.1f} ms de telemetria "
+          f"({PARENT_SPANS} + {args.tenants}×{SPANS_PER_SNAPSHOT} spans)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""Diretório de entrada sintético em escala: N contratantes × D dias × 48 métricas.
+
+Segue o esquema de database/metricas.csv (nomes e ordem das métricas) e as
+relações entre colunas de uma extração real:
+
+- as partições de total_de_skus (histórico >1 / <1 ano; estoque zero / positivo /
+  negativo; inativo / ativo / não comercializado × estoque >0 / <=0; grupos A/B/C)
+  somam o total de SKUs; consistentes + inconsistentes = verificados;
+- cada percent_* é 100 × total_* / base (total_de_skus, verificados ou venda
+  total), com 2 casas, como nas extrações;
+- custo_total_* = total_* × custo médio por SKU do contratante (com ruído);
+- cobertura_em_dias_* é um passeio aleatório positivo.
+
+As participações evoluem num passeio aleatório com deriva em escala logit
+(softmax por partição) e cada ação de acoes_planejamento.csv desloca, a partir
+de implementada_em, as métricas ligadas a ela em relation_action_problem_metrics.json
+(o relacionamento real de monitor/output). Alguns dias de extração faltam (`gaps`).
+
+Gera tudo o que generate_analysis.py e quinzenal.py leem: metric_store/,
+metricas.csv, mapping_metrics.json, planejamento.csv (um plano por contratante,
+id_planejamento = id_contratante), relacao_planejamento_metrica.csv,
+problemas_identificados.csv, acoes_planejamento.csv e
+relation_action_problem_metrics.json; com --csv também metricas_extraidas.csv
+e database.csv (formato legado, cabeçalhos em maiúsculas).
+
+Uso
+---
+$ python benchmarks/synthetic_inputs.py --out /tmp/bench_data --tenants 500 --days 365 --csv
+"""
+from __future__ import annotations
+import argparse, json, shutil, sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import metric_store  # noqa: E402
+from metric_store import TENANT_COL, TS_COL  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+SCHEMA_DIR = ROOT / "database"
+RELATION_TEMPLATE = ROOT / "monitor" / "output" / "relation_action_problem_metrics_bibi.json"
+START = "2025-01-01 09:00"
+
+# partição ➜ (base, [(coluna total, participação inicial)])
+PARTITIONS = {
+    "historico": ("total_de_skus", [("total_sku_com_historico_>_1_ano", 40), ("total_sku_com_historico_<_1_ano", 60)]),
+    "estoque": ("total_de_skus", [("total_sku_com_estoque_zero", 55), ("total_sku_com_estoque_positivo", 40),
+                                  ("total_sku_com_estoque_negativo", 5)]),
+    "situacao": ("total_de_skus", [("total_sku_inativo_(estoque_>_0)", 22), ("total_sku_inativo_(estoque_<=_0)", 35),
+                                   ("total_sku_ativo_(estoque_>_0)", 13), ("total_sku_ativo_(estoque_<=_0)", 9),
+                                   ("total_sku_nao_comercializado_(estoque_>_0)", 13),
+                                   ("total_sku_nao_comercializado_(estoque_<=_0)", 8)]),
+    "abc": ("total_de_skus", [("total_sku_grupo_a", 10), ("total_sku_grupo_b", 30), ("total_sku_grupo_c", 60)]),
+    "consistencia": ("total_sku_verificados", [("total_sku_consistentes", 92), ("total_sku_inconsistentes", 8)]),
+    "venda": ("venda_total", [("total_venda_grupo_a", 50), ("total_venda_grupo_b", 37.5),
+                              ("total_venda_grupo_c", 12.5)]),
+}
+# participações que uma ação bem-sucedida reduz (as demais crescem)
+BAD_PARTS = ("negativo", "inativo", "inconsistentes", "zero", "nao_comercializado")
+
+PLAN_TARGETS = [  # (métrica, unidade, tipo, fator sobre o valor inicial)
+    ("percent_sku_com_estoque_negativo", "percent", "menor_que", 0.5),
+    ("percent_sku_inativo_(estoque_>_0)", "percent", "menor_que", 0.6),
+    ("percent_sku_consistentes", "percent", "maior_que", 1.04),
+    ("cobertura_em_dias_grupo_c", "dias", "menor_que", 0.8),
+]
+ACTION_TEXT = {
+    "1": ("Implementar inventário cíclico semanal, priorizando SKUs grupo A e B com histórico de divergências",
+          "Redução de 80% nas divergências de estoque;Aumento de 15% na assertividade de disponibilidade"),
+    "2": ("Criar programa de liquidação progressiva para SKUs sem venda há mais de 1 ano",
+          "Redução do estoque inativo;Conversão de produtos sem giro em receita"),
+    "3": ("Revisar parâmetros de reposição com política diferenciada por grupo ABC",
+          "Redução da cobertura do grupo C;Melhoria no fluxo de caixa"),
+}
+PROBLEM_TEXT = {"1": "Estoque negativo significativo", "2": "Alto índice de SKUs inativos com saldo",
+                "3": "Desequilíbrio na cobertura de estoque", "4": "Inconsistências de inventário"}
+
+
+def schema() -> List[str]:
+    """As 48 métricas (sem data_hora_analise), na ordem de database/metricas.csv."""
+    names = pd.read_csv(SCHEMA_DIR / "metricas.csv")["nome_metrica"].astype(str).tolist()
+    return [n for n in names if n != TS_COL]
+
+
+def _ratio_sources(metrics: List[str]) -> Dict[str, str]:
+    """percent_* / custo_total_* ➜ coluna total_* de origem; erro p/ métrica sem regra."""
+    totals = {"total_de_skus", "total_sku_verificados"} | {c for _, parts in PARTITIONS.values() for c, _ in parts}
+    src = {}
+    for m in metrics:
+        if m in totals or m.startswith("cobertura_"):
+            continue
+        if m.startswith("percent_"):
+            cands = ["total_" + m[len("percent_"):]]
+        elif m.startswith("custo_total_"):
+            rest = m[len("custo_total_"):]
+            cands = ["total_sku_com_" + rest, "total_sku_" + rest]
+        else:
+            cands = []
+        found = [c for c in cands if c in totals]
+        if not found:
+            raise ValueError(f"métrica sem regra de geração: {m}")
+        src[m] = found[0]
+    return src
+
+
+def _walk(rng: np.random.Generator, shape: tuple, sigma: float) -> np.ndarray:
+    """Passeio aleatório ao longo do eixo dos dias (eixo 1)."""
+    return np.cumsum(rng.normal(0, sigma, shape), axis=1)
+
+
+def _ramp(days: int, t0: np.ndarray, width: int = 14) -> np.ndarray:
+    """(T, D): 0 antes de t0, sobe linearmente até 1 em `width` dias."""
+    return np.clip((np.arange(days)[None, :] - t0[:, None]) / width, 0, 1)
+
+
+def generate(tenants: int, days: int, seed: int = 0, gaps: float = 0.02,
+             relation: Optional[dict] = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(extrato no formato do store, ações por plano com implementada_em)."""
+    rng = np.random.default_rng(seed)
+    metrics = schema()
+    relation = relation or json.loads(RELATION_TEMPLATE.read_text(encoding="utf-8"))
+    T, D = tenants, days
+    d = np.arange(D)[None, :]
+
+    # ações: implementada entre 30% e 70% do período, efeito por contratante
+    act_ids = sorted(relation["actions"], key=int)
+    t0 = {a: rng.integers(int(D * 0.3), max(int(D * 0.7), int(D * 0.3) + 1), T) for a in act_ids}
+    effect = {a: rng.uniform(0.1, 0.6, T) * (rng.random(T) < 0.8) for a in act_ids}  # 20% sem efeito
+    linked = {a: set(relation["actions"][a]["metric_ids"]) for a in act_ids}
+
+    cols: Dict[str, np.ndarray] = {}
+    n0 = np.exp(rng.normal(np.log(10_000), 0.8, T)).clip(1_000, 200_000)
+    cols["total_de_skus"] = np.round(n0[:, None] * np.exp(rng.normal(0, 3e-4, T)[:, None] * d
+                                                           + _walk(rng, (T, D), 1e-3)))
+    cols["total_sku_verificados"] = np.round(cols["total_de_skus"] * (0.97 + 0.03 * np.tanh(_walk(rng, (T, D), 0.05))))
+    ticket = np.exp(rng.normal(np.log(40), 0.5, T))
+    weekly = 1 + 0.1 * np.sin(2 * np.pi * d / 7)
+    cols["venda_total"] = cols["total_de_skus"] * ticket[:, None] * weekly * np.exp(_walk(rng, (T, D), 0.01))
+
+    for base, parts in PARTITIONS.values():
+        names = [c for c, _ in parts]
+        logit = (np.log(np.array([s for _, s in parts], dtype=float))[None, None, :]
+                 + rng.normal(0, 0.3, (T, 1, len(parts)))
+                 + rng.normal(0, 1e-3, (T, 1, len(parts))) * d[..., None]
+                 + _walk(rng, (T, D, len(parts)), 0.01))
+        for a in act_ids:
+            for j, name in enumerate(names):
+                if name in linked[a]:
+                    sign = -1 if any(b in name for b in BAD_PARTS) else 1
+                    logit[:, :, j] += sign * effect[a][:, None] * _ramp(D, t0[a])
+        share = np.exp(logit - logit.max(axis=2, keepdims=True))
+        share /= share.sum(axis=2, keepdims=True)
+        values = share * cols[base][..., None]
+        if base != "venda_total":  # contagens inteiras; a última parte fecha a soma
+            values = np.round(values)
+            values[..., -1] = cols[base] - values[..., :-1].sum(axis=2)
+        else:
+            values = np.round(values, 2)
+        for j, name in enumerate(names):
+            cols[name] = values[..., j]
+
+    unit_cost = np.exp(rng.normal(np.log(120), 0.4, T))
+    for m, src in _ratio_sources(metrics).items():
+        if m.startswith("percent_"):
+            base = next(b for b, parts in PARTITIONS.values() if src in [c for c, _ in parts])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cols[m] = np.round(np.where(cols[base] > 0, 100 * cols[src] / cols[base], 0.0), 2)
+        else:
+            cols[m] = np.round(cols[src] * unit_cost[:, None] * np.exp(_walk(rng, (T, D), 0.01)), 2)
+    for m in metrics:
+        if m.startswith("cobertura_"):
+            level = np.log(rng.uniform(30, 250, T))[:, None] + _walk(rng, (T, D), 0.02)
+            for a in act_ids:
+                if m in linked[a]:
+                    level = level - effect[a][:, None] * _ramp(D, t0[a])
+            cols[m] = np.round(np.exp(level), 1)
+
+    keep = rng.random((T, D)) >= gaps
+    keep[:, [0, -1]] = True  # 1º e último dia sempre presentes
+    tid, day = np.nonzero(keep)
+    df = pd.DataFrame({TENANT_COL: tid + 1,
+                       TS_COL: pd.Timestamp(START) + pd.to_timedelta(day, unit="D")})
+    for m in metrics:
+        df[m] = cols[m][tid, day]
+
+    start = pd.Timestamp(START).normalize()
+    actions = pd.DataFrame([
+        {"action_id": int(a), "id_planejamento": t + 1, "descricao": ACTION_TEXT.get(a, (f"Ação {a}", ""))[0],
+         "impacto_esperado": ACTION_TEXT.get(a, ("", ""))[1],
+         "implementada_em": (start + pd.Timedelta(days=int(t0[a][t]))).date().isoformat()}
+        for t in range(T) for a in act_ids])
+    return df, actions
+
+
+def write_inputs(out: str | Path, tenants: int, days: int, seed: int = 0, gaps: float = 0.02,
+                 csv: bool = False) -> Path:
+    """Grava o diretório de entrada completo em `out` (recria o store)."""
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    relation = json.loads(RELATION_TEMPLATE.read_text(encoding="utf-8"))
+    df, actions = generate(tenants, days, seed, gaps, relation)
+
+    if csv:
+        df.rename(columns={TS_COL: "data_extracao"}).to_csv(out / "metricas_extraidas.csv", index=False)
+        mapping = json.loads((SCHEMA_DIR / "mapping_metrics.json").read_text(encoding="utf-8"))
+        legacy = df.assign(**{TS_COL: df[TS_COL].dt.strftime("%Y-%m-%dT%H:%M:%SZ")})
+        legacy.rename(columns={TENANT_COL: "contratante", **mapping}).to_csv(out / "database.csv", index=False)
+    store = out / "metric_store"
+    shutil.rmtree(store, ignore_errors=True)
+    if csv:  # como na 1ª execução: o store registra o CSV de origem (ver metric_store.ensure_store)
+        metric_store.import_csv(out / "metricas_extraidas.csv", store)
+    else:
+        metric_store.write_extract(metric_store.normalize_extract(df), store)
+
+    for name in ("metricas.csv", "mapping_metrics.json"):
+        shutil.copyfile(SCHEMA_DIR / name, out / name)
+    (out / "relation_action_problem_metrics.json").write_text(json.dumps(relation, ensure_ascii=False, indent=2),
+                                                              encoding="utf-8")
+    ids = np.arange(1, tenants + 1)
+    start = pd.Timestamp(START).normalize()
+    pd.DataFrame({"id_planejamento": ids, "id_contratante": ids, "data_inicio": start.date().isoformat(),
+                  "data_fim": (start + pd.Timedelta(days=days + 60)).date().isoformat()}
+                 ).to_csv(out / "planejamento.csv", index=False)
+    first = df.groupby(TENANT_COL).first()
+    pd.DataFrame([
+        {"id_planejamento": t, "nome_metrica": m, "valor_final_esperado": round(float(first.at[t, m]) * f, 2),
+         "unidade": u, "tipo": tipo}
+        for t in ids for m, u, tipo, f in PLAN_TARGETS]).to_csv(out / "relacao_planejamento_metrica.csv", index=False)
+    pd.DataFrame([{"problem_id": int(p), "id_planejamento": t, "descricao": PROBLEM_TEXT.get(p, f"Problema {p}")}
+                  for t in ids for p in sorted(relation["problems"], key=int)]
+                 ).to_csv(out / "problemas_identificados.csv", index=False)
+    actions.to_csv(out / "acoes_planejamento.csv", index=False)
+    for cache in (".metric_catalog.json", ".relation_graph.npz", ".changepoints.json"):
+        (out / cache).unlink(missing_ok=True)  # arquivos de origem novos
+    return out
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Gera um diretório de entrada sintético em escala")
+    p.add_argument("--out", required=True, help="Diretório de saída (o metric_store/ é recriado)")
+    p.add_argument("--tenants", type=int, default=100)
+    p.add_argument("--days", type=int, default=180)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--gaps", type=float, default=0.02, help="Fração de dias sem extração")
+    p.add_argument("--csv", action="store_true", help="Também grava metricas_extraidas.csv e database.csv (legado)")
+    args = p.parse_args()
+    out = write_inputs(args.out, args.tenants, args.days, args.seed, args.gaps, args.csv)
+    rows = sum(1 for _ in (out / "metric_store").rglob("*.parquet"))
+    print(f"{args.tenants} contratante(s) × {args.days} dias × {len(schema())} métricas em {out} "
+          f"({rows} arquivos Parquet)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""Pontos de mudança (change points) em todas as séries de métricas.
+
+Para cada série (contratante × planejamento × métrica) encontra as datas em que
+o comportamento mudou — salto de nível e/ou mudança de inclinação — por
+segmentação binária com custo de reta (SSE de mínimos quadrados por segmento):
+
+- y é padronizado pelo desvio de longo prazo do ruído, estimado por MAD das
+  diferenças de defasagem 1 e 2 (ruído AR(1); ver `noise_scale`), p/ que
+  séries autocorrelacionadas não virem uma escada de cortes
+- um corte em k entra se reduz o SSE padronizado em mais de `penalty` · ln(n)
+  (estilo BIC: nível, inclinação e posição do corte) e deixa ≥ `min_size`
+  pontos de cada lado
+- cada rodada corta de uma vez todos os segmentos de todas as séries (somas
+  acumuladas + reduceat, sem laço por série): O(pontos) por rodada e no máximo
+  `max_breaks` rodadas, que também limita os cortes por série em cada varredura
+
+Cada corte vira {data, salto, inclinacao_antes, inclinacao_depois} (unidades da
+métrica, por dia) na lista `changepoints` da métrica no snapshot.
+
+Cache incremental
+-----------------
+Os cortes ficam em <input_dir>/.changepoints.json, por série, com a data do
+último corte (âncora) e do último ponto varrido. Na execução seguinte só séries
+com pontos novos são varridas, e só do último corte em diante (no máximo
+`max_scan_days` dias): cortes já gravados não são revistos, apenas a
+inclinacao_depois do último é atualizada. Ao gravar, só as séries varridas (ou
+esquecidas) na execução são mescladas no arquivo, sob trava (<cache>.lock):
+execuções paralelas de outros contratantes não perdem os seus cortes.
+Parâmetros diferentes invalidam o cache; histórico reescrito pede --rebuild (ou
+--rebuild_state no generate_analysis.py).
+
+Uso
+---
+$ python changepoints.py --input_dir ./data --contratante 45 --planejamento 123
+$ python changepoints.py --input_dir ./data --contratante 45 --planejamento 123 --rebuild
+"""
+from __future__ import annotations
+import argparse, sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import disk_cache
+import metric_engine
+from metric_catalog import PLAN_COL
+from metric_store import TENANT_COL
+
+CACHE_NAME = ".changepoints.json"
+CACHE_VERSION = 2   # 2: séries recortadas na janela do planejamento também fora do batch
+PENALTY = 3.0       # × ln(n) por corte
+MIN_SIZE = 7        # pontos mínimos em cada segmento
+MAX_BREAKS = 5      # cortes novos por série em cada varredura
+MAX_SCAN_DAYS = 365  # teto do segmento em aberto reprocessado
+MAX_RHO = 0.9       # teto da autocorrelação do ruído (séries ~passeio aleatório)
+KEYS = [TENANT_COL, PLAN_COL]
+
+################################################################################
+# Detecção vetorizada
+################################################################################
+
+def _group_median(v: np.ndarray, g: np.ndarray, ngroups: int) -> np.ndarray:
+    """Mediana de `v` por grupo (NaN p/ grupos vazios).
+
+    Um único np.sort: cada valor vira g + posição relativa na faixa do grupo
+    (em [0, 0.5]), o que ordena por (grupo, valor) bem mais rápido que lexsort.
+    """
+    cnt = np.bincount(g, minlength=ngroups)
+    vmin = np.full(ngroups, np.inf)
+    vmax = np.full(ngroups, -np.inf)
+    np.minimum.at(vmin, g, v)
+    np.maximum.at(vmax, g, v)
+    span = np.where(vmax > vmin, vmax - vmin, 1.0)
+    key = np.sort(g + (v - vmin[g]) / span[g] * 0.5)
+    first = np.cumsum(cnt) - cnt
+    out = np.full(ngroups, np.nan)
+    has = np.flatnonzero(cnt > 0)
+    lo, hi = first[has] + (cnt[has] - 1) // 2, first[has] + cnt[has] // 2
+    mid = (key[lo] + key[hi]) / 2 - has
+    out[has] = vmin[has] + mid * 2 * span[has]
+    return out
+
+
+def _diff_var(y: np.ndarray, gid: np.ndarray, starts: np.ndarray, lag: int) -> np.ndarray:
+    """Variância robusta (1.4826 · MAD)² das diferenças de defasagem `lag` de cada série."""
+    ngroups = len(starts)
+    inner = np.ones(len(y), dtype=bool)
+    for k in range(lag):
+        inner[np.minimum(starts + k, len(y) - 1)] = False
+    inner &= np.r_[np.zeros(lag, dtype=bool), gid[lag:] == gid[:-lag]]
+    d = np.r_[np.full(lag, np.nan), y[lag:] - y[:-lag]][inner]
+    g = gid[inner]
+    med = _group_median(d, g, ngroups)
+    mad = _group_median(np.abs(d - med[g]), g, ngroups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sd = np.sqrt(np.bincount(g, (d - med[g]) ** 2, ngroups) / np.bincount(g, minlength=ngroups))
+    return np.where(mad > 0, 1.4826 * mad, sd) ** 2
+
+
+def noise_scale(y: np.ndarray, gid: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Desvio de longo prazo do ruído de cada série, robusto a saltos e tendência.
+
+    Com ruído AR(1) (variância σ², autocorrelação ρ) as diferenças de defasagem
+    1 e 2 têm variância 2σ²(1 - ρ) e 2σ²(1 - ρ²): a razão dá ρ (limitado a
+    [0, MAX_RHO]) e a escala é a variância de longo prazo σ²(1 + ρ)/(1 - ρ).
+    Séries quase passeio aleatório ficam com escala grande e quase sem cortes.
+    """
+    v1, v2 = _diff_var(y, gid, starts, 1), _diff_var(y, gid, starts, 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rho = np.clip(np.where(v1 > 0, v2 / v1 - 1, 0.0), 0.0, MAX_RHO)
+        lrv = v1 / 2 / (1 - rho) * (1 + rho) / (1 - rho)
+    scale = np.sqrt(lrv)
+    return np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+
+
+def detect(ts: np.ndarray, y: np.ndarray, gid: np.ndarray, starts: np.ndarray, ends: np.ndarray, *,
+           penalty: float = PENALTY, min_size: int = MIN_SIZE,
+           max_breaks: int = MAX_BREAKS) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Segmentação binária de todas as séries de uma vez.
+
+    Entradas ordenadas por (série, data), como `metric_engine.to_long`/`group_bounds`;
+    x = dias inteiros desde o 1º ponto da série. Devolve (cortes, inclinação do
+    1º segmento de cada série); cortes tem gid, row (1º ponto do segmento novo),
+    salto, inclinacao_antes e inclinacao_depois, em unidades de y.
+    """
+    ngroups = len(starts)
+    sizes = ends - starts + 1
+    x = ((ts - ts[starts][gid]) // np.timedelta64(1, "D")).astype(float)
+    scale = noise_scale(y, gid, starts)
+    z = (y - (np.bincount(gid, y, ngroups) / sizes)[gid]) / scale[gid]
+    cum = [np.r_[0.0, np.cumsum(w)] for w in (x, z, x * x, x * z, z * z)]
+
+    def fit(lo: np.ndarray, hi: np.ndarray):
+        """Reta de cada segmento [lo, hi): inclinação, intercepto e SSE."""
+        n = (hi - lo).astype(float)
+        sx, sy, sxx, sxy, syy = (c[hi] - c[lo] for c in cum)
+        cxx, cxy, cyy = sxx - sx * sx / n, sxy - sx * sy / n, syy - sy * sy / n
+        slope = np.where(cxx > 1e-12, cxy / np.where(cxx > 1e-12, cxx, 1.0), 0.0)
+        return slope, (sy - slope * sx) / n, np.maximum(cyy - slope * cxy, 0.0)
+
+    threshold = penalty * np.log(np.maximum(sizes, 2))
+    budget = np.full(ngroups, int(max_breaks))
+    seg_g, seg_lo, seg_hi = np.arange(ngroups), starts.copy(), ends + 1
+    cut_g: List[np.ndarray] = []
+    cut_k: List[np.ndarray] = []
+    while len(seg_g):
+        ncand = seg_hi - seg_lo - 2 * min_size + 1
+        ok = (ncand > 0) & (budget[seg_g] > 0)
+        seg_g, seg_lo, seg_hi, ncand = seg_g[ok], seg_lo[ok], seg_hi[ok], ncand[ok]
+        if not len(seg_g):
+            break
+        # todos os cortes candidatos de todos os segmentos num vetor só
+        owner = np.repeat(np.arange(len(seg_g)), ncand)
+        first = np.cumsum(ncand) - ncand
+        k = seg_lo[owner] + min_size + (np.arange(ncand.sum()) - first[owner])
+        gain = fit(seg_lo, seg_hi)[2][owner] - fit(seg_lo[owner], k)[2] - fit(k, seg_hi[owner])[2]
+        best = np.maximum.reduceat(gain, first)
+        hit = np.flatnonzero(gain == best[owner])
+        _, pos = np.unique(owner[hit], return_index=True)
+        k_best = k[hit[pos]]
+
+        accept = best > threshold[seg_g]
+        # no máximo `budget` cortes por série na rodada: os de maior ganho
+        order = np.lexsort((-best, seg_g))
+        rank = np.empty(len(order), dtype=np.int64)
+        g_sorted = seg_g[order]
+        rank[order] = np.arange(len(order)) - np.searchsorted(g_sorted, g_sorted, side="left")
+        accept &= rank < budget[seg_g]
+        if not accept.any():
+            break
+        g, lo, hi, kb = seg_g[accept], seg_lo[accept], seg_hi[accept], k_best[accept]
+        budget -= np.bincount(g, minlength=ngroups)
+        cut_g.append(g)
+        cut_k.append(kb)
+        seg_g, seg_lo, seg_hi = np.r_[g, g], np.r_[lo, kb], np.r_[kb, hi]
+
+    # segmentos finais de cada série e descrição de cada corte pelos vizinhos
+    b_g = np.concatenate([np.arange(ngroups), *cut_g])
+    b_k = np.concatenate([starts, *cut_k])
+    order = np.lexsort((b_k, b_g))
+    seg_g, seg_lo = b_g[order], b_k[order]
+    is_first = np.r_[True, seg_g[1:] != seg_g[:-1]]
+    is_last = np.r_[seg_g[1:] != seg_g[:-1], True]
+    seg_hi = np.where(is_last, ends[seg_g] + 1, np.r_[seg_lo[1:], 0])
+    slope, icpt, _ = fit(seg_lo, seg_hi)
+
+    right = np.flatnonzero(~is_first)
+    left = right - 1
+    s = scale[seg_g[right]]
+    xk = x[seg_lo[right]]
+    cuts = pd.DataFrame({
+        "gid": seg_g[right],
+        "row": seg_lo[right],
+        "salto": ((icpt[right] + slope[right] * xk) - (icpt[left] + slope[left] * xk)) * s,
+        "inclinacao_antes": slope[left] * s,
+        "inclinacao_depois": slope[right] * s,
+    })
+    return cuts, slope[is_first] * scale
+
+################################################################################
+# Cache incremental
+################################################################################
+
+def _iso(ts) -> str:
+    return pd.Timestamp(ts).isoformat()
+
+
+class ChangepointCache:
+    """Cortes por série + âncora/última varredura; ver docstring do módulo."""
+
+    def __init__(self, path: Optional[Path], params: Dict[str, Any],
+                 series: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None):
+        self.path = path
+        self.params = params
+        self.series = series or {}  # contratante ➜ planejamento ➜ métrica ➜ entrada
+        self._reset: set = set()     # (contratante, planejamento) esquecidos nesta execução
+        self._scanned: set = set()   # (contratante, planejamento, métrica) varridas nesta execução
+
+    def _plan(self, contratante, planejamento) -> Dict[str, Dict[str, Any]]:
+        return self.series.setdefault(str(contratante), {}).setdefault(str(planejamento), {})
+
+    def reset(self, contratante, planejamento) -> None:
+        """Esquece os cortes de um planejamento (próxima varredura relê o histórico)."""
+        self.series.get(str(contratante), {}).pop(str(planejamento), None)
+        key = (str(contratante), str(planejamento))
+        self._reset.add(key)
+        self._scanned = {k for k in self._scanned if k[:2] != key}
+
+    def scan_start(self, contratante, planejamento) -> Optional[pd.Timestamp]:
+        """1º instante do extrato que a próxima varredura do planejamento lê (None = histórico todo)."""
+        plan = self.series.get(str(contratante), {}).get(str(planejamento))
+        if not plan:
+            return None
+        span = pd.Timedelta(days=self.params["max_scan_days"])
+        starts = []
+        for e in plan.values():
+            floor = pd.Timestamp(e["scanned_to"]) - span
+            starts.append(max(pd.Timestamp(e["anchor"]), floor) if e["anchor"] else floor)
+        return min(starts)
+
+    def breaks(self, contratante, planejamento) -> Dict[str, List[Dict[str, Any]]]:
+        """métrica ➜ cortes (bloco `changepoints` do snapshot)."""
+        plan = self.series.get(str(contratante), {}).get(str(planejamento), {})
+        return {mid: [dict(b) for b in e["breaks"]] for mid, e in plan.items()}
+
+    def scan(self, df: pd.DataFrame, ts_col: str, metric_cols, planejamento=None) -> int:
+        """Varre o extrato largo `df` e incorpora os cortes novos. Retorna nº de séries varridas.
+
+        O planejamento vem da coluna id_planejamento (modo batch) ou de `planejamento`.
+        Linhas anteriores à âncora de cada série são ignoradas.
+        """
+        if planejamento is not None:
+            df = df.assign(**{PLAN_COL: planejamento})
+        long = metric_engine.to_long(df, ts_col, metric_cols, KEYS)
+        if long.empty:
+            return 0
+        gid, starts, ends = metric_engine.group_bounds(long, KEYS)
+        ts = long[ts_col].to_numpy(dtype="datetime64[ns]")
+        heads = long.iloc[starts]
+        series = [(str(c), str(p), str(m))
+                  for c, p, m in zip(heads[TENANT_COL], heads[PLAN_COL], heads[metric_engine.METRIC_COL])]
+        entries = [self._plan(c, p).setdefault(m, {"anchor": None, "scanned_to": None, "breaks": []})
+                   for c, p, m in series]
+
+        nat = np.datetime64("NaT", "ns")
+        anchor = np.array([np.datetime64(pd.Timestamp(e["anchor"])) if e["anchor"] else nat for e in entries],
+                          dtype="datetime64[ns]")
+        scanned = np.array([np.datetime64(pd.Timestamp(e["scanned_to"])) if e["scanned_to"] else nat
+                            for e in entries], dtype="datetime64[ns]")
+        last = ts[ends]
+        fresh = np.isnat(scanned) | (last > scanned)
+        lo = last - np.timedelta64(int(self.params["max_scan_days"]), "D")
+        lo = np.where(~np.isnat(anchor) & (anchor > lo), anchor, lo)
+
+        rows = np.flatnonzero(fresh[gid] & (ts >= lo[gid]))
+        if not len(rows):
+            return 0
+        groups, sub_gid = np.unique(gid[rows], return_inverse=True)
+        sub_starts = np.flatnonzero(np.r_[True, sub_gid[1:] != sub_gid[:-1]])
+        sub_ends = np.r_[sub_starts[1:], len(rows)] - 1
+        sub_ts = ts[rows]
+        cuts, first_slope = detect(sub_ts, long["value"].to_numpy()[rows], sub_gid, sub_starts, sub_ends,
+                                   penalty=self.params["penalty"], min_size=self.params["min_size"],
+                                   max_breaks=self.params["max_breaks"])
+
+        new: Dict[int, List[Dict[str, Any]]] = {}
+        new_anchor: Dict[int, str] = {}
+        for c in cuts.itertuples(index=False):  # em ordem de data dentro da série
+            new.setdefault(c.gid, []).append({
+                "data": pd.Timestamp(sub_ts[c.row]).date().isoformat(),
+                "salto": round(float(c.salto), 3),
+                "inclinacao_antes": round(float(c.inclinacao_antes), 3),
+                "inclinacao_depois": round(float(c.inclinacao_depois), 3),
+            })
+            new_anchor[c.gid] = _iso(sub_ts[c.row])
+        for j, g in enumerate(groups):
+            e = entries[g]
+            if e["breaks"]:  # o segmento em aberto cresceu (ou foi cortado)
+                e["breaks"][-1]["inclinacao_depois"] = round(float(first_slope[j]), 3)
+            e["breaks"].extend(new.get(j, []))
+            e["anchor"] = new_anchor.get(j, e["anchor"])
+            e["scanned_to"] = _iso(last[g])
+        self._scanned.update(series[g] for g in groups)
+        return len(groups)
+
+    def save(self) -> None:
+        """Mescla no arquivo só as séries varridas/esquecidas aqui (outros processos gravam as deles)."""
+        if self.path is None or not (self._reset or self._scanned):
+            return
+        with disk_cache.file_lock(self.path):
+            on_disk = _read_series(self.path, self.params) or {}
+            for c, p in self._reset:
+                on_disk.get(c, {}).pop(p, None)
+            for c, p, m in self._scanned:
+                on_disk.setdefault(c, {}).setdefault(p, {})[m] = self.series[c][p][m]
+            disk_cache.save_json(self.path, {"version": CACHE_VERSION, "params": self.params, "series": on_disk})
+        self.series = on_disk
+        self._reset, self._scanned = set(), set()
+
+
+def _read_series(path: Path, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    cached = disk_cache.load_json(path)
+    if cached and cached.get("version") == CACHE_VERSION and cached.get("params") == params \
+            and isinstance(cached.get("series"), dict):
+        return cached["series"]
+    return None
+
+
+def load_cache(base_dir: str | Path, cache_path: str | Path | None = None, *,
+               penalty: float = PENALTY, min_size: int = MIN_SIZE, max_breaks: int = MAX_BREAKS,
+               max_scan_days: int = MAX_SCAN_DAYS) -> ChangepointCache:
+    """Cache do diretório; vazio se não existir, estiver corrompido ou for de outros parâmetros."""
+    path = Path(cache_path) if cache_path else Path(base_dir) / CACHE_NAME
+    params = {"penalty": float(penalty), "min_size": int(min_size), "max_breaks": int(max_breaks),
+              "max_scan_days": int(max_scan_days)}
+    return ChangepointCache(path, params, _read_series(path, params))
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    import generate_analysis as ga  # só p/ a CLI: config.yaml e store como no snapshot
+
+    p = argparse.ArgumentParser(description="Pontos de mudança das métricas de um planejamento")
+    p.add_argument("--input_dir", required=True, help="Diretório onde estão os CSV/JSON de entrada")
+    p.add_argument("--contratante", type=int, required=True)
+    p.add_argument("--planejamento", type=int, required=True)
+    p.add_argument("--store", default=None, help="Store colunar de métricas (padrão: <input_dir>/metric_store)")
+    p.add_argument("--rebuild", action="store_true", help="Esquece os cortes gravados do planejamento")
+    args = p.parse_args()
+
+    base_dir = Path(args.input_dir)
+    cache = load_cache(base_dir, **ga.CHANGEPOINT_PARAMS)
+    if args.rebuild:
+        cache.reset(args.contratante, args.planejamento)
+    df = ga.load_extract(base_dir, args.store, contratante=args.contratante,
+                         start=cache.scan_start(args.contratante, args.planejamento))
+    metric_cols = [c for c in df.columns if c not in (TENANT_COL, "data_extracao")]
+    scanned = cache.scan(df, "data_extracao", metric_cols, args.planejamento)
+    cache.save()
+
+    found = cache.breaks(args.contratante, args.planejamento)
+    print(f"{scanned} série(s) varrida(s); {sum(map(len, found.values()))} corte(s) no total")
+    for mid, breaks in found.items():
+        for b in breaks:
+            print(f"  {b['data']}  {mid:<40} salto {b['salto']:>12.3f}   "
+                  f"inclinação {b['inclinacao_antes']:>9.3f} ➜ {b['inclinacao_depois']:>9.3f} /dia")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,8 @@ import json
 from langchain.chat_models import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage
 
+from llm_cache import langchain_cache
+
 # Caminhos dos arquivos de entrada e saída
 PROBLEMAS_PATH = "/Users/matius/Documents/maloka/agents/agente-analista-estoque/database/problemas_identificados.csv"
 ACOES_PATH = "../database/acoes_planejamento.csv"
@@ -54,7 +56,7 @@ Objetivo:
 Restrições:
 - Fundamente-se exclusivamente nos resumos de dados passados na entrada.
 - Sempre devolva um JSON com as chaves exigidas em cada subtarefa."""
-llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
+llm = ChatOpenAI(model="gpt-4o", temperature=0.3, cache=langchain_cache())
 messages = [
     SystemMessage(content="Você é um analista de dados especialista em planejamento de estoques."),
     HumanMessage(content=prompt)
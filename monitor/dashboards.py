@@ -0,0 +1,330 @@
+"""Renderização dos dashboards do acompanhamento quinzenal.
+
+Os dois painéis do quinzenal (métricas e status das ações) saem daqui:
+
+- backend Agg (sem GUI) e sem pyplot: nenhuma figura fica registrada num
+  gerenciador global, então a memória não cresce ciclo a ciclo;
+- uma figura-modelo por tipo de painel e por thread/processo, reaproveitada
+  (eixos limpos a cada render) em vez de criar/destruir uma Figure por PNG;
+- só os números desenhados (nomes, valores, metas, progresso) entram no
+  payload; o hash dele vai gravado no próprio PNG (chunk tEXt). Se o arquivo de
+  destino já tem o mesmo hash, nada é renderizado;
+- `DashboardPool` renderiza num pool de processos (spawn, processos reciclados
+  a cada `max_tasks_per_child` PNGs) e, dentro da mesma execução, copia o PNG
+  de um payload idêntico já renderizado em vez de desenhá-lo de novo. O pool só
+  sobe no primeiro desenho de verdade e, com poucos PNGs (`INLINE_JOBS`), nem
+  sobe: subir processos (spawn + import do matplotlib) custa mais que desenhar
+  numa thread do próprio processo.
+
+Uso
+---
+$ python dashboards.py metricas output/analise_metricas.json output/dashboard_metricas.png
+$ python dashboards.py acoes output/status_acoes.json output/dashboard_acoes.png --force
+"""
+from __future__ import annotations
+import argparse, hashlib, json, multiprocessing, os, shutil, struct, sys, threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")
+from matplotlib.figure import Figure  # noqa: E402
+
+RENDER_VERSION = 1  # muda o hash de todos os PNGs quando o desenho muda
+HASH_KEY = "dashboard-hash"
+FIGSIZE = (15, 8)
+MAX_METRICS = 6
+INLINE_JOBS = 32  # até aqui, desenha numa thread em vez de subir o pool de processos
+
+# status devolvidos por render/submit
+RENDERED, CACHED, COPIED, EMPTY = "renderizado", "em_cache", "copiado", "vazio"
+
+################################################################################
+# Payloads
+################################################################################
+
+def metrics_payload(metrics_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """O que o painel de métricas desenha (no máximo MAX_METRICS métricas)."""
+    data = metrics_analysis.get("metrics_comparison", [])[:MAX_METRICS]
+    if not data:
+        return None
+    return {
+        "names": [m["metric_name"] for m in data],
+        "current": [m["current_value"] for m in data],
+        "target": [m["target_value"] for m in data],
+        "progress": [float(m["progress_rate"].replace("%", "")) for m in data],
+    }
+
+
+def actions_payload(action_status: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """O que o painel de status das ações desenha."""
+    overall = action_status.get("overall_plan_status", {})
+    if not overall:
+        return None
+    return {
+        "sizes": [overall.get("actions_complete", 0), overall.get("actions_in_progress", 0),
+                  overall.get("actions_delayed", 0), overall.get("actions_not_started", 0)],
+        "completion": float(overall.get("overall_completion", "0").replace("%", "")),
+    }
+
+
+def payload_key(kind: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps([RENDER_VERSION, kind, payload], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+################################################################################
+# Desenho
+################################################################################
+
+def _draw_metrics(fig: Figure, data: Dict[str, Any]) -> None:
+    ax1, ax2 = fig.axes
+
+    # Gráfico 1: Valores atuais vs metas
+    x = range(len(data["names"]))
+    width = 0.35
+    ax1.bar([i - width / 2 for i in x], data["current"], width, label='Valor Atual')
+    ax1.bar([i + width / 2 for i in x], data["target"], width, label='Meta')
+    ax1.set_title('Valores Atuais vs Metas')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(data["names"], rotation=45, ha='right')
+    ax1.legend()
+
+    # Gráfico 2: Taxa de progresso, cores pelo progresso
+    rates = data["progress"]
+    colors = ['#ff9999' if rate < 30 else '#ffcc99' if rate < 70 else '#99cc99' for rate in rates]
+    ax2.barh(data["names"], rates, color=colors)
+    ax2.set_title('Taxa de Progresso (%)')
+    ax2.set_xlim(0, 100)
+    ax2.axvline(x=50, color='gray', linestyle='--')
+    for i, v in enumerate(rates):
+        ax2.text(v + 3, i, f"{v}%", va='center')
+
+
+def _draw_actions(fig: Figure, data: Dict[str, Any]) -> None:
+    ax1, ax2 = fig.axes
+
+    # Gráfico 1: Pizza de status das ações
+    labels = ['Completas', 'Em Andamento', 'Atrasadas', 'Não Iniciadas']
+    colors = ['#99cc99', '#ffcc99', '#ff9999', '#dddddd']
+    ax1.pie(data["sizes"], labels=labels, colors=colors, autopct='%1.1f%%',
+            startangle=90, wedgeprops={'edgecolor': 'white'})
+    ax1.axis('equal')
+    ax1.set_title('Status das Ações')
+
+    # Gráfico 2: Conclusão geral do plano
+    completion = data["completion"]
+    ax2.barh(['Progresso Total'], [completion], color='#aaddff')
+    ax2.barh(['Progresso Total'], [100], color='#eeeeee')
+    ax2.set_title('Conclusão Geral do Plano')
+    ax2.set_xlim(0, 100)
+    ax2.text(completion + 3, 0, f"{completion}%", va='center')
+
+
+KINDS: Dict[str, Tuple[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                       Callable[[Figure, Dict[str, Any]], None]]] = {
+    "metricas": (metrics_payload, _draw_metrics),
+    "acoes": (actions_payload, _draw_actions),
+}
+
+_SUBPLOT_PARAMS = ("left", "bottom", "right", "top", "wspace", "hspace")
+_templates = threading.local()  # figuras-modelo por thread (to_thread) ou processo (pool)
+
+
+def _template(kind: str) -> Figure:
+    figs = getattr(_templates, "figs", None)
+    if figs is None:
+        figs = _templates.figs = {}
+    fig = figs.get(kind)
+    if fig is None:
+        fig = figs[kind] = Figure(figsize=FIGSIZE)
+        fig.subplots(1, 2)
+        return fig
+    # clear() não desfaz o aspecto da pizza nem as posições do tight_layout anterior
+    fig.subplots_adjust(**{k: matplotlib.rcParams[f"figure.subplot.{k}"] for k in _SUBPLOT_PARAMS})
+    for ax in fig.axes:
+        ax.clear()
+        ax.set_aspect("auto", adjustable="box")
+    return fig
+
+################################################################################
+# PNG
+################################################################################
+
+def png_key(path: str | Path) -> Optional[str]:
+    """Hash gravado no PNG (chunk tEXt antes dos dados da imagem), ou None."""
+    try:
+        with open(path, "rb") as fp:
+            if fp.read(8) != b"\x89PNG\r\n\x1a\n":
+                return None
+            while True:
+                head = fp.read(8)
+                if len(head) < 8:
+                    return None
+                length, ctype = struct.unpack(">I4s", head)
+                if ctype in (b"IDAT", b"IEND"):
+                    return None
+                body = fp.read(length)
+                fp.seek(4, os.SEEK_CUR)  # CRC
+                if ctype == b"tEXt":
+                    name, _, value = body.partition(b"\0")
+                    if name == HASH_KEY.encode("latin-1"):
+                        return value.decode("latin-1")
+    except OSError:
+        return None
+
+
+def _save(fig: Figure, path: Path, key: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    fig.tight_layout()
+    fig.savefig(tmp, format="png", metadata={HASH_KEY: key})
+    os.replace(tmp, path)  # troca atômica: um PNG pela metade nunca tem o hash certo
+
+
+def _copy(src: Path, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, path)
+
+
+def render_payload(kind: str, payload: Dict[str, Any], path: str | Path,
+                   key: Optional[str] = None, force: bool = False) -> str:
+    """Desenha o payload em `path`, a menos que o PNG já tenha o mesmo hash."""
+    path = Path(path)
+    key = key or payload_key(kind, payload)
+    if not force and png_key(path) == key:
+        return CACHED
+    fig = _template(kind)
+    KINDS[kind][1](fig, payload)
+    _save(fig, path, key)
+    return RENDERED
+
+
+def render(kind: str, analysis: Dict[str, Any], path: str | Path, force: bool = False) -> str:
+    """Renderiza na thread atual a partir da análise (saída do LLM) do quinzenal."""
+    payload = KINDS[kind][0](analysis)
+    if payload is None:
+        return EMPTY
+    return render_payload(kind, payload, path, force=force)
+
+################################################################################
+# Pool de processos
+################################################################################
+
+def _done(status: str) -> Future:
+    fut: Future = Future()
+    fut.set_result(status)
+    return fut
+
+
+class DashboardPool:
+    """Renderiza dashboards num pool de processos, sem desenhar duas vezes o mesmo payload.
+
+    `submit` devolve um concurrent.futures.Future com o status (use
+    `asyncio.wrap_future` no código assíncrono). Extração do payload, checagem
+    do hash e cópias rodam no processo chamador; só o desenho vai p/ o pool.
+
+    Os executores são criados no primeiro desenho (reexecução sem mudanças não
+    sobe nada). Os primeiros `inline_jobs` desenhos vão p/ uma thread; o pool de
+    processos só sobe a partir daí, ou logo de início se `jobs` (nº de PNGs
+    previsto) passar de `inline_jobs`. Com 1 CPU (ou `workers=1`) tudo vai p/ a
+    thread: um único processo a mais só acrescenta o custo de subi-lo.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_tasks_per_child: int = 200,
+                 force: bool = False, jobs: Optional[int] = None, inline_jobs: int = INLINE_JOBS):
+        self.workers = min(workers or os.cpu_count() or 1, os.cpu_count() or 1)
+        self.force = force
+        self.max_tasks_per_child = max_tasks_per_child
+        self.inline_jobs = 0 if jobs is not None and jobs > inline_jobs else inline_jobs
+        self._renders = 0
+        self._thread: Optional[ThreadPoolExecutor] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Tuple[Path, Future]] = {}  # hash ➜ 1º PNG desta execução
+        self.stats = {RENDERED: 0, CACHED: 0, COPIED: 0, EMPTY: 0}
+
+    def submit(self, kind: str, analysis: Dict[str, Any], path: str | Path) -> Future:
+        payload = KINDS[kind][0](analysis)
+        if payload is None:
+            return self._count(_done(EMPTY))
+        path = Path(path)
+        key = payload_key(kind, payload)
+        if not self.force and png_key(path) == key:
+            return self._count(_done(CACHED))
+        with self._lock:
+            first = self._by_key.get(key)
+            if first is None:
+                fut = self._next_executor().submit(render_payload, kind, payload, str(path), key, True)
+                self._by_key[key] = (path, fut)
+                return self._count(fut)
+        src, src_fut = first
+        if src == path:
+            return src_fut
+        out: Future = Future()
+
+        def copy(f: Future) -> None:
+            try:
+                f.result()
+                _copy(src, path)
+                out.set_result(COPIED)
+            except BaseException as e:
+                out.set_exception(e)
+
+        src_fut.add_done_callback(copy)
+        return self._count(out)
+
+    def _next_executor(self) -> Executor:
+        """Thread p/ os primeiros `inline_jobs` desenhos, pool de processos depois (chamar com _lock)."""
+        self._renders += 1
+        if self._renders <= self.inline_jobs or self.workers == 1:
+            if self._thread is None:
+                self._thread = ThreadPoolExecutor(1, thread_name_prefix="dashboards")
+            return self._thread
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 max_tasks_per_child=self.max_tasks_per_child)
+        return self._executor
+
+    def _count(self, fut: Future) -> Future:
+        def bump(f: Future) -> None:
+            if not f.cancelled() and f.exception() is None:
+                with self._lock:
+                    self.stats[f.result()] += 1
+        fut.add_done_callback(bump)
+        return fut
+
+    def close(self) -> None:
+        for executor in (self._thread, self._executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+    def __enter__(self) -> "DashboardPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Renderiza um dashboard do quinzenal a partir da análise em JSON")
+    p.add_argument("kind", choices=sorted(KINDS))
+    p.add_argument("analysis", help="JSON da análise de métricas ou do status das ações")
+    p.add_argument("output", help="PNG de saída")
+    p.add_argument("--force", action="store_true", help="Renderiza mesmo se o PNG já tiver o mesmo hash")
+    args = p.parse_args()
+
+    with open(args.analysis, "r", encoding="utf-8") as fp:
+        analysis = json.load(fp)
+    print(f"{args.output}: {render(args.kind, analysis, args.output, force=args.force)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Utilitários comuns dos caches em disco (catálogo, grafo de relações, cortes).
+
+- `fingerprint`: (mtime, tamanho) dos arquivos de origem, p/ invalidar o cache
+- `write_atomic`: grava num temporário do próprio processo e troca com
+  os.replace ➜ leitores nunca veem arquivo pela metade e dois processos
+  gravando ao mesmo tempo não disputam o mesmo .tmp
+- `save_cache` / `load_json`: falhas de E/S não derrubam a execução (o cache é
+  só atalho), mas ficam no log em vez de sumirem num `pass`
+- `file_lock`: trava exclusiva (<arquivo>.lock) p/ ler-mesclar-gravar um cache
+  compartilhado entre processos
+"""
+from __future__ import annotations
+import json, logging, os, uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (a troca continua atômica)
+    fcntl = None
+
+
+def fingerprint(base_dir: str | Path, names: Iterable[str]) -> Dict[str, Any]:
+    """{nome: [mtime_ns, tamanho]} dos arquivos de origem que existem em base_dir."""
+    fp = {}
+    for name in names:
+        path = Path(base_dir) / name
+        if path.is_file():
+            st = path.stat()
+            fp[name] = [st.st_mtime_ns, st.st_size]
+    return fp
+
+
+def tmp_path(path: str | Path) -> Path:
+    """Temporário ao lado de `path`, único por processo, com a mesma extensão."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp{path.suffix}")
+
+
+def write_atomic(path: str | Path, write: Callable[[Path], None]) -> None:
+    """write(tmp) e troca tmp ➜ path; o temporário não fica para trás se der erro."""
+    tmp = tmp_path(path)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def save_cache(path: str | Path, write: Callable[[Path], None]) -> bool:
+    """write_atomic que só registra (e segue sem cache) se o diretório não aceitar escrita."""
+    try:
+        write_atomic(path, write)
+        return True
+    except OSError as e:
+        logging.warning(f"cache {path} não gravado ({e}); seguindo sem cache")
+        return False
+
+
+def save_json(path: str | Path, obj: Any) -> bool:
+    def write(tmp: Path) -> None:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+    return save_cache(path, write)
+
+
+def load_json(path: str | Path) -> Optional[Dict[str, Any]]:
+    """Conteúdo do cache; None se não existir ou estiver ilegível (registrado no log)."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"cache {path} ilegível ({e}); recompilando")
+        return None
+
+
+@contextmanager
+def file_lock(path: str | Path) -> Iterator[None]:
+    """Trava exclusiva em <path>.lock enquanto o bloco roda (sem trava se não der p/ criar o arquivo)."""
+    lock = Path(path).with_name(Path(path).name + ".lock")
+    try:
+        fp = open(lock, "a")
+    except OSError as e:
+        logging.warning(f"trava {lock} indisponível ({e}); seguindo sem trava")
+        yield
+        return
+    with fp:
+        if fcntl is not None:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
@@ -2,11 +2,15 @@
 
 Entradas
 =======
-- relacao_relevancia_planejamento_metrica.csv  ➜ lista de métricas relevantes, se há target, valor-alvo, unidade.
-- metricas_extraidas.csv                       ➜ dados diários de 49 métricas   (id_contratante, data_extracao, m1..m49)
+- relacao_planejamento_metrica.csv             ➜ metas por plano: valor_final_esperado, unidade, tipo (menor_que/maior_que)
+- planejamento.csv                             ➜ data_fim de cada plano (horizonte das projeções)
+  (ou relacao_relevancia_planejamento_metrica.csv, formato antigo; ver metric_catalog.py, compilado e cacheado)
+- metric_store/ (ou metricas_extraidas.csv)    ➜ dados diários de 49 métricas   (id_contratante, data_extracao, m1..m49)
+                                                 store Parquet particionado; ver metric_store.py
 - problemas_identificados.csv                  ➜ id_problema, descricao
-- acoes_planejamento.csv                       ➜ id_acao, descricao, impacto_esperado, data_impl (opcional)
+- acoes_planejamento.csv                       ➜ id_acao, descricao, impacto_esperado, implementada_em (opcional)
 - relation_action_problem_metrics.json         ➜ mapeia problema ⇄ ação ⇄ métricas
+                                                 (compilado em grafo indexado; ver relation_graph.py)
 
 Saída
 =====
@@ -14,27 +18,59 @@ Saída
 
 Como funciona
 =============
-1. ETL: lê todos os CSV/JSON, filtra contratante/plano.
+1. ETL: lê todos os CSV/JSON, filtra contratante/plano e recorta o extrato na janela
+   [data_inicio, data_fim] do planejamento (planejamento.csv), igual nos três modos.
 2. Calcula baseline (primeiro dia) e current (último dia) para cada métrica.
-3. Para cada métrica ➜ delta_abs, delta_pct, slope_7d, trend, status.
-4. Constrói blocos problems, actions, metrics usando os relacionamentos.
-5. Detecta alerts (regras simples).
+3. Para todas as métricas de uma vez (metric_engine) ➜ delta_abs, delta_pct, slope_<d>d p/ cada
+   janela de temporality_days (config.yaml), trend (janela `temporality`), status e a
+   projeção até data_fim com intervalo e P(atingir a meta) (projection.py).
+4. Constrói blocos problems, actions, metrics usando os relacionamentos; eficácia de cada
+   ação pelo antes × depois de implementada_em nas métricas ligadas (action_impact.py) e
+   datas de mudança de comportamento de cada métrica (changepoints.py, com cache incremental).
+5. Detecta alerts (regras declarativas de alert_rules.yaml, vetorizadas; ver alert_rules.py).
 6. Chama LLM **apenas** para gerar `llm_summary` (headline curtinha).
 7. Serializa em JSON, grava em diretório particionado.
 
 Uso
 ---
 $ python build_structured_snapshot.py --input_dir ./data --contratante 45 --planejamento 123 --out snapshot/snapshots
+
+Modo incremental (estado persistido; só as linhas novas do extrato são lidas):
+$ python generate_analysis.py --input_dir ./data --contratante 45 --planejamento 123 --state_dir ./state --out snapshot/snapshots
+  (--rebuild_state reconstrói do zero; --verify_state confere contra o recálculo completo)
+
+Modo batch (todos os planejamentos de planejamento.csv, saída particionada por contratante/planejamento/data):
+$ python generate_analysis.py --input_dir ./data --batch --workers 8 --out snapshot/snapshots
+  (--defer_llm deixa os llm_summary p/ um job em lote: python batch_jobs.py run --kind summary ...)
+
+Com --repo <arquivo.db> cada snapshot também é indexado no repositório SQLite (snapshot_repo.py).
+Tempos de cada etapa e tokens/custo do LLM vão p/ a telemetria (telemetry.py); --profile grava
+um perfil cProfile da execução.
 """
 from __future__ import annotations
 import argparse, json, os, sys, textwrap
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 import pandas as pd
+import yaml
 from dateutil import parser as dtparser
 
+import action_impact
+import alert_rules
+import changepoints
+import llm_cache
+import metric_catalog
+import metric_engine
+import metric_store
+import projection
+import relation_graph
+import snapshot_repo
+import snapshot_state
+import telemetry
+
 # OpenAI é opcional; importe só se chave existir
 try:
     from openai import OpenAI
@@ -49,7 +85,29 @@ TEMPERATURE = 0.2
 MAX_TOKENS = 120
 EPSILON = 0.1  # limiar mínimo de slope por dia (ajustável)
 FAST_FACTOR = 2  # slope > 2*epsilon => *_fast
-ALERT_DELTA_PCT = 15  # desv pct p alerta se meta
+
+# janelas de tendência (dias) vêm do config.yaml, como no app Streamlit
+CONFIG_PATH = Path(__file__).with_name("config.yaml")
+with open(CONFIG_PATH, "r", encoding="utf-8") as _fp:
+    _config = yaml.safe_load(_fp) or {}
+TEMPORALITY_DAYS: List[int] = [int(d) for d in _config.get("temporality_days", [7])]
+TEMPORALITY: int = int(_config.get("temporality", TEMPORALITY_DAYS[0]))
+if TEMPORALITY not in TEMPORALITY_DAYS:
+    TEMPORALITY_DAYS.insert(0, TEMPORALITY)
+# projeção até data_fim: reta da maior janela (o estado incremental guarda os pontos dela)
+PROJECTION_DAYS: int = max(TEMPORALITY_DAYS)
+PROJECTION_LEVEL: float = float(_config.get("projection_level", projection.LEVEL))
+# eficácia das ações: dias de extrato de cada lado de implementada_em
+IMPACT_DAYS: int = int(_config.get("impact_days", action_impact.DAYS))
+# pontos de mudança: penalidade, tamanho mínimo de segmento, cortes por varredura, teto da varredura
+CHANGEPOINT_PARAMS: Dict[str, Any] = {
+    "penalty": float(_config.get("changepoint_penalty", changepoints.PENALTY)),
+    "min_size": int(_config.get("changepoint_min_size", changepoints.MIN_SIZE)),
+    "max_breaks": int(_config.get("changepoint_max_breaks", changepoints.MAX_BREAKS)),
+    "max_scan_days": int(_config.get("changepoint_max_scan_days", changepoints.MAX_SCAN_DAYS)),
+}
+# regras de alerta (thresholds, tendências, razões, overrides por plano) ao lado do config.yaml
+ALERT_RULES_PATH = CONFIG_PATH.with_name(_config.get("alert_rules") or alert_rules.RULES_PATH.name)
 
 ################################################################################
 # Utilidades de data & metrica
@@ -93,197 +151,299 @@ HUMAN_TEMPLATE = textwrap.dedent(
     """
 )
 
+PROJECTION_TEMPLATE = "METAS EM RISCO ATÉ {data_fim} (prob. de atingir): {em_risco}\n"
+
+
+def summary_messages(metrics_dict: Dict[str, Any], alerts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Mensagens da chamada que gera o llm_summary (usadas também pelo batch_jobs.py)."""
+    qt_baixo = sum(1 for m in metrics_dict.values() if m["status"] == "abaixo_meta")
+    qt_ok    = sum(1 for m in metrics_dict.values() if m["status"] in ("dentro_meta","acima_meta"))
+    top_alerts = [f"{al['metric']} – {al['issue']}" for al in alerts[:3]]
+    human_prompt = HUMAN_TEMPLATE.format(alertas="; ".join(top_alerts) or "nenhum", qt_baixo=qt_baixo, qt_ok=qt_ok)
+    projected = [(mid, m["projection"]) for mid, m in metrics_dict.items()
+                 if (m.get("projection") or {}).get("prob_meta") is not None]
+    if projected:  # sem projeção (plano em aberto) o prompt fica como antes
+        risky = sorted((p["prob_meta"], mid) for mid, p in projected if p["prob_meta"] < 0.5)
+        human_prompt += PROJECTION_TEMPLATE.format(
+            data_fim=projected[0][1]["data_fim"],
+            em_risco="; ".join(f"{mid} {prob:.0%}" for prob, mid in risky[:3]) or "nenhuma")
+    return [
+        {"role":"system","content":SYSTEM_PROMPT},
+        {"role":"user","content":human_prompt}
+    ]
+
 ################################################################################
 # Pipeline principal
 ################################################################################
 
-def build_snapshot(args: argparse.Namespace) -> Dict[str, Any]:
-    base_dir = Path(args.input_dir)
+def load_extract(base_dir: Path, store: str | None = None, **filters) -> pd.DataFrame:
+    """Extrato de métricas a partir do store colunar (filtros empurrados p/ o Parquet).
 
-    # 1. Carregar CSVs/JSON ---------------------------------------------------
-    df_relev = pd.read_csv(base_dir / "relacao_relevancia_planejamento_metrica.csv")  # columns: metric_id, has_target, target
-    df_extr = pd.read_csv(base_dir / "metricas_extraidas.csv")  # id_contratante, data_extracao, …
-    df_prob  = pd.read_csv(base_dir / "problemas_identificados.csv")  # problem_id, descricao
-    df_acoes = pd.read_csv(base_dir / "acoes_planejamento.csv")       # action_id, descricao, impacto_esperado, implementada_em
+    Sem --store usa <input_dir>/metric_store, importado de metricas_extraidas.csv
+    na primeira execução e reimportado quando o CSV muda. A coluna de data volta
+    como `data_extracao`.
+    """
+    root = Path(store) if store else base_dir / "metric_store"
+    metric_store.ensure_store(root, base_dir / "metricas_extraidas.csv")
+    df = metric_store.read_metrics(root, **filters)
+    return df.rename(columns={metric_store.TS_COL: "data_extracao"})
+
+
+def load_reference(base_dir: Path) -> Dict[str, Any]:
+    """Lê os arquivos de referência (tudo menos o extrato de métricas)."""
+    refs: Dict[str, Any] = {
+        "catalog": metric_catalog.load_catalog(base_dir),  # metas, direção (tipo), unidade e nome por plano
+        # relation_action_problem_metrics.json + problemas/ações, compilado (relation_graph.py)
+        "graph": relation_graph.load_graph(base_dir),
+        "alerts": alert_rules.load_rules(ALERT_RULES_PATH, TEMPORALITY),
+        "plan_ends": projection.load_plan_ends(base_dir),  # data_fim por id_planejamento
+    }
+    return refs
 
-    with open(base_dir / "relation_action_problem_metrics.json", "r", encoding="utf-8") as fp:
-        rel_map = json.load(fp)
 
-    contratante = args.contratante
-    df_extr = df_extr[df_extr["id_contratante"] == contratante].copy()
-    if df_extr.empty:
-        raise SystemExit("Nenhum dado encontrado para id_contratante fornecido.")
+def action_impacts(df_extr: pd.DataFrame, cases: pd.DataFrame) -> Dict[Any, Dict[str, Dict[str, Any]]]:
+    """Antes × depois de todas as ações de `cases` (action_impact.impact_cases) numa passada."""
+    if cases.empty:
+        return {}
+    return action_impact.summarize(action_impact.evaluate(df_extr, "data_extracao", cases, days=IMPACT_DAYS))
 
-    # converter col data_extracao
-    df_extr["data_extracao"] = pd.to_datetime(df_extr["data_extracao"])
-    df_extr.sort_values("data_extracao", inplace=True)
 
-    # Baseline & current ------------------------------------------------------
-    baseline_ts = df_extr["data_extracao"].iloc[0]
-    current_ts  = df_extr["data_extracao"].iloc[-1]
+def load_plan_window(base_dir: Path, contratante: int, planejamento: int) -> Optional[pd.DataFrame]:
+    """Linha do planejamento em planejamento.csv (None sem o arquivo ou sem o plano: histórico inteiro)."""
+    path = base_dir / "planejamento.csv"
+    if not path.is_file():
+        return None
+    df_plan = pd.read_csv(path)
+    df_plan = df_plan[(df_plan["id_contratante"] == contratante) & (df_plan["id_planejamento"] == planejamento)]
+    return df_plan if len(df_plan) else None
 
-    metrics_dict: Dict[str, Any] = {}
 
-    metric_cols = [c for c in df_extr.columns if c not in ("id_contratante", "data_extracao")]
-    for metric_id in metric_cols:
-        series = df_extr.set_index("data_extracao")[metric_id].dropna()
-        if series.empty:
-            continue
-        baseline_val = float(series.iloc[0])
-        current_val  = float(series.iloc[-1])
-        delta_abs = current_val - baseline_val
-        delta_pct = (delta_abs / baseline_val * 100) if baseline_val != 0 else None
-
-        # slope em janela 7 dias ------------------------------------------------
-        last7 = series[last_window(series.index, days=7)]
-        slp = slope(last7) if len(last7) >= 2 else 0.0
-        trend = classify_trend(slp)
-
-        # target ---------------------------------------------------------------
-        row_target = df_relev[df_relev["metric_id"] == metric_id]
-        has_target = bool(row_target["has_target"].iloc[0]) if not row_target.empty else False
-        target_val = float(row_target["target"].iloc[0]) if has_target else None
-
-        # status ---------------------------------------------------------------
-        status = "sem_meta"
-        if has_target and target_val is not None:
-            # menor = melhor ou maior = melhor ? simplificamos: assume target é valor máximo permitido
-            status = (
-                "acima_meta" if current_val < target_val else
-                "abaixo_meta" if current_val > target_val else
-                "dentro_meta"
-            )
+def clip_to_plan(df_extr: pd.DataFrame, window: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """Mesmo recorte [data_inicio, data_fim] do modo batch (plan_windows) p/ um planejamento."""
+    if window is None:
+        return df_extr
+    return plan_windows(df_extr, window).drop(columns=["id_planejamento"])
+
+
+def load_inputs(base_dir: Path, store: str | None = None, **filters) -> Dict[str, Any]:
+    """Lê (uma única vez) todos os CSV/JSON de entrada do diretório."""
+    inputs = load_reference(base_dir)
+    inputs["df_extr"] = load_extract(base_dir, store, **filters)  # id_contratante, data_extracao, …
+    return inputs
+
+
+def build_snapshot(args: argparse.Namespace) -> Dict[str, Any]:
+    base_dir = Path(args.input_dir)
 
-        metrics_dict[metric_id] = {
-            "name": metric_id,
-            "has_target": has_target,
-            "baseline": baseline_val,
-            "current": current_val,
-            "target": target_val,
-            "delta_abs": delta_abs,
-            "delta_pct": round(delta_pct, 2) if delta_pct is not None else None,
-            "slope_7d": round(slp, 3),
-            "trend": trend,
-            "status": status,
-            # placeholders, serão preenchidos depois
-            "problem_ids": [],
-            "action_ids": []
-        }
-
-    # 2. Preencher relationships ---------------------------------------------
+    # 1. Carregar CSVs/JSON ---------------------------------------------------
+    contratante = args.contratante
+    with telemetry.span("load"):
+        inputs = load_inputs(base_dir, args.store, contratante=contratante)
+    df_extr = inputs["df_extr"]
+
+    with telemetry.span("etl"):
+        df_extr = df_extr[df_extr["id_contratante"] == contratante].copy()
+        if df_extr.empty:
+            raise SystemExit("Nenhum dado encontrado para id_contratante fornecido.")
+
+        # converter col data_extracao
+        df_extr["data_extracao"] = pd.to_datetime(df_extr["data_extracao"])
+        df_extr.sort_values("data_extracao", inplace=True)
+        # eficácia das ações usa o extrato sem recorte (o "antes" pode cair antes de data_inicio)
+        df_full = df_extr
+        df_extr = clip_to_plan(df_extr, load_plan_window(base_dir, contratante, args.planejamento))
+        if df_extr.empty:
+            raise SystemExit("Nenhum dado do extrato cai na janela do planejamento (planejamento.csv).")
+
+    # Métricas (motor colunar: todas as colunas de uma vez) ------------------
+    metric_cols = [c for c in df_extr.columns if c not in ("id_contratante", "data_extracao")]
+    with telemetry.span("metrics"):
+        stats = metric_engine.metric_stats(
+            df_extr, "data_extracao", metric_cols,
+            windows=TEMPORALITY_DAYS, primary=TEMPORALITY, eps=EPSILON, fast_factor=FAST_FACTOR,
+            fit_days=PROJECTION_DAYS,
+        )
+        stats = inputs["catalog"].attach(stats, args.planejamento)
+        stats = projection.attach(stats, inputs["plan_ends"], args.planejamento, level=PROJECTION_LEVEL)
+        metrics_dict: Dict[str, Any] = metric_engine.metrics_block(stats)
+    with telemetry.span("alerts"):
+        alerts = inputs["alerts"].alerts(stats, args.planejamento)
+    with telemetry.span("impacts"):
+        cases = action_impact.impact_cases(inputs["graph"], [(contratante, args.planejamento)], inputs["catalog"])
+        impacts = action_impacts(df_full, cases).get((contratante, args.planejamento), {})
+    with telemetry.span("changepoints"):
+        cp_cache = changepoints.load_cache(base_dir, **CHANGEPOINT_PARAMS)
+        cp_cache.scan(df_extr, "data_extracao", metric_cols, args.planejamento)  # só o trecho após o último corte
+        cp_cache.save()
+
+    return assemble_snapshot(
+        metrics_dict,
+        baseline_ts=df_extr["data_extracao"].iloc[0],
+        current_ts=df_extr["data_extracao"].iloc[-1],
+        contratante=contratante,
+        planejamento=args.planejamento,
+        graph=inputs["graph"],
+        alerts=alerts,
+        impacts=impacts,
+        changepoints=cp_cache.breaks(contratante, args.planejamento),
+    )
+
+
+def build_snapshot_incremental(args: argparse.Namespace) -> Dict[str, Any]:
+    """Como build_snapshot, mas a partir do estado persistido em --state_dir.
+
+    Só as linhas do extrato posteriores ao último processamento são lidas do
+    store; sem estado (ou com --rebuild_state) o histórico inteiro é usado para
+    reconstruí-lo. --verify_state confere o estado contra o recálculo completo.
+    A eficácia das ações lê só o trecho do extrato em volta das datas de
+    implementação (IMPACT_DAYS de cada lado) e os pontos de mudança só o trecho
+    após o último corte em cache.
+    """
+    base_dir = Path(args.input_dir)
+    contratante, planejamento = args.contratante, args.planejamento
+    path = snapshot_state.state_path(args.state_dir, contratante, planejamento)
+
+    with telemetry.span("load"):
+        refs = load_reference(base_dir)
+        window = load_plan_window(base_dir, contratante, planejamento)
+        state = None if args.rebuild_state else snapshot_state.load_state(path, TEMPORALITY_DAYS)
+        if state is None:
+            state = snapshot_state.new_state(contratante, planejamento, TEMPORALITY_DAYS, TEMPORALITY)
+            df_new = load_extract(base_dir, args.store, contratante=contratante)
+        else:
+            df_new = load_extract(base_dir, args.store, contratante=contratante, start=state["last_ts"])
+        df_new = clip_to_plan(df_new, window)
+
+    metric_cols = [c for c in df_new.columns if c not in ("id_contratante", "data_extracao")]
+    rebuilt = not state["metrics"]
+    with telemetry.span("state"):
+        used = snapshot_state.update_state(state, df_new, "data_extracao", metric_cols)
+        if not state["metrics"]:
+            raise SystemExit("Nenhum dado encontrado para id_contratante fornecido.")
+        snapshot_state.save_state(state, path)
+
+    with telemetry.span("changepoints"):
+        cp_cache = changepoints.load_cache(base_dir, **CHANGEPOINT_PARAMS)
+        if rebuilt:
+            cp_cache.reset(contratante, planejamento)
+        if used:
+            start = cp_cache.scan_start(contratante, planejamento)
+            df_cp = df_new if rebuilt else clip_to_plan(
+                load_extract(base_dir, args.store, contratante=contratante, start=start), window)
+            cp_cache.scan(df_cp, "data_extracao", metric_cols, planejamento)
+            cp_cache.save()
+
+    if args.verify_state:
+        with telemetry.span("verify_state"):
+            history = clip_to_plan(load_extract(base_dir, args.store, contratante=contratante), window)
+            diffs = snapshot_state.verify_state(state, history, "data_extracao", metric_cols,
+                                                eps=EPSILON, fast_factor=FAST_FACTOR, fit_days=PROJECTION_DAYS)
+        if diffs:
+            raise SystemExit("Estado incremental diverge do recálculo completo:\n  " + "\n  ".join(diffs))
+        print("Estado incremental consistente com o recálculo completo.", file=sys.stderr)
+
+    with telemetry.span("metrics"):
+        stats = snapshot_state.state_stats(state, metric_cols, eps=EPSILON, fast_factor=FAST_FACTOR,
+                                           fit_days=PROJECTION_DAYS)
+        stats = refs["catalog"].attach(stats, planejamento)
+        stats = projection.attach(stats, refs["plan_ends"], planejamento, level=PROJECTION_LEVEL)
+        metrics_dict: Dict[str, Any] = metric_engine.metrics_block(stats)
+    with telemetry.span("alerts"):
+        alerts = refs["alerts"].alerts(stats, planejamento)
+    with telemetry.span("impacts"):
+        cases = action_impact.impact_cases(refs["graph"], [(contratante, planejamento)], refs["catalog"])
+        bounds = action_impact.history_bounds(cases, IMPACT_DAYS)
+        impacts = {}
+        if bounds is not None:
+            df_impl = load_extract(base_dir, args.store, contratante=contratante, start=bounds[0], end=bounds[1])
+            impacts = action_impacts(df_impl, cases).get((contratante, planejamento), {})
+
+    return assemble_snapshot(
+        metrics_dict,
+        baseline_ts=pd.Timestamp(state["first_ts"]),
+        current_ts=pd.Timestamp(state["last_ts"]),
+        contratante=contratante,
+        planejamento=planejamento,
+        graph=refs["graph"],
+        alerts=alerts,
+        impacts=impacts,
+        changepoints=cp_cache.breaks(contratante, planejamento),
+    )
+
+
+def assemble_snapshot(metrics_dict: Dict[str, Any], *, baseline_ts: pd.Timestamp, current_ts: pd.Timestamp,
+                      contratante: int, planejamento: int, graph: relation_graph.RelationGraph,
+                      alerts: List[Dict[str, Any]], impacts: Dict[str, Dict[str, Any]],
+                      changepoints: Dict[str, List[Dict[str, Any]]], llm: bool = True) -> Dict[str, Any]:
+    """Relacionamentos, eficácia de ações e llm_summary a partir do bloco de métricas.
+
+    `alerts` vem de `alert_rules.AlertRules` (sem timestamp; carimbado aqui) e
+    `impacts` (action_id ➜ observado, eficacia, recomendacao, impacto) de
+    `action_impact.summarize`; ações fora dele ficam sem avaliação. `changepoints`
+    (metric_id ➜ cortes) vem de `changepoints.ChangepointCache.breaks`.
+    Descrições de problemas/ações são as do `planejamento` quando os CSVs têm id_planejamento.
+    llm=False deixa llm_summary vazio (preenchido depois em lote pelo batch_jobs.py).
+    """
+    # 2. Preencher relationships (grafo compilado: vizinhos em O(grau)) -------
     problems_block: List[Dict[str, Any]] = []
     actions_block: List[Dict[str, Any]] = []
 
-    # inversos para fácil atribuição
-    metric_to_problems: Dict[str, List[str]] = {}
-    metric_to_actions: Dict[str, List[str]] = {}
-
-    # problems
-    for pid, pdata in rel_map["problems"].items():
-        p_metrics = pdata["metric_ids"]
-        p_actions = pdata["action_ids"]
-
-        problems_block.append({
-            "problem_id": pid,
-            "descricao": df_prob.loc[df_prob["problem_id"] == int(pid), "descricao"].squeeze() if not df_prob.empty else "",
-            "status": "em_andamento",
-            "metric_ids": p_metrics,
-            "action_ids": p_actions
-        })
-        for m in p_metrics:
-            metric_to_problems.setdefault(m, []).append(pid)
-
-    # actions
-    for aid, adata in rel_map["actions"].items():
-        a_metrics = adata["metric_ids"]
-        a_row = df_acoes.loc[df_acoes["action_id"] == int(aid)] if not df_acoes.empty else pd.DataFrame()
-        actions_block.append({
-            "action_id": aid,
-            "descricao": a_row["descricao"].squeeze() if not a_row.empty else "",
-            "implementada_em": a_row["implementada_em"].squeeze() if "implementada_em" in a_row else None,
-            "problem_ids": rel_map["problems"].get(str(aid), {}).get("problem_ids", []),
-            "metric_ids": a_metrics,
-            "impacto_esperado": a_row["impacto_esperado"].squeeze() if "impacto_esperado" in a_row else None,
-            "observado": None,  # calculado abaixo
-            "eficacia": None,
-            "recomendacao": None
-        })
-        for m in a_metrics:
-            metric_to_actions.setdefault(m, []).append(aid)
-
-    # atribuir inversos na métrica
-    for mid, mdict in metrics_dict.items():
-        mdict["problem_ids"] = metric_to_problems.get(mid, [])
-        mdict["action_ids"] = metric_to_actions.get(mid, [])
-
-    # 3. Eficácia de ações -----------------------------------------------------
-    def evaluate_action(action: Dict[str, Any]):
-        exp = action.get("impacto_esperado")
-        met_ids = action["metric_ids"]
-        deltas = [metrics_dict[m]["delta_abs"] for m in met_ids if m in metrics_dict]
-        if not deltas:
-            return None, None, None
-        mean_delta = sum(deltas) / len(deltas)
-        # heurística: se impacto_esperado começar com '+/-X', comparar sinal
-        efficacy = "média"
-        if exp and isinstance(exp, str):
-            sign_exp = -1 if "-" in exp else 1
-            if sign_exp * mean_delta < 0:
-                efficacy = "contrária"
-            elif abs(mean_delta) >= abs(sign_exp):
-                efficacy = "alta"
-            else:
-                efficacy = "baixa"
-        action["observado"] = round(mean_delta, 2)
-        action["eficacia"] = efficacy
-        action["recomendacao"] = "manter" if efficacy == "alta" else "ajustar"
-
-    for action in actions_block:
-        evaluate_action(action)
-
-    # 4. Alertas --------------------------------------------------------------
-    alerts: List[Dict[str, Any]] = []
-    for mid, mdict in metrics_dict.items():
-        if mdict["status"] == "abaixo_meta" and abs(mdict["delta_pct"] or 0) > ALERT_DELTA_PCT:
-            alerts.append({
-                "metric": mid,
-                "issue": "abaixo_meta",
-                "detail": f"{mid} {mdict['current']} acima da meta {mdict['target']}",
-                "severity": "alta",
-                "timestamp": datetime.utcnow().isoformat()
+    with telemetry.span("relations"):
+        for pid in graph.problems():
+            problems_block.append({
+                "problem_id": pid,
+                "descricao": graph.info("problem", pid, planejamento).get("descricao") or "",
+                "status": "em_andamento",
+                "metric_ids": graph.metrics_for_problem(pid),
+                "action_ids": graph.actions_for_problem(pid)
             })
-        if mdict["trend"] in ("up_fast", "down_fast"):
-            alerts.append({
-                "metric": mid,
-                "issue": mdict["trend"],
-                "detail": f"Tendência {mdict['trend']} (slope {mdict['slope_7d']})",
-                "severity": "média",
-                "timestamp": datetime.utcnow().isoformat()
+
+        for aid in graph.actions():
+            a_info = graph.info("action", aid, planejamento)
+            actions_block.append({
+                "action_id": aid,
+                "descricao": a_info.get("descricao") or "",
+                "implementada_em": a_info.get("implementada_em"),
+                "problem_ids": graph.problems_for_action(aid),
+                "metric_ids": graph.metrics_for_action(aid),
+                "impacto_esperado": a_info.get("impacto_esperado"),
+                "observado": None,  # preenchidos por `impacts` abaixo
+                "eficacia": None,
+                "recomendacao": None,
+                "impacto": None,
             })
 
+        # inversos na métrica
+        for mid, mdict in metrics_dict.items():
+            mdict["problem_ids"] = graph.problems_for_metric(mid)
+            mdict["action_ids"] = graph.actions_for_metric(mid)
+            mdict["changepoints"] = changepoints.get(mid, [])
+
+        # 3. Eficácia de ações (antes × depois de implementada_em) -------------
+        for action in actions_block:
+            action.update(impacts.get(action["action_id"], {}))
+
+    # 4. Alertas (já avaliados pelas regras) --------------------------------
+    now = datetime.utcnow().isoformat()
+    alerts = [{**al, "timestamp": now} for al in alerts]
+
     # 5. LLM summary ----------------------------------------------------------
     llm_summary = ""
-    if OpenAI and os.getenv("OPENAI_API_KEY"):
-        qt_baixo = sum(1 for m in metrics_dict.values() if m["status"] == "abaixo_meta")
-        qt_ok    = sum(1 for m in metrics_dict.values() if m["status"] in ("dentro_meta","acima_meta"))
-        top_alerts = [f"{al['metric']} – {al['issue']}" for al in alerts[:3]]
-        human_prompt = HUMAN_TEMPLATE.format(alertas="; ".join(top_alerts) or "nenhum", qt_baixo=qt_baixo, qt_ok=qt_ok)
+    if llm and OpenAI and os.getenv("OPENAI_API_KEY"):
         client = OpenAI()
-        resp = client.chat.completions.create(
-            model=MODEL_NAME,
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS,
-            messages=[
-                {"role":"system","content":SYSTEM_PROMPT},
-                {"role":"user","content":human_prompt}
-            ]
-        )
-        llm_summary = resp.choices[0].message.content.strip()
+        with telemetry.span("llm"):  # tokens, custo e latência registrados pelo llm_cache
+            llm_summary = llm_cache.chat_completion(
+                client,
+                model=MODEL_NAME,
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                messages=summary_messages(metrics_dict, alerts),
+            )
 
     # 6. Montar snapshot dict --------------------------------------------------
     snapshot = {
         "schema_version": 1,
-        "planejamento_id": args.planejamento,
+        "planejamento_id": planejamento,
         "contratante_id": contratante,
         "run_timestamp": datetime.utcnow().isoformat(),
         "window": {
@@ -300,6 +460,145 @@ def build_snapshot(args: argparse.Namespace) -> Dict[str, Any]:
 
     return snapshot
 
+################################################################################
+# Modo batch (todos os contratantes/planejamentos)
+################################################################################
+
+# referências compartilhadas, carregadas 1x por processo worker (initializer)
+_BATCH_REFS: Dict[str, Any] = {}
+
+
+def _init_batch_worker(refs: Dict[str, Any]) -> None:
+    _BATCH_REFS.update(refs)
+
+
+def plan_windows(df_extr: pd.DataFrame, df_plan: pd.DataFrame) -> pd.DataFrame:
+    """Associa cada linha do extrato aos planejamentos do contratante (planejamento.csv)
+    e mantém só as linhas dentro de [data_inicio, data_fim]. data_fim vazia = em aberto."""
+    df_plan = df_plan[["id_planejamento", "id_contratante", "data_inicio", "data_fim"]].copy()
+    df_plan["data_inicio"] = pd.to_datetime(df_plan["data_inicio"])
+    df_plan["data_fim"] = pd.to_datetime(df_plan["data_fim"])
+
+    merged = df_extr.merge(df_plan, on="id_contratante", how="inner")
+    day = merged["data_extracao"].dt.normalize()
+    keep = (day >= merged["data_inicio"]) & (merged["data_fim"].isna() | (day <= merged["data_fim"]))
+    return merged.loc[keep].drop(columns=["data_inicio", "data_fim"])
+
+
+def partition_path(out_dir: str, contratante: int, planejamento: int, day: pd.Timestamp) -> str:
+    """<out>/contratante=<id>/planejamento=<id>/data=<YYYY-MM-DD>/structured_snapshot_<ts>.json"""
+    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    return "/".join([
+        out_dir.rstrip("/"),
+        f"contratante={contratante}",
+        f"planejamento={planejamento}",
+        f"data={day.date().isoformat()}",
+        f"structured_snapshot_{ts}.json",
+    ])
+
+
+def _batch_job(job: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Monta e grava um snapshot; devolve o caminho e os contadores de telemetria do job."""
+    refs = _BATCH_REFS
+    with telemetry.tenant(job["contratante"], job["planejamento"]), telemetry.span("snapshot"):
+        snap = assemble_snapshot(
+            job["metrics"],
+            baseline_ts=job["baseline_ts"],
+            current_ts=job["current_ts"],
+            contratante=job["contratante"],
+            planejamento=job["planejamento"],
+            graph=refs["graph"],
+            alerts=job["alerts"],
+            impacts=job["impacts"],
+            changepoints=job["changepoints"],
+            llm=job["llm"],
+        )
+        out = partition_path(job["out"], job["contratante"], job["planejamento"], job["current_ts"])
+        with telemetry.span("save"):
+            if not out.startswith("s3://"):
+                Path(out).parent.mkdir(parents=True, exist_ok=True)
+            save_snapshot(snap, out)
+            if job["repo"]:
+                with snapshot_repo.SnapshotRepo(job["repo"]) as repo:
+                    repo.put(snap, out)
+    return out, telemetry.drain()
+
+
+def build_batch(args: argparse.Namespace) -> List[str]:
+    """Gera snapshots de todos os planejamentos de planejamento.csv.
+
+    Os arquivos de entrada são lidos uma única vez, as métricas de todos os
+    contratantes/planejamentos saem de uma chamada do motor colunar, os alertas de
+    uma avaliação das regras, a eficácia de todas as ações de uma regressão
+    segmentada, os pontos de mudança de uma varredura (só o trecho novo de cada
+    série, via cache) e a montagem (relacionamentos, LLM, gravação) roda num
+    pool de processos.
+    """
+    base_dir = Path(args.input_dir)
+    with telemetry.span("load"):
+        df_plan = pd.read_csv(base_dir / "planejamento.csv")  # id_planejamento, id_contratante, data_inicio, data_fim
+        inputs = load_reference(base_dir)
+        plans = list(zip(df_plan["id_contratante"].tolist(), df_plan["id_planejamento"].tolist()))
+        cases = action_impact.impact_cases(inputs["graph"], plans, inputs["catalog"])
+        start = pd.to_datetime(df_plan["data_inicio"]).min()
+        bounds = action_impact.history_bounds(cases, IMPACT_DAYS)
+        if bounds is not None:
+            start = min(start, pd.Timestamp(bounds[0]))  # o "antes" da ação pode cair antes de data_inicio
+        df_extr = load_extract(base_dir, args.store, contratante=df_plan["id_contratante"].unique().tolist(),
+                               start=start)
+
+    df_extr["data_extracao"] = pd.to_datetime(df_extr["data_extracao"])
+    with telemetry.span("impacts"):
+        impacts = action_impacts(df_extr, cases)  # extrato sem o recorte por plano
+    with telemetry.span("etl"):
+        df_extr = plan_windows(df_extr, df_plan).sort_values("data_extracao", kind="mergesort")
+    if df_extr.empty:
+        raise SystemExit("Nenhum dado do extrato cai nas janelas de planejamento.csv.")
+
+    keys = ["id_contratante", "id_planejamento"]
+    metric_cols = [c for c in df_extr.columns if c not in (*keys, "data_extracao")]
+    with telemetry.span("metrics"):
+        stats = metric_engine.metric_stats(
+            df_extr, "data_extracao", metric_cols, keys=keys,
+            windows=TEMPORALITY_DAYS, primary=TEMPORALITY, eps=EPSILON, fast_factor=FAST_FACTOR,
+            fit_days=PROJECTION_DAYS,
+        )
+        stats = inputs["catalog"].attach(stats)  # meta de cada linha pelo nível id_planejamento
+        # projeções de todas as séries de uma vez; data_fim pelo nível id_planejamento
+        stats = projection.attach(stats, inputs["plan_ends"], level=PROJECTION_LEVEL)
+    bounds = df_extr.groupby(keys)["data_extracao"].agg(["min", "max"])
+    with telemetry.span("alerts"):
+        # todas as regras sobre todos os contratantes/planejamentos de uma vez
+        alerts = alert_rules.alerts_by_group(inputs["alerts"].evaluate(stats), keys)
+    with telemetry.span("changepoints"):
+        cp_cache = changepoints.load_cache(base_dir, **CHANGEPOINT_PARAMS)
+        cp_cache.scan(df_extr, "data_extracao", metric_cols)
+        cp_cache.save()
+
+    jobs = []
+    for (contratante, planejamento), st in stats.groupby(level=keys, sort=False):
+        jobs.append({
+            "contratante": int(contratante),
+            "planejamento": int(planejamento),
+            "metrics": metric_engine.metrics_block(st),
+            "baseline_ts": bounds.loc[(contratante, planejamento), "min"],
+            "current_ts": bounds.loc[(contratante, planejamento), "max"],
+            "alerts": alerts.get((contratante, planejamento), []),
+            "impacts": impacts.get((contratante, planejamento), {}),
+            "changepoints": cp_cache.breaks(contratante, planejamento),
+            "out": args.out,
+            "llm": not args.defer_llm,
+            "repo": args.repo,
+        })
+
+    paths = []
+    with telemetry.span("assemble"), ProcessPoolExecutor(max_workers=args.workers, initializer=_init_batch_worker,
+                                                         initargs=(inputs,)) as pool:
+        for out, counters in pool.map(_batch_job, jobs):
+            telemetry.merge(counters)  # spans/LLM dos workers entram no .prom deste processo
+            paths.append(out)
+    return paths
+
 ################################################################################
 # Helpers
 ################################################################################
@@ -317,10 +616,28 @@ def last_window(idx: pd.DatetimeIndex, days: int = 7) -> pd.DatetimeIndex:
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Gera artefato estruturado de análise de progresso")
     p.add_argument("--input_dir", required=True, help="Diretório onde estão os CSV/JSON de entrada")
-    p.add_argument("--contratante", type=int, required=True, help="ID do contratante")
-    p.add_argument("--planejamento", type=int, required=True, help="ID do planejamento")
+    p.add_argument("--contratante", type=int, help="ID do contratante")
+    p.add_argument("--planejamento", type=int, help="ID do planejamento")
     p.add_argument("--out", required=True, help="Path destino (arquivo ou dir). Use s3:// para S3")
-    return p.parse_args()
+    p.add_argument("--store", default=None,
+                   help="Store colunar de métricas (padrão: <input_dir>/metric_store, importado do CSV na 1ª vez)")
+    p.add_argument("--state_dir", default=None,
+                   help="Diretório do estado incremental; com ele só linhas novas do extrato são processadas")
+    p.add_argument("--rebuild_state", action="store_true", help="Reconstrói o estado a partir do histórico completo")
+    p.add_argument("--verify_state", action="store_true", help="Confere o estado contra o recálculo completo")
+    p.add_argument("--batch", action="store_true",
+                   help="Gera snapshots de todos os planejamentos de planejamento.csv (out = diretório raiz)")
+    p.add_argument("--workers", type=int, default=None, help="Processos no modo batch (padrão: nº de CPUs)")
+    p.add_argument("--repo", default=None,
+                   help="Repositório SQLite de snapshots (snapshot_repo.py) onde indexar cada snapshot gerado")
+    p.add_argument("--defer_llm", action="store_true",
+                   help="Modo batch sem chamar o LLM: llm_summary fica vazio p/ o batch_jobs.py preencher")
+    p.add_argument("--profile", nargs="?", const="", default=None, metavar="ARQUIVO.prof",
+                   help="Grava um perfil cProfile da execução (padrão: <TELEMETRY_DIR>/generate_analysis_<ts>.prof)")
+    args = p.parse_args()
+    if not args.batch and (args.contratante is None or args.planejamento is None):
+        p.error("--contratante e --planejamento são obrigatórios fora do modo --batch")
+    return args
 
 
 def save_snapshot(snapshot: Dict[str, Any], out_path: str):
@@ -337,15 +654,34 @@ def save_snapshot(snapshot: Dict[str, Any], out_path: str):
         Path(out_path).write_text(data, encoding="utf-8")
 
 
-if __name__ == "__main__":
-    args = parse_args()
-    snap = build_snapshot(args)
+def main(args: argparse.Namespace) -> None:
+    if args.batch:
+        paths = build_batch(args)
+        print(f"{len(paths)} snapshots gerados em {args.out}")
+        return
+
+    with telemetry.tenant(args.contratante, args.planejamento), telemetry.span("snapshot"):
+        snap = build_snapshot_incremental(args) if args.state_dir else build_snapshot(args)
 
-    # gerar path se for diretório
-    out = args.out
-    if out.endswith("/") or os.path.isdir(out):
-        ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-        out = os.path.join(out, f"structured_snapshot_{ts}.json")
+        # gerar path se for diretório
+        out = args.out
+        if out.endswith("/") or os.path.isdir(out):
+            ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+            out = os.path.join(out, f"structured_snapshot_{ts}.json")
 
-    save_snapshot(snap, out)
+        with telemetry.span("save"):
+            save_snapshot(snap, out)
+            if args.repo:
+                with snapshot_repo.SnapshotRepo(args.repo) as repo:
+                    repo.put(snap, out)
     print(f"Snapshot gerado em {out}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    telemetry.configure(job="generate_analysis")  # <TELEMETRY_DIR>/events.jsonl e generate_analysis.prom
+    if args.profile is not None:
+        with telemetry.profiled(args.profile or None):
+            main(args)
+    else:
+        main(args)
@@ -1,6 +1,9 @@
 """Gera relatório quinzenal de progresso de um planejamento de estoque
 usando um snapshot JSON estruturado + OpenAI LLM.
 
+Tabelas e alertas são renderizados localmente a partir do snapshot
+(report_tables); o LLM escreve só o Resumo Executivo e as Recomendações.
+
 Requisitos:
 - python-dotenv (para OPENAI_API_KEY) ou defina OPENAI_API_KEY em env.
 - openai>=1.3.7 (nova lib)
@@ -17,9 +20,15 @@ from typing import Dict, List, Any
 
 from openai import OpenAI, RateLimitError  # pip install openai>=1.3.7
 
+import llm_cache  # cache em disco das respostas (LLM_CACHE_BYPASS=1 p/ ignorar)
+import telemetry
+from report_tables import render_report
+from snapshot_compactor import compact_context
+
 MODEL_NAME = "gpt-4o"
 TEMPERATURE = 0.2
-MAX_TOKENS = 2400  # suficiente p/ ~3k palavras
+MAX_TOKENS = 900  # só as seções narrativas (resumo ≤200 palavras + recomendações)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("REPORT_CONTEXT_TOKENS", "2000"))  # tokens do bloco JSON
 
 # ---------------------------------------------------------------------------
 #  Utilidades
@@ -53,52 +62,43 @@ SYSTEM_PROMPT = textwrap.dedent(
 HUMAN_PROMPT_TEMPLATE = textwrap.dedent(
     """
     ## CONTEXTO JSON
+    Tabelas em formato `columns` + `rows`, linhas em ordem de prioridade
+    (alertas e métricas mais críticas primeiro); `omitidos` conta as linhas cortadas.
     ```json
     {context_json}
     ```
 
     ## TAREFA
-    Gere o relatório quinzenal para o contratante **ID {contratante_id}**, cobrindo o período {periodo_str}.
-
-    Estrutura esperada:
-    1. **Resumo Executivo** (≤ 200 palavras)
-    2. **Painel de Métricas-Objetivo**
-       - Tabela: Métrica | Baseline | Atual | Meta | Δ% | Status
-    3. **Tendências & Insights**
-       - Destaque métricas observacionais relevantes (sem meta) com suas tendências.
-    4. **Avaliação de Ações**
-       - Tabela: Ação | Implementada | Eficácia | Métricas afetadas | Próximos Passos
-    5. **Recomendações** (curto prazo ≤2 semanas & médio prazo)
-       - Inclua matriz ICE (Impacto, Confiança, Esforço) 1-10-10.
-    6. **Próximos Passos**
+    Escreva as seções narrativas do relatório quinzenal do contratante **ID {contratante_id}**, período {periodo_str}.
+    O painel de métricas, os alertas, as tendências e a avaliação de ações já são gerados
+    automaticamente a partir dos dados: **não reproduza tabelas nem repita os números um a um**.
+
+    Responda apenas com estas duas seções, com estes títulos:
+    ## Resumo Executivo
+    (≤ 200 palavras: situação geral, principal risco e principal conquista)
+    ## Recomendações
+    (curto prazo ≤2 semanas & médio prazo; inclua matriz ICE (Impacto, Confiança, Esforço) 1-10-10
+    e os próximos passos)
 
     Gere respostas num português formal, mas direto.
     """
 )
 
 
-def build_human_prompt(snapshot: Dict[str, Any]) -> str:
-    """Gera o prompt de usuário com o JSON compacto (truncando métricas se >15)."""
-    # Seleciona até 15 métricas (priorizando com target e alerts)
-    metrics = snapshot["metrics"]
-    target_metrics = [m for m in metrics if metrics[m].get("has_target")]
-    observe_metrics = [m for m in metrics if not metrics[m].get("has_target")]
-    selected = (
-        target_metrics[:10]
-        + observe_metrics[:5]
-    )
-    compact_metrics = {k: metrics[k] for k in selected}
-    # substitui no contexto para ficar leve
-    ctx = snapshot.copy()
-    ctx["metrics"] = compact_metrics
-    ctx_json = json.dumps(ctx, ensure_ascii=False, indent=2)[:6000]  # cabe no contexto
+def periodo_str(snapshot: Dict[str, Any]) -> str:
+    if "window" not in snapshot:
+        return "(últimas 2 semanas)"
+    return f"{iso_to_pt(snapshot['window']['start'])} – {iso_to_pt(snapshot['window']['end'])}"
 
-    periodo = f"{iso_to_pt(ctx['window']['start'])} – {iso_to_pt(ctx['window']['end'])}" if "window" in ctx else "(últimas 2 semanas)"
+
+def build_human_prompt(snapshot: Dict[str, Any], budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Gera o prompt de usuário com o snapshot compactado p/ caber em `budget` tokens."""
+    ctx_json, _ = compact_context(snapshot, budget, MODEL_NAME)
 
     return HUMAN_PROMPT_TEMPLATE.format(
         context_json=ctx_json,
-        contratante_id=ctx.get("contratante_id", "?"),
-        periodo_str=periodo,
+        contratante_id=snapshot.get("contratante_id", "?"),
+        periodo_str=periodo_str(snapshot),
     )
 
 
@@ -106,25 +106,38 @@ def build_human_prompt(snapshot: Dict[str, Any]) -> str:
 #  Geração de relatório
 # ---------------------------------------------------------------------------
 
+def report_messages(snapshot: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Mensagens da chamada que gera a narrativa (usadas também pelo batch_jobs.py)."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_human_prompt(snapshot)},
+    ]
+
+
 def generate_report(snapshot_path: str | Path) -> str:
-    snapshot = load_snapshot(snapshot_path)
-    human_prompt = build_human_prompt(snapshot)
-
-    client = OpenAI()
-
-    try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": human_prompt},
-            ],
-        )
-        return response.choices[0].message.content.strip()
-    except RateLimitError as e:
-        raise SystemExit(f"Chamada à API excedeu limite: {e}")
+    """Relatório em markdown; tempo de cada etapa e tokens/custo do LLM vão p/ a telemetria."""
+    with telemetry.span("load"):
+        snapshot = load_snapshot(snapshot_path)
+
+    with telemetry.tenant(snapshot.get("contratante_id"), snapshot.get("planejamento_id")), \
+            telemetry.span("report"):
+        client = OpenAI()
+        with telemetry.span("prompt"):
+            messages = report_messages(snapshot)
+
+        try:
+            with telemetry.span("llm"):
+                narrative = llm_cache.chat_completion(
+                    client,
+                    model=MODEL_NAME,
+                    temperature=TEMPERATURE,
+                    max_tokens=MAX_TOKENS,
+                    messages=messages,
+                )
+        except RateLimitError as e:
+            raise SystemExit(f"Chamada à API excedeu limite: {e}")
+        with telemetry.span("render"):
+            return render_report(snapshot, narrative, periodo_str(snapshot))
 
 
 # ---------------------------------------------------------------------------
@@ -138,11 +151,13 @@ if __name__ == "__main__":
 
     in_path = Path(sys.argv[1])
     out_path = Path(sys.argv[2]) if len(sys.argv) > 2 else None
+    telemetry.configure(job="generate_report")
 
     report_md = generate_report(in_path)
 
     if out_path:
-        out_path.write_text(report_md, encoding="utf-8")
+        with telemetry.span("save"):
+            out_path.write_text(report_md, encoding="utf-8")
         print(f"Relatório gravado em {out_path}")
     else:
         print(report_md)
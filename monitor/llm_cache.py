@@ -0,0 +1,249 @@
+"""Cache em disco (SQLite) das respostas de LLM, compartilhado por todos os pontos de entrada.
+
+A chave é o sha256 de (modelo, temperatura, mensagens e demais parâmetros da
+chamada); o valor é a resposta. Entradas vencem após `ttl` segundos e, acima de
+`max_entries`, as menos usadas recentemente são descartadas (LRU).
+
+Três jeitos de usar:
+- SDK OpenAI:  `chat_completion(client, model=..., messages=[...], ...)` ➜ texto da resposta
+- LangChain:   `ChatOpenAI(..., cache=langchain_cache())` (LLMChain, llm(messages) etc.)
+- Streaming:   `cached_stream(key, lambda: pedaços_de_texto)` ➜ repassa os pedaços e
+               grava a resposta completa (o cache do LangChain não cobre `.stream()`)
+
+Variáveis de ambiente
+---------------------
+LLM_CACHE_PATH         arquivo SQLite (padrão: monitor/llm_cache.sqlite)
+LLM_CACHE_TTL          validade em segundos (padrão: 7 dias)
+LLM_CACHE_MAX_ENTRIES  limite de entradas antes do LRU (padrão: 5000)
+LLM_CACHE_BYPASS=1     ignora o cache (não lê nem grava)
+
+Uso
+---
+$ python llm_cache.py stats     # hits/misses acumulados e nº de entradas
+$ python llm_cache.py clear     # apaga todas as entradas
+"""
+from __future__ import annotations
+import hashlib, json, os, sqlite3, sys, threading, time, warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+import telemetry
+
+DEFAULT_PATH = Path(__file__).with_name("llm_cache.sqlite")
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT PRIMARY KEY,
+    value    TEXT NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "sim")
+
+
+def make_key(model: str, temperature: Optional[float], messages: Any, **params) -> str:
+    """sha256 de modelo + temperatura + mensagens (+ parâmetros extras, ex.: max_tokens)."""
+    payload = {"model": model, "temperature": temperature, "messages": messages, "params": params}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Cache chave ➜ texto em SQLite, com TTL, LRU e contadores de hit/miss."""
+
+    def __init__(self, path: str | Path | None = None, ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None, bypass: Optional[bool] = None):
+        self.path = Path(path or os.getenv("LLM_CACHE_PATH") or DEFAULT_PATH)
+        self.ttl = float(ttl if ttl is not None else os.getenv("LLM_CACHE_TTL", DEFAULT_TTL))
+        self.max_entries = int(max_entries if max_entries is not None
+                               else os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.bypass = _env_flag("LLM_CACHE_BYPASS") if bypass is None else bypass
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    # conexão por thread/processo (pool de processos, Streamlit multi-thread)
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, key: str) -> Optional[str]:
+        if self.bypass:
+            return None
+        now = time.time()
+        row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None and now - row[1] > self.ttl:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            row = None
+        if row is None:
+            self.misses += 1
+            self._count("misses")
+            return None
+        self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        self._count("hits")
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        if self.bypass:
+            return
+        now = time.time()
+        conn = self._conn
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, value, now, now))
+        excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)", (excess,))
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores acumulados (todas as execuções) + os deste processo."""
+        conn = self._conn
+        totals = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "entries": conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            "hits_total": totals.get("hits", 0),
+            "misses_total": totals.get("misses", 0),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_DEFAULT: Optional[LLMCache] = None
+
+
+def get_cache() -> LLMCache:
+    """Instância padrão do processo (configurada pelas variáveis de ambiente)."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = LLMCache()
+    return _DEFAULT
+
+################################################################################
+# SDK OpenAI
+################################################################################
+
+def cacheable(content: str, finish_reason: Optional[str]) -> bool:
+    """Só respostas completas vão p/ o cache: vazia ou cortada (length, content_filter...) seria repetida."""
+    return bool(content) and finish_reason == "stop"
+
+
+def chat_completion(client, *, model: str, messages: Sequence[Dict[str, str]],
+                    temperature: Optional[float] = None, cache: Optional[LLMCache] = None,
+                    **params) -> str:
+    """`client.chat.completions.create(...)` com cache; devolve o texto da 1ª escolha.
+
+    Cada chamada (hit ou miss) é registrada na telemetria: latência, tokens de `resp.usage` e custo.
+    """
+    cache = cache or get_cache()
+    key = make_key(model, temperature, list(messages), **params)
+    t0 = time.perf_counter()
+    cached = cache.get(key)
+    if cached is not None:
+        telemetry.record_llm(model, seconds=time.perf_counter() - t0, cached=True)
+        return cached
+    kwargs = dict(params, model=model, messages=list(messages))
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    resp = client.chat.completions.create(**kwargs)
+    telemetry.record_openai(model, resp, time.perf_counter() - t0)
+    content = (resp.choices[0].message.content or "").strip()
+    if cacheable(content, resp.choices[0].finish_reason):
+        cache.set(key, content)
+    return content
+
+
+def cached_stream(key: str, open_stream: Callable[[], Iterable[str]],
+                  cache: Optional[LLMCache] = None,
+                  finish_reason: Callable[[], Optional[str]] = lambda: "stop") -> Iterator[str]:
+    """Repassa os pedaços de texto de `open_stream()`; num hit, devolve a resposta inteira de uma vez.
+
+    Só grava no cache se o stream terminar: interrompido (ex.: cancelado), nada é salvo.
+    `finish_reason()` (lido após o último pedaço) e texto vazio seguem `cacheable`.
+    """
+    cache = cache or get_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    for piece in open_stream():
+        parts.append(piece)
+        yield piece
+    content = "".join(parts)
+    if cacheable(content.strip(), finish_reason()):
+        cache.set(key, content)
+
+################################################################################
+# LangChain
+################################################################################
+
+def langchain_cache(cache: Optional[LLMCache] = None):
+    """Adaptador p/ o parâmetro `cache=` dos modelos LangChain."""
+    from langchain_core.caches import BaseCache
+    from langchain_core.load import dumps, loads
+
+    class _LangChainCache(BaseCache):
+        # llm_string já traz modelo, temperatura e demais parâmetros; prompt são as mensagens
+        def __init__(self, backend: LLMCache):
+            self.backend = backend
+
+        def lookup(self, prompt: str, llm_string: str):
+            raw = self.backend.get(make_key(llm_string, None, prompt))
+            if raw is None:
+                return None
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # `loads` é marcado como beta no langchain-core
+                return loads(raw)
+
+        def update(self, prompt: str, llm_string: str, return_val) -> None:
+            self.backend.set(make_key(llm_string, None, prompt), dumps(return_val))
+
+        def clear(self, **kwargs) -> None:
+            self.backend.clear()
+
+    return _LangChainCache(cache or get_cache())
+
+################################################################################
+# CLI
+################################################################################
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    c = get_cache()
+    if cmd == "clear":
+        c.clear()
+        print(f"Cache limpo: {c.path}")
+    elif cmd == "stats":
+        print(json.dumps({"path": str(c.path), **c.stats()}, indent=2))
+    else:
+        print("Uso: python llm_cache.py [stats|clear]", file=sys.stderr)
+        sys.exit(1)
@@ -1,13 +1,20 @@
 import streamlit as st
 import pandas as pd
 from langchain.chat_models import ChatOpenAI  # substitui OpenAI para modelos de chat
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
 from dotenv import load_dotenv
 from datetime import datetime
+from contextlib import closing
+from typing import Dict, Tuple
+import numpy as np
+import time
 import yaml
 import os
 
+from llm_cache import LLMCache, cached_stream, get_cache, make_key
+from metric_store import TENANT_COL, TS_COL, ensure_store, read_metrics
+from token_count import count_tokens
+import telemetry
+
 load_dotenv()
 # Caminho absoluto do config.yaml
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.yaml')
@@ -26,32 +33,86 @@ ID_CONTRATANTE = config.get('id_bibi')
 START_DATE= config.get('start_date_bibi')
 END_DATE = config.get('end_date_bibi')
 
-METRICS_PATH = "monitor/metricas_extraidas.csv"
+METRICS_PATH = "monitor/metricas_extraidas.csv"  # usado só p/ criar o store na 1ª execução
+METRICS_STORE = "monitor/metric_store"
 PLANO_PATH = "monitor/plano_acao_bibi_1.json"
 api_key = os.getenv("OPENAI_API_KEY")
+telemetry.configure(job="main_stream")  # processo longo: o .prom é regravado a cada relatório
+
+# ---------------------------------------------------------------------------
+#  Camada de dados (cacheada entre reruns; invalida quando os arquivos mudam)
+# ---------------------------------------------------------------------------
+
+def fingerprint(path: str) -> Tuple[int, int]:
+    """(mtime mais recente, nº de arquivos) de um arquivo ou diretório (store particionado)."""
+    if os.path.isfile(path):
+        return os.stat(path).st_mtime_ns, 1
+    latest, count = 0, 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+            count += 1
+    return latest, count
+
+
+@st.cache_resource(show_spinner="Carregando métricas...", max_entries=2)
+def load_tenant_index(store: str, fp: Tuple[int, int]) -> Dict[str, Tuple[np.ndarray, pd.DataFrame]]:
+    """Lê o store uma vez e separa por contratante: (timestamps ordenados, linhas).
+
+    `fp` (fingerprint do store) só entra na chave do cache: store alterado ➜ recarrega.
+    """
+    df = read_metrics(store)  # já vem ordenado por (contratante, data)
+    return {
+        str(tid): (g[TS_COL].to_numpy("datetime64[ns]"), g.reset_index(drop=True))
+        for tid, g in df.groupby(TENANT_COL, sort=False)
+    }
+
+
+@st.cache_data(max_entries=4)
+def load_plano(path: str, mtime: int) -> str:
+    with open(path, "r", encoding="utf-8") as fp:
+        return fp.read()
+
+
+def tenant_window(store: str, contratante, start, end) -> pd.DataFrame:
+    """Linhas do contratante com data em [start, end] (dias inteiros), via busca binária."""
+    index = load_tenant_index(store, fingerprint(store))
+    if str(contratante) not in index:
+        return pd.DataFrame(columns=[TENANT_COL, TS_COL])
+    ts, df = index[str(contratante)]
+    lo = np.searchsorted(ts, np.datetime64(pd.Timestamp(start)), side="left")
+    hi = np.searchsorted(ts, np.datetime64(pd.Timestamp(end) + pd.Timedelta(days=1)), side="left")
+    return df.iloc[lo:hi]
+
 
 st.set_page_config(page_title="Relatório Automático de Estoque", layout="wide")
 
 st.title("📊 Relatório Automático de Estoque - Powered by GPT")
 # Parâmetros do modelo e do relatório
 st.success(f"Current directory: {os.getcwd()}")
-# Carrega o arquivo CSV diretamente do METRICS_PATH
-csv_file = open(METRICS_PATH, "r", encoding="utf-8")
-st.success(f"Arquivo CSV carregado: {METRICS_PATH}")
+# Store colunar de métricas (leitura filtrada por contratante/período no clique)
+metrics_store = ensure_store(METRICS_STORE, METRICS_PATH)
+st.success(f"Store de métricas disponível: {METRICS_STORE}")
 
-# Carrega o arquivo JSON do plano diretamente do PLANO_PATH
-plano_file = open(PLANO_PATH, "rb")
-st.success(f"Arquivo JSON do plano carregado: {PLANO_PATH}")
+# Plano de ação: lido só no clique (e cacheado até o arquivo mudar)
+plano_existe = os.path.isfile(PLANO_PATH)
+if plano_existe:
+    st.success(f"Arquivo JSON do plano disponível: {PLANO_PATH}")
 
 modelo = "o3-mini-2025-01-31"
+ignorar_cache = st.checkbox("Ignorar cache de respostas", value=False,
+                            help="Força nova chamada ao modelo mesmo que o mesmo prompt já tenha sido respondido")
 btn_gerar = st.button("Gerar Relatório")
 
-if csv_file and api_key and btn_gerar:
-    # Carregar dados CSV
-    df = pd.read_csv(csv_file)
-    # Garante que a coluna está em datetime
-    df["data_hora_analise"] = pd.to_datetime(df["data_hora_analise"])
+# Clicar em "Cancelar" durante o streaming dispara um rerun do Streamlit, que
+# interrompe o script no próximo update da página e fecha a conexão com a API.
+if st.session_state.get("cancelar") and not btn_gerar:
+    st.warning("Geração cancelada.")
+    parcial = st.session_state.pop("relatorio_parcial", "")
+    if parcial:
+        st.markdown(parcial, unsafe_allow_html=True)
 
+if metrics_store and api_key and btn_gerar:
     # Converte START_DATE para datetime.date se necessário
     if isinstance(START_DATE, str):
         start_date = pd.to_datetime(START_DATE).date()
@@ -60,19 +121,16 @@ if csv_file and api_key and btn_gerar:
 
     end_date = datetime.today().date()
 
-    # Filtra o DataFrame para datas entre START_DATE e hoje
-    filtered_df = df[
-        (df["data_hora_analise"].dt.date >= start_date) &
-        (df["data_hora_analise"].dt.date <= end_date) &
-        (df["id_contratante"] == ID_CONTRATANTE)
-    ]
+    # Recorte START_DATE..hoje do contratante, a partir do índice em memória
+    with telemetry.tenant(ID_CONTRATANTE), telemetry.span("load"):
+        filtered_df = tenant_window(str(metrics_store), ID_CONTRATANTE, start_date, end_date)
     st.subheader("🔎 Dados carregados:")
     st.dataframe(filtered_df, use_container_width=True)
 
     # Carregar plano se houver
     plano_acao = ""
-    if plano_file:
-        plano_acao = plano_file.read().decode("utf-8")
+    if plano_existe:
+        plano_acao = load_plano(PLANO_PATH, os.stat(PLANO_PATH).st_mtime_ns)
         st.caption("Plano de ação carregado!")
 
     # PREPARA O PROMPT
@@ -92,12 +150,13 @@ JSON do plano de ação (se houver):
 """
 
     # Prepara só um recorte do CSV (para não explodir o contexto!)
-    csv_str = str(filtered_df)
+    with telemetry.tenant(ID_CONTRATANTE), telemetry.span("prompt"):
+        csv_str = str(filtered_df)
 
-    prompt_final = prompt_str.format(
-        csv=csv_str,
-        plano=plano_acao
-    )
+        prompt_final = prompt_str.format(
+            csv=csv_str,
+            plano=plano_acao
+        )
 
     # Instancia o modelo LangChain+OpenAI
     llm = ChatOpenAI(
@@ -105,18 +164,63 @@ JSON do plano de ação (se houver):
         model=modelo,
         max_completion_tokens=1800,
         temperature=1, #o3-mini nao aceita parametro de temperatura, mas so funciona passando =1, NAO REMOVA
+        streaming=True,
     )
 
-    chain = LLMChain(
-        llm=llm,
-        prompt=PromptTemplate.from_template("{input}")
-    )
+    # Streaming: o relatório aparece pedaço a pedaço; cache em disco como no resto do projeto
+    cache = LLMCache(bypass=True) if ignorar_cache else get_cache()
+    chave = make_key(modelo, 1, prompt_final, max_completion_tokens=1800)
+    cancel_slot = st.empty()
+    cancel_slot.button("⏹ Cancelar", key="cancelar")
+    col_ttft, col_total = st.columns(2)
+    ttft_slot, total_slot = col_ttft.empty(), col_total.empty()
+    saida = st.empty()
+
+    partes = []
+    t0 = time.perf_counter()
+    ttft = None
+    ultimo_update = 0.0
+    chamou_api = []  # vazio ➜ resposta veio do cache
+    fim = []  # finish_reason do último pedaço (resposta cortada não vai p/ o cache)
+
+    def abrir_stream():
+        chamou_api.append(True)
+        for c in llm.stream(prompt_final):
+            if c.response_metadata.get("finish_reason"):
+                fim.append(c.response_metadata["finish_reason"])
+            yield c.content
+
+    stream = cached_stream(chave, abrir_stream, cache, finish_reason=lambda: fim[-1] if fim else None)
+    with closing(stream), telemetry.tenant(ID_CONTRATANTE), telemetry.span("llm"):  # cancelado ➜ fecha o stream (e a conexão) em vez de esperar o GC
+        for pedaco in stream:
+            if not pedaco:
+                continue
+            agora = time.perf_counter()
+            if ttft is None:
+                ttft = agora - t0
+                ttft_slot.metric("Tempo até o 1º token", f"{ttft:.2f} s")
+            partes.append(pedaco)
+            st.session_state["relatorio_parcial"] = "".join(partes)
+            if agora - ultimo_update > 0.05:  # no máx. ~20 redesenhos/s
+                saida.markdown("".join(partes) + " ▌", unsafe_allow_html=True)
+                ultimo_update = agora
+    total = time.perf_counter() - t0
+    resultado = "".join(partes)
+    # o stream não traz usage: tokens contados localmente (tiktoken)
+    with telemetry.tenant(ID_CONTRATANTE):
+        telemetry.record_llm(modelo, count_tokens(prompt_final, modelo) if chamou_api else 0,
+                             count_tokens(resultado, modelo) if chamou_api else 0, total,
+                             cached=not chamou_api, estimated=True, ttft=ttft, stage="llm")
+    telemetry.flush()
+    st.session_state.pop("relatorio_parcial", None)
+    cancel_slot.empty()
+    total_slot.metric("Latência total", f"{total:.2f} s")
+    saida.markdown(resultado, unsafe_allow_html=True)
 
-    resultado = chain.run({"input": prompt_final})
-    
     st.success("Relatório pronto!")
-    st.markdown(resultado, unsafe_allow_html=True)
-    st.write("Resultado bruto:", resultado)
+    cache_stats = cache.stats()
+    st.caption(f"Cache de respostas: {cache_stats['hits_total']} hits / {cache_stats['misses_total']} misses "
+               f"({cache_stats['entries']} entradas)")
     if not resultado:
         st.error("Nenhum resultado foi retornado pelo modelo. Verifique a configuração da API ou o prompt.")
     # Removido o botão de download, apenas exibe o resultado na tela
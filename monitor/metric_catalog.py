@@ -0,0 +1,255 @@
+"""Catálogo de métricas: metadados de todas as métricas e planos num só objeto.
+
+Junta o que hoje está espalhado pelos arquivos de referência
+
+- metricas.csv                                 ➜ ids canônicos (nome_metrica)
+- mapping_metrics.json                         ➜ nome de exibição (cabeçalho legado)
+- relacao_planejamento_metrica.csv             ➜ por plano: valor_final_esperado, unidade, tipo
+- metricas_plano_acao.csv                      ➜ por plano: métricas do plano (meta opcional)
+- relacao_relevancia_planejamento_metrica.csv  ➜ formato antigo: metric_id, has_target, target
+                                                 (sem plano; vale p/ todos, tipo menor_que)
+
+em arrays compilados (planos × métricas) de meta e direção, com índices
+métrica ➜ coluna e plano ➜ linha: `info(métrica, plano)` é O(1) e `attach`
+calcula has_target/target/tipo/status de todas as métricas e contratantes de
+uma vez, respeitando `tipo`:
+
+    menor_que (quanto menor, melhor): atual < meta ➜ acima_meta, atual > meta ➜ abaixo_meta
+    maior_que (quanto maior, melhor): atual > meta ➜ acima_meta, atual < meta ➜ abaixo_meta
+
+O catálogo compilado fica em <dir>/.metric_catalog.json e só é refeito quando
+algum arquivo de origem muda (mtime/tamanho).
+
+Uso
+---
+$ python metric_catalog.py ../database                                  # compila (ou lê do cache) e resume
+$ python metric_catalog.py ../database --metric percent_sku_com_estoque_negativo --planejamento 1
+"""
+from __future__ import annotations
+import argparse, json, logging, sys
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+import disk_cache
+import metric_engine
+from metric_store import TS_COL
+
+CACHE_NAME = ".metric_catalog.json"
+CACHE_VERSION = 1
+SOURCES = ["metricas.csv", "mapping_metrics.json", "relacao_planejamento_metrica.csv",
+           "metricas_plano_acao.csv", "relacao_relevancia_planejamento_metrica.csv"]
+DIRECTIONS = {"menor_que": 1, "maior_que": -1}  # sinal de (meta - atual) que conta como "acima da meta"
+TIPO_BY_DIRECTION = {v: k for k, v in DIRECTIONS.items()}
+DEFAULT_PLAN = "*"  # linha das metas sem plano (formato antigo), base de todos os planos
+PLAN_COL = "id_planejamento"
+
+
+class MetricInfo(NamedTuple):
+    metric_id: str
+    name: str
+    unit: Optional[str]
+    target: Optional[float]
+    tipo: Optional[str]
+
+################################################################################
+# Catálogo
+################################################################################
+
+class MetricCatalog:
+    def __init__(self, metrics: List[str], names: List[str], units: List[Optional[str]],
+                 plans: List[str], target: np.ndarray, direction: np.ndarray):
+        self.metrics = list(metrics)
+        self.names = list(names)
+        self.units = list(units)
+        self.plans = list(plans)
+        self.target = np.asarray(target, dtype="float64")       # planos × métricas (NaN = sem meta)
+        self.direction = np.asarray(direction, dtype="int8")    # planos × métricas (0 = sem meta)
+        self.metric_index = {m: i for i, m in enumerate(self.metrics)}
+        self.plan_index = {p: i for i, p in enumerate(self.plans)}
+
+    # ------------------------------------------------------------------ consulta
+    def _plan_row(self, planejamento) -> int:
+        return self.plan_index.get(str(planejamento), 0) if planejamento is not None else 0
+
+    def info(self, metric_id: str, planejamento=None) -> MetricInfo:
+        """Metadados de uma métrica num plano (sem plano ou plano desconhecido ➜ metas gerais)."""
+        j = self.metric_index.get(metric_id)
+        if j is None:
+            return MetricInfo(metric_id, metric_id, None, None, None)
+        i = self._plan_row(planejamento)
+        d = int(self.direction[i, j])
+        return MetricInfo(metric_id, self.names[j], self.units[j],
+                          float(self.target[i, j]) if d else None, TIPO_BY_DIRECTION.get(d))
+
+    def lookup(self, metric_ids, planejamentos=None) -> tuple[np.ndarray, np.ndarray]:
+        """(target, direction) p/ vetores de métrica e plano (plano escalar ou um por linha)."""
+        cols = pd.Index(self.metrics).get_indexer(pd.Index(metric_ids, dtype=object).astype(str))
+        if planejamentos is None or np.isscalar(planejamentos):
+            rows = np.full(len(cols), self._plan_row(planejamentos))
+        else:
+            plans = pd.Index(pd.Series(planejamentos).astype(str))
+            rows = pd.Index(self.plans).get_indexer(plans)
+            rows[rows < 0] = 0
+        known = cols >= 0
+        target = np.full(len(cols), np.nan)
+        direction = np.zeros(len(cols), dtype="int8")
+        target[known] = self.target[rows[known], cols[known]]
+        direction[known] = self.direction[rows[known], cols[known]]
+        return target, direction
+
+    def attach(self, stats: pd.DataFrame, planejamento=None) -> pd.DataFrame:
+        """Versão com catálogo de `metric_engine.attach_targets`: has_target, target, tipo, status.
+
+        O plano vem do nível `id_planejamento` do índice (modo batch) ou de `planejamento`.
+        Também anexa `name` (nome de exibição) e `unit`.
+        """
+        mids = stats.index.get_level_values(metric_engine.METRIC_COL).astype(str)
+        plans = (stats.index.get_level_values(PLAN_COL) if PLAN_COL in stats.index.names else planejamento)
+        target, direction = self.lookup(mids, plans)
+        cols = pd.Index(self.metrics).get_indexer(mids)
+
+        out = stats.copy()
+        out["has_target"] = direction != 0
+        out["target"] = target
+        out["tipo"] = np.select([direction == 1, direction == -1], ["menor_que", "maior_que"], default="")
+        out["status"] = metric_engine.target_status(out["current"].to_numpy(), target, direction)
+        out["name"] = [self.names[j] if j >= 0 else m for j, m in zip(cols, mids)]
+        out["unit"] = [self.units[j] if j >= 0 else None for j in cols]
+        return out
+
+    # ------------------------------------------------------------ serialização
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "metrics": self.metrics, "names": self.names, "units": self.units, "plans": self.plans,
+            "target": [[None if np.isnan(v) else float(v) for v in row] for row in self.target],
+            "direction": self.direction.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "MetricCatalog":
+        target = np.array([[np.nan if v is None else v for v in row] for row in d["target"]], dtype="float64")
+        return cls(d["metrics"], d["names"], d["units"], d["plans"],
+                   target.reshape(len(d["plans"]), len(d["metrics"])), d["direction"])
+
+################################################################################
+# Compilação a partir dos arquivos de referência
+################################################################################
+
+def _read(base_dir: Path, name: str) -> Optional[pd.DataFrame]:
+    path = base_dir / name
+    return pd.read_csv(path) if path.is_file() else None
+
+
+def _direction(tipo) -> int:
+    if tipo is None or (isinstance(tipo, float) and np.isnan(tipo)) or str(tipo).strip() == "":
+        return DIRECTIONS["menor_que"]  # regra antiga: meta é o máximo permitido
+    key = str(tipo).strip().lower()
+    if key not in DIRECTIONS:
+        raise ValueError(f"tipo de meta desconhecido: {tipo!r} (use {' ou '.join(DIRECTIONS)})")
+    return DIRECTIONS[key]
+
+
+def build_catalog(base_dir: str | Path) -> MetricCatalog:
+    """Compila o catálogo a partir dos arquivos de `base_dir` (os ausentes são ignorados)."""
+    base_dir = Path(base_dir)
+    metrics: Dict[str, None] = {}  # ordem de inserção = ordem das colunas
+    names: Dict[str, str] = {}
+    units: Dict[str, Optional[str]] = {}
+    entries: List[tuple] = []  # (plano, métrica, meta, direção)
+
+    df = _read(base_dir, "metricas.csv")
+    if df is not None:
+        metrics.update(dict.fromkeys(df["nome_metrica"].astype(str)))
+    mapping_path = base_dir / "mapping_metrics.json"
+    if mapping_path.is_file():
+        with open(mapping_path, "r", encoding="utf-8") as fp:
+            names.update(json.load(fp))
+
+    df = _read(base_dir, "relacao_relevancia_planejamento_metrica.csv")
+    if df is not None:
+        for r in df.itertuples(index=False):
+            metrics.setdefault(str(r.metric_id))
+            if bool(r.has_target) and pd.notna(r.target):
+                entries.append((DEFAULT_PLAN, str(r.metric_id), float(r.target), DIRECTIONS["menor_que"]))
+
+    df = _read(base_dir, "metricas_plano_acao.csv")
+    if df is not None:
+        for r in df.itertuples(index=False):
+            metrics.setdefault(str(r.nome_metrica))
+            meta = getattr(r, "meta", None)
+            if pd.notna(meta):
+                entries.append((str(r.id_planejamento), str(r.nome_metrica), float(meta), DIRECTIONS["menor_que"]))
+
+    df = _read(base_dir, "relacao_planejamento_metrica.csv")
+    if df is not None:
+        for r in df.itertuples(index=False):
+            mid = str(r.nome_metrica)
+            metrics.setdefault(mid)
+            if pd.notna(getattr(r, "unidade", None)):
+                units.setdefault(mid, str(r.unidade))
+            if pd.notna(r.valor_final_esperado):
+                entries.append((str(r.id_planejamento), mid, float(r.valor_final_esperado),
+                                _direction(getattr(r, "tipo", None))))
+
+    metrics.pop(TS_COL, None)
+    metric_list = list(metrics)
+    plans = [DEFAULT_PLAN] + sorted({p for p, *_ in entries if p != DEFAULT_PLAN}, key=str)
+    col = {m: j for j, m in enumerate(metric_list)}
+    row = {p: i for i, p in enumerate(plans)}
+    target = np.full((len(plans), len(metric_list)), np.nan)
+    direction = np.zeros((len(plans), len(metric_list)), dtype="int8")
+    # metas gerais primeiro (valem p/ todos os planos); depois as de cada plano, por cima
+    for p, mid, tgt, d in sorted(entries, key=lambda e: e[0] != DEFAULT_PLAN):
+        rows = slice(None) if p == DEFAULT_PLAN else row[p]
+        target[rows, col[mid]] = tgt
+        direction[rows, col[mid]] = d
+    return MetricCatalog(metric_list, [names.get(m, m) for m in metric_list],
+                         [units.get(m) for m in metric_list], plans, target, direction)
+
+
+def load_catalog(base_dir: str | Path, cache_path: str | Path | None = None) -> MetricCatalog:
+    """Catálogo do diretório, lido do cache em disco se os arquivos de origem não mudaram."""
+    base_dir = Path(base_dir)
+    cache_path = Path(cache_path) if cache_path else base_dir / CACHE_NAME
+    fp = disk_cache.fingerprint(base_dir, SOURCES)
+    cached = disk_cache.load_json(cache_path)
+    if cached and cached.get("version") == CACHE_VERSION and cached.get("sources") == fp:
+        try:
+            return MetricCatalog.from_dict(cached["catalog"])
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"cache {cache_path} inválido ({e!r}); recompilando")
+    catalog = build_catalog(base_dir)
+    disk_cache.save_json(cache_path, {"version": CACHE_VERSION, "sources": fp, "catalog": catalog.to_dict()})
+    return catalog
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Catálogo compilado de métricas")
+    p.add_argument("base_dir", help="Diretório com os arquivos de referência")
+    p.add_argument("--metric", help="Mostra os metadados de uma métrica")
+    p.add_argument("--planejamento", help="Plano p/ --metric")
+    p.add_argument("--rebuild", action="store_true", help="Ignora o cache em disco")
+    args = p.parse_args()
+
+    if args.rebuild:
+        (Path(args.base_dir) / CACHE_NAME).unlink(missing_ok=True)
+    catalog = load_catalog(args.base_dir)
+    if args.metric:
+        print(json.dumps(catalog.info(args.metric, args.planejamento)._asdict(), ensure_ascii=False, indent=2))
+        return 0
+    with_target = int((catalog.direction != 0).sum(axis=1)[0])
+    print(f"{len(catalog.metrics)} métricas, {len(catalog.plans) - 1} plano(s) com metas próprias, "
+          f"{with_target} meta(s) gerais")
+    for plan, row in zip(catalog.plans[1:], catalog.direction[1:]):
+        print(f"  plano {plan}: {int((row != 0).sum())} meta(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Motor colunar de métricas para o snapshot estruturado.
+
+Calcula, de uma só vez e para todas as colunas de métrica, os mesmos campos que
+`generate_analysis.build_snapshot` calculava métrica a métrica:
+
+- baseline / current      ➜ primeiro e último valor não-nulo da série
+- delta_abs / delta_pct   ➜ variação absoluta e percentual (None se baseline == 0)
+- slope_<d>d              ➜ inclinação por dia nas últimas janelas d (temporality_days)
+- trend / trend_<d>d      ➜ classificação de `classify_trend` (trend = janela principal)
+- status                  ➜ acima_meta | dentro_meta | abaixo_meta | sem_meta (direção da meta
+                            por `tipo`: menor_que | maior_que; ver metric_catalog)
+- fit_*                   ➜ (opcional, `fit_days`) reta de mínimos quadrados da última janela,
+                            base das projeções até o fim do plano (ver projection.py)
+
+O trabalho é feito em formato longo (chaves, metric_id, data, valor) com
+operações de groupby, então o mesmo código atende um contratante ou vários de
+uma vez (basta passar as colunas-chave em `keys`).
+"""
+from __future__ import annotations
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+METRIC_COL = "metric_id"
+DAY = pd.Timedelta(days=1)
+# rótulos de `classify_trend_vec` (os mesmos de generate_analysis.classify_trend)
+TREND_FLAT = "flat"
+TRENDS = (TREND_FLAT, "up_fast", "up", "down_fast", "down")
+
+################################################################################
+# Formato longo
+################################################################################
+
+def to_long(df: pd.DataFrame, ts_col: str, metric_cols: Sequence[str],
+            keys: Sequence[str] = ()) -> pd.DataFrame:
+    """Converte o extrato largo (uma coluna por métrica) em formato longo ordenado.
+
+    Valores nulos são descartados, como o `.dropna()` por série do loop original.
+    A ordem das métricas é preservada via categoria ordenada.
+    """
+    keys = list(keys)
+    metric_cols = list(metric_cols)
+    n, m = len(df), len(metric_cols)
+    try:
+        values = df[metric_cols].to_numpy(dtype=float)
+    except (TypeError, ValueError):  # alguma coluna com texto: coage célula a célula
+        values = df[metric_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    data = {k: np.tile(df[k].to_numpy(), m) for k in keys}
+    data[METRIC_COL] = pd.Categorical.from_codes(np.repeat(np.arange(m), n), categories=metric_cols, ordered=True)
+    data[ts_col] = np.tile(pd.to_datetime(df[ts_col]).to_numpy(), m)
+    data["value"] = values.T.ravel()
+    long = pd.DataFrame(data)
+    long = long[~np.isnan(long["value"].to_numpy())]
+    long = long.sort_values(keys + [METRIC_COL, ts_col], kind="mergesort", ignore_index=True)
+    return long
+
+
+def group_bounds(long: pd.DataFrame, keys: Sequence[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(gid por linha, início, fim) de cada série no formato longo já ordenado."""
+    gkeys = list(keys) + [METRIC_COL]
+    gid = long.groupby(gkeys, sort=False, observed=True).ngroup().to_numpy()
+    starts = np.flatnonzero(np.r_[True, gid[1:] != gid[:-1]])
+    ends = np.r_[starts[1:], len(gid)] - 1
+    return gid, starts, ends
+
+################################################################################
+# Estatísticas vetorizadas
+################################################################################
+
+def classify_trend_vec(slopes: np.ndarray, eps: float, fast_factor: int) -> np.ndarray:
+    """Versão vetorizada de `generate_analysis.classify_trend`."""
+    slopes = np.asarray(slopes, dtype=float)
+    return np.select(
+        [np.abs(slopes) < eps,
+         slopes >= fast_factor * eps,
+         slopes > 0,
+         slopes <= -fast_factor * eps],
+        list(TRENDS[:-1]),
+        default=TRENDS[-1],
+    )
+
+
+def window_slopes(ts: np.ndarray, y: np.ndarray, gid: np.ndarray, ends: np.ndarray,
+                  windows: Sequence[int]) -> np.ndarray:
+    """Inclinação por dia nas janelas [fim - d, fim] de cada série, p/ todos os d de uma vez.
+
+    Regressão por estatísticas suficientes (n, Σx, Σy, Σx², Σxy): cada ponto é
+    atribuído à menor janela que o contém e um único bincount por estatística
+    acumula (série, janela); como as janelas são aninhadas, a soma acumulada ao
+    longo das janelas dá os totais de cada uma. x é o nº de dias inteiros até o
+    fim da série e y é centrado no último valor (estabilidade numérica).
+
+    Com extrações no mesmo horário do dia o resultado é o de
+    `slope(series[last_window(series.index, d)])`. Séries com menos de 2
+    pontos na janela (ou var(x) == 0) recebem 0.
+    Entradas já ordenadas por (série, data), como devolvido por `to_long`.
+    Retorna matriz (séries × janelas) na ordem de `windows`.
+    """
+    order = np.argsort(windows)
+    spans = np.asarray(windows, dtype="int64")[order].astype("timedelta64[D]")
+    ngroups, nwin = len(ends), len(spans)
+
+    back = ts[ends][gid] - ts
+    k = np.searchsorted(spans, back, side="left")  # menor janela que contém o ponto
+    inside = k < nwin
+    cell = gid[inside] * nwin + k[inside]
+    x = -(back[inside] // np.timedelta64(1, "D")).astype(float)
+    yc = (y - y[ends][gid])[inside]
+
+    def acc(weights=None) -> np.ndarray:
+        sums = np.bincount(cell, weights, minlength=ngroups * nwin).reshape(ngroups, nwin)
+        return sums.cumsum(axis=1)
+
+    n, sx, sy, sxx, sxy = acc(), acc(x), acc(yc), acc(x * x), acc(x * yc)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = n * sxx - sx * sx
+        slp = (n * sxy - sx * sy) / var
+    slp = np.where((n >= 2) & (var != 0), slp, 0.0)
+    return slp[:, np.argsort(order)]
+
+
+def window_fit(ts: np.ndarray, y: np.ndarray, gid: np.ndarray, ends: np.ndarray,
+               days: int) -> dict:
+    """Reta de mínimos quadrados na janela [fim - days, fim] de cada série, com resíduo.
+
+    Mesmas convenções de `window_slopes` (x = dias inteiros até o fim da série,
+    y centrado no último valor), uma só janela. Devolve, por série:
+    fit_n (pontos), fit_level (valor da reta no fim da série), fit_slope,
+    fit_xbar (x médio, ≤ 0), fit_sxx (Σ(x - x̄)²), fit_s2 (variância residual,
+    n - 2 g.l.; NaN com menos de 3 pontos) e fit_end (data do último ponto).
+    """
+    ngroups = len(ends)
+    back = ts[ends][gid] - ts
+    inside = back <= np.timedelta64(int(days), "D")
+    g = gid[inside]
+    x = -(back[inside] // np.timedelta64(1, "D")).astype(float)
+    yc = (y - y[ends][gid])[inside]
+
+    def acc(weights=None) -> np.ndarray:
+        return np.bincount(g, weights, minlength=ngroups).astype(float)
+
+    n, sx, sy, sxx, sxy, syy = acc(), acc(x), acc(yc), acc(x * x), acc(x * yc), acc(yc * yc)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        xbar, ybar = sx / n, sy / n
+        cxx = sxx - sx * xbar
+        cxy = sxy - sx * ybar
+        cyy = syy - sy * ybar
+        slp = np.where((n >= 2) & (cxx > 0), cxy / cxx, 0.0)
+        s2 = np.where(n >= 3, np.maximum(cyy - slp * cxy, 0.0) / (n - 2), np.nan)
+    return {
+        "fit_n": n.astype("int64"),
+        "fit_level": y[ends] + ybar - slp * xbar,
+        "fit_slope": slp,
+        "fit_xbar": xbar,
+        "fit_sxx": np.maximum(cxx, 0.0),
+        "fit_s2": s2,
+        "fit_end": ts[ends],
+    }
+
+
+def metric_stats(df: pd.DataFrame, ts_col: str, metric_cols: Sequence[str], *,
+                 keys: Sequence[str] = (), windows: Sequence[int] = (7,), primary: int | None = None,
+                 eps: float, fast_factor: int, fit_days: int | None = None) -> pd.DataFrame:
+    """baseline, current, deltas, slopes e trends para todas as métricas (e chaves).
+
+    Para cada janela d em `windows` gera slope_<d>d e trend_<d>d; `trend` é a
+    tendência da janela `primary` (padrão: a primeira de `windows`). Com
+    `fit_days` também as colunas fit_* de `window_fit` nessa janela.
+    Retorna um DataFrame indexado por `keys + [metric_id]`, uma linha por série
+    não vazia, na ordem das colunas de entrada.
+    """
+    gkeys = list(keys) + [METRIC_COL]
+    long = to_long(df, ts_col, metric_cols, keys)
+    gid, starts, ends = group_bounds(long, keys)
+    ts = long[ts_col].to_numpy()
+    y = long["value"].to_numpy()
+
+    out = long.iloc[starts][gkeys].reset_index(drop=True)
+    out["baseline"] = y[starts]
+    out["current"] = y[ends]
+    out["delta_abs"] = out["current"] - out["baseline"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["delta_pct"] = (out["delta_abs"] / out["baseline"] * 100).where(out["baseline"] != 0)
+
+    add_trends(out, window_slopes(ts, y, gid, ends, windows), windows, primary,
+               eps=eps, fast_factor=fast_factor)
+    if fit_days:
+        for col, values in window_fit(ts, y, gid, ends, fit_days).items():
+            out[col] = values
+    return out.set_index(gkeys)
+
+
+def add_trends(out: pd.DataFrame, slopes: np.ndarray, windows: Sequence[int], primary: int | None, *,
+               eps: float, fast_factor: int) -> None:
+    """Grava slope_<d>d / trend_<d>d (matriz séries × janelas) e `trend` da janela principal."""
+    primary = windows[0] if primary is None else primary
+    for j, d in enumerate(windows):
+        out[f"slope_{d}d"] = slopes[:, j]
+    for j, d in enumerate(windows):
+        out[f"trend_{d}d"] = classify_trend_vec(slopes[:, j], eps, fast_factor)
+    out["trend"] = out[f"trend_{primary}d"]
+
+
+def target_status(current: np.ndarray, target: np.ndarray, direction: np.ndarray) -> np.ndarray:
+    """Status vetorizado a partir da direção da meta.
+
+    direction: 1 = menor_que (meta é o máximo), -1 = maior_que (meta é o mínimo),
+    0 = sem meta. acima_meta = do lado bom da meta, abaixo_meta = do lado ruim.
+    """
+    with np.errstate(invalid="ignore"):
+        gap = direction * (np.asarray(target, dtype=float) - np.asarray(current, dtype=float))
+    return np.select(
+        [direction == 0, gap > 0, gap < 0],
+        ["sem_meta", "acima_meta", "abaixo_meta"],
+        default="dentro_meta",
+    )
+
+
+def attach_targets(stats: pd.DataFrame, df_relev: pd.DataFrame) -> pd.DataFrame:
+    """Anexa has_target/target (primeira linha por metric_id) e calcula status.
+
+    Sem coluna `tipo` mantém a regra original: target é o valor máximo permitido,
+    ou seja, current < target ➜ acima_meta, current > target ➜ abaixo_meta.
+    Com `tipo` (menor_que | maior_que) a direção vem de cada linha; p/ metas por
+    plano use `metric_catalog.MetricCatalog.attach`.
+    """
+    relev = df_relev.drop_duplicates(METRIC_COL, keep="first").set_index(METRIC_COL)
+    mids = stats.index.get_level_values(METRIC_COL).astype(str)
+
+    has_target = relev["has_target"].astype(bool).reindex(mids, fill_value=False).to_numpy()
+    target = pd.to_numeric(relev["target"], errors="coerce").reindex(mids).to_numpy(dtype=float)
+    target = np.where(has_target, target, np.nan)
+    tipo = relev["tipo"].reindex(mids).to_numpy() if "tipo" in relev else np.full(len(mids), "menor_que")
+    direction = np.where(has_target, np.where(tipo == "maior_que", -1, 1), 0)
+
+    out = stats.copy()
+    out["has_target"] = has_target
+    out["target"] = target
+    out["status"] = target_status(out["current"].to_numpy(), target, direction)
+    return out
+
+################################################################################
+# Conversão p/ o bloco "metrics" do snapshot
+################################################################################
+
+def _opt_float(v) -> float | None:
+    return None if v is None or pd.isna(v) else float(v)
+
+
+def _round_opt(v, ndigits: int) -> float | None:
+    v = _opt_float(v)
+    return round(v, ndigits) if v is not None else None
+
+
+def _projection(rec: dict) -> dict | None:
+    """Bloco `projection` da métrica (colunas proj_* de projection.attach)."""
+    if pd.isna(rec["proj_value"]):
+        return None
+    return {
+        "data_fim": pd.Timestamp(rec["proj_end"]).date().isoformat(),
+        "horizon_days": int(rec["proj_horizon"]),
+        "value": round(float(rec["proj_value"]), 3),
+        "lower": _round_opt(rec["proj_lower"], 3),
+        "upper": _round_opt(rec["proj_upper"], 3),
+        "level": float(rec["proj_level"]),
+        "prob_meta": _round_opt(rec["proj_prob"], 3),
+    }
+
+
+def metrics_block(stats: pd.DataFrame) -> dict:
+    """Converte o resultado de `attach_targets` (um único contratante) em `metrics_dict`."""
+    slope_cols = [c for c in stats.columns if c.startswith("slope_")]
+    trend_cols = [c for c in stats.columns if c.startswith("trend_")]
+    block = {}
+    for rec in stats.reset_index().to_dict("records"):
+        mid = str(rec[METRIC_COL])
+        delta_pct = _opt_float(rec["delta_pct"])
+        block[mid] = {
+            "name": rec.get("name") or mid,
+            "has_target": bool(rec["has_target"]),
+            "baseline": float(rec["baseline"]),
+            "current": float(rec["current"]),
+            "target": _opt_float(rec["target"]),
+            "delta_abs": float(rec["delta_abs"]),
+            "delta_pct": round(delta_pct, 2) if delta_pct is not None else None,
+            **{c: round(float(rec[c]), 3) for c in slope_cols},
+            "trend": str(rec["trend"]),
+            **{c: str(rec[c]) for c in trend_cols},
+            "status": str(rec["status"]),
+            **({"tipo": rec["tipo"]} if rec.get("tipo") else {}),
+            **({"unit": rec["unit"]} if rec.get("unit") else {}),
+            **({"projection": _projection(rec)} if "proj_value" in rec else {}),
+            "problem_ids": [],
+            "action_ids": [],
+        }
+    return block
@@ -0,0 +1,406 @@
+"""Armazenamento colunar particionado dos extratos diários de métricas.
+
+Substitui a leitura integral de `metricas_extraidas.csv`: os extratos ficam em
+Parquet, particionados por contratante e mês (layout hive)
+
+    <root>/id_contratante=<id>/mes=<YYYY-MM>/part-*.parquet
+
+e as leituras empurram para o pyarrow os filtros de contratante e de período
+(poda de partições + filtro de linhas) e leem só as colunas pedidas.
+
+A coluna de data canônica é `data_hora_analise` (como em metricas.csv);
+extratos com `data_extracao` são renomeados na importação.
+
+Uso
+---
+# importa (ou reimporta) um CSV completo, reescrevendo os meses tocados
+$ python metric_store.py import metricas_extraidas.csv ./metric_store
+# acrescenta um extrato diário novo sem tocar no restante
+$ python metric_store.py import extrato_2025-08-21.csv ./metric_store --append
+# formato legado (database.csv com cabeçalhos em maiúsculas)
+$ python metric_store.py import cenarios/database_toy.csv ./metric_store --mapping ../database/mapping_metrics.json
+
+Sem store, `read_csv_typed` / `iter_csv_tenants` leem o CSV direto, tipado e
+com os nomes canônicos (arquivos grandes em blocos, um contratante por vez).
+"""
+from __future__ import annotations
+import argparse, json, logging, os, shutil, sys, uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+import disk_cache
+
+TS_COL = "data_hora_analise"
+TENANT_COL = "id_contratante"
+MONTH_COL = "mes"
+LEGACY_TS_COLS = ("data_extracao",)
+LEGACY_TENANT_COLS = ("contratante",)
+# CSVs importados (caminho ➜ tamanho/mtime); o ponto inicial some da descoberta do pyarrow
+SOURCES_NAME = ".sources.json"
+
+################################################################################
+# Escrita
+################################################################################
+
+def normalize_extract(df: pd.DataFrame, mapping: Optional[dict] = None) -> pd.DataFrame:
+    """Padroniza nomes de colunas e tipos de um extrato lido de CSV.
+
+    mapping: dicionário nome_canônico ➜ cabeçalho legado (mapping_metrics.json).
+    """
+    df = df.copy()
+    if mapping:
+        df = df.rename(columns={v: k for k, v in mapping.items()})
+    df = df.rename(columns={c: TS_COL for c in LEGACY_TS_COLS if c in df.columns})
+    df = df.rename(columns={c: TENANT_COL for c in LEGACY_TENANT_COLS if c in df.columns})
+    missing = {TS_COL, TENANT_COL} - set(df.columns)
+    if missing:
+        raise ValueError(f"Extrato sem coluna(s) obrigatória(s): {sorted(missing)}")
+
+    ts = pd.to_datetime(df[TS_COL], utc=True, format="ISO8601")
+    df[TS_COL] = ts.dt.tz_localize(None)  # tudo em UTC, sem fuso
+    metric_cols = [c for c in df.columns if c not in (TS_COL, TENANT_COL)]
+    df[metric_cols] = df[metric_cols].apply(pd.to_numeric, errors="coerce").astype("float64")
+    df[MONTH_COL] = df[TS_COL].dt.strftime("%Y-%m")
+    return df
+
+
+def write_extract(df: pd.DataFrame, root: str | Path, append: bool = False) -> None:
+    """Grava um extrato normalizado no store.
+
+    append=False reescreve as partições (contratante, mês) presentes em `df`;
+    append=True só acrescenta arquivos novos (extrato diário incremental).
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table,
+        str(root),
+        format="parquet",
+        partitioning=[TENANT_COL, MONTH_COL],
+        partitioning_flavor="hive",
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore" if append else "delete_matching",
+    )
+
+
+def _csv_stamp(csv_path: str | Path) -> dict:
+    st = os.stat(csv_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _read_sources(root: Path) -> dict:
+    path = root / SOURCES_NAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def _record_source(root: Path, csv_path: str | Path) -> None:
+    """Anota tamanho/mtime do CSV importado (gravação atômica)."""
+    sources = _read_sources(root)
+    sources[str(Path(csv_path).resolve())] = _csv_stamp(csv_path)
+    tmp = root / (SOURCES_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(sources, fp, indent=2)
+    os.replace(tmp, root / SOURCES_NAME)
+
+
+def import_csv(csv_path: str | Path, root: str | Path, append: bool = False,
+               mapping_path: Optional[str | Path] = None) -> int:
+    """Converte um CSV de extratos para o store. Retorna o nº de linhas importadas."""
+    mapping = None
+    if mapping_path:
+        with open(mapping_path, "r", encoding="utf-8") as fp:
+            mapping = json.load(fp)
+    df = normalize_extract(pd.read_csv(csv_path), mapping)
+    write_extract(df, root, append=append)
+    _record_source(Path(root), csv_path)
+    return len(df)
+
+
+def rebuild_store(csv_path: str | Path, root: str | Path, mapping_path: Optional[str | Path] = None) -> int:
+    """Importa o CSV inteiro num diretório irmão e troca o store por ele.
+
+    Leitores nunca veem meses pela metade e contratantes/meses que saíram do CSV
+    somem do store (o import in-place só reescreve as partições presentes no CSV).
+    """
+    root = Path(root)
+    tag = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    tmp, old = root.with_name(f".{root.name}.{tag}.tmp"), root.with_name(f".{root.name}.{tag}.old")
+    try:
+        tmp.mkdir(parents=True)
+        n = import_csv(csv_path, tmp, mapping_path=mapping_path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if root.exists():
+        os.replace(root, old)
+    os.replace(tmp, root)
+    shutil.rmtree(old, ignore_errors=True)
+    return n
+
+
+def ensure_store(root: str | Path, csv_path: str | Path, mapping_path: Optional[str | Path] = None) -> Path:
+    """Garante que o store existe e acompanha o CSV legado.
+
+    Na primeira execução importa o CSV; depois, se o tamanho ou o mtime do CSV
+    mudaram desde a importação, reconstrói o store a partir dele (`rebuild_store`).
+    Store sem registro do CSV (criado antes de SOURCES_NAME existir ou a partir
+    de outros arquivos) não é tocado: só avisa se o CSV for mais novo que ele; se
+    o CSV é só uma das origens registradas (extratos acrescentados com --append),
+    reimporta no lugar, reescrevendo os meses tocados. Importações correm sob
+    trava (<root>.lock), e quem esperou a trava reconfere antes de reimportar.
+    """
+    root = Path(root)
+    if root.exists() and not Path(csv_path).exists():
+        return root
+    key = str(Path(csv_path).resolve())
+    stamp = _csv_stamp(csv_path) if Path(csv_path).exists() else None
+    if root.exists():
+        recorded = _read_sources(root).get(key)
+        if recorded is None:
+            newest = max((f.stat().st_mtime_ns for f in root.rglob("*.parquet")), default=0)
+            if stamp["mtime_ns"] > newest:
+                logging.warning(f"{csv_path} é mais novo que o store {root} e não foi importado nele; "
+                                f"rode `metric_store.py import {csv_path} {root}` p/ atualizar")
+            return root
+        if recorded == stamp:
+            return root
+    with disk_cache.file_lock(root):
+        if not root.exists():
+            rebuild_store(csv_path, root, mapping_path)
+            return root
+        sources = _read_sources(root)
+        if sources.get(key) == stamp:  # outro processo reimportou enquanto esperávamos
+            return root
+        logging.warning(f"{csv_path} mudou desde a importação; reimportando no store {root}")
+        if set(sources) == {key}:
+            rebuild_store(csv_path, root, mapping_path)
+        else:
+            import_csv(csv_path, root, mapping_path=mapping_path)
+    return root
+
+################################################################################
+# Leitura
+################################################################################
+
+def _dataset(root: str | Path) -> ds.Dataset:
+    if not Path(root).exists():
+        raise FileNotFoundError(f"Store de métricas não encontrado: {root} (rode `metric_store.py import`)")
+    return ds.dataset(str(root), format="parquet", partitioning="hive")
+
+
+def _as_partition_value(dataset: ds.Dataset, value):
+    """Ajusta o tipo do id ao inferido na partição (ids numéricos ou texto, ex.: 'a_1')."""
+    typ = dataset.schema.field(TENANT_COL).type
+    if pa.types.is_integer(typ):
+        return int(value)
+    return str(value)
+
+
+def _month(d: date | datetime) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _is_day(v) -> bool:
+    """True p/ datas sem componente de hora (date ou 'YYYY-MM-DD')."""
+    if isinstance(v, str):
+        return len(v.strip()) <= 10
+    return isinstance(v, date) and not isinstance(v, datetime)
+
+
+def read_metrics(root: str | Path, contratante=None,
+                 start: Optional[date | datetime | str] = None,
+                 end: Optional[date | datetime | str] = None,
+                 columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Lê extratos do store com filtros empurrados para o pyarrow.
+
+    contratante: um id ou lista de ids (None = todos).
+    start/end:   limites de data; datas sem hora em `end` incluem o dia inteiro.
+    columns:     métricas desejadas (id_contratante e data_hora_analise sempre vêm).
+    Retorna o DataFrame ordenado por (id_contratante, data_hora_analise).
+    """
+    dataset = _dataset(root)
+    flt = None
+
+    def _and(expr):
+        nonlocal flt
+        flt = expr if flt is None else flt & expr
+
+    if contratante is not None:
+        ids = contratante if isinstance(contratante, (list, tuple, set)) else [contratante]
+        _and(ds.field(TENANT_COL).isin([_as_partition_value(dataset, i) for i in ids]))
+    if start is not None:
+        start_ts = pd.Timestamp(start)
+        _and(ds.field(MONTH_COL) >= _month(start_ts))
+        _and(ds.field(TS_COL) >= start_ts.to_pydatetime())
+    if end is not None:
+        end_ts = pd.Timestamp(end)
+        _and(ds.field(MONTH_COL) <= _month(end_ts))
+        if _is_day(end):  # dia inteiro
+            _and(ds.field(TS_COL) < (end_ts + timedelta(days=1)).to_pydatetime())
+        else:
+            _and(ds.field(TS_COL) <= end_ts.to_pydatetime())
+
+    wanted = _metric_cols(dataset) if columns is None else columns
+    cols = [TENANT_COL, TS_COL] + [c for c in wanted if c not in (TENANT_COL, TS_COL)]
+
+    df = dataset.to_table(columns=cols, filter=flt).to_pandas()
+    if pd.api.types.is_integer_dtype(df[TENANT_COL]):
+        df[TENANT_COL] = df[TENANT_COL].astype("int64")
+    return df.sort_values([TENANT_COL, TS_COL], kind="mergesort", ignore_index=True)
+
+
+def _metric_cols(dataset: ds.Dataset) -> List[str]:
+    return [n for n in dataset.schema.names if n not in (TENANT_COL, TS_COL, MONTH_COL)]
+
+
+def metric_names(root: str | Path) -> List[str]:
+    """Colunas de métrica disponíveis no store (sem chaves de partição)."""
+    return _metric_cols(_dataset(root))
+
+################################################################################
+# Leitura tipada do CSV (database.csv / metricas_extraidas.csv)
+################################################################################
+
+CSV_BLOCK_BYTES = 16 * 1024 * 1024  # bloco lido por vez: memória ≈ bloco + linhas pedidas
+
+
+def load_mapping(path: Optional[str | Path]) -> Optional[dict]:
+    if not path or not Path(path).is_file():
+        return None
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def _csv_schema(csv_path: str | Path, mapping: Optional[dict]) -> tuple[dict, dict]:
+    """(renomeação cabeçalho ➜ nome canônico, tipo arrow por cabeçalho) a partir só do cabeçalho."""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    rename = {v: k for k, v in (mapping or {}).items() if v in header}
+    rename.update({c: TS_COL for c in header if c in LEGACY_TS_COLS or c.lower() == TS_COL})
+    rename.update({c: TENANT_COL for c in LEGACY_TENANT_COLS if c in header})
+    canon = [rename.get(c, c) for c in header]
+    missing = {TS_COL, TENANT_COL} - set(canon)
+    if missing:
+        raise ValueError(f"Extrato sem coluna(s) obrigatória(s): {sorted(missing)}")
+    types = {c: (pa.string() if n in (TS_COL, TENANT_COL) else pa.float64()) for c, n in zip(header, canon)}
+    return rename, types
+
+
+def _csv_frames(csv_path: str | Path, mapping: Optional[dict], block_size: int,
+                contratante=None) -> Iterator[pd.DataFrame]:
+    """Lê o CSV em blocos convertidos pelo leitor do pyarrow e devolve um DataFrame tipado por bloco.
+
+    Com `contratante`, cada bloco é filtrado ainda em formato arrow, antes de virar DataFrame.
+    """
+    rename, types = _csv_schema(csv_path, mapping)
+    tenant = next(c for c in types if rename.get(c, c) == TENANT_COL)
+
+    def blocks(column_types):
+        reader = pacsv.open_csv(str(csv_path), read_options=pacsv.ReadOptions(block_size=block_size),
+                                convert_options=pacsv.ConvertOptions(column_types=column_types))
+        for batch in reader:
+            if contratante is not None:
+                batch = batch.filter(pc.equal(batch.column(tenant), str(contratante)))
+            yield _typed_frame(batch, rename)
+
+    done = 0
+    try:
+        for df in blocks(types):
+            done += 1
+            yield df
+        return
+    except pa.ArrowInvalid:
+        pass
+    # célula não numérica numa métrica: relê como texto a partir do bloco que falhou (vira NaN)
+    for i, df in enumerate(blocks({c: pa.string() for c in types})):
+        if i >= done:
+            yield df
+
+
+def _typed_frame(batch: pa.RecordBatch, rename: dict) -> pd.DataFrame:
+    df = batch.to_pandas().rename(columns=rename)
+    df[TENANT_COL] = df[TENANT_COL].astype("string")
+    df[TS_COL] = pd.to_datetime(df[TS_COL], utc=True, format="ISO8601").dt.tz_localize(None)
+    loose = [c for c in df.columns if c not in (TS_COL, TENANT_COL) and df[c].dtype != "float64"]
+    if loose:
+        df[loose] = df[loose].apply(pd.to_numeric, errors="coerce").astype("float64")
+    return df
+
+
+def read_csv_typed(csv_path: str | Path, mapping: Optional[dict] = None, contratante=None,
+                   block_size: int = CSV_BLOCK_BYTES) -> pd.DataFrame:
+    """Lê um CSV de extratos com nomes canônicos (mapping_metrics.json) e tipos fixos.
+
+    Métricas em float64, data em datetime64 (UTC, sem fuso) e contratante como texto.
+    O arquivo é lido em blocos de `block_size` bytes e, com `contratante`, cada
+    bloco é filtrado antes de virar DataFrame: só as linhas dele ficam em memória.
+    Retorna o DataFrame ordenado por (id_contratante, data_hora_analise).
+    """
+    frames = list(_csv_frames(csv_path, mapping, block_size, contratante))
+    if not frames:  # só cabeçalho
+        return pd.DataFrame(columns=[TENANT_COL, TS_COL])
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return df.sort_values([TENANT_COL, TS_COL], kind="mergesort", ignore_index=True)
+
+
+def iter_csv_tenants(csv_path: str | Path, mapping: Optional[dict] = None,
+                     block_size: int = CSV_BLOCK_BYTES) -> Iterator[tuple[str, pd.DataFrame]]:
+    """(contratante, linhas) um contratante por vez, lendo o CSV em blocos.
+
+    Exige o arquivo agrupado por contratante (como os extratos são gerados): só as
+    linhas do contratante corrente ficam em memória.
+    """
+    seen: set = set()
+    current, parts = None, []
+
+    def flush() -> tuple[str, pd.DataFrame]:
+        df = pd.concat(parts, ignore_index=True)
+        return current, df.sort_values(TS_COL, kind="mergesort", ignore_index=True)
+
+    for frame in _csv_frames(csv_path, mapping, block_size):
+        ids = frame[TENANT_COL].to_numpy()
+        cuts = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(ids)]):
+            if ids[lo] != current:
+                if current is not None:
+                    yield flush()
+                if ids[lo] in seen:
+                    raise ValueError(f"CSV não agrupado por contratante ({ids[lo]} reaparece); "
+                                     "use read_csv_typed ou importe para o store")
+                seen.add(ids[lo])
+                current, parts = ids[lo], []
+            parts.append(frame.iloc[lo:hi])
+    if current is not None:
+        yield flush()
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Store colunar de métricas extraídas")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="Importa um CSV de extratos para o store")
+    imp.add_argument("csv", help="CSV de extratos (metricas_extraidas.csv ou database.csv)")
+    imp.add_argument("root", help="Diretório raiz do store")
+    imp.add_argument("--append", action="store_true", help="Acrescenta sem reescrever os meses tocados")
+    imp.add_argument("--mapping", help="mapping_metrics.json p/ cabeçalhos legados em maiúsculas")
+    args = p.parse_args()
+
+    if args.cmd == "import":
+        n = import_csv(args.csv, args.root, append=args.append, mapping_path=args.mapping)
+        print(f"{n} linhas importadas em {args.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
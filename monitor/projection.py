@@ -0,0 +1,213 @@
+"""Projeção das métricas até o fim do planejamento (data_fim de planejamento.csv).
+
+Para todas as séries de uma vez (contratante × planejamento × métrica), em NumPy:
+
+- reta de mínimos quadrados nos últimos `fit_days` dias da série
+  (colunas fit_* de `metric_engine.window_fit` / `snapshot_state.state_stats`)
+- valor projetado em data_fim e intervalo de previsão no nível `level`
+  (t de Student com n - 2 graus de liberdade)
+- prob_meta = P(valor em data_fim do lado bom de valor_final_esperado), com a
+  direção da meta por `tipo` (menor_que ➜ P(Y ≤ meta); maior_que ➜ P(Y ≥ meta))
+
+Planos sem data_fim (em aberto) ou séries com menos de MIN_POINTS pontos na
+janela ficam sem intervalo/probabilidade. O resultado vai em colunas proj_*
+do stats (`attach`) e no bloco `projection` de cada métrica do snapshot
+(`metric_engine.metrics_block`); as regras de alert_rules.yaml podem usar
+proj_prob, proj_value etc. como qualquer outra coluna.
+
+Sem SciPy: a CDF da t usa a série finita exata p/ graus de liberdade inteiros
+(Abramowitz-Stegun 26.7.3/26.7.4, vetorizada) e o quantil sai de
+Cornish-Fisher refinado por Newton, uma vez por nº distinto de g.l.
+
+Uso
+---
+$ python projection.py --input_dir ./data --contratante 45 --planejamento 123
+"""
+from __future__ import annotations
+import argparse, math, sys
+from pathlib import Path
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from metric_catalog import PLAN_COL
+
+LEVEL = 0.9      # nível padrão do intervalo de previsão
+MIN_POINTS = 4   # pontos na janela p/ intervalo e probabilidade (t com ≥ 2 g.l.)
+EXACT_DOF = 200  # acima disso a t vira a normal equivalente de 26.7.8 (erro desprezível)
+PROJ_COLS = ["proj_end", "proj_horizon", "proj_value", "proj_lower", "proj_upper", "proj_level", "proj_prob"]
+
+################################################################################
+# Distribuições (vetorizadas, sem SciPy)
+################################################################################
+
+def norm_cdf(z: np.ndarray) -> np.ndarray:
+    """Φ(z) pela aproximação 7.1.26 de Abramowitz-Stegun para erf (erro < 1.5e-7)."""
+    z = np.asarray(z, dtype=float)
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+
+def t_cdf(t: np.ndarray, dof: np.ndarray) -> np.ndarray:
+    """F(t) da t de Student, g.l. inteiros ≥ 1 (NaN onde dof for NaN)."""
+    t, v = np.broadcast_arrays(np.asarray(t, dtype=float), np.asarray(dof, dtype=float))
+    shape, t, v = t.shape, t.ravel(), v.ravel()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = norm_cdf(t * (1 - 1 / (4 * v)) / np.sqrt(1 + t * t / (2 * v)))  # 26.7.8
+    exact = (v >= 1) & (v <= EXACT_DOF) & ~np.isnan(t)
+    if exact.any():
+        te, ve = t[exact], v[exact].astype(np.int64)
+        theta = np.arctan(np.abs(te) / np.sqrt(ve))
+        c2, odd = np.cos(theta) ** 2, ve % 2 == 1
+        # par: 1 + ½cos² + (1·3)/(2·4)cos⁴ + …;  ímpar: cos + ⅔cos³ + (2·4)/(3·5)cos⁵ + …
+        term = np.where(odd, np.cos(theta), 1.0)
+        acc = np.where(ve == 1, 0.0, term)
+        kmax = (ve - np.where(odd, 3, 2)) // 2
+        for k in range(1, int(kmax.max()) + 1):
+            term = term * c2 * np.where(odd, 2 * k / (2 * k + 1), (2 * k - 1) / (2 * k))
+            acc += np.where(k <= kmax, term, 0.0)
+        a = np.where(odd, 2 / np.pi * (theta + np.sin(theta) * acc), np.sin(theta) * acc)
+        out[exact] = 0.5 + 0.5 * np.sign(te) * a
+    return np.where(np.isnan(v), np.nan, out).reshape(shape)
+
+
+def _t_pdf(t: float, v: float) -> float:
+    logc = math.lgamma((v + 1) / 2) - math.lgamma(v / 2) - 0.5 * math.log(v * math.pi)
+    return math.exp(logc - (v + 1) / 2 * math.log1p(t * t / v))
+
+
+def t_ppf(p: float, dof: np.ndarray) -> np.ndarray:
+    """Quantil p da t de Student por linha; calculado uma vez por nº distinto de g.l."""
+    v = np.asarray(dof, dtype=float)
+    out = np.full(v.shape, np.nan)
+    z = NormalDist().inv_cdf(p)
+    for d in np.unique(v[~np.isnan(v) & (v >= 1)]):
+        q = (z + (z ** 3 + z) / (4 * d) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * d ** 2)
+             + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * d ** 3))  # Cornish-Fisher
+        for _ in range(4):  # Newton na CDF exata
+            q -= (float(t_cdf(q, d)) - p) / _t_pdf(q, d)
+        out[v == d] = q
+    return out
+
+################################################################################
+# Projeção
+################################################################################
+
+def load_plan_ends(base_dir: str | Path) -> pd.Series:
+    """data_fim por id_planejamento (NaT = em aberto); vazio sem planejamento.csv."""
+    path = Path(base_dir) / "planejamento.csv"
+    if not path.is_file():
+        return pd.Series(dtype="datetime64[ns]")
+    df = pd.read_csv(path)
+    return pd.Series(pd.to_datetime(df["data_fim"]).to_numpy(), index=df["id_planejamento"].to_numpy(),
+                     name="data_fim")
+
+
+def project(stats: pd.DataFrame, end: np.ndarray, *, level: float = LEVEL) -> dict:
+    """Projeção das colunas fit_* de cada linha até `end` (datetime64 por linha, NaT = sem fim).
+
+    O horizonte é contado em dias inteiros entre o dia do último ponto e o dia
+    de `end` (a data_fim inteira pertence ao plano, como em plan_windows); um
+    plano já encerrado projeta o próprio último dia.
+    """
+    end = np.asarray(end, dtype="datetime64[ns]")
+    last = stats["fit_end"].to_numpy().astype("datetime64[D]")
+    horizon = (end.astype("datetime64[D]") - last) / np.timedelta64(1, "D")
+    horizon = np.where(np.isnan(horizon), np.nan, np.maximum(horizon, 0.0))
+
+    n = stats["fit_n"].to_numpy(dtype=float)
+    xbar, sxx = stats["fit_xbar"].to_numpy(dtype=float), stats["fit_sxx"].to_numpy(dtype=float)
+    value = stats["fit_level"].to_numpy(dtype=float) + stats["fit_slope"].to_numpy(dtype=float) * horizon
+    value = np.where(n >= 2, value, np.nan)
+
+    dof = n - 2
+    ok = (n >= MIN_POINTS) & (sxx > 0) & ~np.isnan(value)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se = np.sqrt(stats["fit_s2"].to_numpy(dtype=float) * (1 + 1 / n + (horizon - xbar) ** 2 / sxx))
+    se = np.where(ok, se, np.nan)
+    half = t_ppf(0.5 + level / 2, np.where(ok, dof, np.nan)) * se
+
+    # direção da meta: 1 = menor_que (meta é o máximo), -1 = maior_que, 0 = sem meta
+    target = stats["target"].to_numpy(dtype=float) if "target" in stats else np.full(len(stats), np.nan)
+    if "tipo" in stats:
+        tipo = stats["tipo"].to_numpy()
+        direction = np.select([tipo == "menor_que", tipo == "maior_que"], [1, -1], default=0)
+    else:
+        direction = np.where(~np.isnan(target), 1, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gap = direction * (target - value)  # > 0: projeção do lado bom da meta
+        prob = np.where(se > 0, t_cdf(gap / se, dof), (gap >= 0).astype(float))
+    prob = np.where(ok & (direction != 0) & ~np.isnan(target), prob, np.nan)
+
+    return {
+        "proj_end": end,
+        "proj_horizon": horizon,
+        "proj_value": value,
+        "proj_lower": value - half,
+        "proj_upper": value + half,
+        "proj_level": np.full(len(stats), float(level)),
+        "proj_prob": prob,
+    }
+
+
+def attach(stats: pd.DataFrame, plan_ends: pd.Series, planejamento=None, *,
+           level: float = LEVEL) -> pd.DataFrame:
+    """Anexa as colunas proj_* (PROJ_COLS) a um stats com fit_* e metas (MetricCatalog.attach).
+
+    O plano vem do nível `id_planejamento` do índice (modo batch) ou de `planejamento`.
+    """
+    if PLAN_COL in stats.index.names:
+        plans = stats.index.get_level_values(PLAN_COL)
+    else:
+        plans = pd.Index([planejamento] * len(stats))
+    ends = plan_ends[~plan_ends.index.duplicated()] if len(plan_ends) else plan_ends
+    end = pd.to_datetime(ends.reindex(plans)).to_numpy() if len(ends) else np.full(len(stats), np.datetime64("NaT"))
+
+    out = stats.copy()
+    for col, values in project(stats, end, level=level).items():
+        out[col] = values
+    return out
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    import generate_analysis as ga  # só p/ a CLI: config.yaml, store e catálogo como no snapshot
+
+    p = argparse.ArgumentParser(description="Projeta as métricas de um planejamento até data_fim")
+    p.add_argument("--input_dir", required=True, help="Diretório onde estão os CSV/JSON de entrada")
+    p.add_argument("--contratante", type=int, required=True)
+    p.add_argument("--planejamento", type=int, required=True)
+    p.add_argument("--store", default=None, help="Store colunar de métricas (padrão: <input_dir>/metric_store)")
+    p.add_argument("--level", type=float, default=ga.PROJECTION_LEVEL, help="Nível do intervalo de previsão")
+    args = p.parse_args()
+
+    base_dir = Path(args.input_dir)
+    df = ga.load_extract(base_dir, args.store, contratante=args.contratante)
+    if df.empty:
+        raise SystemExit("Nenhum dado encontrado para id_contratante fornecido.")
+    metric_cols = [c for c in df.columns if c not in ("id_contratante", "data_extracao")]
+    stats = ga.metric_engine.metric_stats(df, "data_extracao", metric_cols, windows=ga.TEMPORALITY_DAYS,
+                                          primary=ga.TEMPORALITY, eps=ga.EPSILON, fast_factor=ga.FAST_FACTOR,
+                                          fit_days=ga.PROJECTION_DAYS)
+    stats = ga.metric_catalog.load_catalog(base_dir).attach(stats, args.planejamento)
+    stats = attach(stats, load_plan_ends(base_dir), args.planejamento, level=args.level)
+
+    cols = ["current", "target", "tipo", "proj_value", "proj_lower", "proj_upper", "proj_prob"]
+    table = stats[cols].sort_values("proj_prob", na_position="last")
+    end: Optional[pd.Timestamp] = stats["proj_end"].iloc[0] if len(stats) else None
+    print(f"Projeção até {end.date() if end is not None and pd.notna(end) else 'sem data_fim'} "
+          f"(reta dos últimos {ga.PROJECTION_DAYS} dias, intervalo de {args.level:.0%})")
+    with pd.option_context("display.max_rows", None, "display.width", 160, "display.float_format", "{:.3f}".format):
+        print(table)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
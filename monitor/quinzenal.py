@@ -1,5 +1,7 @@
 import pandas as pd
 import numpy as np
+import argparse
+import asyncio
 import os
 import sys
 import json
@@ -12,25 +14,43 @@ from langchain.chat_models import ChatOpenAI
 from langchain.chains import LLMChain
 from typing import Dict, List, Any, Optional, Tuple
 import logging
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
 from io import BytesIO
 import base64
 
+import dashboards
+import telemetry
+from llm_cache import langchain_cache
+from rate_limiter import RateLimiter, call_with_backoff, estimate_tokens
+from snapshot_diff import diff_frame, diff_history, frame_history
+
 # Configuração básica
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# cabeçalhos em maiúsculas do database.csv ➜ nomes canônicos (os mesmos do store)
+MAPPING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "database", "mapping_metrics.json")
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+DASHBOARD_LABELS = {"metricas": "métricas", "acoes": "status das ações"}
+
+
+def _log_dashboard(label: str, status: str, output_path: str) -> None:
+    if status == dashboards.EMPTY:
+        logging.warning(f"Nenhum dado encontrado para gerar o dashboard de {label}")
+    elif status == dashboards.CACHED:
+        logging.info(f"Dashboard de {label} inalterado, mantido: {output_path}")
+    else:
+        logging.info(f"Dashboard de {label} gerado e salvo em: {output_path}")
+
 class InventoryTrackingAgent:
     """
     Agente de acompanhamento quinzenal para monitorar a evolução das métricas de estoque
     e avaliar o progresso das ações implementadas.
     """
     
-    def __init__(self, openai_api_key: str = None, model_name: str = "gpt-4o", temp=0.2):
+    def __init__(self, openai_api_key: str = None, model_name: str = "gpt-4o", temp=0.2,
+                 max_retries: Optional[int] = None):
         """
         Inicializa o agente de acompanhamento.
         
@@ -38,14 +58,19 @@ class InventoryTrackingAgent:
             openai_api_key: Chave da API OpenAI (padrão para variável de ambiente)
             model_name: Nome do modelo OpenAI a ser usado
             temp: Temperatura para o modelo LLM
+            max_retries: Tentativas do cliente OpenAI (0 quando o RateLimiter cuida do backoff)
         """
         self.api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
         self.model_name = model_name
         self.temp = temp
+        llm_kwargs = {} if max_retries is None else {"max_retries": max_retries}
         self.llm = ChatOpenAI(
             temperature=temp, 
             model_name=self.model_name,
-            openai_api_key=self.api_key
+            openai_api_key=self.api_key,
+            cache=langchain_cache(),  # respostas repetidas saem do cache em disco
+            callbacks=[telemetry.langchain_handler()],  # latência, tokens e custo de cada chamada
+            **llm_kwargs
         )
         
         # Criação dos prompts e chains
@@ -59,6 +84,7 @@ class InventoryTrackingAgent:
         
         # Armazenamento de dados processados
         self.metrics_history = {}
+        self.metrics_frame = None  # extrato tipado do contratante (load_data_from_database)
         self.baseline_metrics = {}
         self.current_metrics = {}
         self.action_plan = {}
@@ -80,9 +106,11 @@ class InventoryTrackingAgent:
         {current_metrics}
         ```
         
-        ## Histórico de Métricas
+        ## Mudanças desde o Ciclo Anterior
+        Só o que mudou entre o ciclo anterior e o atual (metas cruzadas, tendências
+        invertidas); `ciclos` é o nº de extrações no histórico.
         ```json
-        {metrics_history}
+        {metrics_delta}
         ```
         
         ## Metas Estabelecidas
@@ -93,16 +121,16 @@ class InventoryTrackingAgent:
         ## Instruções
         1. Compare as métricas atuais com a linha de base e identifique as principais variações
         2. Avalie o progresso em relação às metas estabelecidas
-        3. Identifique tendências (positivas ou negativas) nas métricas-chave
+        3. Identifique tendências (positivas ou negativas) nas métricas-chave, usando as mudanças desde o ciclo anterior
         4. Destaque os desvios significativos do plano original
         5. Calcule a taxa de progresso para cada métrica-chave (porcentagem do caminho em direção à meta)
         
         ## Formato de Saída
         Forneça sua análise como um objeto JSON com a seguinte estrutura:
         ```json
-        {
+        {{
           "metrics_comparison": [
-            {
+            {{
               "metric_name": "Nome da métrica",
               "baseline_value": valor_inicial,
               "current_value": valor_atual,
@@ -113,32 +141,32 @@ class InventoryTrackingAgent:
               "trend": "increasing/decreasing/stable",
               "status": "on_track/at_risk/off_track",
               "insights": "Análise específica desta métrica"
-            }
+            }}
           ],
-          "overall_assessment": {
+          "overall_assessment": {{
             "overall_progress": "taxa_global_de_progresso%",
             "on_track_metrics": número_métricas_no_caminho,
             "at_risk_metrics": número_métricas_em_risco,
             "off_track_metrics": número_métricas_fora_do_caminho,
             "key_achievements": ["conquista1", "conquista2"],
             "key_concerns": ["preocupação1", "preocupação2"]
-          },
+          }},
           "trends_identified": [
-            {
+            {{
               "trend_description": "Descrição da tendência",
               "affected_metrics": ["métrica1", "métrica2"],
               "potential_impact": "Impacto potencial desta tendência",
               "recommendation": "Recomendação relacionada a esta tendência"
-            }
+            }}
           ]
-        }
+        }}
         ```
         
         Forneça uma análise profunda baseada em dados, com insights quantitativos e qualitativos.
         """
         
         return PromptTemplate(
-            input_variables=["baseline_metrics", "current_metrics", "metrics_history", "target_metrics"],
+            input_variables=["baseline_metrics", "current_metrics", "metrics_delta", "target_metrics"],
             template=template
         )
     
@@ -172,9 +200,9 @@ class InventoryTrackingAgent:
         ## Formato de Saída
         Forneça sua avaliação como um objeto JSON com a seguinte estrutura:
         ```json
-        {
+        {{
           "action_status": [
-            {
+            {{
               "problem": "Descrição do problema",
               "action": "Descrição da ação",
               "status": "complete/in_progress/delayed/not_started",
@@ -184,26 +212,26 @@ class InventoryTrackingAgent:
               "financial_impact": "Estimativa do impacto financeiro observado",
               "obstacles": ["obstáculo1", "obstáculo2"],
               "recommended_adjustments": "Ajustes recomendados para esta ação"
-            }
+            }}
           ],
-          "overall_plan_status": {
+          "overall_plan_status": {{
             "actions_complete": número_ações_completas,
             "actions_in_progress": número_ações_em_andamento,
             "actions_delayed": número_ações_atrasadas,
             "actions_not_started": número_ações_não_iniciadas,
             "overall_completion": "percentual_global_de_conclusão%",
             "financial_impact_to_date": "Impacto financeiro total observado até o momento"
-          },
+          }},
           "new_actions_recommended": [
-            {
+            {{
               "problem": "Problema relacionado",
               "action_description": "Descrição da nova ação recomendada",
               "rationale": "Justificativa para esta nova ação",
               "expected_impact": "Impacto esperado desta ação",
               "priority": "high/medium/low"
-            }
+            }}
           ]
-        }
+        }}
         ```
         
         Forneça uma avaliação objetiva baseada em evidências quantitativas das métricas.
@@ -269,6 +297,7 @@ class InventoryTrackingAgent:
             problem_analysis_path: Caminho para o arquivo de análise de problemas
         """
         logging.info(f"Carregando dados para análise...")
+        self.metrics_frame = None
         
         # Carrega cenários de métricas
         scenario_files = sorted(glob.glob(scenario_pattern))
@@ -319,24 +348,22 @@ class InventoryTrackingAgent:
     def load_data_from_database(self, database_path: str, contratante: str,
                                 action_plan_path: str = None, problem_analysis_path: str = None) -> None:
         """
-        Carrega os dados do CSV de banco de dados para o acompanhamento, filtrando pelo contratante.
+        Carrega os dados do banco de dados para o acompanhamento, filtrando pelo contratante.
+
+        database_path pode ser o diretório do store colunar (metric_store.py), de onde
+        só as partições do contratante são lidas, ou o CSV legado (database.csv).
         """
-        import csv
+        if os.path.isdir(database_path):
+            df = self._load_frame_from_store(database_path, contratante)
+        else:
+            df = self._load_frame_from_csv(database_path, contratante)
+        if df.empty:
+            raise ValueError(f"Nenhuma linha encontrada para contratante: {contratante}")
+        # o histórico fica como DataFrame: linha de base, atual e delta saem dele sob demanda
+        self.metrics_frame = df.reset_index(drop=True)
         self.metrics_history = {}
-        self.baseline_metrics = None
-        self.current_metrics = None
-        with open(database_path, newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            rows = [row for row in reader if row['contratante'] == contratante]
-            if not rows:
-                raise ValueError(f"Nenhuma linha encontrada para contratante: {contratante}")
-            for idx, row in enumerate(rows):
-                metrics = {k: self._try_parse_number(v) for k, v in row.items() if k != 'contratante'}
-                self.metrics_history[idx] = metrics
-                if idx == 0:
-                    self.baseline_metrics = metrics
-                self.current_metrics = metrics
-        self.cycle_count = len(rows)
+        self.baseline_metrics = self.current_metrics = None
+        self.cycle_count = len(df)
         # Carrega plano de ação e análise de problemas (como no load_data)
         if action_plan_path:
             with open(action_plan_path, "r") as f:
@@ -351,16 +378,24 @@ class InventoryTrackingAgent:
         self.target_metrics = self._extract_targets_from_action_plan()
 
     @staticmethod
-    def _try_parse_number(value):
-        try:
-            if value is None or value == '':
-                return None
-            if '.' in value or 'e' in value.lower():
-                return float(value)
-            return int(value)
-        except Exception:
-            return value
-    
+    def _load_frame_from_csv(database_path: str, contratante: str) -> pd.DataFrame:
+        from metric_store import TENANT_COL, load_mapping, read_csv_typed
+        df = read_csv_typed(database_path, load_mapping(MAPPING_PATH), contratante=contratante)
+        return df.drop(columns=[TENANT_COL])
+
+    @staticmethod
+    def _load_frame_from_store(store_path: str, contratante: str) -> pd.DataFrame:
+        from metric_store import TENANT_COL, read_metrics
+        return read_metrics(store_path, contratante=contratante).drop(columns=[TENANT_COL])
+
+    @staticmethod
+    def _frame_to_rows(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Poucas linhas do extrato ➜ dicts p/ o prompt (datas em texto, NaN ➜ None)."""
+        from metric_store import TS_COL
+        df = df.assign(**{TS_COL: df[TS_COL].dt.strftime("%Y-%m-%dT%H:%M:%SZ")})
+        df = df.astype(object).where(df.notna(), None)
+        return df.to_dict("records")
+
     def _extract_targets_from_action_plan(self) -> Dict[str, Any]:
         """
         Extrai as métricas-alvo definidas no plano de ação.
@@ -410,18 +445,44 @@ class InventoryTrackingAgent:
             Análise de métricas em formato JSON
         """
         logging.info("Analisando evolução das métricas...")
-        
-        # Prepara inputs para o chain
-        inputs = {
-            "baseline_metrics": json.dumps(self.baseline_metrics, indent=2),
-            "current_metrics": json.dumps(self.current_metrics, indent=2),
-            "metrics_history": json.dumps(self.metrics_history, indent=2),
+        with telemetry.span("llm.metrics_analysis"):
+            analysis_result = self.metrics_analysis_chain.run(**self._metrics_analysis_inputs())
+        return self._parse_metrics_analysis(analysis_result)
+    
+    async def aanalyze_metrics(self, limiter: Optional[RateLimiter] = None) -> Dict[str, Any]:
+        """Versão assíncrona de analyze_metrics (respeita o limitador global, se houver)."""
+        logging.info("Analisando evolução das métricas...")
+        with telemetry.span("llm.metrics_analysis"):
+            analysis_result = await self._arun_chain(self.metrics_analysis_chain,
+                                                     self._metrics_analysis_inputs(), limiter)
+        return self._parse_metrics_analysis(analysis_result)
+    
+    def _metrics_analysis_inputs(self) -> Dict[str, str]:
+        baseline, current = self.endpoint_metrics()
+        return {
+            "baseline_metrics": json.dumps(baseline, indent=2),
+            "current_metrics": json.dumps(current, indent=2),
+            "metrics_delta": json.dumps(self.metrics_delta(), indent=2, ensure_ascii=False),
             "target_metrics": json.dumps(self.target_metrics, indent=2)
         }
-        
-        # Executa a análise
-        analysis_result = self.metrics_analysis_chain.run(**inputs)
-        
+    
+    def endpoint_metrics(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """(linha de base, atual): 1ª e última linha do extrato, ou os cenários JSON de load_data."""
+        if self.metrics_frame is not None:
+            baseline, current = self._frame_to_rows(self.metrics_frame.iloc[[0, -1]])
+            return baseline, current
+        return self.baseline_metrics, self.current_metrics
+
+    def metrics_delta(self) -> Dict[str, Any]:
+        """Delta compacto do histórico (snapshot_diff): o prompt não cresce com o nº de ciclos."""
+        if self.metrics_frame is not None:
+            from metric_store import TS_COL
+            return diff_frame(frame_history(self.metrics_frame, TS_COL), self.target_metrics,
+                              self.metrics_frame[TS_COL])
+        rows = [self.metrics_history[k] for k in sorted(self.metrics_history)]
+        return diff_history(rows, self.target_metrics)
+    
+    def _parse_metrics_analysis(self, analysis_result: str) -> Dict[str, Any]:
         # Limpa e converte o resultado para JSON
         cleaned_result = self._clean_json_string(analysis_result)
         try:
@@ -444,17 +505,27 @@ class InventoryTrackingAgent:
             Status das ações em formato JSON
         """
         logging.info("Acompanhando status das ações...")
-        
-        # Prepara inputs para o chain
-        inputs = {
+        with telemetry.span("llm.action_tracking"):
+            action_result = self.action_tracking_chain.run(**self._action_tracking_inputs(metrics_analysis))
+        return self._parse_action_status(action_result)
+    
+    async def atrack_actions(self, metrics_analysis: Dict[str, Any],
+                             limiter: Optional[RateLimiter] = None) -> Dict[str, Any]:
+        """Versão assíncrona de track_actions."""
+        logging.info("Acompanhando status das ações...")
+        with telemetry.span("llm.action_tracking"):
+            action_result = await self._arun_chain(self.action_tracking_chain,
+                                                   self._action_tracking_inputs(metrics_analysis), limiter)
+        return self._parse_action_status(action_result)
+    
+    def _action_tracking_inputs(self, metrics_analysis: Dict[str, Any]) -> Dict[str, str]:
+        return {
             "action_plan": self.action_plan,
             "problem_analysis": self.problem_analysis,
             "metrics_evolution": json.dumps(metrics_analysis, indent=2)
         }
-        
-        # Executa o acompanhamento
-        action_result = self.action_tracking_chain.run(**inputs)
-        
+    
+    def _parse_action_status(self, action_result: str) -> Dict[str, Any]:
         # Limpa e converte o resultado para JSON
         cleaned_result = self._clean_json_string(action_result)
         try:
@@ -484,28 +555,49 @@ class InventoryTrackingAgent:
             Relatório em formato markdown
         """
         logging.info(f"Gerando relatório para o ciclo {cycle_number}...")
-        
+        inputs = self._report_inputs(metrics_analysis, action_status, cycle_number)
+        with telemetry.span("llm.report"):
+            report = self.report_generation_chain.run(**inputs)
+        return self._save_report(report, output_path)
+    
+    async def agenerate_report(self, metrics_analysis: Dict[str, Any], action_status: Dict[str, Any],
+                               cycle_number: int, output_path: str,
+                               limiter: Optional[RateLimiter] = None) -> str:
+        """Versão assíncrona de generate_report."""
+        logging.info(f"Gerando relatório para o ciclo {cycle_number}...")
+        inputs = self._report_inputs(metrics_analysis, action_status, cycle_number)
+        with telemetry.span("llm.report"):
+            report = await self._arun_chain(self.report_generation_chain, inputs, limiter)
+        return self._save_report(report, output_path)
+    
+    def _report_inputs(self, metrics_analysis: Dict[str, Any], action_status: Dict[str, Any],
+                       cycle_number: int) -> Dict[str, str]:
         # Prepara a data do relatório (atual)
         report_date = datetime.now().strftime("%d/%m/%Y")
-        
-        # Prepara inputs para o chain
-        inputs = {
+        return {
             "metrics_analysis": json.dumps(metrics_analysis, indent=2),
             "action_status": json.dumps(action_status, indent=2),
             "cycle_number": str(cycle_number),
             "report_date": report_date
         }
-        
-        # Gera o relatório
-        report = self.report_generation_chain.run(**inputs)
-        
-        # Salva o relatório
-        with open(output_path, "w") as f:
+    
+    @staticmethod
+    def _save_report(report: str, output_path: str) -> str:
+        with telemetry.span("save"), open(output_path, "w") as f:
             f.write(report)
-        
         logging.info(f"Relatório gerado e salvo em: {output_path}")
         return report
     
+    async def _arun_chain(self, chain: LLMChain, inputs: Dict[str, str],
+                          limiter: Optional[RateLimiter] = None) -> str:
+        """Executa o chain de forma assíncrona; com limitador, reserva tokens e recua em rate limit."""
+        if limiter is None:
+            return await chain.arun(**inputs)
+        tokens = estimate_tokens(chain.prompt.template + "".join(inputs.values()), model=self.model_name)
+        tokens += tokens // 2  # reserva p/ a resposta (o prompt não fixa max_tokens)
+        return await call_with_backoff(lambda: chain.arun(**inputs), limiter, tokens,
+                                       label=self.model_name)
+    
     def generate_metrics_dashboard(self, 
                                    metrics_analysis: Dict[str, Any], 
                                    output_path: str) -> None:
@@ -516,60 +608,7 @@ class InventoryTrackingAgent:
             metrics_analysis: Análise de métricas
             output_path: Caminho para salvar o dashboard
         """
-        logging.info("Gerando dashboard de métricas...")
-        
-        try:
-            # Extrai os dados de métricas da análise
-            metrics_data = metrics_analysis.get("metrics_comparison", [])
-            
-            if not metrics_data:
-                logging.warning("Nenhum dado de métrica encontrado para gerar o dashboard")
-                return
-            
-            # Limita a no máximo 6 métricas para o dashboard
-            metrics_data = metrics_data[:6]
-            
-            # Cria uma figura com 2 gráficos
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 8))
-            
-            # Gráfico 1: Valores atuais vs metas
-            metric_names = [m["metric_name"] for m in metrics_data]
-            current_values = [m["current_value"] for m in metrics_data]
-            target_values = [m["target_value"] for m in metrics_data]
-            
-            x = range(len(metric_names))
-            width = 0.35
-            
-            ax1.bar([i - width/2 for i in x], current_values, width, label='Valor Atual')
-            ax1.bar([i + width/2 for i in x], target_values, width, label='Meta')
-            
-            ax1.set_title('Valores Atuais vs Metas')
-            ax1.set_xticks(x)
-            ax1.set_xticklabels(metric_names, rotation=45, ha='right')
-            ax1.legend()
-            
-            # Gráfico 2: Taxa de progresso
-            progress_rates = [float(m["progress_rate"].replace("%", "")) for m in metrics_data]
-            
-            # Cores baseadas no progresso
-            colors = ['#ff9999' if rate < 30 else '#ffcc99' if rate < 70 else '#99cc99' for rate in progress_rates]
-            
-            ax2.barh(metric_names, progress_rates, color=colors)
-            ax2.set_title('Taxa de Progresso (%)')
-            ax2.set_xlim(0, 100)
-            ax2.axvline(x=50, color='gray', linestyle='--')
-            
-            # Adiciona rótulos de porcentagem
-            for i, v in enumerate(progress_rates):
-                ax2.text(v + 3, i, f"{v}%", va='center')
-            
-            plt.tight_layout()
-            plt.savefig(output_path)
-            
-            logging.info(f"Dashboard de métricas gerado e salvo em: {output_path}")
-            
-        except Exception as e:
-            logging.error(f"Erro ao gerar dashboard de métricas: {e}")
+        self._render_dashboard("metricas", metrics_analysis, output_path)
     
     def generate_action_status_dashboard(self, 
                                          action_status: Dict[str, Any], 
@@ -581,54 +620,30 @@ class InventoryTrackingAgent:
             action_status: Status das ações
             output_path: Caminho para salvar o dashboard
         """
-        logging.info("Gerando dashboard de status das ações...")
-        
+        self._render_dashboard("acoes", action_status, output_path)
+
+    @staticmethod
+    def _render_dashboard(kind: str, analysis: Dict[str, Any], output_path: str) -> None:
+        label = DASHBOARD_LABELS[kind]
+        logging.info(f"Gerando dashboard de {label}...")
         try:
-            # Extrai os dados de status do plano
-            overall_status = action_status.get("overall_plan_status", {})
-            
-            if not overall_status:
-                logging.warning("Nenhum dado de status encontrado para gerar o dashboard")
-                return
-            
-            # Extrai os números
-            complete = overall_status.get("actions_complete", 0)
-            in_progress = overall_status.get("actions_in_progress", 0)
-            delayed = overall_status.get("actions_delayed", 0)
-            not_started = overall_status.get("actions_not_started", 0)
-            
-            # Cria a figura
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 8))
-            
-            # Gráfico 1: Pizza de status das ações
-            labels = ['Completas', 'Em Andamento', 'Atrasadas', 'Não Iniciadas']
-            sizes = [complete, in_progress, delayed, not_started]
-            colors = ['#99cc99', '#ffcc99', '#ff9999', '#dddddd']
-            
-            ax1.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', 
-                    startangle=90, wedgeprops={'edgecolor': 'white'})
-            ax1.axis('equal')
-            ax1.set_title('Status das Ações')
-            
-            # Gráfico 2: Taxa de conclusão do plano
-            overall_completion = float(overall_status.get("overall_completion", "0").replace("%", ""))
-            
-            # Cria um gráfico de progresso
-            ax2.barh(['Progresso Total'], [overall_completion], color='#aaddff')
-            ax2.barh(['Progresso Total'], [100], color='#eeeeee')
-            ax2.set_title('Conclusão Geral do Plano')
-            ax2.set_xlim(0, 100)
-            
-            # Adiciona rótulo de porcentagem
-            ax2.text(overall_completion + 3, 0, f"{overall_completion}%", va='center')
-            
-            plt.tight_layout()
-            plt.savefig(output_path)
-            
-            logging.info(f"Dashboard de status das ações gerado e salvo em: {output_path}")
-            
+            with telemetry.span(f"render.{kind}"):
+                _log_dashboard(label, dashboards.render(kind, analysis, output_path), output_path)
         except Exception as e:
-            logging.error(f"Erro ao gerar dashboard de status das ações: {e}")
+            logging.error(f"Erro ao gerar dashboard de {label}: {e}")
+
+    async def _arender_dashboard(self, kind: str, analysis: Dict[str, Any], output_path: str,
+                                 renderer: Optional[dashboards.DashboardPool]) -> None:
+        """Renderiza no pool de processos, se houver; senão numa thread."""
+        if renderer is None:
+            return await asyncio.to_thread(self._render_dashboard, kind, analysis, output_path)
+        label = DASHBOARD_LABELS[kind]
+        try:
+            with telemetry.span(f"render.{kind}"):  # inclui a espera na fila do pool
+                status = await asyncio.wrap_future(renderer.submit(kind, analysis, output_path))
+            _log_dashboard(label, status, output_path)
+        except Exception as e:
+            logging.error(f"Erro ao gerar dashboard de {label}: {e}")
     
     def _clean_json_string(self, json_string: str) -> str:
         """
@@ -658,51 +673,170 @@ class InventoryTrackingAgent:
         """
         Executa um ciclo completo de análise e gera todos os relatórios.
         """
-        os.makedirs(output_dir, exist_ok=True)
-        report_path = os.path.join(output_dir, f"relatorio_quinzenal_ciclo_{cycle_number}.md")
-        metrics_dashboard_path = os.path.join(output_dir, f"dashboard_metricas_ciclo_{cycle_number}.png")
-        actions_dashboard_path = os.path.join(output_dir, f"dashboard_acoes_ciclo_{cycle_number}.png")
+        paths = self._cycle_paths(output_dir, cycle_number)
+
+        with telemetry.span("cycle"):
+            # Só carrega dados se scenario_pattern não for None (modo antigo)
+            if scenario_pattern is not None:
+                with telemetry.span("load"):
+                    self.load_data(scenario_pattern, action_plan_path, problem_analysis_path)
 
-        # Só carrega dados se scenario_pattern não for None (modo antigo)
-        if scenario_pattern is not None:
-            self.load_data(scenario_pattern, action_plan_path, problem_analysis_path)
+            metrics_analysis = self.analyze_metrics()
+            action_status = self.track_actions(metrics_analysis)
+            self.generate_report(metrics_analysis, action_status, cycle_number, paths["report"])
+            self.generate_metrics_dashboard(metrics_analysis, paths["metrics_dashboard"])
+            self.generate_action_status_dashboard(action_status, paths["actions_dashboard"])
+        return paths
+
+    async def arun_analysis_cycle(self, cycle_number: int, output_dir: str = "./output",
+                                  limiter: Optional[RateLimiter] = None,
+                                  renderer: Optional[dashboards.DashboardPool] = None) -> Dict[str, str]:
+        """
+        Ciclo completo assíncrono (dados já carregados). Cada dashboard é renderizado
+        assim que sua entrada fica pronta, em paralelo com a próxima chamada ao LLM:
+        no pool de processos `renderer`, se houver, senão numa thread.
+        """
+        paths = self._cycle_paths(output_dir, cycle_number)
 
-        metrics_analysis = self.analyze_metrics()
-        action_status = self.track_actions(metrics_analysis)
-        report = self.generate_report(metrics_analysis, action_status, cycle_number, report_path)
-        self.generate_metrics_dashboard(metrics_analysis, metrics_dashboard_path)
-        self.generate_action_status_dashboard(action_status, actions_dashboard_path)
+        with telemetry.span("cycle"):
+            metrics_analysis = await self.aanalyze_metrics(limiter)
+            metrics_dashboard = asyncio.create_task(self._arender_dashboard(
+                "metricas", metrics_analysis, paths["metrics_dashboard"], renderer))
+            action_status = await self.atrack_actions(metrics_analysis, limiter)
+            actions_dashboard = asyncio.create_task(self._arender_dashboard(
+                "acoes", action_status, paths["actions_dashboard"], renderer))
+            await self.agenerate_report(metrics_analysis, action_status, cycle_number, paths["report"], limiter)
+            await asyncio.gather(metrics_dashboard, actions_dashboard)
+        return paths
 
+    @staticmethod
+    def _cycle_paths(output_dir: str, cycle_number: int) -> Dict[str, str]:
+        os.makedirs(output_dir, exist_ok=True)
         return {
-            "report": report_path,
-            "metrics_dashboard": metrics_dashboard_path,
-            "actions_dashboard": actions_dashboard_path
+            "report": os.path.join(output_dir, f"relatorio_quinzenal_ciclo_{cycle_number}.md"),
+            "metrics_dashboard": os.path.join(output_dir, f"dashboard_metricas_ciclo_{cycle_number}.png"),
+            "actions_dashboard": os.path.join(output_dir, f"dashboard_acoes_ciclo_{cycle_number}.png")
         }
 
+
+################################################################################
+# Execução concorrente (vários contratantes)
+################################################################################
+
+def list_contratantes(database_path: str) -> List[str]:
+    """Contratantes presentes no store colunar ou no database.csv."""
+    if os.path.isdir(database_path):
+        from metric_store import TENANT_COL, read_metrics
+        ids = read_metrics(database_path, columns=[])[TENANT_COL].unique()
+    else:
+        ids = pd.read_csv(database_path, usecols=["contratante"], dtype=str)["contratante"].unique()
+    return [str(i) for i in ids]
+
+
+async def run_cycles_concurrently(contratantes: List[str], database_path: str,
+                                  action_plan_path: str, problem_analysis_path: str,
+                                  output_dir: str = "./output", *, max_concurrency: int = 4,
+                                  tokens_per_minute: Optional[int] = None,
+                                  model_name: str = "gpt-4o", temp: float = 0.2,
+                                  render_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Roda o ciclo de análise de vários contratantes ao mesmo tempo.
+
+    Todas as chamadas ao LLM passam por um único RateLimiter (concorrência + TPM) e
+    recuam com backoff exponencial em rate limit. Os dashboards de todos os
+    contratantes saem de um único pool de processos (`render_workers`, padrão: nº
+    de CPUs), que nem sobe se forem poucos PNGs. Os caminhos de plano/análise aceitam o marcador {contratante}. Cada
+    contratante grava em <output_dir>/<contratante>/.
+
+    Returns:
+        contratante -> caminhos gerados (dict) ou a exceção que interrompeu o ciclo
+    """
+    limiter = RateLimiter(max_concurrency, tokens_per_minute)
+    # limita contratantes carregados em memória ao mesmo tempo (dados + análises intermediárias)
+    in_flight = asyncio.Semaphore(max_concurrency * 2)
+
+    async def one(contratante: str) -> Dict[str, str]:
+        def load() -> InventoryTrackingAgent:
+            agent = InventoryTrackingAgent(model_name=model_name, temp=temp, max_retries=0)
+            agent.load_data_from_database(database_path, contratante,
+                                          action_plan_path.format(contratante=contratante),
+                                          problem_analysis_path.format(contratante=contratante))
+            return agent
+
+        async with in_flight:
+            with telemetry.tenant(contratante):  # contexto da task: vale p/ a thread do load e os chains
+                with telemetry.span("load"):
+                    agent = await asyncio.to_thread(load)
+                return await agent.arun_analysis_cycle(agent.cycle_count or 1,
+                                                       os.path.join(output_dir, contratante), limiter, renderer)
+
+    with dashboards.DashboardPool(render_workers, jobs=2 * len(contratantes)) as renderer:
+        results = await asyncio.gather(*(one(c) for c in contratantes), return_exceptions=True)
+    logging.info(f"Dashboards: {renderer.stats}")
+    for contratante, res in zip(contratantes, results):
+        if isinstance(res, Exception):
+            logging.error(f"Ciclo do contratante {contratante} falhou: {res}")
+    return dict(zip(contratantes, results))
+
+
+def main_concurrent(argv: List[str]) -> int:
+    """Modo não interativo: ciclos de todos (ou alguns) contratantes em paralelo."""
+    p = argparse.ArgumentParser(description="Acompanhamento quinzenal concorrente (vários contratantes)")
+    p.add_argument("--database", required=True, help="Store de métricas (diretório) ou database.csv")
+    p.add_argument("--contratantes", nargs="*", help="Contratantes a processar (padrão: todos do database)")
+    p.add_argument("--action_plan", default="./plans/action_plan_pt_cenario_a.md",
+                   help="Plano de ação; aceita {contratante} no caminho")
+    p.add_argument("--problem_analysis", default="./plans/problem_analysis_pt_cenario_a.md",
+                   help="Análise de problemas; aceita {contratante} no caminho")
+    p.add_argument("--output_dir", default="./output")
+    p.add_argument("--max_concurrency", type=int, default=4, help="Chamadas ao LLM em voo ao mesmo tempo")
+    p.add_argument("--tpm", type=int, default=None, help="Limite de tokens por minuto (todas as chamadas)")
+    p.add_argument("--model", default="gpt-4o")
+    p.add_argument("--render_workers", type=int, default=None,
+                   help="Processos renderizando dashboards (padrão: nº de CPUs)")
+    args = p.parse_args(argv)
+
+    telemetry.configure(job="quinzenal")
+    contratantes = args.contratantes or list_contratantes(args.database)
+    results = asyncio.run(run_cycles_concurrently(
+        contratantes, args.database, args.action_plan, args.problem_analysis, args.output_dir,
+        max_concurrency=args.max_concurrency, tokens_per_minute=args.tpm, model_name=args.model,
+        render_workers=args.render_workers))
+    failed = [c for c, r in results.items() if isinstance(r, Exception)]
+    print(f"\n=== {len(results) - len(failed)}/{len(results)} CICLOS CONCLUÍDOS ===")
+    for c in failed:
+        print(f"ERRO [{c}]: {results[c]}")
+    return 1 if failed else 0
+
 def main():
     """Função principal para executar o agente de acompanhamento quinzenal."""
+    if len(sys.argv) > 1:  # argumentos na linha de comando ➜ modo concorrente
+        return main_concurrent(sys.argv[1:])
     print("=== AGENTE DE ACOMPANHAMENTO QUINZENAL DE ESTOQUE ===")
     print("Este agente analisa a evolução das métricas de estoque e acompanha o progresso das ações implementadas.")
 
     # Novo fluxo para usar database.csv
-    database_path = str(input("Digite o caminho para o arquivo database.csv (ex: './cenarios/database.csv'): ")) or "./cenarios/database.csv"
+    database_path = str(input("Digite o caminho para o store de métricas ou o arquivo database.csv (ex: './metric_store' ou './cenarios/database.csv'): ")) or "./cenarios/database.csv"
     contratante = str(input("Digite o nome do contratante (ex: 'a_0'): "))
     action_plan_path = str(input("Digite o caminho para o arquivo do plano de ação (ex: './plans/action_plan_pt_cenario_a.md'): ")) or "./plans/action_plan_pt_cenario_a.md"
     problem_analysis_path = str(input("Digite o caminho para o arquivo de análise de problemas (ex: './plans/problem_analysis_pt_cenario_a.md'): ")) or "./plans/problem_analysis_pt_cenario_a.md"
     output_dir = input("Digite o diretório de saída para os relatórios (ex: './output'): ") or "./output"
 
+    telemetry.configure(job="quinzenal")
     try:
-        agent = InventoryTrackingAgent(model_name="gpt-4o", temp=0.2)
-        agent.load_data_from_database(database_path, contratante, action_plan_path, problem_analysis_path)
-        cycle_number = getattr(agent, 'cycle_count', 1)
-        # Executa o ciclo de análise
-        output_files = agent.run_analysis_cycle(
-            scenario_pattern=None,  # Não usado neste fluxo
-            action_plan_path=action_plan_path,
-            problem_analysis_path=problem_analysis_path,
-            cycle_number=cycle_number,
-            output_dir=output_dir
-        )
+        with telemetry.tenant(contratante):
+            agent = InventoryTrackingAgent(model_name="gpt-4o", temp=0.2)
+            with telemetry.span("load"):
+                agent.load_data_from_database(database_path, contratante, action_plan_path, problem_analysis_path)
+            cycle_number = getattr(agent, 'cycle_count', 1)
+            # Executa o ciclo de análise
+            output_files = agent.run_analysis_cycle(
+                scenario_pattern=None,  # Não usado neste fluxo
+                action_plan_path=action_plan_path,
+                problem_analysis_path=problem_analysis_path,
+                cycle_number=cycle_number,
+                output_dir=output_dir
+            )
         print("\n=== ANÁLISE CONCLUÍDA COM SUCESSO ===")
         print(f"Relatório quinzenal: {output_files['report']}")
         print(f"Dashboard de métricas: {output_files['metrics_dashboard']}")
@@ -0,0 +1,99 @@
+"""Limite global de chamadas ao LLM para execuções concorrentes (asyncio).
+
+- `RateLimiter` combina um semáforo (nº máximo de chamadas em voo) com um balde
+  de tokens por minuto (TPM). Cada chamada reserva antes a sua estimativa de
+  tokens (prompt + resposta); o balde reabastece continuamente.
+- `call_with_backoff` envolve uma corrotina de chamada ao LLM: em RateLimitError
+  espera com backoff exponencial + jitter (ou o `retry-after` da API) e pausa o
+  limitador inteiro, para que as demais tarefas também recuem.
+
+O tempo total de N contratantes passa a ser limitado pela vazão da API
+(TPM / concorrência), não pela soma das latências.
+"""
+from __future__ import annotations
+import asyncio, logging, random, time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from token_count import count_tokens
+
+T = TypeVar("T")
+
+
+def estimate_tokens(text: str, completion_tokens: int = 0, model: str = "gpt-4o") -> int:
+    """Tokens de um prompt (+ resposta esperada) p/ reservar no balde antes da chamada."""
+    return count_tokens(text, model) + completion_tokens
+
+
+class RateLimiter:
+    """Semáforo de concorrência + balde de tokens por minuto, compartilhado entre tarefas."""
+
+    def __init__(self, max_concurrency: int = 4, tokens_per_minute: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        rate = self.tokens_per_minute / 60.0
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    async def _reserve(self, tokens: int) -> None:
+        if not self.tokens_per_minute:
+            return
+        tokens = min(tokens, self.tokens_per_minute)  # prompt maior que o balde: espera o balde cheio
+        async with self._lock:  # FIFO: quem chegou antes reserva antes
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / (self.tokens_per_minute / 60.0))
+
+    async def _wait_pause(self) -> None:
+        while (delay := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Suspende novas chamadas por `seconds` (usado após um 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        await self._wait_pause()
+        await self._reserve(tokens)
+        async with self._sem:
+            yield
+
+
+def _retry_after(exc: openai.RateLimitError) -> Optional[float]:
+    try:
+        return float(exc.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def call_with_backoff(fn: Callable[[], Awaitable[T]], limiter: RateLimiter, tokens: int = 0, *,
+                            max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                            label: str = "") -> T:
+    """Executa `fn()` dentro do limitador, repetindo em RateLimitError com backoff exponencial."""
+    for attempt in range(max_retries + 1):
+        try:
+            async with limiter.slot(tokens):
+                return await fn()
+        except openai.RateLimitError as e:
+            if attempt == max_retries:
+                raise
+            delay = _retry_after(e) or min(max_delay, base_delay * 2 ** attempt) * (1 + random.random())
+            logging.warning(f"Rate limit{f' ({label})' if label else ''}; nova tentativa em {delay:.1f}s "
+                            f"({attempt + 1}/{max_retries})")
+            limiter.pause(delay)
+            await asyncio.sleep(delay)
+    raise AssertionError("inalcançável")
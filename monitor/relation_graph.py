@@ -0,0 +1,289 @@
+"""Grafo compilado problema ⇄ ação ⇄ métrica.
+
+Compila o relation_action_problem_metrics.json (gerado por
+create_relation_action_problem_metrics_file.py) junto com as descrições de
+problemas_identificados.csv e acoes_planejamento.csv num grafo indexado:
+
+- cada nó (problema, ação, métrica) vira um inteiro (posição na lista do tipo);
+- cada relação é uma matriz de adjacência CSR (indptr + indices, int32),
+  nos dois sentidos: problema ➜ ação/métrica, ação ➜ métrica e os inversos;
+- os atributos de problemas e ações (descrição, impacto esperado, data de
+  implementação) ficam numa lista por nó, por plano quando o CSV tem
+  id_planejamento.
+
+Consultas como "ações que afetam a métrica m" ou "métricas alcançáveis a partir
+do problema p" custam O(grau). O grafo é gravado em <input_dir>/.relation_graph.npz
+(sem pickle) e só é recompilado quando algum arquivo de origem muda.
+
+Uso
+---
+$ python relation_graph.py compile ./data
+$ python relation_graph.py query ./data --metric percent_sku_com_estoque_negativo
+$ python relation_graph.py query ./data --problem 1
+"""
+from __future__ import annotations
+import argparse, json, logging, sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import disk_cache
+
+CACHE_NAME = ".relation_graph.npz"
+CACHE_VERSION = 1
+RELATION_FILE = "relation_action_problem_metrics.json"
+PROBLEMS_FILE = "problemas_identificados.csv"
+ACTIONS_FILE = "acoes_planejamento.csv"
+SOURCES = [RELATION_FILE, PROBLEMS_FILE, ACTIONS_FILE]
+ACTION_FIELDS = ["descricao", "implementada_em", "impacto_esperado"]
+ANY_PLAN = "*"
+
+# relação ➜ (tipo de origem, tipo de destino); os inversos são derivados na compilação
+EDGES = {"pa": ("problem", "action"), "pm": ("problem", "metric"), "am": ("action", "metric")}
+INVERSE = {"ap": "pa", "mp": "pm", "ma": "am"}
+
+################################################################################
+# Grafo
+################################################################################
+
+def _csr(src: np.ndarray, dst: np.ndarray, n_src: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Arestas (src, dst) ➜ CSR; vizinhos de cada nó na ordem em que as arestas aparecem."""
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n_src + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_src), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+
+class RelationGraph:
+    def __init__(self, nodes: Dict[str, List[str]], adj: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                 attrs: Dict[str, List[Dict[str, Any]]], meta: Optional[Dict[str, Any]] = None):
+        self.nodes = {kind: list(names) for kind, names in nodes.items()}
+        self.index = {kind: {n: i for i, n in enumerate(names)} for kind, names in self.nodes.items()}
+        self.adj = adj
+        self.attrs = attrs
+        self.meta = meta or {}
+
+    # ------------------------------------------------------------------ consulta
+    def _kind(self, rel: str) -> Tuple[str, str]:
+        if rel in EDGES:
+            return EDGES[rel]
+        src, dst = EDGES[INVERSE[rel]]
+        return dst, src
+
+    def neighbor_ids(self, rel: str, i: int) -> np.ndarray:
+        indptr, indices = self.adj[rel]
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def neighbors(self, rel: str, key: str) -> List[str]:
+        """Vizinhos de `key` pela relação `rel` (pa, pm, am, ap, mp, ma), em O(grau)."""
+        src, dst = self._kind(rel)
+        i = self.index[src].get(str(key))
+        if i is None:
+            return []
+        names = self.nodes[dst]
+        return [names[j] for j in self.neighbor_ids(rel, i)]
+
+    def problems(self) -> List[str]:
+        return self.nodes["problem"]
+
+    def actions(self) -> List[str]:
+        return self.nodes["action"]
+
+    def actions_for_problem(self, pid: str) -> List[str]:
+        return self.neighbors("pa", pid)
+
+    def metrics_for_problem(self, pid: str) -> List[str]:
+        return self.neighbors("pm", pid)
+
+    def metrics_for_action(self, aid: str) -> List[str]:
+        return self.neighbors("am", aid)
+
+    def problems_for_action(self, aid: str) -> List[str]:
+        return self.neighbors("ap", aid)
+
+    def problems_for_metric(self, mid: str) -> List[str]:
+        return self.neighbors("mp", mid)
+
+    def actions_for_metric(self, mid: str) -> List[str]:
+        return self.neighbors("ma", mid)
+
+    def reachable_metrics(self, pid: str) -> List[str]:
+        """Métricas do problema e das ações ligadas a ele (sem repetição, em ordem de descoberta)."""
+        i = self.index["problem"].get(str(pid))
+        if i is None:
+            return []
+        ids = dict.fromkeys(self.neighbor_ids("pm", i).tolist())
+        for a in self.neighbor_ids("pa", i):
+            ids.update(dict.fromkeys(self.neighbor_ids("am", a).tolist()))
+        names = self.nodes["metric"]
+        return [names[j] for j in ids]
+
+    def info(self, kind: str, key: str, planejamento=None) -> Dict[str, Any]:
+        """Atributos de um problema/ação no plano (ou os sem plano)."""
+        i = self.index[kind].get(str(key))
+        if i is None:
+            return {}
+        by_plan = self.attrs[kind][i]
+        if planejamento is not None and str(planejamento) in by_plan:
+            return by_plan[str(planejamento)]
+        if ANY_PLAN in by_plan:
+            return by_plan[ANY_PLAN]
+        # CSV por plano: sem plano pedido vale a 1ª linha; plano sem linha ➜ vazio
+        return next(iter(by_plan.values()), {}) if planejamento is None else {}
+
+    # ------------------------------------------------------------ serialização
+    def save(self, path: str | Path, sources: Optional[Dict[str, Any]] = None) -> None:
+        disk_cache.write_atomic(path, lambda tmp: self._write_npz(tmp, sources))
+
+    def _write_npz(self, path: Path, sources: Optional[Dict[str, Any]]) -> None:
+        arrays: Dict[str, np.ndarray] = {}
+        for rel, (indptr, indices) in self.adj.items():
+            arrays[f"{rel}_indptr"], arrays[f"{rel}_indices"] = indptr, indices
+        for kind, names in self.nodes.items():
+            arrays[f"{kind}_names"] = np.array(names, dtype=str)
+        header = {"version": CACHE_VERSION, "sources": sources or {}, "attrs": self.attrs, "meta": self.meta}
+        arrays["header"] = np.array(json.dumps(header, ensure_ascii=False, default=str))
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str | Path) -> Tuple["RelationGraph", Dict[str, Any]]:
+        """(grafo, cabeçalho) do arquivo .npz gravado por `save`."""
+        with np.load(path, allow_pickle=False) as z:
+            header = json.loads(str(z["header"]))
+            nodes = {kind: z[f"{kind}_names"].tolist() for kind in ("problem", "action", "metric")}
+            adj = {rel: (z[f"{rel}_indptr"], z[f"{rel}_indices"]) for rel in [*EDGES, *INVERSE]}
+        return cls(nodes, adj, header["attrs"], header.get("meta")), header
+
+################################################################################
+# Compilação
+################################################################################
+
+def _clean(v: Any) -> Any:
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+def _attrs_by_id(df: Optional[pd.DataFrame], id_col: str, fields: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """{id: {plano | '*': {campo: valor}}}, primeira linha de cada (id, plano)."""
+    out: Dict[str, Dict[str, Any]] = {}
+    if df is None or df.empty:
+        return out
+    has_plan = "id_planejamento" in df.columns
+    cols = [c for c in fields if c in df.columns]
+    for rec in df.to_dict("records"):
+        plan = str(rec["id_planejamento"]) if has_plan else ANY_PLAN
+        out.setdefault(str(rec[id_col]), {}).setdefault(plan, {c: _clean(rec[c]) for c in cols})
+    return out
+
+
+def compile_graph(rel_map: Dict[str, Any], df_prob: Optional[pd.DataFrame] = None,
+                  df_acoes: Optional[pd.DataFrame] = None) -> RelationGraph:
+    problems = [str(p) for p in rel_map.get("problems", {})]
+    actions: Dict[str, None] = dict.fromkeys(str(a) for a in rel_map.get("actions", {}))
+    metrics: Dict[str, None] = {}
+    edges: Dict[str, List[Tuple[str, str]]] = {rel: [] for rel in EDGES}
+
+    for pid, pdata in rel_map.get("problems", {}).items():
+        for aid in pdata.get("action_ids", []):
+            actions.setdefault(str(aid))
+            edges["pa"].append((str(pid), str(aid)))
+        for mid in pdata.get("metric_ids", []):
+            metrics.setdefault(mid)
+            edges["pm"].append((str(pid), mid))
+    for aid, adata in rel_map.get("actions", {}).items():
+        for mid in adata.get("metric_ids", []):
+            metrics.setdefault(mid)
+            edges["am"].append((str(aid), mid))
+
+    nodes = {"problem": problems, "action": list(actions), "metric": list(metrics)}
+    index = {kind: {n: i for i, n in enumerate(names)} for kind, names in nodes.items()}
+    adj: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    for rel, (src_kind, dst_kind) in EDGES.items():
+        src = np.array([index[src_kind][s] for s, _ in edges[rel]], dtype=np.int64)
+        dst = np.array([index[dst_kind][d] for _, d in edges[rel]], dtype=np.int64)
+        adj[rel] = _csr(src, dst, len(nodes[src_kind]))
+    for inv, rel in INVERSE.items():
+        src_kind, dst_kind = EDGES[rel]
+        indptr, indices = adj[rel]
+        src = np.repeat(np.arange(len(nodes[src_kind])), np.diff(indptr))
+        adj[inv] = _csr(indices.astype(np.int64), src, len(nodes[dst_kind]))
+
+    prob_attrs = _attrs_by_id(df_prob, "problem_id", ["descricao"])
+    act_attrs = _attrs_by_id(df_acoes, "action_id", ACTION_FIELDS)
+    attrs = {
+        "problem": [prob_attrs.get(p, {}) for p in nodes["problem"]],
+        "action": [act_attrs.get(a, {}) for a in nodes["action"]],
+    }
+    meta = {k: rel_map.get(k) for k in ("schema_version", "contratante", "planejamento")}
+    return RelationGraph(nodes, adj, attrs, meta)
+
+
+def build_graph(base_dir: str | Path) -> RelationGraph:
+    base_dir = Path(base_dir)
+    with open(base_dir / RELATION_FILE, "r", encoding="utf-8") as fp:
+        rel_map = json.load(fp)
+    read = lambda name: pd.read_csv(base_dir / name) if (base_dir / name).is_file() else None  # noqa: E731
+    return compile_graph(rel_map, read(PROBLEMS_FILE), read(ACTIONS_FILE))
+
+
+def load_graph(base_dir: str | Path, cache_path: str | Path | None = None) -> RelationGraph:
+    """Grafo do diretório, lido do .npz se os arquivos de origem não mudaram."""
+    base_dir = Path(base_dir)
+    cache_path = Path(cache_path) if cache_path else base_dir / CACHE_NAME
+    fp = disk_cache.fingerprint(base_dir, SOURCES)
+    if cache_path.is_file():
+        try:
+            graph, header = RelationGraph.load(cache_path)
+            if header.get("version") == CACHE_VERSION and header.get("sources") == fp:
+                return graph
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"cache {cache_path} ilegível ({e!r}); recompilando")
+    graph = build_graph(base_dir)
+    disk_cache.save_cache(cache_path, lambda tmp: graph._write_npz(tmp, fp))
+    return graph
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Grafo compilado problema ⇄ ação ⇄ métrica")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("compile", help="Compila (ou recompila) o grafo do diretório")
+    c.add_argument("input_dir")
+    q = sub.add_parser("query", help="Vizinhos de um nó")
+    q.add_argument("input_dir")
+    g = q.add_mutually_exclusive_group(required=True)
+    g.add_argument("--metric")
+    g.add_argument("--action")
+    g.add_argument("--problem")
+    args = p.parse_args()
+
+    base_dir = Path(args.input_dir)
+    if args.cmd == "compile":
+        graph = build_graph(base_dir)
+        graph.save(base_dir / CACHE_NAME, disk_cache.fingerprint(base_dir, SOURCES))
+        n = {k: len(v) for k, v in graph.nodes.items()}
+        print(f"{n['problem']} problemas, {n['action']} ações, {n['metric']} métricas ➜ {base_dir / CACHE_NAME}")
+        return 0
+
+    graph = load_graph(base_dir)
+    if args.metric:
+        out = {"problemas": graph.problems_for_metric(args.metric), "acoes": graph.actions_for_metric(args.metric)}
+    elif args.action:
+        out = {"problemas": graph.problems_for_action(args.action), "metricas": graph.metrics_for_action(args.action),
+               **graph.info("action", args.action)}
+    else:
+        out = {"acoes": graph.actions_for_problem(args.problem), "metricas": graph.metrics_for_problem(args.problem),
+               "metricas_alcancaveis": graph.reachable_metrics(args.problem), **graph.info("problem", args.problem)}
+    print(json.dumps(out, ensure_ascii=False, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""Seções numéricas do relatório quinzenal, renderizadas direto do snapshot.
+
+Painel de métricas-objetivo, alertas, tendências das métricas observacionais e
+avaliação de ações saem daqui, com formatação pt-BR (1.234,56) e marcadores
+🔴/✅. O LLM escreve só as seções narrativas (Resumo Executivo e
+Recomendações); `render_report` junta as duas partes.
+"""
+from __future__ import annotations
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from metric_engine import TREND_FLAT
+from snapshot_compactor import rank_metrics
+
+EMPTY = "—"
+
+STATUS_LABEL = {
+    "acima_meta": "✅ Acima da meta",
+    "dentro_meta": "✅ Dentro da meta",
+    "abaixo_meta": "🔴 Abaixo da meta",
+    "sem_meta": EMPTY,
+}
+SEVERITY_MARK = {"alta": "🔴", "média": "🟠", "media": "🟠", "baixa": "🟡"}
+EFFICACY_LABEL = {"alta": "✅ Alta", "média": "Média", "baixa": "Baixa", "contrária": "🔴 Contrária"}
+TREND_LABEL = {
+    "up_fast": "⬆️ Alta forte", "up": "↗️ Alta", TREND_FLAT: "➡️ Estável",
+    "down": "↘️ Queda", "down_fast": "⬇️ Queda forte",
+}
+
+################################################################################
+# Formatação pt-BR
+################################################################################
+
+def fmt_num(v: Any, decimals: int = 2) -> str:
+    """1234.5 ➜ '1.234,50'; inteiros sem casas decimais; None ➜ '—'."""
+    if v is None or isinstance(v, bool):
+        return EMPTY
+    if not isinstance(v, (int, float)):
+        return str(v)
+    if v != v:  # NaN
+        return EMPTY
+    if float(v).is_integer():
+        decimals = 0
+    txt = f"{v:,.{decimals}f}"
+    return txt.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def fmt_pct(v: Optional[float], decimals: int = 1) -> str:
+    if v is None or v != v:
+        return EMPTY
+    return f"{'+' if v > 0 else ''}{fmt_num(round(v, decimals), decimals)}%"
+
+
+def fmt_date(iso: Optional[str]) -> str:
+    if not iso:
+        return EMPTY
+    try:
+        return datetime.fromisoformat(str(iso)).strftime("%d/%m/%Y")
+    except ValueError:
+        return str(iso)
+
+
+def _cell(v: Any) -> str:
+    return str(v).replace("|", "\\|").replace("\n", " ")
+
+
+def _table(header: Sequence[str], rows: List[Sequence[Any]]) -> str:
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join("---" for _ in header) + "|"]
+    lines += ["| " + " | ".join(_cell(c) for c in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+################################################################################
+# Seções
+################################################################################
+
+def _metric_name(snapshot: Dict[str, Any], mid: str) -> str:
+    return snapshot.get("metrics", {}).get(mid, {}).get("name") or mid
+
+
+def metrics_panel(snapshot: Dict[str, Any]) -> str:
+    """Tabela Métrica | Baseline | Atual | Meta | Δ% | Status (métricas com meta, críticas primeiro)."""
+    metrics = snapshot.get("metrics", {})
+    rows = [
+        [m.get("name") or mid, fmt_num(m.get("baseline")), fmt_num(m.get("current")),
+         fmt_num(m.get("target")), fmt_pct(m.get("delta_pct")), STATUS_LABEL.get(m.get("status"), EMPTY)]
+        for mid in rank_metrics(snapshot) if (m := metrics[mid]).get("has_target")
+    ]
+    if not rows:
+        return "_Nenhuma métrica com meta definida._"
+    return _table(["Métrica", "Baseline", "Atual", "Meta", "Δ%", "Status"], rows)
+
+
+_SLOPE_RE = re.compile(r"slope (-?\d+(?:\.\d+)?)")
+
+
+def _alert_text(snapshot: Dict[str, Any], al: Dict[str, Any]) -> str:
+    """Texto do alerta com números em pt-BR (o `detail` do snapshot vem em formato en)."""
+    m = snapshot.get("metrics", {}).get(al.get("metric"), {})
+    issue = al.get("issue")
+    if issue == "abaixo_meta" and m:
+        return (f"atual {fmt_num(m.get('current'))} fora da meta {fmt_num(m.get('target'))} "
+                f"(Δ {fmt_pct(m.get('delta_pct'))} vs baseline)")
+    if issue in TREND_LABEL:
+        slope = _SLOPE_RE.search(al.get("detail") or "")
+        suffix = f" — inclinação de {fmt_num(float(slope.group(1)), 3)} por dia" if slope else ""
+        return TREND_LABEL[issue] + suffix
+    return al.get("detail") or issue or EMPTY
+
+
+def alerts_list(snapshot: Dict[str, Any]) -> str:
+    alerts = [al for al in snapshot.get("alerts", []) if isinstance(al, dict)]
+    if not alerts:
+        return "✅ Nenhum alerta no período."
+    alerts.sort(key=lambda al: 0 if al.get("severity") == "alta" else 1)
+    return "\n".join(
+        f"- {SEVERITY_MARK.get(al.get('severity'), '🔴')} **{_metric_name(snapshot, al.get('metric'))}**"
+        f" — {_alert_text(snapshot, al)}"
+        for al in alerts
+    )
+
+
+def trends_table(snapshot: Dict[str, Any]) -> str:
+    """Métricas observacionais (sem meta) que não estão estáveis."""
+    metrics = snapshot.get("metrics", {})
+    rows = [
+        [m.get("name") or mid, fmt_num(m.get("current")), fmt_pct(m.get("delta_pct")),
+         TREND_LABEL.get(m.get("trend"), m.get("trend") or EMPTY)]
+        for mid in rank_metrics(snapshot)
+        if not (m := metrics[mid]).get("has_target") and m.get("trend") not in (None, TREND_FLAT)
+    ]
+    if not rows:
+        return "_Métricas observacionais estáveis no período._"
+    return _table(["Métrica", "Atual", "Δ%", "Tendência"], rows)
+
+
+def actions_table(snapshot: Dict[str, Any]) -> str:
+    """Tabela Ação | Implementada | Eficácia | Métricas afetadas | Próximos Passos."""
+    rows = []
+    for a in snapshot.get("actions", []):
+        observed = a.get("observado")
+        efficacy = EFFICACY_LABEL.get(a.get("eficacia"), a.get("eficacia") or EMPTY)
+        if observed is not None:
+            efficacy += f" (efeito {fmt_num(observed)} dp)" if isinstance(observed, (int, float)) else f" ({observed})"
+        rows.append([
+            a.get("descricao") or a.get("action_id"),
+            fmt_date(a.get("implementada_em")),
+            efficacy,
+            ", ".join(_metric_name(snapshot, m) for m in a.get("metric_ids", [])) or EMPTY,
+            (a.get("recomendacao") or EMPTY).replace("_", " "),
+        ])
+    if not rows:
+        return "_Nenhuma ação cadastrada._"
+    return _table(["Ação", "Implementada", "Eficácia", "Métricas afetadas", "Próximos Passos"], rows)
+
+################################################################################
+# Montagem
+################################################################################
+
+_SECTION_RE = re.compile(r"^#{1,6}\s*(?:\d+\.\s*)?(resumo executivo|recomenda\w*)", re.IGNORECASE | re.MULTILINE)
+
+
+def split_narrative(text: str) -> Dict[str, str]:
+    """Separa a resposta do LLM em {'resumo': ..., 'recomendacoes': ...} pelos títulos."""
+    parts: Dict[str, str] = {}
+    matches = list(_SECTION_RE.finditer(text))
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        line_end = text.find("\n", m.end())
+        body = text[end if line_end == -1 else line_end + 1:end].strip()
+        parts["resumo" if m.group(1).lower().startswith("resumo") else "recomendacoes"] = body
+    if not parts:  # sem títulos: tudo vira resumo
+        parts["resumo"] = text.strip()
+    return parts
+
+
+def render_report(snapshot: Dict[str, Any], narrative: str, periodo: str) -> str:
+    """Relatório completo: narrativa do LLM + seções numéricas determinísticas."""
+    parts = split_narrative(narrative)
+    sections = [
+        f"# Relatório Quinzenal — Contratante {snapshot.get('contratante_id', '?')}",
+        f"_Período: {periodo}_",
+        "## 1. Resumo Executivo", parts.get("resumo", EMPTY),
+        "## 2. Painel de Métricas-Objetivo", metrics_panel(snapshot),
+        "## 3. Alertas", alerts_list(snapshot),
+        "## 4. Tendências & Insights", trends_table(snapshot),
+        "## 5. Avaliação de Ações", actions_table(snapshot),
+        "## 6. Recomendações", parts.get("recomendacoes", EMPTY),
+    ]
+    return "\n\n".join(sections) + "\n"
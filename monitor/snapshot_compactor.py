@@ -0,0 +1,181 @@
+"""Compactação do snapshot estruturado para o prompt do relatório.
+
+Em vez de cortar o JSON num nº fixo de caracteres (o que quebrava o JSON no
+meio e podia descartar os alertas), monta um contexto que:
+
+- é sempre JSON válido;
+- cabe num orçamento de tokens contado com o tokenizador do modelo (token_count);
+- usa codificação tabular (`columns` + `rows`) p/ métricas, alertas, ações e
+  problemas, sem repetir os nomes dos campos em cada item;
+- inclui as linhas por prioridade: alertas (mais severos primeiro), métricas
+  críticas, ações, problemas e, por fim, as demais métricas;
+- informa em `omitidos` quantas linhas de cada tabela ficaram de fora.
+
+Ordem das métricas (`rank_metrics`): severidade do alerta ➜ fora da meta ➜
+desvio relativo à meta ➜ velocidade da tendência (rótulo e |slope| / |atual|).
+
+Uso
+---
+$ python snapshot_compactor.py structured_snapshot.json --budget 1500
+"""
+from __future__ import annotations
+import argparse, json, sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from token_count import DEFAULT_MODEL, count_tokens
+
+DEFAULT_BUDGET = 2000  # tokens do bloco de contexto
+
+SEVERITY_RANK = {"alta": 3, "média": 2, "media": 2, "baixa": 1}
+TREND_RANK = {"up_fast": 2, "down_fast": 2, "up": 1, "down": 1, "flat": 0}
+
+ALERT_COLUMNS = ["metric", "issue", "severity", "detail"]
+ACTION_COLUMNS = ["action_id", "descricao", "implementada_em", "metric_ids",
+                  "impacto_esperado", "observado", "eficacia", "recomendacao"]
+PROBLEM_COLUMNS = ["problem_id", "descricao", "status", "metric_ids", "action_ids"]
+HEADER_KEYS = ["contratante_id", "planejamento_id", "window", "next_report_due", "llm_summary"]
+
+################################################################################
+# Priorização
+################################################################################
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _num(v: Any) -> Any:
+    """Arredonda floats (menos tokens); mantém o resto como está."""
+    if isinstance(v, float):
+        v = round(v, 4)
+        return int(v) if v.is_integer() else v
+    return v
+
+
+def _alert_severity(snapshot: Dict[str, Any]) -> Dict[str, int]:
+    sev: Dict[str, int] = {}
+    for al in snapshot.get("alerts", []):
+        if isinstance(al, dict) and "metric" in al:
+            rank = SEVERITY_RANK.get(al.get("severity"), 0)
+            sev[al["metric"]] = max(sev.get(al["metric"], 0), rank)
+    return sev
+
+
+def _metric_key(mid: str, m: Dict[str, Any], severity: Dict[str, int]) -> Tuple:
+    cur, tgt = m.get("current"), m.get("target")
+    deviation = 0.0
+    if m.get("has_target") and cur is not None and tgt not in (None, 0):
+        deviation = abs(cur - tgt) / abs(tgt)
+    speed = 0.0
+    if cur not in (None, 0):
+        speed = max((abs(v) / abs(cur) for k, v in m.items() if k.startswith("slope_") and v is not None),
+                    default=0.0)
+    return (severity.get(mid, 0), m.get("status") == "abaixo_meta", deviation,
+            TREND_RANK.get(m.get("trend"), 0), speed)
+
+
+def rank_metrics(snapshot: Dict[str, Any]) -> List[str]:
+    """Ids de métrica da mais p/ a menos importante (empates mantêm a ordem original)."""
+    metrics = snapshot.get("metrics", {})
+    severity = _alert_severity(snapshot)
+    return sorted(metrics, key=lambda mid: _metric_key(mid, metrics[mid], severity), reverse=True)
+
+
+def metric_columns(metrics: Dict[str, Any]) -> List[str]:
+    sample = next(iter(metrics.values()), {})
+    slopes = sorted((k for k in sample if k.startswith("slope_")), key=lambda k: int(k[6:-1]))
+    cols = ["name", "baseline", "current", "target", "tipo", "delta_pct", *slopes, "trend", "status"]
+    return ["id"] + [c for c in cols if c in sample]
+
+################################################################################
+# Compactação
+################################################################################
+
+def _rows(items: Sequence[Dict[str, Any]], columns: Sequence[str]) -> List[List[Any]]:
+    return [[_num(it.get(c)) for c in columns] for it in items]
+
+
+def compact_context(snapshot: Dict[str, Any], budget: int = DEFAULT_BUDGET,
+                    model: str = DEFAULT_MODEL) -> Tuple[str, Dict[str, int]]:
+    """JSON compacto do snapshot que cabe em `budget` tokens.
+
+    Retorna (json, info) com info = tokens usados e linhas mantidas/totais por tabela.
+    """
+    metrics = snapshot.get("metrics", {})
+    ranked = rank_metrics(snapshot)
+    severity = _alert_severity(snapshot)
+    mcols = metric_columns(metrics)
+    metric_rows = {mid: [mid] + [_num(metrics[mid].get(c)) for c in mcols[1:]] for mid in ranked}
+
+    alerts = [al for al in snapshot.get("alerts", []) if isinstance(al, dict)]
+    alerts.sort(key=lambda al: SEVERITY_RANK.get(al.get("severity"), 0), reverse=True)
+
+    tables: Dict[str, Dict[str, Any]] = {
+        "alerts": {"columns": ALERT_COLUMNS, "rows": _rows(alerts, ALERT_COLUMNS)},
+        "metrics": {"columns": mcols, "rows": [metric_rows[mid] for mid in ranked]},
+        "actions": {"columns": ACTION_COLUMNS, "rows": _rows(snapshot.get("actions", []), ACTION_COLUMNS)},
+        "problems": {"columns": PROBLEM_COLUMNS, "rows": _rows(snapshot.get("problems", []), PROBLEM_COLUMNS)},
+    }
+    critical = sum(1 for mid in ranked if severity.get(mid) or metrics[mid].get("status") == "abaixo_meta")
+    # (tabela, de, até) em ordem de prioridade
+    tiers = [("alerts", 0, None), ("metrics", 0, critical), ("actions", 0, None),
+             ("problems", 0, None), ("metrics", critical, None)]
+
+    ctx: Dict[str, Any] = {k: snapshot[k] for k in HEADER_KEYS if k in snapshot}
+    for name, table in tables.items():
+        ctx[name] = {"columns": table["columns"], "rows": []}
+    omitted_stub = {name: 0 for name in tables}
+    used = count_tokens(_dumps({**ctx, "omitidos": omitted_stub}), model)
+
+    added: List[str] = []  # ordem de inclusão, p/ desfazer no ajuste final
+    closed = set()
+    for name, lo, hi in tiers:
+        for row in tables[name]["rows"][lo:hi]:
+            if name in closed:
+                break
+            cost = count_tokens(_dumps(row), model) + 1
+            if used + cost > budget:
+                closed.add(name)  # mantém a ordem de prioridade dentro da tabela
+                break
+            ctx[name]["rows"].append(row)
+            added.append(name)
+            used += cost
+
+    def render() -> str:
+        omitted = {n: len(t["rows"]) - len(ctx[n]["rows"]) for n, t in tables.items()}
+        out = dict(ctx)
+        if any(omitted.values()):
+            out["omitidos"] = {n: k for n, k in omitted.items() if k}
+        return _dumps(out)
+
+    text = render()
+    while count_tokens(text, model) > budget and added:  # soma por linha é aproximada
+        ctx[added.pop()]["rows"].pop()
+        text = render()
+
+    info = {"tokens": count_tokens(text, model)}
+    for n, t in tables.items():
+        info[f"{n}_kept"], info[f"{n}_total"] = len(ctx[n]["rows"]), len(t["rows"])
+    return text, info
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Compacta um snapshot p/ o prompt do relatório")
+    p.add_argument("snapshot", help="structured_snapshot_*.json")
+    p.add_argument("--budget", type=int, default=DEFAULT_BUDGET, help="Orçamento de tokens do contexto")
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    args = p.parse_args()
+
+    with open(args.snapshot, "r", encoding="utf-8") as fp:
+        snapshot = json.load(fp)
+    text, info = compact_context(snapshot, args.budget, args.model)
+    full = count_tokens(json.dumps(snapshot, ensure_ascii=False, indent=2), args.model)
+    print(text)
+    print(json.dumps({"tokens_snapshot_completo": full, **info}, ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
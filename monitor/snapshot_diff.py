@@ -0,0 +1,269 @@
+"""Diff entre dois snapshots estruturados (ou dois pontos do histórico de métricas).
+
+Em vez de reenviar o histórico inteiro ao LLM a cada ciclo (prompt que cresce
+linearmente com o nº de ciclos), o agente quinzenal envia só o que mudou desde
+o ciclo anterior:
+
+- metas_cruzadas        ➜ métricas cujo status em relação à meta mudou
+- tendencias_invertidas ➜ sentido da tendência mudou (alta ⇄ estável ⇄ queda)
+- alertas_novos         ➜ alertas (métrica, issue) que não existiam no anterior
+- alertas_encerrados    ➜ alertas do anterior que não aparecem mais
+- eficacia_alterada     ➜ ações cuja eficácia mudou
+
+Listas vazias são omitidas; o tamanho do delta depende do que mudou no ciclo,
+não de há quanto tempo o plano está rodando.
+
+`diff_history` faz o mesmo para as linhas planas de métricas usadas pelo
+quinzenal.py (um dict métrica ➜ valor por extração): monta o bloco de métricas
+de cada ponto com o metric_engine (trend por slope, status pelas metas do plano)
+e compara o ponto do ciclo anterior com o atual. `diff_frame(frame_history(df, ts))`
+faz o mesmo direto do extrato tipado, sem converter cada linha em dict.
+
+Uso
+---
+$ python snapshot_diff.py structured_snapshot_anterior.json structured_snapshot_atual.json
+$ python snapshot_diff.py --repo snapshots.db --contratante 2 --planejamento 1   # dois últimos do repositório
+"""
+from __future__ import annotations
+import argparse, json, re, sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metric_engine
+
+CYCLE_DAYS = 15     # ciclo quinzenal
+TREND_WINDOW = 7    # janela da tendência nos pontos do histórico (dias)
+EPSILON = 0.1       # mesmos limiares de classify_trend no generate_analysis
+FAST_FACTOR = 2
+TS_KEYS = ("data_hora_analise",)  # coluna de data das linhas do histórico (qualquer caixa)
+TS = "_ts"                        # coluna de data interna do history_frame
+TS_FORMAT = "%Y-%m-%dT%H:%M:%SZ"  # datas de/para vindas de colunas datetime
+
+################################################################################
+# Diff de snapshots
+################################################################################
+
+def direction(trend: Optional[str]) -> int:
+    """up/up_fast ➜ 1, down/down_fast ➜ -1, flat/stable/None ➜ 0."""
+    if not trend:
+        return 0
+    if trend.startswith("up"):
+        return 1
+    if trend.startswith("down"):
+        return -1
+    return 0
+
+
+def _num(v: Any) -> Any:
+    if isinstance(v, float):
+        v = round(v, 4)
+        return int(v) if v.is_integer() else v
+    return v
+
+
+def _crossed(old: Optional[str], new: Optional[str]) -> bool:
+    """Passou de fora da meta p/ dentro (ou o contrário); acima ⇄ dentro não conta."""
+    if "sem_meta" in (old, new) or None in (old, new):
+        return False
+    return (old == "abaixo_meta") != (new == "abaixo_meta")
+
+
+def diff_metrics(prev: Dict[str, Any], curr: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(metas_cruzadas, tendencias_invertidas) entre dois blocos `metrics`."""
+    crossed, flipped = [], []
+    for mid, m in curr.items():
+        old = prev.get(mid)
+        if old is None:
+            continue
+        if _crossed(old.get("status"), m.get("status")):
+            crossed.append({"metric": mid, "de": old.get("status"), "para": m.get("status"),
+                            "anterior": _num(old.get("current")), "atual": _num(m.get("current")),
+                            "target": _num(m.get("target"))})
+        if direction(m.get("trend")) != direction(old.get("trend")):
+            flipped.append({"metric": mid, "de": old.get("trend"), "para": m.get("trend"),
+                            "anterior": _num(old.get("current")), "atual": _num(m.get("current"))})
+    return crossed, flipped
+
+
+def _alert_keys(snapshot: Dict[str, Any]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    return {(al.get("metric"), al.get("issue")): al
+            for al in snapshot.get("alerts", []) if isinstance(al, dict)}
+
+
+def diff_alerts(prev: Dict[str, Any], curr: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(alertas_novos, alertas_encerrados), casando alertas por (métrica, issue)."""
+    old, new = _alert_keys(prev), _alert_keys(curr)
+    opened = [{"metric": k[0], "issue": k[1], "severity": al.get("severity")}
+              for k, al in new.items() if k not in old]
+    closed = [{"metric": k[0], "issue": k[1]} for k in old if k not in new]
+    return opened, closed
+
+
+def diff_actions(prev: Dict[str, Any], curr: Dict[str, Any]) -> List[Dict[str, Any]]:
+    old = {str(a.get("action_id")): a for a in prev.get("actions", [])}
+    changed = []
+    for a in curr.get("actions", []):
+        o = old.get(str(a.get("action_id")))
+        if o is not None and o.get("eficacia") != a.get("eficacia"):
+            changed.append({"action_id": a.get("action_id"), "de": o.get("eficacia"), "para": a.get("eficacia"),
+                            "observado_de": _num(o.get("observado")), "observado_para": _num(a.get("observado"))})
+    return changed
+
+
+def diff_snapshots(prev: Dict[str, Any], curr: Dict[str, Any]) -> Dict[str, Any]:
+    """Só o que mudou de `prev` para `curr` (snapshots estruturados ou dicts com `metrics`)."""
+    crossed, flipped = diff_metrics(prev.get("metrics", {}), curr.get("metrics", {}))
+    opened, closed = diff_alerts(prev, curr)
+    delta: Dict[str, Any] = {
+        "de": (prev.get("window") or {}).get("end"),
+        "para": (curr.get("window") or {}).get("end"),
+        "metas_cruzadas": crossed,
+        "tendencias_invertidas": flipped,
+        "alertas_novos": opened,
+        "alertas_encerrados": closed,
+        "eficacia_alterada": diff_actions(prev, curr),
+    }
+    delta = {k: v for k, v in delta.items() if v}
+    if not any(isinstance(v, list) for v in delta.values()):
+        delta["sem_mudancas"] = True
+    return delta
+
+################################################################################
+# Pontos do histórico (linhas planas métrica ➜ valor)
+################################################################################
+
+def _norm(name: str) -> str:
+    """'%SKU com Estoque Zero' e 'percent_sku_com_estoque_zero' ➜ mesma chave (regra do mapping_metrics)."""
+    key = re.sub(r"\s+", "_", str(name).strip().lower().replace("%", "percent_"))
+    return re.sub(r"_+", "_", key)
+
+
+def _ts_key(row: Dict[str, Any]) -> Optional[str]:
+    return next((k for k in row if k.lower() in TS_KEYS), None)
+
+
+def history_frame(rows: Sequence[Dict[str, Any]]) -> pd.DataFrame:
+    """Linhas ➜ DataFrame numérico com a coluna `TS` de datas.
+
+    Se as datas não avançam (cenários versionados com a mesma data), cada linha
+    vira um dia consecutivo, p/ que a ordem das versões defina a tendência.
+    """
+    df = pd.DataFrame(list(rows))
+    ts_key = _ts_key(rows[0]) if rows else None
+    ts = pd.to_datetime(df.pop(ts_key), errors="coerce", utc=True).dt.tz_localize(None) if ts_key else None
+    return _history(df, ts)
+
+
+def frame_history(df: pd.DataFrame, ts_col: str) -> pd.DataFrame:
+    """Extrato já tipado (datas em `ts_col`) ➜ mesmo formato de `history_frame`, sem passar por dicts."""
+    ts = df[ts_col]
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert(None)
+    return _history(df.drop(columns=[ts_col]), ts.reset_index(drop=True))
+
+
+def _history(df: pd.DataFrame, ts: Optional[pd.Series]) -> pd.DataFrame:
+    df = df.reset_index(drop=True)
+    if ts is None or ts.isna().any() or not ts.is_monotonic_increasing or ts.duplicated().any():
+        ts = pd.Series(pd.date_range("2000-01-01", periods=len(df), freq="D"))
+    df = df.apply(pd.to_numeric, errors="coerce").dropna(axis=1, how="all")
+    df.insert(0, TS, ts.to_numpy())
+    return df
+
+
+def _relevance(columns: Sequence[str], targets: Dict[str, Any]) -> pd.DataFrame:
+    """Tabela no formato de relacao_relevancia (metric_id, has_target, target) p/ attach_targets.
+
+    As metas do plano casam com as colunas pelo nome, em maiúsculas ou canônico.
+    """
+    by_name = {_norm(k): v for k, v in (targets or {}).items() if isinstance(v, (int, float))}
+    return pd.DataFrame({
+        metric_engine.METRIC_COL: list(columns),
+        "has_target": [_norm(c) in by_name for c in columns],
+        "target": [by_name.get(_norm(c), np.nan) for c in columns],
+    })
+
+
+def history_point(df: pd.DataFrame, targets: Dict[str, Any], *, window: int = TREND_WINDOW) -> Dict[str, Any]:
+    """Bloco `metrics` (como no snapshot) calculado sobre as linhas de `df`."""
+    cols = [c for c in df.columns if c != TS]
+    stats = metric_engine.metric_stats(df, TS, cols, windows=(window,), eps=EPSILON, fast_factor=FAST_FACTOR)
+    stats = metric_engine.attach_targets(stats, _relevance(cols, targets))
+    return metric_engine.metrics_block(stats)
+
+
+def previous_cut(ts: pd.Series, cycle_days: int = CYCLE_DAYS) -> int:
+    """Nº de linhas que formam o ponto do ciclo anterior (até data atual - cycle_days)."""
+    n = int(np.searchsorted(ts.to_numpy(), (ts.iloc[-1] - pd.Timedelta(days=cycle_days)).to_datetime64(),
+                            side="right"))
+    return n if n >= 1 else len(ts) - 1
+
+
+def diff_history(rows: Sequence[Dict[str, Any]], targets: Optional[Dict[str, Any]] = None, *,
+                 cycle_days: int = CYCLE_DAYS, window: int = TREND_WINDOW) -> Dict[str, Any]:
+    """Delta entre o ponto do ciclo anterior e o atual do histórico de métricas."""
+    if len(rows) < 2:
+        return {"ciclos": len(rows), "sem_historico": True}
+    ts_key = _ts_key(rows[0])
+    labels = [r.get(ts_key) for r in rows] if ts_key else None
+    return diff_frame(history_frame(rows), targets, labels, cycle_days=cycle_days, window=window)
+
+
+def diff_frame(df: pd.DataFrame, targets: Optional[Dict[str, Any]] = None, labels: Optional[Sequence[Any]] = None, *,
+               cycle_days: int = CYCLE_DAYS, window: int = TREND_WINDOW) -> Dict[str, Any]:
+    """`diff_history` sobre o histórico já no formato de `history_frame` (ex.: de `frame_history`).
+
+    `labels[i]` é a data da linha i como veio na origem (sem elas, a coluna `TS`);
+    datas viram texto no formato das linhas do quinzenal.py.
+    """
+    if len(df) < 2:
+        return {"ciclos": len(df), "sem_historico": True}
+    cut = previous_cut(df[TS], cycle_days)
+    prev = history_point(df.iloc[:cut], targets or {}, window=window)
+    curr = history_point(df, targets or {}, window=window)
+    delta = diff_snapshots({"metrics": prev}, {"metrics": curr})
+    if labels is None:
+        labels = df[TS]
+    delta["de"], delta["para"] = (_label(labels[i]) for i in (cut - 1, len(df) - 1))
+    return {"ciclos": len(df), **delta}
+
+
+def _label(v: Any) -> Any:
+    return v.strftime(TS_FORMAT) if isinstance(v, pd.Timestamp) else v
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Diferenças entre dois snapshots estruturados")
+    p.add_argument("snapshots", nargs="*", help="anterior.json atual.json")
+    p.add_argument("--repo", help="Repositório SQLite (snapshot_repo.py): compara os dois últimos")
+    p.add_argument("--contratante", type=int)
+    p.add_argument("--planejamento", type=int)
+    args = p.parse_args()
+
+    if args.repo:
+        from snapshot_repo import SnapshotRepo
+        if args.contratante is None or args.planejamento is None:
+            p.error("--repo exige --contratante e --planejamento")
+        with SnapshotRepo(args.repo) as repo:
+            snaps = repo.recent(args.contratante, args.planejamento, 2)
+        if len(snaps) < 2:
+            print("menos de dois snapshots no repositório", file=sys.stderr)
+            return 1
+    elif len(args.snapshots) == 2:
+        snaps = []
+        for path in args.snapshots:
+            with open(path, "r", encoding="utf-8") as fp:
+                snaps.append(json.load(fp))
+    else:
+        p.error("informe dois snapshots ou --repo")
+    print(json.dumps(diff_snapshots(*snaps), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Repositório de snapshots indexado em SQLite.
+
+Cada snapshot (structured_snapshot_<ts>.json) vira uma linha em `snapshots`,
+chaveada por (contratante_id, planejamento_id, run_timestamp), com o documento
+inteiro guardado comprimido (zlib) e as colunas de consulta à parte. Os valores
+de cada métrica vão também para `snapshot_metrics`, de modo que
+
+- último snapshot de um contratante/planejamento  ➜ `latest`
+- snapshots numa janela de datas                   ➜ `in_window` (só cabeçalhos, ou documentos)
+- métrica X em todos os snapshots                  ➜ `metric_history`
+
+são respondidas pelo índice, sem descomprimir/parsear os documentos (só
+`latest` e `in_window(full=True)` descomprimem o que devolvem).
+
+Uso
+---
+$ python snapshot_repo.py index snapshot/snapshots snapshots.db          # indexa JSONs já existentes
+$ python snapshot_repo.py latest snapshots.db --contratante 2 --planejamento 1
+$ python snapshot_repo.py metric snapshots.db custo_total_estoque_positivo --contratante 2
+"""
+from __future__ import annotations
+import argparse, json, sqlite3, sys, zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id              INTEGER PRIMARY KEY,
+    contratante_id  INTEGER NOT NULL,
+    planejamento_id INTEGER NOT NULL,
+    run_timestamp   TEXT NOT NULL,
+    window_start    TEXT,
+    window_end      TEXT,
+    n_alerts        INTEGER,
+    path            TEXT,
+    blob            BLOB NOT NULL,
+    UNIQUE (contratante_id, planejamento_id, run_timestamp)
+);
+CREATE INDEX IF NOT EXISTS snapshots_window ON snapshots (contratante_id, planejamento_id, window_end);
+CREATE TABLE IF NOT EXISTS snapshot_metrics (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    metric_id   TEXT NOT NULL,
+    baseline    REAL,
+    current     REAL,
+    target      REAL,
+    delta_abs   REAL,
+    delta_pct   REAL,
+    trend       TEXT,
+    status      TEXT,
+    slopes      TEXT,
+    PRIMARY KEY (snapshot_id, metric_id)
+);
+CREATE INDEX IF NOT EXISTS snapshot_metrics_metric ON snapshot_metrics (metric_id, snapshot_id);
+"""
+HEADER_COLS = ["id", "contratante_id", "planejamento_id", "run_timestamp",
+               "window_start", "window_end", "n_alerts", "path"]
+METRIC_COLS = ["baseline", "current", "target", "delta_abs", "delta_pct", "trend", "status"]
+
+
+def compress(snapshot: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def decompress(blob: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(blob))
+
+
+class SnapshotRepo:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # vários processos do modo batch gravando
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "SnapshotRepo":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------ escrita
+    def put(self, snapshot: Dict[str, Any], path: Optional[str] = None) -> int:
+        """Grava (ou substitui) o snapshot; devolve o id."""
+        window = snapshot.get("window") or {}
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM snapshots WHERE contratante_id = ? AND planejamento_id = ? AND run_timestamp = ?",
+                (snapshot["contratante_id"], snapshot["planejamento_id"], snapshot["run_timestamp"]))
+            cur = self.conn.execute(
+                "INSERT INTO snapshots (contratante_id, planejamento_id, run_timestamp, window_start, window_end,"
+                " n_alerts, path, blob) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (snapshot["contratante_id"], snapshot["planejamento_id"], snapshot["run_timestamp"],
+                 window.get("start"), window.get("end"), len(snapshot.get("alerts", [])),
+                 str(path) if path else None, compress(snapshot)))
+            sid = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO snapshot_metrics (snapshot_id, metric_id, baseline, current, target, delta_abs,"
+                " delta_pct, trend, status, slopes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(sid, mid, *(m.get(c) for c in METRIC_COLS),
+                  json.dumps({k: v for k, v in m.items() if k.startswith("slope_")}))
+                 for mid, m in snapshot.get("metrics", {}).items()])
+        return sid
+
+    def index_dir(self, root: str | Path) -> int:
+        """Indexa os structured_snapshot_*.json de uma árvore de diretórios."""
+        n = 0
+        for p in sorted(Path(root).rglob("structured_snapshot_*.json")):
+            with open(p, "r", encoding="utf-8") as fp:
+                snap = json.load(fp)
+            if "contratante_id" in snap and "run_timestamp" in snap:
+                self.put(snap, str(p))
+                n += 1
+        return n
+
+    # ---------------------------------------------------------------- consultas
+    def latest(self, contratante: int, planejamento: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT blob FROM snapshots WHERE contratante_id = ? AND planejamento_id = ?"
+            " ORDER BY window_end DESC, run_timestamp DESC LIMIT 1", (contratante, planejamento)).fetchone()
+        return decompress(row[0]) if row else None
+
+    def recent(self, contratante: int, planejamento: int, n: int = 2) -> List[Dict[str, Any]]:
+        """Os `n` snapshots mais recentes, em ordem cronológica (p/ o snapshot_diff)."""
+        rows = self.conn.execute(
+            "SELECT blob FROM snapshots WHERE contratante_id = ? AND planejamento_id = ?"
+            " ORDER BY window_end DESC, run_timestamp DESC LIMIT ?", (contratante, planejamento, n)).fetchall()
+        return [decompress(r[0]) for r in reversed(rows)]
+
+    def in_window(self, contratante: int, planejamento: int, start: Optional[str] = None,
+                  end: Optional[str] = None, full: bool = False) -> List[Dict[str, Any]]:
+        """Snapshots cujo fim de janela cai em [start, end] (datas ISO), em ordem cronológica.
+
+        full=False devolve só os cabeçalhos (sem descomprimir nada).
+        """
+        sql = (f"SELECT {', '.join(HEADER_COLS)}{', blob' if full else ''} FROM snapshots"
+               " WHERE contratante_id = ? AND planejamento_id = ?")
+        params: List[Any] = [contratante, planejamento]
+        if start:
+            sql += " AND window_end >= ?"
+            params.append(str(start))
+        if end:
+            sql += " AND window_end <= ?"
+            params.append(str(end))
+        rows = self.conn.execute(sql + " ORDER BY window_end, run_timestamp", params).fetchall()
+        if full:
+            return [decompress(r[-1]) for r in rows]
+        return [dict(zip(HEADER_COLS, r)) for r in rows]
+
+    def metric_history(self, metric_id: str, contratante: Optional[int] = None,
+                       planejamento: Optional[int] = None) -> pd.DataFrame:
+        """Valores de uma métrica em todos os snapshots (uma linha por snapshot)."""
+        sql = ("SELECT s.contratante_id, s.planejamento_id, s.run_timestamp, s.window_end, "
+               + ", ".join(f"m.{c}" for c in METRIC_COLS) + ", m.slopes"
+               " FROM snapshot_metrics m JOIN snapshots s ON s.id = m.snapshot_id WHERE m.metric_id = ?")
+        params: List[Any] = [metric_id]
+        if contratante is not None:
+            sql += " AND s.contratante_id = ?"
+            params.append(contratante)
+        if planejamento is not None:
+            sql += " AND s.planejamento_id = ?"
+            params.append(planejamento)
+        sql += " ORDER BY s.contratante_id, s.planejamento_id, s.window_end, s.run_timestamp"
+        df = pd.read_sql_query(sql, self.conn, params=params)
+        df["slopes"] = df["slopes"].map(json.loads)
+        return df
+
+################################################################################
+# CLI
+################################################################################
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Repositório SQLite de snapshots")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    i = sub.add_parser("index", help="Indexa JSONs de snapshot existentes")
+    i.add_argument("root")
+    i.add_argument("db")
+    lt = sub.add_parser("latest", help="Último snapshot de um contratante/planejamento")
+    lt.add_argument("db")
+    lt.add_argument("--contratante", type=int, required=True)
+    lt.add_argument("--planejamento", type=int, required=True)
+    w = sub.add_parser("window", help="Cabeçalhos dos snapshots numa janela")
+    w.add_argument("db")
+    w.add_argument("--contratante", type=int, required=True)
+    w.add_argument("--planejamento", type=int, required=True)
+    w.add_argument("--start")
+    w.add_argument("--end")
+    m = sub.add_parser("metric", help="Histórico de uma métrica em todos os snapshots")
+    m.add_argument("db")
+    m.add_argument("metric_id")
+    m.add_argument("--contratante", type=int)
+    m.add_argument("--planejamento", type=int)
+    args = p.parse_args()
+
+    if args.cmd == "index":
+        with SnapshotRepo(args.db) as repo:
+            print(f"{repo.index_dir(args.root)} snapshots indexados em {args.db}")
+        return 0
+    with SnapshotRepo(args.db) as repo:
+        if args.cmd == "latest":
+            snap = repo.latest(args.contratante, args.planejamento)
+            print(json.dumps(snap, ensure_ascii=False, indent=2) if snap else "nenhum snapshot")
+        elif args.cmd == "window":
+            print(json.dumps(repo.in_window(args.contratante, args.planejamento, args.start, args.end),
+                             ensure_ascii=False, indent=2))
+        else:
+            print(repo.metric_history(args.metric_id, args.contratante, args.planejamento).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""Estado persistido p/ atualização incremental do snapshot.
+
+Para cada (contratante, planejamento) guarda, por métrica:
+
+- baseline / baseline_ts  ➜ primeiro valor não-nulo (origem do eixo x)
+- current  / current_ts   ➜ último valor não-nulo
+- sums[d] = n, sx, sy, sxx, sxy, lo
+                          ➜ somas da regressão na janela [current_ts - d, current_ts],
+                            uma por janela de temporality_days (lo = 1º ponto dentro dela)
+- points                  ➜ pontos (ts, x, y) da maior janela, p/ retirar das somas quem sai
+                            (e p/ a reta das projeções, `state_stats(fit_days=...)`)
+
+x = dias inteiros desde baseline_ts. Com extrações sempre no mesmo horário (o
+caso do pipeline diário) a inclinação é a mesma de `generate_analysis.slope`;
+`verify_state` compara o estado com o recálculo completo do metric_engine.
+
+Cada linha nova de extrato custa O(métricas × janelas × pontos que saem): não é
+preciso reler o histórico. O arquivo é um JSON em
+<state_dir>/contratante=<id>/planejamento=<id>/state.json
+"""
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import metric_engine
+
+SCHEMA_VERSION = 3  # 3: extrato recortado na janela [data_inicio, data_fim] do planejamento
+DAY = pd.Timedelta(days=1)
+
+################################################################################
+# Atualização
+################################################################################
+
+def new_state(contratante: int, planejamento: int, windows: Sequence[int] = (7,),
+              primary: Optional[int] = None) -> Dict[str, Any]:
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "contratante_id": contratante,
+        "planejamento_id": planejamento,
+        "windows": list(windows),
+        "primary": windows[0] if primary is None else primary,
+        "first_ts": None,
+        "last_ts": None,
+        "metrics": {},
+    }
+
+
+def _push(m: Dict[str, Any], ts: pd.Timestamp, y: float) -> None:
+    """Acrescenta um ponto à série e retira de cada janela os pontos vencidos."""
+    if m["current_ts"] is not None and ts <= pd.Timestamp(m["current_ts"]):
+        raise ValueError(f"Ponto fora de ordem ({ts} <= {m['current_ts']}); reconstrua o estado")
+    x = float((ts - pd.Timestamp(m["baseline_ts"])) // DAY)
+    points = m["points"]
+    points.append([ts.isoformat(), x, y])
+    m["current"], m["current_ts"] = y, ts.isoformat()
+
+    for days, acc in m["sums"].items():
+        acc[0] += 1
+        acc[1] += x
+        acc[2] += y
+        acc[3] += x * x
+        acc[4] += x * y
+        start = ts - pd.Timedelta(days=int(days))
+        while pd.Timestamp(points[acc[5]][0]) < start:
+            _, ox, oy = points[acc[5]]
+            acc[0] -= 1
+            acc[1] -= ox
+            acc[2] -= oy
+            acc[3] -= ox * ox
+            acc[4] -= ox * oy
+            acc[5] += 1
+
+    # descarta o que já saiu da maior janela
+    drop = min(acc[5] for acc in m["sums"].values())
+    if drop:
+        del points[:drop]
+        for acc in m["sums"].values():
+            acc[5] -= drop
+
+
+def update_state(state: Dict[str, Any], df_new: pd.DataFrame, ts_col: str,
+                 metric_cols: Sequence[str]) -> int:
+    """Aplica linhas novas de extrato (ordenadas por data) ao estado. Retorna nº de linhas usadas."""
+    metrics = state["metrics"]
+    last = pd.Timestamp(state["last_ts"]) if state["last_ts"] else None
+    used = 0
+    for rec in df_new.sort_values(ts_col, kind="mergesort").to_dict("records"):
+        ts = pd.Timestamp(rec[ts_col])
+        if last is not None and ts <= last:
+            continue  # já incorporada
+        for mid in metric_cols:
+            y = rec.get(mid)
+            if y is None or pd.isna(y):
+                continue
+            y = float(y)
+            m = metrics.get(mid)
+            if m is None:
+                m = metrics[mid] = {
+                    "baseline": y, "baseline_ts": ts.isoformat(),
+                    "current": None, "current_ts": None,
+                    "sums": {str(d): [0, 0.0, 0.0, 0.0, 0.0, 0] for d in state["windows"]},
+                    "points": [],
+                }
+            _push(m, ts, y)
+        if state["first_ts"] is None:
+            state["first_ts"] = ts.isoformat()
+        state["last_ts"] = ts.isoformat()
+        last = ts
+        used += 1
+    return used
+
+
+def rebuild_state(df_history: pd.DataFrame, ts_col: str, metric_cols: Sequence[str],
+                  contratante: int, planejamento: int, windows: Sequence[int] = (7,),
+                  primary: Optional[int] = None) -> Dict[str, Any]:
+    """Reconstrói o estado do zero a partir do histórico completo."""
+    state = new_state(contratante, planejamento, windows, primary)
+    update_state(state, df_history, ts_col, metric_cols)
+    return state
+
+################################################################################
+# Leitura do estado
+################################################################################
+
+def state_stats(state: Dict[str, Any], metric_order: Optional[Sequence[str]] = None, *,
+                eps: float, fast_factor: int, fit_days: Optional[int] = None) -> pd.DataFrame:
+    """Mesmo formato de `metric_engine.metric_stats` (índice metric_id), a partir do estado.
+
+    As colunas fit_* (`fit_days`) saem dos pontos guardados, então fit_days não
+    pode passar da maior janela de temporality_days.
+    """
+    windows = state["windows"]
+    mids = [m for m in (metric_order or state["metrics"]) if m in state["metrics"]]
+    base = np.empty(len(mids))
+    cur = np.empty(len(mids))
+    slopes = np.zeros((len(mids), len(windows)))
+    for i, mid in enumerate(mids):
+        m = state["metrics"][mid]
+        base[i], cur[i] = m["baseline"], m["current"]
+        for j, d in enumerate(windows):
+            n, sx, sy, sxx, sxy, _ = m["sums"][str(d)]
+            var = n * sxx - sx * sx
+            slopes[i, j] = (n * sxy - sx * sy) / var if n >= 2 and var != 0 else 0.0
+
+    out = pd.DataFrame({"baseline": base, "current": cur},
+                       index=pd.Index(mids, name=metric_engine.METRIC_COL))
+    out["delta_abs"] = out["current"] - out["baseline"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["delta_pct"] = (out["delta_abs"] / out["baseline"] * 100).where(out["baseline"] != 0)
+    metric_engine.add_trends(out, slopes, windows, state["primary"], eps=eps, fast_factor=fast_factor)
+    if fit_days:
+        if fit_days > max(windows):
+            raise ValueError(f"fit_days={fit_days} maior que a maior janela do estado ({max(windows)})")
+        points = [state["metrics"][mid]["points"] for mid in mids]
+        sizes = np.array([len(p) for p in points])
+        ts = pd.to_datetime([p[0] for pts in points for p in pts]).to_numpy(dtype="datetime64[ns]")
+        y = np.array([p[2] for pts in points for p in pts], dtype=float)
+        gid = np.repeat(np.arange(len(mids)), sizes)
+        for col, values in metric_engine.window_fit(ts, y, gid, np.cumsum(sizes) - 1, fit_days).items():
+            out[col] = values
+    return out
+
+
+def verify_state(state: Dict[str, Any], df_history: pd.DataFrame, ts_col: str,
+                 metric_cols: Sequence[str], *, eps: float, fast_factor: int,
+                 fit_days: Optional[int] = None, tol: float = 1e-6) -> List[str]:
+    """Compara o estado com o recálculo completo (metric_engine). Lista divergências."""
+    full = metric_engine.metric_stats(df_history, ts_col, metric_cols, windows=state["windows"],
+                                      primary=state["primary"], eps=eps, fast_factor=fast_factor,
+                                      fit_days=fit_days)
+    full.index = full.index.astype(str)
+    inc = state_stats(state, metric_cols, eps=eps, fast_factor=fast_factor, fit_days=fit_days)
+
+    diffs: List[str] = []
+    if list(full.index) != list(inc.index):
+        diffs.append(f"métricas divergem: {sorted(set(full.index) ^ set(inc.index))}")
+    for mid in full.index.intersection(inc.index):
+        for col in full.columns:
+            a, b = full.at[mid, col], inc.at[mid, col]
+            if col.startswith("trend") or col == "fit_end":
+                if a != b:
+                    diffs.append(f"{mid}.{col}: {b} (estado) != {a} (completo)")
+            elif not (pd.isna(a) and pd.isna(b)) and not np.isclose(a, b, rtol=tol, atol=tol):
+                diffs.append(f"{mid}.{col}: {b} (estado) != {a} (completo)")
+    first = df_history[ts_col].min()
+    if state["first_ts"] is None or pd.Timestamp(state["first_ts"]) != first:
+        diffs.append(f"first_ts: {state['first_ts']} (estado) != {first} (completo)")
+    return diffs
+
+################################################################################
+# Persistência
+################################################################################
+
+def state_path(state_dir: str | Path, contratante: int, planejamento: int) -> Path:
+    return Path(state_dir) / f"contratante={contratante}" / f"planejamento={planejamento}" / "state.json"
+
+
+def load_state(path: str | Path, windows: Optional[Sequence[int]] = None) -> Optional[Dict[str, Any]]:
+    """Estado salvo, ou None se não existir / for de outro formato / outras janelas."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as fp:
+        state = json.load(fp)
+    if state.get("schema_version") != SCHEMA_VERSION:
+        return None  # formato antigo ➜ força reconstrução
+    if windows is not None and state["windows"] != list(windows):
+        return None  # temporality_days mudou ➜ força reconstrução
+    return state
+
+
+def save_state(state: Dict[str, Any], path: str | Path) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)  # troca atômica: nunca deixa estado pela metade
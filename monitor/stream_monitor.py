@@ -0,0 +1,470 @@
+"""Monitor contínuo: ingere linhas novas do extrato e alerta na hora.
+
+Processo de longa duração que consome linhas do extrato de métricas (JSONL no
+stdin ou arquivos novos num diretório vigiado) e mantém, por contratante ×
+métrica, estatísticas online em memória constante:
+
+- EWMA / variância EWMA   ➜ média e desvio "de longo prazo" (alpha = EWMA_ALPHA)
+- janela de `temporality` dias (config.yaml) num buffer circular de CAPACITY
+  pontos por contratante ➜ variância da janela e a inclinação de
+  `generate_analysis.slope`, classificada como em `classify_trend`
+
+Alertas (uma linha JSON por alerta, mesmo formato do bloco `alerts` do
+snapshot + contratante, value):
+
+- desvio_ewma          ➜ |valor - EWMA| > Z_THRESHOLD desvios (após WARMUP pontos)
+- volatilidade         ➜ desvio da janela > VOL_RATIO × desvio EWMA (ao entrar no regime)
+- up_fast / down_fast  ➜ tendência da janela passa a ser rápida (na transição; no máximo
+                         um alerta de tendência por métrica a cada janela) e a inclinação
+                         se destaca do ruído (o limiar de classify_trend é absoluto, em
+                         unidades/dia): |t| da inclinação acima do quantil de SLOPE_Z no t
+                         de Student com n - 2 g.l. e variação na janela ≥ TREND_STD
+                         desvios EWMA; senão a tendência conta como up/down
+
+Nada do histórico é relido: com --state o estado (arrays NumPy) é gravado em
+.npz e a próxima execução continua de onde parou, inclusive nos arquivos do
+diretório vigiado (JSONL pelo offset; CSV uma vez, quando para de crescer).
+Linhas com data ≤ à última vista do contratante são ignoradas.
+
+Uso
+---
+$ tail -F extratos.jsonl | python stream_monitor.py --stdin --state stream_state.npz --out alertas.jsonl
+$ python stream_monitor.py --watch ./extratos --interval 30 --state stream_state.npz
+$ python stream_monitor.py --watch ./extratos --once           # processa o que houver e sai
+"""
+from __future__ import annotations
+import argparse, json, logging, math, os, sys, time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+import metric_engine
+import metric_store
+from metric_store import LEGACY_TENANT_COLS, LEGACY_TS_COLS, TENANT_COL, TS_COL
+
+CONFIG_PATH = Path(__file__).with_name("config.yaml")
+MAPPING_PATH = Path(__file__).resolve().parents[1] / "database" / "mapping_metrics.json"
+STATE_VERSION = 1
+
+EPSILON = 0.1         # mesmos limiares de generate_analysis.classify_trend
+FAST_FACTOR = 2
+EWMA_ALPHA = 0.1      # peso do ponto novo na média/variância de longo prazo
+Z_THRESHOLD = 4.0
+WARMUP = 10           # pontos antes de julgar desvios
+VOL_RATIO = 3.0
+MIN_POINTS = 4        # pontos na janela p/ julgar tendência e volatilidade
+SLOPE_Z = 3.9         # tendência rápida: inclinação significativa (≈ p 1e-4 bilateral) ...
+TREND_STD = 3.0       # ... e variação na janela (slope × dias) ≥ TREND_STD desvios EWMA
+REL_STD_FLOOR = 0.01  # desvio mínimo = 1% da média (série constante não dispara a cada ruído)
+CAPACITY_PER_DAY = 4  # extrações por dia que cabem no buffer da janela
+
+DAY_NS = 86_400 * 10 ** 9
+NAT = np.iinfo(np.int64).min
+TRENDS = np.array(sorted(["flat", "up", "up_fast", "down", "down_fast"]))  # ordenado p/ searchsorted
+FAST = {"up_fast", "down_fast"}
+FLAT = int(np.searchsorted(TRENDS, "flat"))
+
+Row = Tuple[str, pd.Timestamp, Dict[str, float]]
+
+
+def t_critical(z: float, df: np.ndarray) -> np.ndarray:
+    """Quantil do t de Student com `df` g.l. correspondente ao quantil `z` da normal
+    (expansão de Cornish-Fisher: erro < 5% p/ df ≥ 5; abaixo disso sai menor que o exato)."""
+    df = np.maximum(np.asarray(df, dtype=float), 1.0)
+    z2 = z * z
+    return z * (1 + (z2 + 1) / (4 * df) + (5 * z2 * z2 + 16 * z2 + 3) / (96 * df * df))
+
+
+def _temporality() -> int:
+    with open(CONFIG_PATH, "r", encoding="utf-8") as fp:
+        return int((yaml.safe_load(fp) or {}).get("temporality", 7))
+
+################################################################################
+# Estado online
+################################################################################
+
+class StreamMonitor:
+    """Estatísticas online por contratante × métrica em arrays NumPy.
+
+    Memória: O(contratantes × métricas × capacity), independente de quantas
+    linhas já passaram. Cada linha custa O(métricas × capacity) em operações
+    vetorizadas sobre o contratante da linha.
+    """
+
+    def __init__(self, window: Optional[int] = None, capacity: Optional[int] = None, *,
+                 alpha: float = EWMA_ALPHA, z: float = Z_THRESHOLD, warmup: int = WARMUP,
+                 vol_ratio: float = VOL_RATIO, eps: float = EPSILON, fast_factor: int = FAST_FACTOR,
+                 slope_z: float = SLOPE_Z, trend_std: float = TREND_STD):
+        self.window = window or _temporality()
+        self.capacity = capacity or CAPACITY_PER_DAY * (self.window + 1)
+        self.alpha, self.z, self.warmup, self.vol_ratio = alpha, z, warmup, vol_ratio
+        self.eps, self.fast_factor = eps, fast_factor
+        self.slope_z, self.trend_std = slope_z, trend_std
+        self.tenants: List[str] = []
+        self.metrics: List[str] = []
+        self._tidx: Dict[str, int] = {}
+        self._midx: Dict[str, int] = {}
+        self.rows = self.stale = 0
+        self._alloc(0, 0)
+
+    # ------------------------------------------------------------ arrays
+    def _alloc(self, n_tenants: int, n_metrics: int) -> None:
+        T, M, C = n_tenants, n_metrics, self.capacity
+        self.ts_ring = np.full((T, C), NAT, dtype=np.int64)
+        self.y_ring = np.full((T, M, C), np.nan)
+        self.seen = np.zeros(T, dtype=np.int64)          # pontos gravados no buffer (slot = seen % C)
+        self.last_ts = np.full(T, NAT, dtype=np.int64)
+        self.ewma = np.zeros((T, M))
+        self.ewvar = np.zeros((T, M))
+        self.count = np.zeros((T, M), dtype=np.int64)
+        self.trend = np.full((T, M), FLAT, dtype=np.int8)  # índice em TRENDS
+        self.volatile = np.zeros((T, M), dtype=bool)
+        self.trend_alert = np.full((T, M), NAT, dtype=np.int64)  # último alerta de tendência
+
+    _ARRAYS = ("ts_ring", "y_ring", "seen", "last_ts", "ewma", "ewvar", "count", "trend", "volatile",
+               "trend_alert")
+    _METRIC_ARRAYS = ("y_ring", "ewma", "ewvar", "count", "trend", "volatile", "trend_alert")
+
+    def _grow(self, n_tenants: int, n_metrics: int) -> None:
+        """Realoca os arrays (contratantes dobram de capacidade; métricas crescem no exato)."""
+        old = {k: getattr(self, k) for k in self._ARRAYS}
+        cap_t, cap_m = old["ewma"].shape
+        if n_tenants > cap_t:
+            cap_t = max(n_tenants, 2 * cap_t)
+        self._alloc(cap_t, max(n_metrics, cap_m))
+        for k, arr in old.items():
+            getattr(self, k)[tuple(slice(0, s) for s in arr.shape)] = arr
+
+    def _tenant(self, tenant: str) -> int:
+        t = self._tidx.get(tenant)
+        if t is None:
+            t = self._tidx[tenant] = len(self.tenants)
+            self.tenants.append(tenant)
+            if t >= len(self.seen):
+                self._grow(t + 1, len(self.metrics))
+        return t
+
+    def _columns(self, names: Iterable[str]) -> List[int]:
+        new = [m for m in names if m not in self._midx]
+        if new:
+            for m in new:
+                self._midx[m] = len(self.metrics)
+                self.metrics.append(m)
+            self._grow(len(self.seen), len(self.metrics))
+        return [self._midx[m] for m in names]
+
+    # ----------------------------------------------------------- atualização
+    def update(self, tenant: str, ts: pd.Timestamp, values: Dict[str, float]) -> List[Dict[str, Any]]:
+        """Incorpora uma linha do extrato; devolve os alertas que ela disparou."""
+        t = self._tenant(str(tenant))
+        cols = self._columns(values)
+        now = pd.Timestamp(ts).value
+        if self.last_ts[t] != NAT and now <= self.last_ts[t]:
+            self.stale += 1
+            return []
+        self.rows += 1
+        M = len(self.metrics)
+        y = np.full(M, np.nan)
+        y[cols] = list(values.values())
+        valid = ~np.isnan(y)
+
+        slot = self.seen[t] % self.capacity
+        self.ts_ring[t, slot] = now
+        self.y_ring[t, :M, slot] = y
+        self.seen[t] += 1
+        self.last_ts[t] = now
+
+        # desvio contra a EWMA *antes* do ponto novo
+        mean, var, cnt = self.ewma[t, :M].copy(), self.ewvar[t, :M].copy(), self.count[t, :M].copy()
+        std = np.maximum(np.sqrt(var), np.maximum(REL_STD_FLOOR * np.abs(mean), 1e-9))
+        with np.errstate(invalid="ignore"):
+            z = np.abs(y - mean) / std
+        spike = valid & (cnt >= self.warmup) & (z > self.z)
+
+        diff = np.where(valid, y - mean, 0.0)
+        incr = self.alpha * diff
+        first = valid & (cnt == 0)
+        self.ewma[t, :M] = np.where(first, y, mean + incr)
+        self.ewvar[t, :M] = np.where(first, 0.0, np.where(valid, (1 - self.alpha) * (var + diff * incr), var))
+        self.count[t, :M] = cnt + valid
+
+        n, slope, wstd, tstat = self._window(t, now)
+        labels = metric_engine.classify_trend_vec(slope, self.eps, self.fast_factor)
+        # eps é absoluto (unidades/dia): "rápida" só vale se a reta se destaca do ruído ➜ senão up/down
+        weak = np.isin(labels, list(FAST)) & ((tstat < t_critical(self.slope_z, n - 2))
+                                              | (np.abs(slope) * self.window < self.trend_std * std))
+        labels = np.where(weak, np.where(slope > 0, "up", "down"), labels)
+        codes = np.searchsorted(TRENDS, labels).astype(np.int8)
+        prev = self.trend[t, :M]
+        last = self.trend_alert[t, :M]
+        quiet = (last == NAT) | (now - last >= self.window * DAY_NS)  # série ruidosa alterna up_fast/down_fast
+        turned = valid & (n >= MIN_POINTS) & (codes != prev) & np.isin(labels, list(FAST)) & quiet
+        self.trend_alert[t, :M] = np.where(turned, now, last)
+        self.trend[t, :M] = np.where(valid & (n >= MIN_POINTS), codes, prev)
+
+        vol = valid & (cnt >= self.warmup) & (n >= MIN_POINTS) & (wstd > self.vol_ratio * std)
+        entered = vol & ~self.volatile[t, :M]
+        self.volatile[t, :M] = np.where(valid, vol, self.volatile[t, :M])
+
+        alerts = []
+        stamp = pd.Timestamp(ts).isoformat()
+        for j in np.flatnonzero(spike | turned | entered):
+            mid, val = self.metrics[j], float(y[j])
+            if spike[j]:
+                alerts.append(self._alert(tenant, mid, "desvio_ewma", "alta", stamp, val,
+                                          f"{mid} {val} a {z[j]:.1f} desvios da média móvel {mean[j]:.4g}"))
+            if entered[j]:
+                alerts.append(self._alert(tenant, mid, "volatilidade", "média", stamp, val,
+                                          f"Desvio na janela de {self.window}d {wstd[j]:.4g} = "
+                                          f"{wstd[j] / std[j]:.1f}x o histórico"))
+            if turned[j]:
+                alerts.append(self._alert(tenant, mid, str(labels[j]), "média", stamp, val,
+                                          f"Tendência {labels[j]} (slope {round(float(slope[j]), 3)})"))
+        return alerts
+
+    def _window(self, t: int, now: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(pontos, inclinação, desvio, |t| da inclinação) por métrica na janela [now - window dias, now],
+        como generate_analysis.last_window + slope."""
+        M = len(self.metrics)
+        ring_ts = self.ts_ring[t]
+        in_win = (ring_ts != NAT) & (ring_ts >= now - self.window * DAY_NS)
+        wts = ring_ts[in_win]
+        x = ((wts - wts.min()) // DAY_NS).astype(float) if len(wts) else wts.astype(float)  # .days
+        yw = self.y_ring[t, :M][:, in_win]
+        ok = ~np.isnan(yw)
+        n = ok.sum(axis=1)
+        xw = np.where(ok, x, 0.0)
+        yw = np.where(ok, yw, 0.0)
+        sx, sy = xw.sum(axis=1), yw.sum(axis=1)
+        sxx, sxy, syy = (xw * xw).sum(axis=1), (xw * yw).sum(axis=1), (yw * yw).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var_x = n * sxx - sx * sx
+            slope = np.where((n >= 2) & (var_x > 0), (n * sxy - sx * sy) / var_x, 0.0)
+            wstd = np.sqrt(np.maximum(syy / n - (sy / n) ** 2, 0.0))
+            # |t| da inclinação contra o resíduo da reta na janela
+            resid = np.sqrt(np.maximum(n * wstd ** 2 - slope * (sxy - sx * sy / n), 0.0) / np.maximum(n - 2, 1))
+            tstat = np.where((n > 2) & (var_x > 0), np.abs(slope) / (resid / np.sqrt(var_x / n)), 0.0)
+        return n, slope, wstd, np.nan_to_num(tstat, nan=0.0, posinf=np.inf)
+
+    def stats(self, tenant: str) -> pd.DataFrame:
+        """Estado atual de um contratante (índice metric_id)."""
+        t = self._tidx[str(tenant)]
+        M = len(self.metrics)
+        n, slope, wstd, tstat = self._window(t, int(self.last_ts[t]))
+        return pd.DataFrame({
+            "count": self.count[t, :M], "ewma": self.ewma[t, :M], "ewstd": np.sqrt(self.ewvar[t, :M]),
+            "window_n": n, "window_std": wstd, f"slope_{self.window}d": slope, "slope_t": tstat,
+            "trend": metric_engine.classify_trend_vec(slope, self.eps, self.fast_factor),
+        }, index=pd.Index(self.metrics, name=metric_engine.METRIC_COL))
+
+    @staticmethod
+    def _alert(tenant: str, metric: str, issue: str, severity: str, stamp: str, value: float,
+               detail: str) -> Dict[str, Any]:
+        return {"contratante": str(tenant), "metric": metric, "issue": issue, "detail": detail,
+                "severity": severity, "timestamp": stamp, "value": value}
+
+    # ------------------------------------------------------------ persistência
+    def save(self, path: str | Path, sources: Optional[Dict[str, Any]] = None) -> None:
+        T, M = len(self.tenants), len(self.metrics)
+        arrays = {k: getattr(self, k)[:T] for k in self._ARRAYS}
+        for k in self._METRIC_ARRAYS:  # eixo 1 = métricas
+            arrays[k] = arrays[k][:, :M]
+        arrays["tenants"] = np.array(self.tenants, dtype=str)
+        arrays["metrics"] = np.array(self.metrics, dtype=str)
+        header = {"version": STATE_VERSION, "window": self.window, "capacity": self.capacity,
+                  "rows": self.rows, "stale": self.stale, "sources": sources or {}}
+        arrays["header"] = np.array(json.dumps(header, ensure_ascii=False))
+        tmp = Path(path).with_suffix(".tmp.npz")
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)  # troca atômica: nunca deixa estado pela metade
+
+    @classmethod
+    def load(cls, path: str | Path, **kwargs) -> Tuple["StreamMonitor", Dict[str, Any]]:
+        """(monitor, fontes já lidas) do .npz gravado por `save`."""
+        with np.load(path, allow_pickle=False) as z:
+            header = json.loads(str(z["header"]))
+            if header.get("version") != STATE_VERSION:
+                raise ValueError(f"estado {path} é da versão {header.get('version')}")
+            mon = cls(header["window"], header["capacity"], **kwargs)
+            mon.tenants, mon.metrics = z["tenants"].tolist(), z["metrics"].tolist()
+            mon._tidx = {t: i for i, t in enumerate(mon.tenants)}
+            mon._midx = {m: i for i, m in enumerate(mon.metrics)}
+            for k in cls._ARRAYS:
+                setattr(mon, k, z[k].copy())
+        mon.rows, mon.stale = header["rows"], header["stale"]
+        return mon, header["sources"]
+
+################################################################################
+# Entradas
+################################################################################
+
+class RowParser:
+    """Registro (JSON) ➜ (contratante, data, {métrica: valor}) com nomes canônicos."""
+
+    def __init__(self, mapping: Optional[dict] = None):
+        self.rename = {v: k for k, v in (mapping or {}).items()}
+
+    def __call__(self, rec: Dict[str, Any]) -> Optional[Row]:
+        tenant = ts = None
+        values: Dict[str, float] = {}
+        for key, v in rec.items():
+            name = self.rename.get(key, key)
+            if name == TENANT_COL or key in LEGACY_TENANT_COLS:
+                tenant = v
+            elif name.lower() == TS_COL or key in LEGACY_TS_COLS:
+                ts = v
+            elif isinstance(v, (int, float)) and not isinstance(v, bool):
+                if not math.isnan(v):
+                    values[name] = float(v)
+            elif isinstance(v, str) and v.strip():
+                try:
+                    values[name] = float(v)
+                except ValueError:
+                    pass
+        if tenant is None or ts is None:
+            return None
+        stamp = pd.Timestamp(ts)
+        if stamp.tzinfo is not None:
+            stamp = stamp.tz_convert("UTC").tz_localize(None)  # como o metric_store: UTC, sem fuso
+        return str(tenant), stamp, values
+
+
+def iter_jsonl(fp: TextIO, parse: RowParser) -> Iterator[Row]:
+    for n, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = parse(json.loads(line))
+        except (ValueError, TypeError) as e:
+            logging.warning(f"linha {n} ignorada: {e}")
+            continue
+        if row is not None:
+            yield row
+
+
+class DirectoryWatcher:
+    """Arquivos novos de um diretório: *.jsonl lidos a partir do último offset,
+    *.csv lidos uma vez quando o tamanho para de mudar entre duas varreduras."""
+
+    def __init__(self, root: str | Path, parse: RowParser, mapping: Optional[dict] = None,
+                 sources: Optional[Dict[str, Any]] = None, exclude: Iterable[str | Path] = ()):
+        self.root, self.parse, self.mapping = Path(root), parse, mapping
+        self.exclude = {Path(p).resolve() for p in exclude}
+        self.offsets: Dict[str, int] = dict((sources or {}).get("offsets", {}))
+        self.done: Dict[str, List[int]] = dict((sources or {}).get("done", {}))
+        self._sizes: Dict[str, int] = {}
+
+    def sources(self) -> Dict[str, Any]:
+        return {"root": str(self.root), "offsets": self.offsets, "done": self.done}
+
+    def poll(self) -> Iterator[Row]:
+        files = sorted((p for p in self.root.iterdir() if p.suffix in (".jsonl", ".csv") and p.is_file()
+                        and p.resolve() not in self.exclude),
+                       key=lambda p: (p.stat().st_mtime_ns, p.name))
+        for path in files:
+            yield from (self._jsonl(path) if path.suffix == ".jsonl" else self._csv(path))
+
+    def _jsonl(self, path: Path) -> Iterator[Row]:
+        start = self.offsets.get(path.name, 0)
+        if path.stat().st_size < start:
+            start = 0  # arquivo truncado/recriado
+        with open(path, "rb") as fp:
+            fp.seek(start)
+            data = fp.read()
+        end = data.rfind(b"\n") + 1  # só linhas completas
+        if end:
+            yield from iter_jsonl(data[:end].decode("utf-8").splitlines(), self.parse)
+            self.offsets[path.name] = start + end
+
+    def _csv(self, path: Path) -> Iterator[Row]:
+        st = path.stat()
+        sig = [st.st_size, st.st_mtime_ns]
+        if self.done.get(path.name) == sig:
+            return
+        if self._sizes.get(path.name) != st.st_size:
+            self._sizes[path.name] = st.st_size  # ainda pode estar sendo escrito: espera a próxima varredura
+            return
+        df = metric_store.read_csv_typed(path, self.mapping).sort_values(TS_COL, kind="mergesort")
+        metric_cols = [c for c in df.columns if c not in (TENANT_COL, TS_COL)]
+        tenants, stamps = df[TENANT_COL].astype(str).tolist(), df[TS_COL].tolist()
+        for i, vals in enumerate(df[metric_cols].itertuples(index=False, name=None)):
+            yield tenants[i], stamps[i], {m: v for m, v in zip(metric_cols, vals) if v == v}
+        self.done[path.name] = sig
+
+################################################################################
+# Loop
+################################################################################
+
+def consume(monitor: StreamMonitor, rows: Iterable[Row], emit: Callable[[Dict[str, Any]], None]) -> int:
+    """Aplica as linhas ao monitor e emite os alertas; devolve nº de alertas."""
+    n = 0
+    for tenant, ts, values in rows:
+        for alert in monitor.update(tenant, ts, values):
+            emit(alert)
+            n += 1
+    return n
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Monitor contínuo do extrato de métricas com alertas online")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--stdin", action="store_true", help="Lê linhas JSONL do stdin")
+    src.add_argument("--watch", help="Diretório vigiado (*.jsonl e *.csv novos)")
+    p.add_argument("--interval", type=float, default=30.0, help="Segundos entre varreduras do diretório")
+    p.add_argument("--once", action="store_true", help="Com --watch: uma varredura e sai")
+    p.add_argument("--state", default=None, help="Estado .npz (carregado no início, gravado a cada varredura/saída)")
+    p.add_argument("--out", default=None, help="Arquivo JSONL de alertas (padrão: stdout)")
+    p.add_argument("--mapping", default=str(MAPPING_PATH), help="mapping_metrics.json (cabeçalhos legados)")
+    p.add_argument("--window", type=int, default=None, help="Janela da tendência em dias (padrão: temporality)")
+    p.add_argument("--alpha", type=float, default=EWMA_ALPHA)
+    p.add_argument("--z", type=float, default=Z_THRESHOLD)
+    p.add_argument("--slope_z", type=float, default=SLOPE_Z, help="Significância (z) da inclinação p/ alerta de tendência")
+    p.add_argument("--trend_std", type=float, default=TREND_STD, help="Variação mínima na janela (desvios EWMA)")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stderr)
+
+    sources: Dict[str, Any] = {}
+    if args.state and Path(args.state).is_file():
+        monitor, sources = StreamMonitor.load(args.state, alpha=args.alpha, z=args.z, slope_z=args.slope_z, trend_std=args.trend_std)
+        logging.info(f"estado retomado: {len(monitor.tenants)} contratante(s), {monitor.rows} linha(s)")
+    else:
+        monitor = StreamMonitor(args.window, alpha=args.alpha, z=args.z, slope_z=args.slope_z, trend_std=args.trend_std)
+
+    out = open(args.out, "a", encoding="utf-8") if args.out else sys.stdout
+
+    def emit(alert: Dict[str, Any]) -> None:
+        out.write(json.dumps(alert, ensure_ascii=False) + "\n")
+        out.flush()
+
+    mapping = metric_store.load_mapping(args.mapping)
+    parse = RowParser(mapping)
+    try:
+        if args.stdin:
+            consume(monitor, iter_jsonl(sys.stdin, parse), emit)
+            return 0
+        watcher = DirectoryWatcher(args.watch, parse, mapping, sources, exclude=[args.out] if args.out else [])
+        while True:
+            n = consume(monitor, watcher.poll(), emit)
+            if args.once:  # CSV visto pela 1ª vez só é lido quando a 2ª varredura confirma o tamanho
+                n += consume(monitor, watcher.poll(), emit)
+            if args.state:
+                monitor.save(args.state, watcher.sources())
+            logging.info(f"varredura: {monitor.rows} linha(s) no total, {n} alerta(s) novo(s)")
+            if args.once:
+                return 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if args.stdin and args.state:
+            monitor.save(args.state, sources)
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
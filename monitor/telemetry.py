@@ -0,0 +1,474 @@
+"""Telemetria leve: tempo de cada etapa e tokens, custo e latência de cada chamada ao LLM.
+
+- `span("etapa")`                       ➜ cronometra um bloco; spans aninhados viram "pai/filho"
+- `tenant(contratante, planejamento)`   ➜ rótulos herdados por tudo que roda dentro do bloco
+                                          (contextvars: vale p/ threads de asyncio.to_thread e tasks)
+- `record_llm(model, prompt_tokens, completion_tokens, seconds, ...)` ➜ uma chamada ao LLM;
+  `llm_cache.chat_completion` e o `LangChainHandler` (callbacks= do ChatOpenAI) já registram sozinhos
+- `profiled(path)`                      ➜ cProfile de uma execução, gravado em .prof (pstats/snakeviz)
+
+Cada evento vira uma linha em <TELEMETRY_DIR>/events.jsonl (um único `os.write` num
+arquivo aberto com O_APPEND: processos de um pool escrevem no mesmo arquivo sem
+misturar linhas) e é somado em contadores em memória. `flush()` — chamado sozinho
+ao fim do processo — grava os contadores em <TELEMETRY_DIR>/<job>.prom, no formato
+texto do Prometheus (textfile collector do node_exporter). Os contadores são do
+processo: o .prom de cada job traz a última execução (ou, num processo longo como o
+Streamlit, tudo desde que ele subiu).
+
+O custo por evento é de poucos microssegundos (perf_counter, json.dumps e um write),
+desprezível diante das etapas medidas; ver benchmarks/bench_telemetry.py.
+
+Variáveis de ambiente
+---------------------
+TELEMETRY_DIR        diretório de saída (padrão: monitor/telemetry)
+TELEMETRY_DISABLE=1  desliga tudo (spans e registros viram no-op)
+TELEMETRY_PRICES     JSON {"modelo": [entrada, saída]} em US$ por 1M de tokens (sobrepõe PRICES)
+TELEMETRY_PROFILE    arquivo .prof padrão de `profiled()` (ex.: --profile sem caminho)
+
+Uso
+---
+$ python telemetry.py summary                          # tempo por etapa e LLM por contratante
+$ python telemetry.py summary --job generate_analysis --since 2024-06-01
+"""
+from __future__ import annotations
+import argparse, atexit, contextvars, json, os, sys, threading, time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+DEFAULT_DIR = Path(__file__).with_name("telemetry")
+EVENTS_NAME = "events.jsonl"
+MAX_EVENTS_BYTES = 64 * 1024 * 1024  # acima disso o events.jsonl vira events.jsonl.1 (na abertura)
+
+# US$ por 1M de tokens (entrada, saída); o modelo casa pelo prefixo mais longo
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "o3-mini": (1.10, 4.40),
+    "o4-mini": (1.10, 4.40),
+}
+
+_PATH: contextvars.ContextVar[Tuple[str, ...]] = contextvars.ContextVar("telemetry_path", default=())
+_LABELS: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("telemetry_labels", default={})
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "sim")
+
+
+def _prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(PRICES)
+    raw = os.getenv("TELEMETRY_PRICES")
+    if raw:
+        prices.update({m: tuple(p) for m, p in json.loads(raw).items()})
+    return prices
+
+
+class _Registry:
+    """Contadores do processo + descritor do events.jsonl (recriado após fork)."""
+
+    def __init__(self, job: str, out_dir: Path, enabled: bool):
+        self.job = job
+        self.dir = out_dir
+        self.enabled = enabled
+        self.pid = os.getpid()
+        self.fd: Optional[int] = None
+        self.lock = threading.Lock()
+        self.prices = _prices()
+        # (stage, tenant) ➜ [segundos, execuções, erros]
+        self.stages: Dict[Tuple[str, str], list] = {}
+        # (model, stage, tenant, cached) ➜ [chamadas, tokens entrada, tokens saída, custo, segundos]
+        self.llm: Dict[Tuple[str, str, str, str], list] = {}
+        self.flush_at_exit = False
+
+    def write(self, event: Dict[str, Any]) -> None:
+        line = (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        if self.fd is None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            path = self.dir / EVENTS_NAME
+            try:
+                if path.stat().st_size > MAX_EVENTS_BYTES:
+                    os.replace(path, path.with_name(EVENTS_NAME + ".1"))
+            except FileNotFoundError:
+                pass
+            self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.write(self.fd, line)
+
+    def price(self, model: str) -> Optional[Tuple[float, float]]:
+        best = max((m for m in self.prices if model.startswith(m)), key=len, default=None)
+        return self.prices.get(best) if best else None
+
+
+_REG: Optional[_Registry] = None
+_REG_LOCK = threading.Lock()
+
+
+def _registry() -> _Registry:
+    global _REG
+    reg = _REG
+    if reg is not None and reg.pid == os.getpid():
+        return reg
+    with _REG_LOCK:
+        if _REG is None or _REG.pid != os.getpid():  # 1º uso ou processo filho (fork): contadores zerados
+            old = _REG
+            _REG = _Registry(old.job if old else Path(sys.argv[0] or "monitor").stem or "monitor",
+                             old.dir if old else Path(os.getenv("TELEMETRY_DIR") or DEFAULT_DIR),
+                             old.enabled if old else not _env_flag("TELEMETRY_DISABLE"))
+        return _REG
+
+
+def configure(job: Optional[str] = None, out_dir: str | Path | None = None,
+              enabled: Optional[bool] = None) -> None:
+    """Nome do job (rótulo e nome do .prom) e diretório; grava o .prom ao fim do processo."""
+    reg = _registry()
+    if job is not None:
+        reg.job = job
+    if out_dir is not None:
+        reg.dir = Path(out_dir)
+        if reg.fd is not None:
+            os.close(reg.fd)
+            reg.fd = None
+    if enabled is not None:
+        reg.enabled = enabled
+    if not reg.flush_at_exit:
+        reg.flush_at_exit = True
+        pid = reg.pid
+        atexit.register(lambda: flush() if os.getpid() == pid else None)
+
+
+def _labels() -> Dict[str, Any]:
+    return _LABELS.get()
+
+################################################################################
+# Spans e rótulos
+################################################################################
+
+@contextmanager
+def span(stage: str, **labels) -> Iterator[None]:
+    """Cronometra o bloco como `stage` (dentro de outro span: "pai/stage")."""
+    reg = _registry()
+    if not reg.enabled:
+        yield
+        return
+    path = _PATH.get() + (stage,)
+    token = _PATH.set(path)
+    ok = True
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        seconds = time.perf_counter() - t0
+        _PATH.reset(token)
+        _record_span("/".join(path), seconds, ok, {**_labels(), **labels})
+
+
+def _record_span(stage: str, seconds: float, ok: bool, labels: Dict[str, Any]) -> None:
+    reg = _registry()
+    tenant = str(labels.get("tenant", ""))
+    with reg.lock:
+        acc = reg.stages.setdefault((stage, tenant), [0.0, 0, 0])
+        acc[0] += seconds
+        acc[1] += 1
+        acc[2] += not ok
+        reg.write({"ts": round(time.time(), 3), "job": reg.job, "pid": reg.pid, "kind": "span",
+                   "stage": stage, "seconds": round(seconds, 6), "ok": ok, **labels})
+
+
+@contextmanager
+def tenant(contratante: Any, planejamento: Any = None) -> Iterator[None]:
+    """Rótula spans e chamadas ao LLM de dentro do bloco com o contratante (e planejamento)."""
+    labels = {**_labels(), "tenant": str(contratante)}
+    if planejamento is not None:
+        labels["plan"] = str(planejamento)
+    token = _LABELS.set(labels)
+    try:
+        yield
+    finally:
+        _LABELS.reset(token)
+
+
+def current_stage() -> str:
+    return "/".join(_PATH.get())
+
+################################################################################
+# Chamadas ao LLM
+################################################################################
+
+def cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Custo em US$ pela tabela de preços; None p/ modelo sem preço conhecido."""
+    price = _registry().price(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1e6
+
+
+def record_llm(model: str, prompt_tokens: int = 0, completion_tokens: int = 0, seconds: float = 0.0, *,
+               cached: bool = False, estimated: bool = False, ttft: Optional[float] = None,
+               stage: Optional[str] = None) -> None:
+    """Uma chamada ao LLM. Hit de cache custa 0; `estimated` = tokens contados localmente (tiktoken)."""
+    reg = _registry()
+    if not reg.enabled:
+        return
+    stage = stage if stage is not None else current_stage()
+    usd = 0.0 if cached else cost(model, prompt_tokens, completion_tokens)
+    labels = _labels()
+    key = (model, stage, str(labels.get("tenant", "")), "true" if cached else "false")
+    event = {"ts": round(time.time(), 3), "job": reg.job, "pid": reg.pid, "kind": "llm", "stage": stage,
+             "model": model, "seconds": round(seconds, 6), "prompt_tokens": int(prompt_tokens),
+             "completion_tokens": int(completion_tokens), "cost_usd": usd, "cached": cached, **labels}
+    if estimated:
+        event["estimated"] = True
+    if ttft is not None:
+        event["ttft"] = round(ttft, 6)
+    with reg.lock:
+        acc = reg.llm.setdefault(key, [0, 0, 0, 0.0, 0.0])
+        acc[0] += 1
+        acc[1] += prompt_tokens
+        acc[2] += completion_tokens
+        acc[3] += usd or 0.0
+        acc[4] += seconds
+        reg.write(event)
+
+
+def record_openai(model: str, resp: Any, seconds: float) -> None:
+    """Registra uma resposta do SDK OpenAI (`resp.usage`), rotulada pelo modelo pedido."""
+    usage = getattr(resp, "usage", None)
+    record_llm(model, getattr(usage, "prompt_tokens", 0) or 0,
+               getattr(usage, "completion_tokens", 0) or 0, seconds)
+
+
+def langchain_handler():
+    """Callback p/ `ChatOpenAI(callbacks=[...])`: latência e token_usage de cada chamada."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LangChainHandler(BaseCallbackHandler):
+        run_inline = True  # no async, roda na própria task (contexto com span/contratante)
+
+        def __init__(self):
+            self._runs: Dict[Any, Tuple[float, str, str, Dict[str, Any]]] = {}
+
+        def _start(self, serialized: Dict[str, Any], run_id) -> None:
+            kw = (serialized or {}).get("kwargs", {})
+            self._runs[run_id] = (time.perf_counter(), kw.get("model_name") or kw.get("model") or "",
+                                  current_stage(), _labels())
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+            self._start(serialized, run_id)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+            self._start(serialized, run_id)
+
+        def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+            start = self._runs.pop(run_id, None)
+            if start is None:
+                return
+            t0, model, stage, labels = start
+            out = response.llm_output or {}
+            usage = out.get("token_usage")
+            token = _LABELS.set(labels)
+            try:
+                # sem token_usage ➜ resposta veio do cache do LangChain (llm_cache.langchain_cache)
+                record_llm(model or out.get("model_name", ""), (usage or {}).get("prompt_tokens", 0),
+                           (usage or {}).get("completion_tokens", 0), time.perf_counter() - t0,
+                           cached=usage is None, stage=stage)
+            finally:
+                _LABELS.reset(token)
+
+        def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+            start = self._runs.pop(run_id, None)
+            if start is not None:
+                t0, model, stage, labels = start
+                _record_span(stage + "/llm_error" if stage else "llm_error", time.perf_counter() - t0, False,
+                             {**labels, "model": model})
+
+    return LangChainHandler()
+
+################################################################################
+# Perfil (cProfile)
+################################################################################
+
+@contextmanager
+def profiled(path: str | Path | None = None) -> Iterator[None]:
+    """cProfile do bloco, gravado em `path` (ou TELEMETRY_PROFILE, ou <dir>/<job>_<ts>.prof)."""
+    import cProfile
+    reg = _registry()
+    path = Path(path or os.getenv("TELEMETRY_PROFILE")
+                or reg.dir / f"{reg.job}_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.prof")
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        prof.dump_stats(str(path))
+        print(f"Perfil gravado em {path} (python -m pstats {path})", file=sys.stderr)
+
+################################################################################
+# Contadores: pool de processos e Prometheus
+################################################################################
+
+def drain() -> Dict[str, Any]:
+    """Tira (e zera) os contadores do processo; p/ um worker devolver ao processo pai."""
+    reg = _registry()
+    with reg.lock:
+        out = {"stages": list(reg.stages.items()), "llm": list(reg.llm.items())}
+        reg.stages, reg.llm = {}, {}
+    return out
+
+
+def merge(counters: Dict[str, Any]) -> None:
+    """Soma os contadores devolvidos por `drain()` de outro processo."""
+    reg = _registry()
+    with reg.lock:
+        for name in ("stages", "llm"):
+            target = getattr(reg, name)
+            for key, vals in counters.get(name, []):
+                acc = target.setdefault(tuple(key), [0] * len(vals))
+                for i, v in enumerate(vals):
+                    acc[i] += v
+
+
+def _esc(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name: str, labels: Dict[str, Any], value: float) -> str:
+    inner = ",".join(f'{k}="{_esc(v)}"' for k, v in labels.items() if v != "")
+    return f"{name}{{{inner}}} {value if isinstance(value, int) else repr(float(value))}"
+
+
+def prometheus_text() -> str:
+    """Contadores do processo no formato texto do Prometheus."""
+    reg = _registry()
+    job = reg.job
+    with reg.lock:
+        stages, llm = dict(reg.stages), dict(reg.llm)
+    lines = []
+
+    def block(name: str, kind: str, help_: str, samples) -> None:
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(_sample(name, labels, v) for labels, v in samples)
+
+    lines.append("# HELP monitor_stage_duration_seconds Tempo gasto em cada etapa.")
+    lines.append("# TYPE monitor_stage_duration_seconds summary")
+    for (st, tn), (s, n, _) in sorted(stages.items()):
+        lines.append(_sample("monitor_stage_duration_seconds_sum", {"job": job, "stage": st, "tenant": tn}, s))
+        lines.append(_sample("monitor_stage_duration_seconds_count", {"job": job, "stage": st, "tenant": tn}, n))
+    block("monitor_stage_errors_total", "counter", "Etapas que terminaram em exceção.",
+          [({"job": job, "stage": st, "tenant": tn}, e) for (st, tn), (_, _, e) in sorted(stages.items()) if e])
+    block("monitor_llm_requests_total", "counter", "Chamadas ao LLM (cached=true: respondidas pelo cache).",
+          [({"job": job, "model": m, "stage": st, "tenant": tn, "cached": c}, v[0])
+           for (m, st, tn, c), v in sorted(llm.items())])
+    block("monitor_llm_tokens_total", "counter", "Tokens consumidos pelo LLM.",
+          [({"job": job, "model": m, "stage": st, "tenant": tn, "type": typ}, v[i])
+           for (m, st, tn, c), v in sorted(llm.items()) if c == "false"
+           for typ, i in (("prompt", 1), ("completion", 2))])
+    block("monitor_llm_cost_usd_total", "counter", "Custo estimado das chamadas ao LLM (US$).",
+          [({"job": job, "model": m, "stage": st, "tenant": tn}, v[3])
+           for (m, st, tn, c), v in sorted(llm.items()) if c == "false"])
+    latency: Dict[Tuple[str, str], list] = {}
+    for (m, _, _, c), v in llm.items():
+        acc = latency.setdefault((m, c), [0.0, 0])
+        acc[0] += v[4]
+        acc[1] += v[0]
+    lines.append("# HELP monitor_llm_latency_seconds Latência das chamadas ao LLM.")
+    lines.append("# TYPE monitor_llm_latency_seconds summary")
+    for (m, c), (s, n) in sorted(latency.items()):
+        lines.append(_sample("monitor_llm_latency_seconds_sum", {"job": job, "model": m, "cached": c}, s))
+        lines.append(_sample("monitor_llm_latency_seconds_count", {"job": job, "model": m, "cached": c}, n))
+    block("monitor_last_run_timestamp_seconds", "gauge", "Momento da última gravação destes contadores.",
+          [({"job": job}, time.time())])
+    return "\n".join(lines) + "\n"
+
+
+def flush() -> Optional[Path]:
+    """Grava <dir>/<job>.prom (atômico: tmp + replace). Sem nada registrado, não grava."""
+    reg = _registry()
+    if not reg.enabled or not (reg.stages or reg.llm):
+        return None
+    reg.dir.mkdir(parents=True, exist_ok=True)
+    path = reg.dir / f"{reg.job}.prom"
+    tmp = path.with_name(f".{path.name}.{reg.pid}.tmp")
+    tmp.write_text(prometheus_text(), encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+################################################################################
+# CLI
+################################################################################
+
+def summary(path: Path, job: Optional[str] = None, since: Optional[str] = None) -> Dict[str, Any]:
+    """Agrega o events.jsonl: tempo por etapa e chamadas/tokens/custo por contratante."""
+    t_min = datetime.fromisoformat(since).timestamp() if since else None
+    stages: Dict[str, list] = {}
+    tenants: Dict[str, list] = {}
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            try:
+                ev = json.loads(line)
+            except json.JSONDecodeError:  # linha cortada (processo morto no meio do write)
+                continue
+            if (job and ev.get("job") != job) or (t_min and ev["ts"] < t_min):
+                continue
+            if ev["kind"] == "span":
+                acc = stages.setdefault(f"{ev['job']}:{ev['stage']}", [0, 0.0, 0.0, 0])
+                acc[0] += 1
+                acc[1] += ev["seconds"]
+                acc[2] = max(acc[2], ev["seconds"])
+                acc[3] += not ev["ok"]
+            else:
+                acc = tenants.setdefault(ev.get("tenant", "-"), [0, 0, 0, 0, 0.0, 0.0])
+                acc[0] += 1
+                acc[1] += ev["cached"]
+                acc[2] += ev["prompt_tokens"]
+                acc[3] += ev["completion_tokens"]
+                acc[4] += ev["cost_usd"] or 0.0
+                acc[5] += ev["seconds"]
+    return {
+        "stages": {k: {"n": n, "total_s": round(s, 3), "mean_s": round(s / n, 4), "max_s": round(mx, 4),
+                       "errors": e} for k, (n, s, mx, e) in sorted(stages.items())},
+        "tenants": {k: {"calls": n, "cached": c, "prompt_tokens": p, "completion_tokens": o,
+                        "cost_usd": round(usd, 4), "llm_s": round(s, 3)}
+                    for k, (n, c, p, o, usd, s) in sorted(tenants.items())},
+    }
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Resumo da telemetria (events.jsonl)")
+    p.add_argument("cmd", choices=["summary"])
+    p.add_argument("--dir", default=None, help="Diretório da telemetria (padrão: TELEMETRY_DIR ou monitor/telemetry)")
+    p.add_argument("--job", default=None, help="Só eventos deste job (ex.: generate_analysis)")
+    p.add_argument("--since", default=None, help="Só eventos a partir desta data/hora ISO")
+    args = p.parse_args()
+
+    path = Path(args.dir or os.getenv("TELEMETRY_DIR") or DEFAULT_DIR) / EVENTS_NAME
+    if not path.exists():
+        print(f"Sem eventos em {path}", file=sys.stderr)
+        return 1
+    out = summary(path, args.job, args.since)
+    print(f"{'etapa':50s} {'n':>6s} {'total s':>10s} {'média s':>10s} {'máx s':>9s} {'erros':>6s}")
+    for k, v in out["stages"].items():
+        print(f"{k:50s} {v['n']:6d} {v['total_s']:10.3f} {v['mean_s']:10.4f} {v['max_s']:9.4f} {v['errors']:6d}")
+    if out["tenants"]:
+        print(f"\n{'contratante':20s} {'chamadas':>9s} {'cache':>6s} {'tok entrada':>12s} {'tok saída':>10s} "
+              f"{'US$':>9s} {'LLM s':>8s}")
+        for k, v in out["tenants"].items():
+            print(f"{k:20s} {v['calls']:9d} {v['cached']:6d} {v['prompt_tokens']:12d} "
+                  f"{v['completion_tokens']:10d} {v['cost_usd']:9.4f} {v['llm_s']:8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
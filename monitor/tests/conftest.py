@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# os módulos do monitor são scripts soltos (import generate_analysis, llm_cache, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,107 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+import batch_jobs
+import llm_cache
+
+
+def _snapshots(root: Path, n: int = 3) -> Path:
+    for i in range(n):
+        d = root / f"contratante_{i}"
+        d.mkdir(parents=True)
+        snapshot = {"metrics": {f"m{i}": {"status": "abaixo_meta"}}, "alerts": [], "llm_summary": ""}
+        (d / f"structured_snapshot_{i}.json").write_text(json.dumps(snapshot), encoding="utf-8")
+    return root
+
+
+def _summaries(root: Path):
+    return sorted(json.loads(p.read_text(encoding="utf-8"))["llm_summary"]
+                  for p in root.rglob("structured_snapshot_*.json"))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = llm_cache.LLMCache(tmp_path / "llm_cache.sqlite")
+    monkeypatch.setattr(llm_cache, "_DEFAULT", cache)  # batch_jobs.run usa get_cache()
+    return cache
+
+
+@pytest.fixture
+def local_backend():
+    server = batch_jobs.make_local_server(0, delay=0.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield batch_jobs.OpenAIBatchBackend(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+    server.shutdown()
+
+
+class FlakyBackend:
+    """Primeiro lote termina em `failed` sem saída; os seguintes respondem tudo."""
+
+    def __init__(self):
+        self.submitted = []
+        self.outputs = {}
+
+    def submit(self, jobs_path):
+        lines = [json.loads(line) for line in Path(jobs_path).read_text(encoding="utf-8").splitlines()]
+        bid = f"batch_{len(self.submitted)}"
+        self.submitted.append([r["custom_id"] for r in lines])
+        if len(self.submitted) > 1:
+            self.outputs[bid] = "".join(json.dumps({
+                "custom_id": r["custom_id"], "error": None,
+                "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "ok"}}]}},
+            }) + "\n" for r in lines)
+        return {"batch_id": bid, "input_file_id": f"file_{bid}"}
+
+    def status(self, batch_id):
+        if batch_id in self.outputs:
+            return {"status": "completed", "output_file_id": batch_id, "error_file_id": None, "counts": {}}
+        return {"status": "failed", "output_file_id": None, "error_file_id": None, "counts": {}}
+
+    def download(self, file_id):
+        return self.outputs[file_id]
+
+
+def test_prepare_submit_collect_resume(tmp_path, cache, local_backend):
+    root = _snapshots(tmp_path / "snapshots")
+    run_dir = tmp_path / "run"
+
+    batch = batch_jobs.BatchRun(run_dir, local_backend, cache=cache)
+    assert batch.prepare(root, ["summary"]) == 3
+    batch.submit()
+    batch_id = batch.manifest["batch_id"]
+
+    # processo interrompido após o envio: outro BatchRun retoma o mesmo lote
+    resumed = batch_jobs.BatchRun(run_dir, local_backend, cache=cache)
+    resumed.submit()
+    assert resumed.manifest["batch_id"] == batch_id
+    assert resumed.wait(poll=0.01, timeout=10) == "completed"
+    assert resumed.collect() == {"ok": 3, "errors": 0}
+    assert _summaries(root) == ["Resumo gerado localmente (servidor de testes)."] * 3
+
+    # rodar de novo não reenvia nem redistribui nada
+    again = batch_jobs.BatchRun(run_dir, local_backend, cache=cache)
+    again.submit()
+    assert again.manifest["batch_id"] == batch_id
+    assert again.collect() == {"ok": 3, "errors": 0}
+
+
+def test_failed_batch_counts_errors_and_rerun_resubmits(tmp_path, cache):
+    root = _snapshots(tmp_path / "snapshots")
+    run_dir = tmp_path / "run"
+    backend = FlakyBackend()
+
+    first = batch_jobs.run(str(root), str(run_dir), backend, kinds=["summary"], poll=0.01, timeout=5)
+    assert first["status"] == "failed"
+    assert first == {**first, "ok": 0, "errors": 3}
+    assert _summaries(root) == [""] * 3
+
+    second = batch_jobs.run(str(root), str(run_dir), backend, kinds=["summary"], poll=0.01, timeout=5)
+    assert second["status"] == "completed"
+    assert second == {**second, "ok": 3, "errors": 0}
+    assert backend.submitted[1] == backend.submitted[0]
+    assert _summaries(root) == ["ok"] * 3
+    manifest = json.loads((run_dir / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["attempts"] == [{"batch_id": "batch_0", "status": "failed", "errors": 3}]
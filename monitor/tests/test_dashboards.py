@@ -0,0 +1,18 @@
+import dashboards
+
+
+def _analysis(n):
+    return {"overall_plan_status": {"actions_complete": n, "actions_in_progress": 1, "actions_delayed": 0,
+                                    "actions_not_started": 2, "overall_completion": f"{10 * n}%"}}
+
+
+def test_few_renders_do_not_start_process_pool(tmp_path):
+    with dashboards.DashboardPool(2, jobs=3) as pool:
+        futs = [pool.submit("acoes", _analysis(n), tmp_path / f"{n}.png") for n in range(3)]
+        assert [f.result() for f in futs] == [dashboards.RENDERED] * 3
+        assert pool._executor is None
+    # reexecução sem mudanças: nada a desenhar ➜ nenhum executor criado
+    with dashboards.DashboardPool(2) as pool:
+        futs = [pool.submit("acoes", _analysis(n), tmp_path / f"{n}.png") for n in range(3)]
+        assert [f.result() for f in futs] == [dashboards.CACHED] * 3
+        assert pool._thread is None and pool._executor is None
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+import stream_monitor
+
+
+def _feed(monitor, values, start="2024-01-01"):
+    alerts = []
+    for ts, v in zip(pd.date_range(start, periods=len(values), freq="D"), values):
+        alerts += monitor.update("1", ts, {"m": float(v)})
+    return alerts
+
+
+def test_flat_noisy_series_emits_no_alerts():
+    # ruído de ±1/dia: a inclinação da janela passa de 2 × eps à toa, mas não é significativa
+    rng = np.random.default_rng(0)
+    monitor = stream_monitor.StreamMonitor(window=7)
+    assert _feed(monitor, 100 + rng.normal(0, 1, 365)) == []
+
+
+def test_steady_ramp_still_alerts_up_fast():
+    rng = np.random.default_rng(0)
+    values = 100 + rng.normal(0, 1, 120)
+    values[60:] += 2.0 * np.arange(60)  # +2/dia a partir do dia 60
+    alerts = _feed(stream_monitor.StreamMonitor(window=7), values)
+    assert [a["issue"] for a in alerts if a["issue"].endswith("_fast")] == ["up_fast"]
@@ -0,0 +1,39 @@
+"""Contagem de tokens dos prompts.
+
+Usa o tokenizador real do modelo (tiktoken) quando disponível; sem tiktoken,
+ou sem acesso ao arquivo de vocabulário (ambiente offline), cai numa
+estimativa por caracteres.
+"""
+from __future__ import annotations
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - dependência opcional
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4o"
+CHARS_PER_TOKEN = 4  # média p/ texto em português + JSON
+
+
+@lru_cache(maxsize=None)
+def encoder_for(model: str = DEFAULT_MODEL):
+    """Tokenizador do modelo, ou None se não der para carregá-lo."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:  # modelo que o tiktoken não conhece
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # vocabulário baixado sob demanda; offline falha
+        logging.warning(f"tiktoken indisponível ({e}); usando estimativa por caracteres")
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    enc = encoder_for(model)
+    if enc is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(enc.encode(text, disallowed_special=()))